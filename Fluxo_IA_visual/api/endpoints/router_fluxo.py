@@ -1,7 +1,7 @@
 # api/endpoints/router_fluxo.py
 
 from fastapi import APIRouter, UploadFile, File, Form, BackgroundTasks, HTTPException, Query, Depends
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import List, Optional
 import uuid
 from pydantic import BaseModel, Field
@@ -14,6 +14,7 @@ from ...models.passport import PassportData
 from ...services.file_manager import FileManagerService
 from ...services.processing_service import ProcessingService
 from ...services.storage_service import StorageService
+from ...services.almacen_resultados import leer_cursor
 from ...models.responses_general import RespuestaProcesamientoIniciado
 from ...services.passport_service import PassportService
 from ...services.webhook_service import WebhookService
@@ -79,7 +80,7 @@ async def procesar_pdf_api(
         for archivo in archivos:
             # Nota: El FileManager ya le inyecta el "hash_documento" a cada archivo 
             # gracias a la modificación que hicimos para el primer servicio.
-            resultado = file_manager.procesar_entrada(archivo)
+            resultado = await file_manager.procesar_entrada(archivo)
             lista_archivos_trabajo.extend(resultado)
     except HTTPException as he:
         raise he
@@ -90,15 +91,11 @@ async def procesar_pdf_api(
     if not lista_archivos_trabajo:
         raise HTTPException(status_code=400, detail="No se encontraron archivos PDF válidos.")
 
-    # 2. Registrar el inicio o actualizar historial sin borrarlo
-    datos_previos = storage.obtener_datos_json(job_id)
-    if not datos_previos:
-        datos_previos = {}
-        
-    datos_previos["estatus"] = "procesando"
-    datos_previos["mensaje"] = "Iniciando Pipeline V2 o recuperando caché..."
-    
-    storage.update_job(job_id, datos_previos)
+    # 2. Registrar el inicio o actualizar historial sin borrarlo (escritura condicional por ETag)
+    await storage.actualizar_campos_job(job_id, {
+        "estatus": "procesando",
+        "mensaje": "Iniciando Pipeline V2 o recuperando caché..."
+    })
 
     # 3. Rescatamos el pool global
     pool_global = request.app.state.process_pool
@@ -151,25 +148,38 @@ class RespuestaPasaporte(BaseModel):
 async def descargar_resultado(
     job_id: UUID, 
     formato: str = Query("excel", enum=["excel", "json"]),
+    fields: Optional[str] = Query(None, description="Solo JSON. Campos separados por coma: de primer nivel (`resultados_generales`) o de cada documento (`resultados_individuales.AnalisisIA`)."),
+    documento: Optional[List[str]] = Query(None, description="Solo JSON. `hash_documento` o `nombre_documento` de los resultados individuales a incluir (repetible)."),
+    cursor: Optional[str] = Query(None, description="Solo JSON. `paginacion.siguiente_cursor` de la página anterior."),
+    limite: Optional[int] = Query(None, ge=1, le=50_000, description="Solo JSON. Transacciones por página (`DetalleTransacciones.transacciones`)."),
     storage: StorageService = Depends(get_storage),
     passport_service: PassportService = Depends(get_passport_service)
 ):
     """
     Intenta descargar. Si no está listo, retorna un 202 (Accepted) con el Pasaporte 
     para que el frontend sepa qué mostrar.
+    El JSON se transmite desde el almacén sin armarlo completo en memoria.
     """
     job_id_str = str(job_id)
     
-    # 1. Intentar buscar el archivo final
-    ruta = storage.obtener_ruta_archivo(job_id_str) if formato == "excel" else storage.obtener_datos_json(job_id_str)
+    # 1. Intentar buscar el archivo final (en el almacén compartido: puede haberlo escrito otra réplica)
+    if formato == "excel":
+        resultado = await storage.abrir_excel(job_id_str)
+    else:
+        campos = [c.strip() for c in fields.split(",") if c.strip()] if fields else None
+        try:
+            leer_cursor(cursor)  # Solo el cursor da 400; un JSON corrupto en el almacén no
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Cursor inválido: {cursor}")
+        resultado = await storage.abrir_json(job_id_str, campos, documento, cursor, limite)
     
-    if ruta:
+    if resultado:
         # SI EXISTE, lo entregamos (Código 200 normal)
-        if formato == "json": return ruta
-        return FileResponse(
-            path=ruta, 
-            filename=f"Reporte_{job_id_str}.xlsx",
-            media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        if formato == "json": return StreamingResponse(resultado, media_type="application/json")
+        return StreamingResponse(
+            resultado,
+            media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            headers={"Content-Disposition": f'attachment; filename="Reporte_{job_id_str}.xlsx"'}
         )
     
     # 2. SI NO EXISTE, buscamos el Pasaporte
@@ -83,7 +83,7 @@ async def extraer_datos_fluxo(
     # 1. Guardar y descomprimir (Streaming a Disco)
     try:
         for archivo in archivos:
-            resultado = file_manager.procesar_entrada(archivo)
+            resultado = await file_manager.procesar_entrada(archivo)
             lista_archivos_trabajo.extend(resultado)
     except HTTPException as he:
         raise he
@@ -94,15 +94,11 @@ async def extraer_datos_fluxo(
     if not lista_archivos_trabajo:
         raise HTTPException(status_code=400, detail="No se encontraron archivos PDF válidos en la subida.")
 
-    # 2. Registrar el inicio del trabajo en disco sin borrar el historial
-    datos_previos = storage.obtener_datos_json(job_id)
-    if not datos_previos:
-        datos_previos = {}
-        
-    datos_previos["estatus"] = "procesando"
-    datos_previos["mensaje"] = "Iniciando lectura de archivos o recuperando caché..."
-    
-    storage.update_job(job_id, datos_previos)
+    # 2. Registrar el inicio del trabajo sin borrar el historial (escritura condicional por ETag)
+    await storage.actualizar_campos_job(job_id, {
+        "estatus": "procesando",
+        "mensaje": "Iniciando lectura de archivos o recuperando caché..."
+    })
 
     # 3. DELEGAMOS AL ORQUESTADOR GENERAL
     background_tasks.add_task(
@@ -128,7 +124,7 @@ async def consultar_resultado(
     """
     Endpoint (Polling) para que el frontend consulte el estatus de su trabajo.
     """
-    job_info = storage.obtener_datos_json(job_id)
+    job_info = await storage.obtener_datos_json(job_id)
     
     if not job_info:
         raise HTTPException(
@@ -24,11 +24,11 @@ async def procesar_precalificacion_bg(rfc: str, job_id: str, orchestrator: Prequ
         data_dict["status"] = "completed"
         data_dict["job_id"] = job_id
         
-        storage.update_job(job_id, data_dict)
+        await storage.update_job(job_id, data_dict)
         logger.info(f"[{rfc}] Job {job_id} completado con éxito.")
     except Exception as e:
         logger.error(f"[{rfc}] Error en Job {job_id}: {e}", exc_info=True)
-        storage.update_job(job_id, {"status": "error", "detail": str(e), "rfc": rfc})
+        await storage.update_job(job_id, {"status": "error", "detail": str(e), "rfc": rfc})
 
 # --- ENDPOINTS ---
 
@@ -41,7 +41,7 @@ async def iniciar_precalificacion(
 ):
     """Retorna un Job ID inmediato e inicia el proceso en el backend."""
     rfc = rfc.strip().upper()
-    job_id = storage.create_pending_job(rfc)
+    job_id = await storage.create_pending_job(rfc)
     
     # Enviar al background
     background_tasks.add_task(procesar_precalificacion_bg, rfc, job_id, orchestrator)
@@ -59,7 +59,7 @@ async def download_syntage_report(
     job_id: str, 
     format: Literal["excel", "json"] = "excel" # Parámetro opcional, Excel por defecto
 ):
-    data = storage.get_json_result(job_id)
+    data = await storage.get_json_result(job_id)
     if not data:
         raise HTTPException(status_code=404, detail="El reporte no existe o ha expirado.")
     
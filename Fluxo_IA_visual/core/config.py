@@ -57,6 +57,34 @@ class Settings(BaseSettings):
     AWS_SECRET_ACCESS_KEY: SecretStr
     AWS_REGION_TEXTRACT: str = "us-east-1"
 
+    # Caché de clasificación IA (descripción canónica -> etiqueta)
+    CACHE_IA_RUTA: str = "downloads/cache/clasificacion_ia.json"
+    CACHE_IA_MAX_ENTRADAS: int = 50_000
+    CACHE_IA_TTL_DIAS: int = 30
+
+    # Almacén de resultados de jobs (JSON/Excel): "disco" (un solo nodo) u "objetos" (S3/MinIO, compartido entre réplicas)
+    RESULTADOS_BACKEND: str = "disco"
+    RESULTADOS_DIR: str = "downloads"
+    RESULTADOS_BUCKET: Optional[str] = None
+    RESULTADOS_PREFIJO: str = "resultados/"
+    RESULTADOS_ENDPOINT_URL: Optional[str] = None # MinIO u otro S3 compatible; None = AWS
+    RESULTADOS_REGION: str = "us-east-1"
+
+    # Despachador global de lotes IA (compartido por todos los documentos del proceso)
+    IA_MAX_CONCURRENCIA: int = 20
+    IA_TOKENS_POR_MINUTO: int = 1_000_000 # 0 desactiva el límite
+    IA_LATENCIA_OBJETIVO_SEG: float = 30.0
+
+    # Carátulas: cuentas de un mismo PDF analizadas en paralelo (cada una = GPT + Qwen)
+    CARATULAS_MAX_CUENTAS_CONCURRENTES: int = 4
+
+    # PDFs publicados a la vez en /dev/shm para los workers; al rebasarlo leen de disco (ver shm_size en docker-compose)
+    SHM_PRESUPUESTO_MB: int = 256
+
+    # Resiliencia de llamadas a OpenAI/OpenRouter
+    IA_MAX_REINTENTOS: int = 3
+    IA_HEDGE_CLASIFICACION: bool = True # Segunda petición si un lote rebasa el p95 del modelo
+
     ## Development settings
     DEBUG: bool = False
     LOG_LEVEL: str = "INFO"
@@ -0,0 +1,240 @@
+# core/cruce_traspasos.py
+
+import re
+import difflib
+import operator
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+# Mismo criterio que la heurística original: ratio de SequenceMatcher >= 0.85 contra una ventana de palabras
+UMBRAL_SIMILITUD_NOMBRE = 0.85
+LARGO_MINIMO_NOMBRE = 4
+
+MOTIVO_CUENTA = "CUENTA"
+MOTIVO_NOMBRE = "NOMBRE"
+
+# Secuencias numéricas de 10 a 18 dígitos (cuentas y CLABEs); ignora montos, fechas y referencias cortas
+REGEX_CUENTA_EN_DESCRIPCION = re.compile(r"\b\d{10,18}\b")
+
+# Sufijos legales (ya sin acentos). Se aplican en este orden, uno tras otro, como siempre se hizo.
+_SUFIJOS_LEGALES = tuple(re.compile(sufijo) for sufijo in (
+    r"\bs\.a\. de c\.v\.\b", r"\bsa de cv\b", r"\bs\.a\.\b", r"\bs a\b",
+    r"\bs\.a\.p\.i\. de c\.v\.\b", r"\bsapi de cv\b", r"\bsapi\b",
+    r"\bs\. de r\.l\. de c\.v\.\b", r"\bs de rl de cv\b", r"\bs de rl\b", r"\bs\. de r\.l\.\b",
+    r"\bc\.v\.\b", r"\bcv\b", r"\bde c\.v\.\b", r"\bde cv\b",
+))
+_REGEX_PUNTUACION = re.compile(r"[^\w\s]")
+_REGEX_ESPACIOS = re.compile(r"\s+")
+_NOMBRES_VACIOS = frozenset({"n/a", "desc.", "desconocido", ""})
+
+# Cota inferior de bigramas compartidos para que una ventana pueda llegar al umbral.
+# Con M caracteres emparejados en r bloques: ratio = 2M / (la + lb) >= 0.85 obliga a
+# lb >= 0.739 * la, y los bloques dejan al menos M - r >= 0.275 * (la + lb) - 1 bigramas
+# del nombre intactos en la descripción, o sea >= 0.478 * la - 1. Se usa 0.47 como margen.
+_FACTOR_BIGRAMAS_MINIMOS = 0.47
+
+def _sin_acentos(texto: str) -> str:
+    """NFKD separa letras de sus modificadores ('ñ' -> 'n' + '~') y el encode ASCII los tira."""
+    return unicodedata.normalize('NFKD', texto).encode('ASCII', 'ignore').decode('utf-8')
+
+@lru_cache(maxsize=4096)
+def limpiar_nombre_empresa(nombre: str) -> str:
+    """Elimina sufijos legales, caracteres especiales y normaliza (ñ->n, acentos) para cruces limpios."""
+    if not nombre or nombre.lower() in _NOMBRES_VACIOS:
+        return ""
+
+    nombre_limpio = _sin_acentos(nombre.lower())
+    for sufijo in _SUFIJOS_LEGALES:
+        nombre_limpio = sufijo.sub("", nombre_limpio)
+
+    # Quitar puntuación extra y dejar solo un espacio entre palabras
+    nombre_limpio = _REGEX_PUNTUACION.sub("", nombre_limpio)
+    return _REGEX_ESPACIOS.sub(" ", nombre_limpio).strip()
+
+def limpiar_descripcion(descripcion: str) -> str:
+    """Minúsculas, sin acentos y sin puntuación (conserva los espacios tal cual)."""
+    return _REGEX_PUNTUACION.sub("", _sin_acentos(descripcion.lower()))
+
+def _bigramas(texto: str) -> Counter:
+    return Counter(map(operator.add, texto, texto[1:]))
+
+def nombre_en_descripcion(
+    nombre_limpio: str, desc_limpia: str, palabras_desc: Sequence[str] = None, comparador: difflib.SequenceMatcher = None
+) -> bool:
+    """
+    Coincidencia exacta o, para OCR ruidoso, una ventana de tantas palabras como el nombre con
+    `SequenceMatcher(None, nombre, fragmento).ratio() >= 0.85`. Antes del ratio completo se
+    descartan las ventanas con las cotas superiores baratas (largo y `quick_ratio`): el resultado
+    es el mismo, solo se evita el cálculo caro donde no puede llegar al umbral.
+    """
+    # 1. Coincidencia Exacta (Vía rápida)
+    if nombre_limpio in desc_limpia:
+        return True
+
+    # 2. Heurística de Texto (Fuzzy Matching)
+    if palabras_desc is None:
+        palabras_desc = desc_limpia.split()
+    largo_nombre = nombre_limpio.count(" ") + 1
+    if len(palabras_desc) < largo_nombre:
+        return False
+
+    if comparador is None:
+        comparador = difflib.SequenceMatcher(None, nombre_limpio)
+    largo_a = len(nombre_limpio)
+
+    for i in range(len(palabras_desc) - largo_nombre + 1):
+        fragmento = " ".join(palabras_desc[i:i + largo_nombre])
+        largo_b = len(fragmento)
+        # Equivale a `real_quick_ratio()`, sin construir el índice del fragmento
+        if 2.0 * min(largo_a, largo_b) / (largo_a + largo_b) < UMBRAL_SIMILITUD_NOMBRE:
+            continue
+        comparador.set_seq2(fragmento)
+        if comparador.quick_ratio() >= UMBRAL_SIMILITUD_NOMBRE and comparador.ratio() >= UMBRAL_SIMILITUD_NOMBRE:
+            return True
+
+    return False
+
+class IndiceTraspasosPropios:
+    """
+    Cruce global de traspasos propios de un lote: cuentas en un set y nombres de cliente ya
+    limpios (una vez por lote, no por transacción) en un índice de bigramas.
+
+    Por descripción: (1) el índice cuenta de un golpe los bigramas que comparte con cada nombre y
+    solo pasan los que alcanzan la cota mínima; (2) coincidencia exacta con esos candidatos;
+    (3) cota de `quick_ratio` para todas las ventanas de todos los candidatos en una sola operación
+    NumPy; (4) `ratio()` solo donde la cota llega al umbral. Cada descripción distinta se evalúa una
+    vez, así que el costo por fila casi no crece con el número de estados de cuenta del lote.
+    """
+
+    def __init__(self, nombres: Iterable[str], cuentas: Iterable[str]):
+        self.cuentas = frozenset(cuentas)
+        self.nombres: List[str] = [
+            nombre for nombre in dict.fromkeys(limpiar_nombre_empresa(n) for n in nombres)
+            if len(nombre) >= LARGO_MINIMO_NOMBRE
+        ]
+        self.palabras_por_nombre: List[Tuple[str, ...]] = [tuple(nombre.split()) for nombre in self.nombres]
+        self._motivos: Dict[str, str] = {}
+        self._comparadores = [difflib.SequenceMatcher(None, nombre) for nombre in self.nombres]
+        self._largos = np.array([len(nombre) for nombre in self.nombres], dtype=np.int64)
+        self._num_palabras = np.array([len(palabras) for palabras in self.palabras_por_nombre], dtype=np.int64)
+        # Sin ningún bigrama en común el ratio no pasa de 0.8, así que el mínimo es 1
+        self._bigramas_minimos = np.array(
+            [max(1, int(_FACTOR_BIGRAMAS_MINIMOS * len(nombre) - 1)) for nombre in self.nombres], dtype=np.int64
+        )
+
+        # Índice de bigramas: una columna por bigrama que aparece en algún nombre. Como todo es
+        # ASCII, el bigrama se codifica como `128 * c1 + c2` y una tabla lo traduce a su columna.
+        bigramas_por_nombre = [_bigramas(nombre) for nombre in self.nombres]
+        columna_bigrama: Dict[str, int] = {}
+        for conteo in bigramas_por_nombre:
+            for bigrama in conteo:
+                columna_bigrama.setdefault(bigrama, len(columna_bigrama))
+        self._columna_por_codigo = np.full(128 * 128, -1, dtype=np.intp)
+        for bigrama, columna in columna_bigrama.items():
+            self._columna_por_codigo[128 * ord(bigrama[0]) + ord(bigrama[1])] = columna
+        self._conteo_bigramas = np.zeros((len(self.nombres), len(columna_bigrama)), dtype=np.int64)
+        for i, conteo in enumerate(bigramas_por_nombre):
+            for bigrama, veces in conteo.items():
+                self._conteo_bigramas[i, columna_bigrama[bigrama]] = veces
+
+        # Conteo de caracteres por nombre (ya son ASCII): base de la cota de `quick_ratio`.
+        # Solo importan los caracteres que aparecen en algún nombre; el resto nunca empareja.
+        conteo_ascii = np.zeros((len(self.nombres), 128), dtype=np.int64)
+        for i, nombre in enumerate(self.nombres):
+            conteo_ascii[i] = np.bincount(np.frombuffer(nombre.encode("ascii"), dtype=np.uint8), minlength=128)
+        self._caracteres = np.flatnonzero(conteo_ascii.any(axis=0))
+        self._conteo_caracteres = conteo_ascii[:, self._caracteres]
+
+    def __bool__(self) -> bool:
+        return bool(self.cuentas or self.nombres)
+
+    def motivo(self, descripcion: str) -> str:
+        """MOTIVO_CUENTA, MOTIVO_NOMBRE o "" si la transacción no es un traspaso propio."""
+        motivo = self._motivos.get(descripcion)
+        if motivo is None:
+            motivo = self._evaluar(descripcion)
+            self._motivos[descripcion] = motivo
+        return motivo
+
+    def cuenta_en_descripcion(self, descripcion: str) -> str:
+        """Primera secuencia numérica de la descripción que es una cuenta del lote ("" si ninguna)."""
+        if self.cuentas:
+            for num_en_desc in REGEX_CUENTA_EN_DESCRIPCION.findall(descripcion.lower()):
+                if num_en_desc in self.cuentas:
+                    return num_en_desc
+        return ""
+
+    def candidatos(self, codigos: np.ndarray) -> np.ndarray:
+        """Índices de los nombres que comparten suficientes bigramas con el texto (bytes ASCII) para poder coincidir."""
+        columnas = self._columna_por_codigo[128 * codigos[:-1].astype(np.intp) + codigos[1:]]
+        columnas = columnas[columnas >= 0]
+        if not columnas.size:
+            return np.empty(0, dtype=np.intp)
+        presentes, veces = np.unique(columnas, return_counts=True)
+        compartidos = np.minimum(self._conteo_bigramas[:, presentes], veces).sum(axis=1)
+        return np.flatnonzero(compartidos >= self._bigramas_minimos)
+
+    def _evaluar(self, descripcion: str) -> str:
+        # --- CRUCE POR NÚMERO DE CUENTA (PRIORIDAD ALTA) ---
+        if self.cuenta_en_descripcion(descripcion):
+            return MOTIVO_CUENTA
+
+        # --- CRUCE POR NOMBRE DEL CLIENTE (PRIORIDAD MEDIA) ---
+        if self.nombres and self._hay_nombre(descripcion):
+            return MOTIVO_NOMBRE
+        return ""
+
+    def _hay_nombre(self, descripcion: str) -> bool:
+        desc_limpia = limpiar_descripcion(descripcion)
+        palabras_desc = desc_limpia.split()
+        # Toda ventana de palabras es un substring de la descripción con un solo espacio entre palabras
+        unida = " ".join(palabras_desc)
+        codigos = np.frombuffer(unida.encode("ascii"), dtype=np.uint8)
+
+        candidatos = self.candidatos(codigos)
+        if not len(candidatos):
+            return False
+
+        # 1. Coincidencia Exacta (Vía rápida)
+        for i in candidatos.tolist():
+            if self.nombres[i] in desc_limpia:
+                return True
+
+        # 2. Fuzzy: posición de cada palabra en `unida` y conteo acumulado de caracteres
+        largos_palabras = np.fromiter((len(p) for p in palabras_desc), dtype=np.int64, count=len(palabras_desc))
+        fines = np.cumsum(largos_palabras + 1) - 1
+        inicios = fines - largos_palabras
+        acumulado = np.zeros((len(codigos) + 1, len(self._caracteres)), dtype=np.int64)
+        np.cumsum(codigos[:, None] == self._caracteres[None, :], axis=0, out=acumulado[1:])
+
+        pares = []
+        num_palabras = self._num_palabras[candidatos]
+        for largo_nombre in np.unique(num_palabras).tolist():
+            num_ventanas = len(palabras_desc) - largo_nombre + 1
+            if num_ventanas <= 0:
+                continue
+            ids = candidatos[num_palabras == largo_nombre]
+            ini = inicios[:num_ventanas]
+            fin = fines[largo_nombre - 1:largo_nombre - 1 + num_ventanas]
+            conteo_ventanas = acumulado[fin] - acumulado[ini]
+
+            # Misma cuenta que `quick_ratio()` (intersección de multiconjuntos de caracteres) para
+            # cada par (nombre, ventana); es cota superior de `ratio()`
+            coincidencias = np.minimum(self._conteo_caracteres[ids][:, None, :], conteo_ventanas[None, :, :]).sum(axis=2)
+            cota = 2.0 * coincidencias / (self._largos[ids][:, None] + (fin - ini)[None, :])
+
+            filas, ventanas = np.nonzero(cota >= UMBRAL_SIMILITUD_NOMBRE)
+            pares.extend(zip(cota[filas, ventanas].tolist(), ids[filas].tolist(), ini[ventanas].tolist(), fin[ventanas].tolist()))
+
+        # `ratio()` empezando por la cota más alta: con nombres parecidos en el lote, el correcto suele ir primero
+        for _, id_nombre, ini_ventana, fin_ventana in sorted(pares, reverse=True):
+            comparador = self._comparadores[id_nombre]
+            comparador.set_seq2(unida[ini_ventana:fin_ventana])
+            if comparador.ratio() >= UMBRAL_SIMILITUD_NOMBRE:
+                return True
+
+        return False
@@ -4,4 +4,13 @@
 # Clase de excepción
 class PDFCifradoError(Exception):
     """Excepción personalizada para PDFs protegidos por contraseña."""
-    pass
\ No newline at end of file
+    pass
+class CircuitoAbiertoError(Exception):
+    """El proveedor de IA acumuló fallos seguidos: se corta la llamada sin esperar un timeout."""
+    pass
+class ConflictoEscrituraError(Exception):
+    """La escritura condicional (ETag esperado / objeto inexistente) perdió contra otra escritura."""
+    pass
+class ExtraccionCanceladaError(Exception):
+    """La extracción se detuvo a medio camino porque el pipeline ya no necesita su resultado."""
+    pass
@@ -3,6 +3,8 @@
 import re
 import json
 
+from .spatial_bank import clave_centavos
+
 class ExtractorDeterministaOCR:
     def __init__(self, banco="ESTANDAR"):
         self.banco = str(banco).upper()
@@ -279,48 +281,68 @@ class ExtractorDeterministaOCR:
 
         kw_transferencias = ["SPEI", "SPEL", "TRASPASO", "TRANSF", "TRANSFERENCIA", "PAGO", "NETNM", "SOBRANTE"]
         
-        padres_candidatos = [
-            tx for tx in todas_las_transacciones 
-            if tx.get("seccion") == "PRINCIPAL" 
-            and any(k in tx.get("descripcion", "").upper() for k in kw_transferencias)
-        ]
-        
-        padres_intocables = [
-            tx for tx in todas_las_transacciones 
-            if tx.get("seccion") == "PRINCIPAL" 
-            and not any(k in tx.get("descripcion", "").upper() for k in kw_transferencias)
-        ]
-        
-        hijos_recibidos = [tx for tx in todas_las_transacciones if tx.get("seccion") == "SPEI_RECIBIDOS"]
-        hijos_enviados = [tx for tx in todas_las_transacciones if tx.get("seccion") == "SPEI_ENVIADOS"]
+        # Partición en una sola pasada (el filtro de keywords se evalúa una vez por transacción)
+        padres_candidatos = []
+        padres_intocables = []
+        hijos_recibidos = []
+        hijos_enviados = []
+        for tx in todas_las_transacciones:
+            seccion = tx.get("seccion")
+            if seccion == "PRINCIPAL":
+                desc_upper = tx.get("descripcion", "").upper()
+                if any(k in desc_upper for k in kw_transferencias):
+                    padres_candidatos.append(tx)
+                else:
+                    padres_intocables.append(tx)
+            elif seccion == "SPEI_RECIBIDOS":
+                hijos_recibidos.append(tx)
+            elif seccion == "SPEI_ENVIADOS":
+                hijos_enviados.append(tx)
         hijos = hijos_recibidos + hijos_enviados
         
         ids_hijos_fusionados = set()
 
+        # Índice de padres por (día, monto en centavos). Fecha e importe nunca se mutan al fusionar.
+        importes_padres = []
+        indice_padres = {}
+        if hijos:
+            for pos, p in enumerate(padres_candidatos):
+                importe_padre = float(p["importe"])
+                importes_padres.append(importe_padre)
+                clave = clave_centavos(importe_padre)
+                if clave is not None:
+                    indice_padres.setdefault((p["fecha"][:2], clave), []).append(pos)
+
+        # Palabras clave de cada padre: se calculan una vez y se actualizan al fusionar
+        palabras_padres = {}
+
         for hijo in hijos:
             fecha_hijo = hijo["fecha"]
             importe_hijo = float(hijo["importe"])
             palabras_hijo = obtener_palabras_clave(hijo["descripcion"])
 
-            candidatos = [
-                p for p in padres_candidatos 
-                if p["fecha"][:2] == fecha_hijo[:2] 
-                and abs(float(p["importe"]) - importe_hijo) < 0.01 
-            ]
+            candidatos = self._buscar_padres(indice_padres, importes_padres, fecha_hijo[:2], importe_hijo)
 
             if len(candidatos) == 1:
-                padre = candidatos[0]
+                pos = candidatos[0]
+                padre = padres_candidatos[pos]
                 padre["descripcion"] = f"{padre['descripcion']} | DETALLE: {hijo['descripcion']}"
+                if pos in palabras_padres:
+                    palabras_padres[pos] |= palabras_hijo | {"detalle"}
                 ids_hijos_fusionados.add(id(hijo))
                 continue
 
             if len(candidatos) > 1:
-                for padre in candidatos:
-                    palabras_padre = obtener_palabras_clave(padre["descripcion"])
-                    coincidencias = palabras_hijo.intersection(palabras_padre)
+                for pos in candidatos:
+                    padre = padres_candidatos[pos]
+                    if pos not in palabras_padres:
+                        palabras_padres[pos] = obtener_palabras_clave(padre["descripcion"])
+                    coincidencias = palabras_hijo.intersection(palabras_padres[pos])
                     
                     if len(coincidencias) >= 1:
                         padre["descripcion"] = f"{padre['descripcion']} | DETALLE: {hijo['descripcion']}"
+                        # "A | DETALLE: B" -> kw(A) ∪ {"detalle"} ∪ kw(B)
+                        palabras_padres[pos] |= palabras_hijo | {"detalle"}
                         ids_hijos_fusionados.add(id(hijo))
                         break
 
@@ -331,4 +353,16 @@ class ExtractorDeterministaOCR:
             tx.pop("seccion", None)
 
         lista_final.sort(key=lambda x: x["fecha"])
-        return lista_final
\ No newline at end of file
+        return lista_final
+
+    def _buscar_padres(self, indice_padres, importes_padres, dia: str, importe: float):
+        """Posiciones (en orden original) de padres del mismo día con abs(importe - p) < 0.01."""
+        clave = clave_centavos(importe)
+        if clave is None:
+            return []
+
+        posiciones = []
+        for k in (clave - 1, clave, clave + 1):
+            posiciones.extend(indice_padres.get((dia, k), ()))
+        posiciones.sort()
+        return [pos for pos in posiciones if abs(importes_padres[pos] - importe) < 0.01]
@@ -0,0 +1,142 @@
+# core/metricas_documento.py
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from ..models.tabla_transacciones import TablaTransacciones
+
+# Llaves (y orden) del diccionario de totales que regresa el MotorClasificador
+CATEGORIAS_TOTALES = (
+    "EFECTIVO", "TRASPASO_ABONO", "TRASPASO_CARGO",
+    "FINANCIAMIENTO", "BMRCASH", "MORATORIOS",
+    "TPV", "DEPOSITOS",
+    "COMISION_CR", "COMISION_DB", "COMISION_AMEX", "COMISION_TPV_MIXTA",
+    "PAGO_FINANCIAMIENTO",
+)
+
+# Clases para el conteo del log del motor
+_CLASE_TPV, _CLASE_OTROS, _CLASE_GENERAL, _CLASE_BASURA = range(4)
+
+# Tipo en mayúsculas para las sumas de confianza
+_TIPO_ABONO, _TIPO_CARGO, _TIPO_OTRO = range(3)
+
+@dataclass
+class MetricasDocumento:
+    """Resultado de la agregación de un documento: totales del motor + métricas de confianza."""
+    totales: Dict[str, float]
+    conteo_categorias: Dict[str, int]
+    total_txs: int
+    txs_clasificadas: int
+    suma_abonos: float
+    suma_cargos: float
+    depositos_caratula: float = 0.0
+    cargos_caratula: float = 0.0
+    confianza_depositos: float = field(init=False)
+    confianza_cargos: float = field(init=False)
+    confianza_global: float = field(init=False)
+    descuadre_depositos: float = field(init=False)
+    descuadre_cargos: float = field(init=False)
+    tasa_categorizacion: float = field(init=False)
+
+    def __post_init__(self):
+        self.confianza_depositos = calcular_similitud(self.suma_abonos, self.depositos_caratula)
+        self.confianza_cargos = calcular_similitud(self.suma_cargos, self.cargos_caratula)
+        self.confianza_global = round((self.confianza_depositos + self.confianza_cargos) / 2.0, 2)
+
+        # Usamos abs() para que siempre sea positivo, sin importar si faltó o sobró dinero
+        self.descuadre_depositos = abs(self.depositos_caratula - self.suma_abonos)
+        self.descuadre_cargos = abs(self.cargos_caratula - self.suma_cargos)
+
+        self.tasa_categorizacion = (self.txs_clasificadas / self.total_txs * 100.0) if self.total_txs > 0 else 0.0
+
+def calcular_similitud(extraido: float, caratula: float) -> float:
+    """Similitud (0 a 100%) entre lo extraído y lo declarado en la carátula."""
+    if caratula == 0 and extraido == 0:
+        return 100.0 # Perfecto, no había nada y no extrajimos nada
+    if caratula == 0 or extraido == 0:
+        return 0.0   # Descuadre total (algo vs nada)
+    # El ratio siempre es el menor entre el mayor, para no superar el 100%
+    return (min(extraido, caratula) / max(extraido, caratula)) * 100.0
+
+def _sumas_por_grupo(grupos: np.ndarray, montos: np.ndarray, num_grupos: int) -> List[float]:
+    """
+    Group-by con `np.bincount`: suma en orden de fila dentro de cada grupo (igual que un `+=` en Python,
+    no la suma por pares de `np.sum`), así que los totales coinciden bit a bit. Grupo -1 = se ignora.
+    """
+    validos = grupos >= 0
+    sumas = np.bincount(grupos[validos], weights=montos[validos], minlength=num_grupos)
+    return sumas.astype(np.float64).tolist()
+
+def calcular_metricas_documento(
+    tabla: TablaTransacciones, depositos_caratula: float = 0.0, cargos_caratula: float = 0.0
+) -> MetricasDocumento:
+    """
+    Una sola agregación vectorizada sobre las columnas de la tabla: totales por categoría (con la
+    misma semántica que el barrido de `_calcular_totales`), sumas de abonos/cargos, tasa de
+    categorización, confianza y descuadres contra la carátula.
+    """
+    # Vistas sin copia sobre los `array` de la tabla
+    montos = np.frombuffer(tabla.montos, dtype=np.float64)
+    codigos_tipo = np.frombuffer(tabla.tipos, dtype=np.uint16).astype(np.intp)
+    codigos_cat = np.frombuffer(tabla.categorias, dtype=np.uint16).astype(np.intp)
+
+    # --- TABLAS DE TRADUCCIÓN POR CÓDIGO (una entrada por valor distinto del catálogo) ---
+    indice_totales = {cat: i for i, cat in enumerate(CATEGORIAS_TOTALES)}
+    idx_depositos = indice_totales["DEPOSITOS"]
+
+    categorias_norm = tabla.categorias_normalizadas()
+    total_por_cat = np.array([indice_totales.get(c, -1) for c in categorias_norm], dtype=np.intp)
+    clase_por_cat = np.array([
+        _CLASE_TPV if c == "TPV" else _CLASE_OTROS if c in indice_totales
+        else _CLASE_BASURA if c == "BASURA_OCR" else _CLASE_GENERAL
+        for c in categorias_norm
+    ], dtype=np.intp)
+
+    abono_por_tipo = np.array(tabla.abonos_por_codigo(), dtype=bool)
+    tipos_mayus = [t.upper().strip() for t in tabla.catalogo_tipos.valores]
+    tipo_por_codigo = np.array([
+        _TIPO_ABONO if t == "ABONO" else _TIPO_CARGO if t == "CARGO" else _TIPO_OTRO for t in tipos_mayus
+    ], dtype=np.intp)
+
+    # --- 1. TOTALES POR CATEGORÍA ---
+    # Cada fila aporta hasta dos sumandos en este orden: DEPOSITOS (si es abono) y su categoría.
+    # Se intercalan por fila para que el orden de acumulación sea el del barrido original, incluso
+    # si una categoría se llamara DEPOSITOS.
+    eventos = np.stack([
+        np.where(abono_por_tipo[codigos_tipo], idx_depositos, -1),
+        total_por_cat[codigos_cat],
+    ], axis=1).ravel()
+    sumas_totales = _sumas_por_grupo(eventos, np.repeat(montos, 2), len(CATEGORIAS_TOTALES))
+    totales = dict(zip(CATEGORIAS_TOTALES, sumas_totales))
+
+    conteo = np.bincount(clase_por_cat[codigos_cat], minlength=4).tolist()
+
+    # --- 2. SUMAS PARA LA CONFIANZA (tipo ABONO / CARGO) ---
+    suma_abonos, suma_cargos, _ = _sumas_por_grupo(tipo_por_codigo[codigos_tipo], montos, 3)
+
+    # --- 3. TASA DE CATEGORIZACIÓN (categoría distinta de "GENERAL" tal cual) ---
+    codigo_general = tabla.catalogo_categorias.codigo("GENERAL")
+    txs_clasificadas = int(np.count_nonzero(codigos_cat != codigo_general))
+
+    return MetricasDocumento(
+        totales=totales,
+        conteo_categorias={"TPV": conteo[_CLASE_TPV], "GENERAL": conteo[_CLASE_GENERAL], "OTROS": conteo[_CLASE_OTROS]},
+        total_txs=len(tabla),
+        txs_clasificadas=txs_clasificadas,
+        suma_abonos=suma_abonos,
+        suma_cargos=suma_cargos,
+        depositos_caratula=depositos_caratula,
+        cargos_caratula=cargos_caratula,
+    )
+
+def sumar_categorias(tabla: TablaTransacciones, categorias: Iterable[str]) -> Dict[str, float]:
+    """Suma de montos por categoría normalizada (ej. traspasos tras el cruce global)."""
+    categorias = tuple(categorias)
+    indice = {cat: i for i, cat in enumerate(categorias)}
+    grupo_por_codigo = np.array([indice.get(c, -1) for c in tabla.categorias_normalizadas()], dtype=np.intp)
+
+    montos = np.frombuffer(tabla.montos, dtype=np.float64)
+    codigos_cat = np.frombuffer(tabla.categorias, dtype=np.uint16).astype(np.intp)
+    return dict(zip(categorias, _sumas_por_grupo(grupo_por_codigo[codigos_cat], montos, len(categorias))))
@@ -1,10 +1,12 @@
 # core/motor_caratulas.py
 
 import fitz  # PyMuPDF
+import asyncio
 import logging
 import re
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Tuple, Any, Optional, Union
 from ..core.exceptions import PDFCifradoError
+from ..services.ipc_pool import RefDocumento, vista_pdf
 
 logger = logging.getLogger(__name__)
 
@@ -15,10 +17,12 @@ class MotorCaratulas:
     """
     def __init__(self, triggers_config: dict, palabras_clave_regex: re.Pattern,
                 alias_banco_map: dict, banco_detection_regex: re.Pattern, 
-                patrones_compilados: dict, debug_flags: list = None):
+                patrones_compilados: dict, debug_flags: list = None,
+                max_cuentas_concurrentes: int = 4):
         """
         Inicializa el motor con las configuraciones necesarias para no depender
         de variables globales esparcidas en otros archivos.
+        `max_cuentas_concurrentes` acota cuántas cuentas de UN documento consultan a los modelos a la vez.
         """
         # Configuración de PDF
         self.triggers_config = triggers_config
@@ -31,6 +35,9 @@ class MotorCaratulas:
 
         # Lista de enteros para granularidad en logs
         self.debug_flags = debug_flags if debug_flags is not None else []
+
+        # Concurrencia por documento (cada cuenta = 1 llamada GPT + 1 llamada Qwen)
+        self.max_cuentas_concurrentes = max(1, max_cuentas_concurrentes)
     
     def _log_debug(self, flag: int, mensaje: str):
         """
@@ -57,7 +64,8 @@ class MotorCaratulas:
         analizar_gpt_fn,   
         analizar_qwen_fn,  
         extraer_json_fn,   
-        sanitizar_fn
+        sanitizar_fn,
+        estructura: Optional[Tuple[Dict[int, str], List[Tuple[int, int]], bool]] = None
     ) -> Tuple[List[Dict[str, Any]], bool, str, Dict[int, str], List[Tuple[int, int]]]:
         """
         Ejecuta el flujo multimodal de extracción, clasificación y reconciliación de carátulas bancarias.
@@ -73,6 +81,8 @@ class MotorCaratulas:
             analizar_qwen_fn (Callable): Inyección de dependencia para el cliente de Qwen.
             extraer_json_fn (Callable): Función de parsing para extraer JSON del Markdown.
             sanitizar_fn (Callable): Función para tipar y limpiar los datos de salida.
+            estructura (Tuple, optional): Resultado de `analizar_estructura` calculado fuera del event loop
+                                        (ej. en el ProcessPool). Si es None, se calcula aquí de forma síncrona.
 
         Returns:
             Tuple: 
@@ -82,17 +92,63 @@ class MotorCaratulas:
                 - Dict: Texto mapeado por número de página.
                 - List[Tuple]: Rangos de páginas detectados para cada cuenta (inicio, fin).
         """
-        # 1. Extracción física y detección de rangos
-        texto_por_pagina, rangos_cuentas = self.extraer_texto_y_rangos(pdf_bytes)
+        # 1. Extracción física y detección de rangos (CPU: idealmente ya viene precalculada del pool)
+        if estructura is None:
+            estructura = self.analizar_estructura(pdf_bytes)
+        texto_por_pagina, rangos_cuentas, es_documento_digital = estructura
         texto_verificacion_global = "\n".join(texto_por_pagina.values())
-        es_documento_digital = self.validar_documento_digital(texto_verificacion_global)
 
         logger.info(f"[MotorCaratulas] Se detectaron {len(rangos_cuentas)} cuentas. Digital: {es_documento_digital}")
 
-        resultados_acumulados = []
+        # 2. Procesamiento concurrente de cada cuenta detectada (acotado por documento).
+        # gather conserva el orden de rangos_cuentas, así el post-proceso ve las cuentas en orden original.
+        semaforo_cuentas = asyncio.Semaphore(self.max_cuentas_concurrentes)
+        resultados_por_cuenta = await asyncio.gather(*[
+            self._procesar_cuenta(
+                inicio_rango, fin_rango, texto_por_pagina, pdf_bytes, prompt_base,
+                analizar_gpt_fn, analizar_qwen_fn, extraer_json_fn, sanitizar_fn, semaforo_cuentas
+            )
+            for inicio_rango, fin_rango in rangos_cuentas
+        ])
+        resultados_acumulados = [res for res in resultados_por_cuenta if res is not None]
+
+        # --- POST-PROCESAMIENTO: Heredar nombre del cliente si comparten RFC ---
+        rfc_memoria = ""
+        cliente_memoria = ""
+        
+        for res in resultados_acumulados:
+            rfc_actual = res.get("rfc", "")
+            nombre_actual = res.get("nombre_cliente", "")
+            
+            # Si tiene nombre y RFC, actualizamos nuestra memoria
+            if rfc_actual and nombre_actual:
+                rfc_memoria = rfc_actual
+                cliente_memoria = nombre_actual
+            # Si no tiene nombre, pero el RFC coincide con la memoria, heredamos
+            elif not nombre_actual and rfc_actual == rfc_memoria:
+                res["nombre_cliente"] = cliente_memoria
 
-        # 2. Bucle Principal: Procesar cada cuenta detectada
-        for inicio_rango, fin_rango in rangos_cuentas:
+        # Mantenemos la misma firma de retorno que espera el orchestator original
+        return resultados_acumulados, es_documento_digital, texto_verificacion_global, None, texto_por_pagina, rangos_cuentas
+
+    async def _procesar_cuenta(
+        self,
+        inicio_rango: int,
+        fin_rango: int,
+        texto_por_pagina: Dict[int, str],
+        pdf_bytes: bytes,
+        prompt_base: str,
+        analizar_gpt_fn,
+        analizar_qwen_fn,
+        extraer_json_fn,
+        sanitizar_fn,
+        semaforo_cuentas: asyncio.Semaphore
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Flujo completo de UNA cuenta: regex, selección de páginas, GPT + Qwen concurrentes y reconciliación.
+        Retorna los datos reconciliados con sus metadatos de páginas, o None si no pasa el filtro de calidad.
+        """
+        async with semaforo_cuentas:
             logger.info(f"[MotorCaratulas] Procesando cuenta en rango: {inicio_rango} a {fin_rango}")
 
             # A. Aislar texto del rango actual para no contaminar el Regex
@@ -124,60 +180,43 @@ class MotorCaratulas:
                 prompt_a_usar = prompt_kapital_fluxo
 
             # D. Ejecución concurrente de Modelos Multimodales
-            # Pasamos el prompt enrutado en lugar del base
+            # Pasamos el prompt enrutado en lugar del base. Ambas funciones piden las mismas páginas
+            # al caché de render (services/cache_render.py): se rasterizan una sola vez, fuera del loop.
             tarea_gpt = analizar_gpt_fn(prompt_a_usar, pdf_bytes, paginas_a_procesar=paginas_para_ia)
             tarea_qwen = analizar_qwen_fn(prompt_a_usar, pdf_bytes, paginas_a_procesar=paginas_para_ia)
 
-            import asyncio
             resultados_ia_brutos = await asyncio.gather(tarea_gpt, tarea_qwen, return_exceptions=True)
             res_gpt_str, res_qwen_str = resultados_ia_brutos
 
-            # E. Extracción y Sanitización de los resultados
-            datos_gpt = {}
-            if res_gpt_str and not isinstance(res_gpt_str, Exception):
-                datos_gpt = sanitizar_fn(extraer_json_fn(res_gpt_str))
-                self._log_debug(2, f"Datos crudos GPT: {datos_gpt}")
-            else:
-                logger.error(f"[MotorCaratulas] Falla en GPT: {res_gpt_str}")
-
-            datos_qwen = {}
-            if res_qwen_str and not isinstance(res_qwen_str, Exception):
-                datos_qwen = sanitizar_fn(extraer_json_fn(res_qwen_str))
-                self._log_debug(3, f"Datos crudos Qwen: {datos_qwen}")
-            else:
-                logger.error(f"[MotorCaratulas] Falla en QwenVL3: {res_qwen_str}")
-
-            # F. Reconciliación Inteligente (Triangulación)
-            datos_reconciliados = self.reconciliar_extracciones(datos_regex, datos_qwen, datos_gpt)
-
-            # --- FILTRO DE CALIDAD ---
-            if self._es_cuenta_valida(datos_reconciliados, texto_verificacion_rango):
-                # G. Inyección de Metadatos
-                datos_reconciliados["_metadatos_paginas"] = {
-                    "inicio": inicio_rango,
-                    "fin": fin_rango,
-                    "paginas_analizadas_ia": paginas_para_ia
-                }
-                resultados_acumulados.append(datos_reconciliados)
-
-        # --- POST-PROCESAMIENTO: Heredar nombre del cliente si comparten RFC ---
-        rfc_memoria = ""
-        cliente_memoria = ""
-        
-        for res in resultados_acumulados:
-            rfc_actual = res.get("rfc", "")
-            nombre_actual = res.get("nombre_cliente", "")
-            
-            # Si tiene nombre y RFC, actualizamos nuestra memoria
-            if rfc_actual and nombre_actual:
-                rfc_memoria = rfc_actual
-                cliente_memoria = nombre_actual
-            # Si no tiene nombre, pero el RFC coincide con la memoria, heredamos
-            elif not nombre_actual and rfc_actual == rfc_memoria:
-                res["nombre_cliente"] = cliente_memoria
+        # E. Extracción y Sanitización de los resultados
+        datos_gpt = {}
+        if res_gpt_str and not isinstance(res_gpt_str, Exception):
+            datos_gpt = sanitizar_fn(extraer_json_fn(res_gpt_str))
+            self._log_debug(2, f"Datos crudos GPT: {datos_gpt}")
+        else:
+            logger.error(f"[MotorCaratulas] Falla en GPT: {res_gpt_str}")
+
+        datos_qwen = {}
+        if res_qwen_str and not isinstance(res_qwen_str, Exception):
+            datos_qwen = sanitizar_fn(extraer_json_fn(res_qwen_str))
+            self._log_debug(3, f"Datos crudos Qwen: {datos_qwen}")
+        else:
+            logger.error(f"[MotorCaratulas] Falla en QwenVL3: {res_qwen_str}")
+
+        # F. Reconciliación Inteligente (Triangulación)
+        datos_reconciliados = self.reconciliar_extracciones(datos_regex, datos_qwen, datos_gpt)
+
+        # --- FILTRO DE CALIDAD ---
+        if not self._es_cuenta_valida(datos_reconciliados, texto_verificacion_rango):
+            return None
 
-        # Mantenemos la misma firma de retorno que espera el orchestator original
-        return resultados_acumulados, es_documento_digital, texto_verificacion_global, None, texto_por_pagina, rangos_cuentas
+        # G. Inyección de Metadatos
+        datos_reconciliados["_metadatos_paginas"] = {
+            "inicio": inicio_rango,
+            "fin": fin_rango,
+            "paginas_analizadas_ia": paginas_para_ia
+        }
+        return datos_reconciliados
 
     def extraer_texto_y_rangos(self, pdf_bytes: bytes) -> Tuple[Dict[int, str], List[Tuple[int, int]]]:
         """
@@ -268,6 +307,58 @@ class MotorCaratulas:
 
         return texto_por_pagina, rangos_detectados
 
+    def analizar_estructura(self, pdf_bytes: bytes) -> Tuple[Dict[int, str], List[Tuple[int, int]], bool]:
+        """
+        Parte CPU-bound de la Etapa 1: texto por página, rangos de cuentas y veredicto digital/escaneado.
+        No toca la red, así que puede correr en un proceso aparte (ver `analizar_estructura_worker_sync`).
+        """
+        texto_por_pagina, rangos_cuentas = self.extraer_texto_y_rangos(pdf_bytes)
+        es_documento_digital = self.validar_documento_digital("\n".join(texto_por_pagina.values()))
+        return texto_por_pagina, rangos_cuentas, es_documento_digital
+
+    def sondear_tipo_documento(self, pdf: Any, max_paginas: int = 2, umbral_caracteres: int = 80,
+                            umbral_cobertura: float = 0.6, umbral_caracteres_confiable: int = 5,
+                            umbral_cobertura_confiable: float = 0.9) -> Dict[str, Any]:
+        """
+        Sonda barata (solo las primeras páginas, sin LLM) para decidir temprano la ruta digital vs OCR.
+        Un documento se considera escaneado si casi no tiene capa de texto y sus páginas están cubiertas
+        por imágenes. El veredicto definitivo sigue siendo `validar_documento_digital` sobre el texto completo.
+
+        `escaneado_confiable` usa umbrales estrictos (prácticamente sin texto y páginas cubiertas por imagen):
+        solo con él se arranca Textract (que cuesta por página) antes de que la carátula confirme.
+
+        Args:
+            pdf: Ruta del archivo o bytes del documento.
+        """
+        with (fitz.open(pdf) if isinstance(pdf, str) else fitz.open(stream=pdf, filetype="pdf")) as doc:
+            if doc.needs_pass and not doc.authenticate(""):
+                raise PDFCifradoError("El documento está protegido con contraseña.")
+
+            paginas = [doc[i] for i in range(min(max_paginas, len(doc)))]
+            caracteres = 0
+            cobertura = 0.0
+            for page in paginas:
+                caracteres += len(page.get_text("text").strip())
+                area_pagina = abs(page.rect) or 1.0
+                area_imagenes = sum(abs(fitz.Rect(img["bbox"]) & page.rect) for img in page.get_image_info())
+                cobertura += min(1.0, area_imagenes / area_pagina)
+
+        total = max(1, len(paginas))
+        caracteres_por_pagina = caracteres / total
+        cobertura_imagen = cobertura / total
+        es_escaneado = caracteres_por_pagina < umbral_caracteres and (cobertura_imagen >= umbral_cobertura or caracteres == 0)
+        escaneado_confiable = (
+            es_escaneado and caracteres_por_pagina <= umbral_caracteres_confiable
+            and cobertura_imagen >= umbral_cobertura_confiable
+        )
+
+        return {
+            "es_digital": not es_escaneado,
+            "escaneado_confiable": escaneado_confiable,
+            "caracteres_por_pagina": round(caracteres_por_pagina, 1),
+            "cobertura_imagen": round(cobertura_imagen, 3),
+        }
+
     def validar_documento_digital(self, texto_extraido: str, umbral: int = 50) -> bool:
         """
         Verifica si el texto extraído es válido para prevenir falsos positivos con escaneos.
@@ -533,4 +624,24 @@ class MotorCaratulas:
         try:
             return float(str(valor).replace(",", "").replace("$", "").strip())
         except (ValueError, TypeError):
-            return None
\ No newline at end of file
+            return None
+
+# =========================================================
+# WORKER PARA EL PROCESS POOL
+# =========================================================
+
+def analizar_estructura_worker_sync(motor: MotorCaratulas, documento: Union[RefDocumento, str]) -> Tuple[Dict[int, str], List[Tuple[int, int]], bool]:
+    """
+    Ejecuta `motor.analizar_estructura` dentro de un worker del ProcessPool. El documento llega como
+    referencia a memoria compartida (o ruta) para que el PDF no viaje por el pipe; el motor es picklable
+    (solo configuración y regex compiladas).
+    """
+    with vista_pdf(documento) as pdf_bytes:
+        return motor.analizar_estructura(pdf_bytes)
+
+def sondear_documento_worker_sync(motor: MotorCaratulas, documento: Union[RefDocumento, str]) -> Dict[str, Any]:
+    """Ejecuta `motor.sondear_tipo_documento` en un worker del ProcessPool (abre solo las primeras páginas)."""
+    if isinstance(documento, RefDocumento) and documento.nombre_shm:
+        with vista_pdf(documento) as pdf_bytes:
+            return motor.sondear_tipo_documento(pdf_bytes)
+    return motor.sondear_tipo_documento(str(getattr(documento, "ruta", documento)))
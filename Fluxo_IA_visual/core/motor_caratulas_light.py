@@ -12,7 +12,7 @@ from ..models.responses_frontend import RespuestaCaratulasFrontend, DatosCaratul
 
 # Prompt TOON
 from ..utils.helpers_texto_frontend import PROMPT_EXTRACCION_CARATULA_TOON, PROMPT_EXTRACCION_CARATULA_TOON_TEXTO
-from ..services.ia_extractor import get_fluxo_client
+from ..services.ia_extractor import get_fluxo_client, crear_completion
 
 logger = logging.getLogger(__name__)
 
@@ -61,7 +61,8 @@ async def procesar_caratula_frontend(
             
             try:
                 client = get_fluxo_client()
-                res = await client.chat.completions.create(
+                res = await crear_completion(
+                    client, "openai",
                     model="gpt-5.2", 
                     messages=[{"role": "user", "content": prompt_final}],
                     temperature=0.0 # Determinista
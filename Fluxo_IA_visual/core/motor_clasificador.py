@@ -3,27 +3,71 @@
 import logging
 import math
 import asyncio
+from collections import OrderedDict
+from functools import lru_cache
 from typing import List, Any
 import re
-import difflib
 import unicodedata
 
-from ..utils.tags_y_pesos_fluxo import CategoriaTag, CONFIGURACION_TAGS
+from ..utils.tags_y_pesos_fluxo import CategoriaTag, CONFIGURACION_TAGS, AUTOMATA_TAGS
+from ..utils.matcher_tags import AutomataTags
+from ..utils.cache_clasificacion import CacheClasificacionIA
+from ..models.tabla_transacciones import como_tabla
+from .metricas_documento import MetricasDocumento, calcular_metricas_documento
+from .cruce_traspasos import LARGO_MINIMO_NOMBRE, limpiar_descripcion, limpiar_nombre_empresa, nombre_en_descripcion
 
 logger = logging.getLogger(__name__)
 
+REGEX_DRU_DOMICILIACION = re.compile(r'\bdru\d+\s*domiciliacion\b')
+REGEX_COMISION_CREDITO = re.compile(r'\b(cr|cre|credito)\b')
+REGEX_COMISION_DEBITO = re.compile(r'\b(db|deb|debito)\b')
+REGEX_COMISION_AMEX = re.compile(r'\b(amex|american express|amexco)\b')
+
+# Autómatas por configuración: el de producción ya viene compilado; si la configuración
+# se reemplaza (ej. parches en pruebas) se compila una vez y se reutiliza. Las reemplazadas
+# viven en un LRU acotado: cada entrada retiene su configuración y su autómata.
+_CONFIGURACION_PRODUCCION = CONFIGURACION_TAGS
+MAX_AUTOMATAS_ALTERNOS = 4
+_AUTOMATAS_ALTERNOS: "OrderedDict[int, tuple]" = OrderedDict()  # id(config) -> (config, autómata)
+
+def _obtener_automata_tags() -> AutomataTags:
+    """Devuelve el autómata de la CONFIGURACION_TAGS vigente en este módulo."""
+    config = CONFIGURACION_TAGS
+    if config is _CONFIGURACION_PRODUCCION:
+        return AUTOMATA_TAGS
+    entrada = _AUTOMATAS_ALTERNOS.get(id(config))
+    if entrada is None or entrada[0] is not config:
+        entrada = (config, AutomataTags(config))
+        _AUTOMATAS_ALTERNOS[id(config)] = entrada
+        while len(_AUTOMATAS_ALTERNOS) > MAX_AUTOMATAS_ALTERNOS:
+            _AUTOMATAS_ALTERNOS.popitem(last=False)
+    _AUTOMATAS_ALTERNOS.move_to_end(id(config))
+    return entrada[1]
+
+@lru_cache(maxsize=65536)
+def _normalizar_descripcion(desc_raw: str) -> str:
+    """Minúsculas, sin acentos (NFKD -> ASCII) y con espacios colapsados. Memoizada: la
+    pre-clasificación y el sub-motor de comisiones normalizan la misma descripción."""
+    desc_norm = unicodedata.normalize('NFKD', desc_raw.lower()).encode('ASCII', 'ignore').decode('utf-8')
+    return re.sub(r'\s+', ' ', desc_norm).strip()
+
 class MotorClasificador:
     """
     Motor centralizado para la clasificación de transacciones bancarias.
     Aplica filtros deterministas de primera capa y delega la ambigüedad a modelos LLM.
     """
-    def __init__(self, debug_flags: list = None):
+    def __init__(self, debug_flags: list = None, cache_ia: CacheClasificacionIA = None, despachador_ia=None):
         """
         Inicializa el motor inyectando los diccionarios de palabras clave.
+        `cache_ia` (opcional) evita re-enviar a la IA descripciones ya clasificadas.
+        `despachador_ia` (opcional, DespachadorLotesIA) comparte lotes y límites de concurrencia
+        entre documentos; sin él, cada documento arma y lanza sus propios lotes.
         """
         # Banderas de debug:
         # 1 = Filtro de Cargos | 2 = Reglas de Texto | 3 = Payload IA | 4 = Sumatorias Totales
         self.debug_flags = debug_flags if debug_flags is not None else []
+        self.cache_ia = cache_ia
+        self.despachador_ia = despachador_ia
 
     def _log_debug(self, flag: int, mensaje: str):
         """Helper para imprimir logs granulares según la bandera activa."""
@@ -130,12 +174,14 @@ class MotorClasificador:
         resueltas_por_python = []
         pendientes_para_ia = []
 
+        # Autómata Aho-Corasick: todas las palabras de todos los tags en una sola pasada
+        automata = _obtener_automata_tags()
+        config_tags = CONFIGURACION_TAGS
+
         for idx_real, tx in enumerate(transacciones):
             # --- NORMALIZACIÓN PLANA ---
             tipo_lower = str(getattr(tx, "tipo", "")).lower().strip()
-            desc_raw = str(getattr(tx, "descripcion", "")).lower()
-            desc_norm = unicodedata.normalize('NFKD', desc_raw).encode('ASCII', 'ignore').decode('utf-8')
-            desc_plana = re.sub(r'\s+', ' ', desc_norm).strip()
+            desc_plana = _normalizar_descripcion(str(getattr(tx, "descripcion", "")))
 
             # FILTRO ANTI-BASURA OCR
             if tipo_lower == "importe":
@@ -150,19 +196,12 @@ class MotorClasificador:
             es_abono = tipo_lower in ["abono", "deposito", "depósito", "credito", "crédito"]
 
             # FASE 1: MULTI-ETIQUETADO (Scoring)
-            tags_encontrados = {} # Formato: {CategoriaTag.TPV: 80, CategoriaTag.FINANCIAMIENTO: 50}
-            
-            for tag, config in CONFIGURACION_TAGS.items():
-                palabras = config["palabras"]
-                peso = config["peso"]
-                
-                # Búsqueda en el diccionario
-                if any(p in desc_plana for p in palabras):
-                    tags_encontrados[tag] = peso
+            # Formato: {CategoriaTag.TPV: 80, CategoriaTag.FINANCIAMIENTO: 50}
+            tags_encontrados = {tag: config_tags[tag]["peso"] for tag in automata.buscar(desc_plana)}
 
             # Hack de compatibilidad: Conservamos tu regex especial de domiciliación Dru
-            if CategoriaTag.PAGO_FINANCIAMIENTO not in tags_encontrados and re.search(r'\bdru\d+\s*domiciliacion\b', desc_plana):
-                tags_encontrados[CategoriaTag.PAGO_FINANCIAMIENTO] = CONFIGURACION_TAGS[CategoriaTag.PAGO_FINANCIAMIENTO]["peso"]
+            if CategoriaTag.PAGO_FINANCIAMIENTO not in tags_encontrados and REGEX_DRU_DOMICILIACION.search(desc_plana):
+                tags_encontrados[CategoriaTag.PAGO_FINANCIAMIENTO] = config_tags[CategoriaTag.PAGO_FINANCIAMIENTO]["peso"]
 
             # FASE 2 y 3: MATRIZ DE CONFLICTOS
             categoria_final, razon = self._aplicar_matriz_conflictos(tags_encontrados, es_abono)
@@ -191,17 +230,15 @@ class MotorClasificador:
 
         for _, tx in enumerate(transacciones):
             if getattr(tx, "categoria", "") == "COMISION_PENDIENTE":
-                # Limpieza agresiva (aplanar texto y quitar acentos/símbolos)
-                desc_raw = str(getattr(tx, "descripcion", "")).lower()
-                desc_norm = unicodedata.normalize('NFKD', desc_raw).encode('ASCII', 'ignore').decode('utf-8')
-                desc_plana = re.sub(r'\s+', ' ', desc_norm).strip()
+                # Limpieza agresiva (aplanar texto y quitar acentos/símbolos). Memoizada desde la Capa 1.
+                desc_plana = _normalizar_descripcion(str(getattr(tx, "descripcion", "")))
 
                 # Sub-clasificación heurística
-                if re.search(r'\b(cr|cre|credito)\b', desc_plana):
+                if REGEX_COMISION_CREDITO.search(desc_plana):
                     tx.categoria = "COMISION_CR"
-                elif re.search(r'\b(db|deb|debito)\b', desc_plana):
+                elif REGEX_COMISION_DEBITO.search(desc_plana):
                     tx.categoria = "COMISION_DB"
-                elif re.search(r'\b(amex|american express|amexco)\b', desc_plana):
+                elif REGEX_COMISION_AMEX.search(desc_plana):
                     tx.categoria = "COMISION_AMEX"
                 else:
                     # Si dice comisión pero no especifica tarjeta, se va a mixta/genérica
@@ -217,27 +254,48 @@ class MotorClasificador:
         batch_size: int = 100,
         nombre_cliente: str = ""
     ) -> dict:
+        """
+        Clasifica (`clasificar_transacciones`) y regresa los totales por categoría.
+
+        Returns:
+            dict: Diccionario consolidado con la sumatoria monetaria por cada categoría 
+                    (ej. {"EFECTIVO": 1500.0, "TPV": 25000.0, "COMISION_CR": 450.0}).
+        """
+        if not transacciones:
+            return {}
+
+        await self.clasificar_transacciones(transacciones, banco, funcion_ia_clasificadora, batch_size, nombre_cliente)
+
+        # --- CAPA 4: SUMATORIAS FINALES ---
+        return self._calcular_totales(transacciones)
+
+    async def clasificar_transacciones(
+        self, 
+        transacciones: List[Any], 
+        banco: str, 
+        funcion_ia_clasificadora, 
+        batch_size: int = 100,
+        nombre_cliente: str = ""
+    ):
         """
         Orquesta el motor de clasificación híbrido para un lote de transacciones.
         
         Aplica una estrategia de "embudo":
         1. Capa determinista (Regex/Pesos) para atrapar transacciones obvias y basura OCR.
         2. Capa de IA semántica (LLM) que recibe lotes dinámicos para clasificar ambigüedades.
-        3. Ensamblaje, inyección de metadatos y cálculo de totales (Sub-motor de comisiones).
+        3. Ensamblaje e inyección de metadatos (Sub-motor de comisiones).
+        Las categorías se escriben en las transacciones; los totales se agregan aparte
+        (`_calcular_totales` / `calcular_metricas`).
 
         Args:
-            transacciones (List[Any]): Lista de objetos de transacción en crudo.
+            transacciones (List[Any]): Lista de objetos de transacción en crudo (o `TablaTransacciones`).
             banco (str): Nombre del banco, utilizado para cargar prompts específicos de la IA.
             funcion_ia_clasificadora (Callable): Función inyectada que maneja la llamada a la API del LLM.
             batch_size (int, optional): Tamaño máximo del lote de transacciones enviado a la IA. Por defecto 100.
             nombre_cliente (str, optional): Nombre del titular para reglas heurísticas de traspasos propios.
-
-        Returns:
-            dict: Diccionario consolidado con la sumatoria monetaria por cada categoría 
-                    (ej. {"EFECTIVO": 1500.0, "TPV": 25000.0, "COMISION_CR": 450.0}).
         """
         if not transacciones:
-            return {}
+            return
 
         self._log_debug(4, f"Iniciando clasificación de {len(transacciones)} transacciones para banco: {banco}")
 
@@ -282,11 +340,6 @@ class MotorClasificador:
         # Pasamos TODAS las transacciones para que convierta las "COMISION_PENDIENTE" en su tipo real
         self._procesar_sub_comisiones(transacciones)
 
-        # --- CAPA 4: SUMATORIAS FINALES ---
-        totales_calculados = self._calcular_totales(transacciones)
-        
-        return totales_calculados
-
     async def _procesar_lotes_ia(
         self, 
         pendientes: List[tuple], 
@@ -297,10 +350,57 @@ class MotorClasificador:
         """
         Divide las transacciones ambiguas en lotes dinámicos equilibrados, 
         llama a la IA concurrentemente y ensambla un diccionario absoluto.
+
+        Con caché activo: primero se resuelven las descripciones ya conocidas, y de las
+        restantes solo viaja a la IA una representante por clave canónica (la respuesta
+        se replica a sus gemelas y se guarda en el caché).
         """
         if not pendientes:
             return {}
 
+        mapa_clasificacion_total = {}
+        gemelas_por_representante = {}
+
+        if self.cache_ia is not None:
+            pendientes, gemelas_por_representante = self._resolver_desde_cache(pendientes, banco, mapa_clasificacion_total)
+            if not pendientes:
+                return mapa_clasificacion_total
+
+        # Mapeo universal (cada lote llega como: respuesta, ids enviados, ¿fue el fallback de error?)
+        async for resultado_ia, ids_lote, es_fallback in self._resultados_por_lote(pendientes, banco, funcion_ia_clasificadora, batch_size_max):
+            if isinstance(resultado_ia, Exception):
+                logger.error(f"[MotorClasificador] Fallo en un lote de IA: {resultado_ia}")
+                continue
+                
+            if isinstance(resultado_ia, dict):
+                for key, etiqueta in resultado_ia.items():
+                    # clean_key = ''.join(filter(str.isdigit, str(key)))  <- ANTERIOR
+                    clean_key = str(key).strip() # <- NUEVO: La IA ya devuelve el ID limpio, pero por si acaso le metemos un strip() para evitar espacios raros. No queremos perder clasificaciones por un espacio de más.
+                    if clean_key:
+                        mapa_clasificacion_total[clean_key] = etiqueta
+                        self._propagar_a_cache(clean_key, etiqueta, gemelas_por_representante, mapa_clasificacion_total, not es_fallback)
+
+        if self.cache_ia is not None:
+            self._log_debug(3, f"Caché IA: {self.cache_ia.metricas()}")
+            # Escritura a disco fuera del event loop (la instantánea es None si aún no toca)
+            await asyncio.to_thread(self.cache_ia.escribir, self.cache_ia.instantanea())
+
+        return mapa_clasificacion_total
+
+    async def _resultados_por_lote(self, pendientes: List[tuple], banco: str, funcion_ia_clasificadora, batch_size_max: int):
+        """
+        Produce (respuesta de la IA, ids del lote, es_fallback) por cada lote terminado.
+        Con despachador: los lotes se comparten entre documentos y llegan conforme terminan.
+        Sin despachador: balanceo dinámico local y un gather por documento (comportamiento original).
+        """
+        lote_para_enviar = [{"id": idx_real, "tx_data": tx} for idx_real, tx in pendientes]
+
+        if self.despachador_ia is not None:
+            self._log_debug(3, f"Despachador IA: {len(pendientes)} txs encoladas ({self.despachador_ia.metricas()})")
+            async for mapa_parcial, ids_lote, es_fallback in self.despachador_ia.en_flujo(banco, lote_para_enviar, funcion_ia_clasificadora):
+                yield mapa_parcial, ids_lote, es_fallback
+            return
+
         total_pendientes = len(pendientes)
         
         # --- LÓGICA DE BALANCEO DINÁMICO ---
@@ -313,154 +413,118 @@ class MotorClasificador:
         self._log_debug(3, f"Balanceo Dinámico: {total_pendientes} txs a IA -> Dividido en {num_lotes} lotes de aprox {tamano_lote_dinamico} txs c/u.")
 
         tareas_lotes = []
+        ids_por_lote = []
         
         for i in range(0, total_pendientes, tamano_lote_dinamico):
-            lote_tuplas = pendientes[i : i + tamano_lote_dinamico]
-            
-            lote_para_enviar = []
-            for idx_real, tx in lote_tuplas:
-                lote_para_enviar.append({
-                    "id": idx_real, 
-                    "tx_data": tx  
-                })
-            
-            tareas_lotes.append(funcion_ia_clasificadora(banco, lote_para_enviar))
+            lote = lote_para_enviar[i : i + tamano_lote_dinamico]
+            tareas_lotes.append(funcion_ia_clasificadora(banco, lote))
+            ids_por_lote.append({str(item["id"]) for item in lote})
 
         resultados_lotes = await asyncio.gather(*tareas_lotes, return_exceptions=True)
 
         # --- LOG TEMPORAL DE DIAGNÓSTICO ---
         # logger.info(f"[DEBUG IA RAW] Payload devuelto por gather: {resultados_lotes}")
 
-        # Mapeo universal
-        mapa_clasificacion_total = {}
-        for resultado_ia in resultados_lotes:
-            if isinstance(resultado_ia, Exception):
-                logger.error(f"[MotorClasificador] Fallo en un lote de IA: {resultado_ia}")
+        for resultado_ia, ids_lote in zip(resultados_lotes, ids_por_lote):
+            es_fallback = isinstance(resultado_ia, dict) and self._es_respuesta_fallback(resultado_ia, ids_lote)
+            yield resultado_ia, ids_lote, es_fallback
+
+    def _resolver_desde_cache(self, pendientes: List[tuple], banco: str, mapa_clasificacion: dict) -> tuple:
+        """
+        Consulta el caché antes de armar los lotes. Las transacciones con clave en caché se
+        escriben directo en `mapa_clasificacion`; de las demás solo la primera de cada clave va a la IA.
+        Retorna (representantes para la IA, {id_representante: (clave, [ids gemelas])}).
+        """
+        representantes = []
+        gemelas_por_representante = {}
+        resueltas_por_clave = {}  # clave -> ("CACHE", etiqueta) o ("IA", id del representante)
+        desde_cache = 0
+
+        for idx_real, tx in pendientes:
+            str_idx = str(idx_real)
+            if isinstance(tx, dict):
+                clave = CacheClasificacionIA.construir_clave(banco, tx.get("tipo", ""), tx.get("descripcion", ""))
+            else:
+                clave = CacheClasificacionIA.construir_clave(banco, getattr(tx, "tipo", ""), getattr(tx, "descripcion", ""))
+
+            previa = resueltas_por_clave.get(clave)
+            if previa is not None:
+                if previa[0] == "CACHE":
+                    mapa_clasificacion[str_idx] = previa[1]
+                    desde_cache += 1
+                else:
+                    gemelas_por_representante[previa[1]][1].append(str_idx)
                 continue
-                
-            if isinstance(resultado_ia, dict):
-                for key, etiqueta in resultado_ia.items():
-                    # clean_key = ''.join(filter(str.isdigit, str(key)))  <- ANTERIOR
-                    clean_key = str(key).strip() # <- NUEVO: La IA ya devuelve el ID limpio, pero por si acaso le metemos un strip() para evitar espacios raros. No queremos perder clasificaciones por un espacio de más.
-                    if clean_key:
-                        mapa_clasificacion_total[clean_key] = etiqueta
 
-        return mapa_clasificacion_total
+            etiqueta = self.cache_ia.obtener(clave)
+            if etiqueta is not None:
+                mapa_clasificacion[str_idx] = etiqueta
+                resueltas_por_clave[clave] = ("CACHE", etiqueta)
+                desde_cache += 1
+                continue
+
+            resueltas_por_clave[clave] = ("IA", str_idx)
+            gemelas_por_representante[str_idx] = (clave, [])
+            representantes.append((idx_real, tx))
+
+        self._log_debug(3, f"Caché IA: {desde_cache} txs resueltas por caché, {len(pendientes) - desde_cache - len(representantes)} gemelas, {len(representantes)} a IA.")
+        return representantes, gemelas_por_representante
+
+    def _propagar_a_cache(self, clave_id: str, etiqueta, gemelas_por_representante: dict, mapa_clasificacion: dict, cacheable: bool):
+        """Replica la etiqueta de un representante a sus gemelas y la guarda en el caché."""
+        entrada = gemelas_por_representante.get(clave_id)
+        if entrada is None:
+            return
+        clave, gemelas = entrada
+        for id_gemela in gemelas:
+            mapa_clasificacion[id_gemela] = etiqueta
+        if cacheable and isinstance(etiqueta, str) and etiqueta.strip():
+            self.cache_ia.guardar(clave, etiqueta)
+
+    @staticmethod
+    def _es_respuesta_fallback(resultado_ia: dict, ids_lote: set) -> bool:
+        """
+        `clasificar_lote_con_ia` responde GENERAL para todo el lote cuando la llamada falla.
+        Esa respuesta no debe envenenar el caché: un lote completo en GENERAL no se cachea.
+        """
+        return {str(k).strip() for k in resultado_ia} == ids_lote and \
+            all(str(v).strip().upper() == "GENERAL" for v in resultado_ia.values())
 
     def _calcular_totales(self, transacciones: List[Any]) -> dict:
         """
         ÚNICA fuente de verdad para los totales base. 
         Nota: Los totales finales de traspasos se recalcularán en la capa global.
         """
-        totales = {
-            "EFECTIVO": 0.0, "TRASPASO_ABONO": 0.0, "TRASPASO_CARGO": 0.0, 
-            "FINANCIAMIENTO": 0.0, "BMRCASH": 0.0, "MORATORIOS": 0.0, 
-            "TPV": 0.0, "DEPOSITOS": 0.0,
-            "COMISION_CR": 0.0, "COMISION_DB": 0.0, "COMISION_AMEX": 0.0, "COMISION_TPV_MIXTA": 0.0,
-            "PAGO_FINANCIAMIENTO": 0.0
-        }
-        
-        conteo_categorias = {"TPV": 0, "GENERAL": 0, "OTROS": 0}
-
-        for tx in transacciones:
-            try:
-                monto_str = str(getattr(tx, "monto", "0")).replace("$", "").replace(",", "").strip()
-                monto = float(monto_str)
-            except (ValueError, TypeError, AttributeError): # <- EXCEPT ACOTADO
-                monto = 0.0
-            
-            tipo_lower = str(getattr(tx, "tipo", "")).lower().strip()
-            es_abono = tipo_lower in ["abono", "deposito", "depósito", "credito", "crédito"]
-            
-            if es_abono:
-                totales["DEPOSITOS"] += monto
-            
-            cat_actual = str(getattr(tx, "categoria", "GENERAL")).upper().strip()
-
-            if cat_actual == "TPV":
-                totales["TPV"] += monto
-                conteo_categorias["TPV"] += 1
-            elif cat_actual in totales:
-                totales[cat_actual] += monto
-                conteo_categorias["OTROS"] += 1
-            elif cat_actual == "BASURA_OCR": # Evita que la basura sume a GENERAL
-                pass
-            else:
-                conteo_categorias["GENERAL"] += 1
+        return self.calcular_metricas(transacciones).totales
+
+    def calcular_metricas(self, transacciones: List[Any], depositos_caratula: float = 0.0, cargos_caratula: float = 0.0) -> MetricasDocumento:
+        """
+        Totales por categoría + métricas de confianza en una sola agregación vectorizada (group-by
+        con NumPy sobre los códigos de la tabla), sin volver a recorrer las transacciones en Python.
+        """
+        metricas = calcular_metricas_documento(como_tabla(transacciones), depositos_caratula, cargos_caratula)
+        totales = metricas.totales
+        conteo_categorias = metricas.conteo_categorias
 
         self._log_debug(4, f"Resumen -> TPV: {conteo_categorias['TPV']} | Otros: {conteo_categorias['OTROS']} | General: {conteo_categorias['GENERAL']}")
 
         logger.info(f"--- DEBUG MOTOR ---")
         logger.info(f"CR: {totales.get('COMISION_CR', 0)} | DB: {totales.get('COMISION_DB', 0)} | AMEX: {totales.get('COMISION_AMEX', 0)} | MIXTA: {totales.get('COMISION_TPV_MIXTA', 0)}")
         
-        return totales
+        return metricas
     
     # ==========================================
     # MÉTODOS AUXILIARES: TRANSACCIONES PROPIAS
     # ==========================================
     def _limpiar_nombre_empresa(self, nombre: str) -> str:
         """Elimina sufijos legales, caracteres especiales y normaliza (ñ->n, acentos) para cruces limpios."""
-
-        if not nombre or nombre.lower() in ["n/a", "desc.", "desconocido", ""]:
-            return ""
-            
-        nombre_lower = nombre.lower()
-        
-        # 1. NORMALIZACIÓN: Quita acentos, diéresis y convierte 'ñ' en 'n'
-        # NFKD separa los caracteres de sus modificadores (ej. 'ñ' -> 'n' + '~')
-        # encode('ASCII', 'ignore') tira los modificadores porque no son ASCII
-        nombre_norm = unicodedata.normalize('NFKD', nombre_lower).encode('ASCII', 'ignore').decode('utf-8')
-        
-        # Lista de sufijos legales a eliminar (ya sin acentos gracias al paso anterior)
-        sufijos = [
-            r"\bs\.a\. de c\.v\.\b", r"\bsa de cv\b", r"\bs\.a\.\b", r"\bs a\b",
-            r"\bs\.a\.p\.i\. de c\.v\.\b", r"\bsapi de cv\b", r"\bsapi\b",
-            r"\bs\. de r\.l\. de c\.v\.\b", r"\bs de rl de cv\b", r"\bs de rl\b", r"\bs\. de r\.l\.\b",
-            r"\bc\.v\.\b", r"\bcv\b", r"\bde c\.v\.\b", r"\bde cv\b"
-        ]
-        
-        nombre_limpio = nombre_norm
-        for sufijo in sufijos:
-            nombre_limpio = re.sub(sufijo, "", nombre_limpio)
-            
-        # 2. Quitar puntuación extra y dejar solo un espacio entre palabras
-        nombre_limpio = re.sub(r"[^\w\s]", "", nombre_limpio)
-        nombre_limpio = re.sub(r"\s+", " ", nombre_limpio).strip()
-        
-        return nombre_limpio
+        return limpiar_nombre_empresa(nombre)
 
     def _es_transaccion_propia(self, descripcion: str, nombre_cliente_caratula: str) -> bool:
         """Valida si el nombre del cliente aparece en la descripción usando coincidencia exacta y heurística."""
         nombre_limpio = self._limpiar_nombre_empresa(nombre_cliente_caratula)
         
-        if len(nombre_limpio) < 4:
-            return False
-            
-        desc_lower = descripcion.lower()
-        desc_norm = unicodedata.normalize('NFKD', desc_lower).encode('ASCII', 'ignore').decode('utf-8')
-        desc_limpia = re.sub(r"[^\w\s]", "", desc_norm)
-        
-        # 1. Coincidencia Exacta (Vía rápida)
-        if nombre_limpio in desc_limpia:
-            return True
-            
-        # 2. Heurística de Texto (Fuzzy Matching) para OCR ruidoso
-        palabras_desc = desc_limpia.split()
-        largo_nombre = len(nombre_limpio.split())
-        
-        if largo_nombre == 0 or len(palabras_desc) < largo_nombre:
+        if len(nombre_limpio) < LARGO_MINIMO_NOMBRE:
             return False
-
-        # Ventana deslizante para comparar fragmentos
-        for i in range(len(palabras_desc) - largo_nombre + 1):
-            # Tomamos un bloque de palabras del mismo tamaño que el nombre del cliente
-            fragmento = " ".join(palabras_desc[i:i+largo_nombre])
-            
-            # Calculamos el ratio de similitud (0.0 a 1.0)
-            similitud = difflib.SequenceMatcher(None, nombre_limpio, fragmento).ratio()
             
-            # Si se parece en un 85% o más, lo damos por bueno
-            if similitud >= 0.85:
-                return True
-                
-        return False
\ No newline at end of file
+        return nombre_en_descripcion(nombre_limpio, limpiar_descripcion(descripcion))
@@ -1,6 +1,8 @@
 import fitz
 import re
+import math
 import logging
+import numpy as np
 from dataclasses import dataclass, field
 from typing import List, Optional, Tuple, Dict
 
@@ -28,6 +30,57 @@ class PageGeometry:
         # +2px de margen para no comerse pixels superiores de los números
         self.content_rect = fitz.Rect(0, self.header_y + 2, self.width, self.footer_y)
 
+class WordYIndex:
+    """
+    Palabras ordenadas por Y (float64) para recortar bandas horizontales con searchsorted.
+    Las bandas se devuelven en el ORDEN ORIGINAL de las palabras (el stitching de signos depende de él).
+    """
+    __slots__ = ("words", "_orden", "_ys")
+
+    def __init__(self, words: List[tuple]):
+        self.words = words
+        ys = np.fromiter((w[1] for w in words), dtype=np.float64, count=len(words))
+        self._orden = np.argsort(ys, kind="stable")
+        self._ys = ys[self._orden]
+
+    def posiciones(self, y_min: float, y_max: float, incluir_min: bool = True) -> List[int]:
+        """Índices originales de las palabras con y_min <= y < y_max (o y_min < y si incluir_min=False)."""
+        lo = np.searchsorted(self._ys, y_min, side="left" if incluir_min else "right")
+        hi = np.searchsorted(self._ys, y_max, side="left")
+        if hi <= lo:
+            return []
+        return np.sort(self._orden[lo:hi]).tolist()
+
+    def banda(self, y_min: float, y_max: float, incluir_min: bool = True) -> List[tuple]:
+        words = self.words
+        return [words[i] for i in self.posiciones(y_min, y_max, incluir_min)]
+
+@dataclass
+class PageTextSnapshot:
+    """Foto única del texto de una página (palabras + bloques) compartida por las 3 pasadas."""
+    page_num: int                # 1-based, igual que PageGeometry
+    words: List[tuple]           # Tuplas crudas de page.get_text("words")
+    blocks: List[tuple]          # Tuplas crudas de page.get_text("blocks")
+    word_boxes: np.ndarray = field(init=False, repr=False)    # (N, 4) float64: x0, y0, x1, y1
+    block_boxes: np.ndarray = field(init=False, repr=False)   # (M, 4) float64: x0, y0, x1, y1
+    blocks_clean: List[str] = field(init=False, repr=False)   # Texto de bloque sin saltos de línea
+    blocks_upper: List[str] = field(init=False, repr=False)   # Mismo texto en mayúsculas
+    word_yc: np.ndarray = field(init=False, repr=False)       # (N,) centro vertical de cada palabra
+    block_stops: Optional[List[Optional[str]]] = field(default=None, init=False, repr=False)  # Cache de triggers (HARD_STOP / FOOTER)
+
+    def __post_init__(self):
+        self.word_boxes = np.array([w[:4] for w in self.words], dtype=np.float64).reshape(-1, 4)
+        self.word_yc = (self.word_boxes[:, 1] + self.word_boxes[:, 3]) / 2
+        self.block_boxes = np.array([b[:4] for b in self.blocks], dtype=np.float64).reshape(-1, 4)
+        self.blocks_clean = [b[4].replace('\n', ' ').strip() for b in self.blocks]
+        self.blocks_upper = [t.upper() for t in self.blocks_clean]
+
+def clave_centavos(monto: float) -> Optional[int]:
+    """Cubeta de 1 centavo. Dos montos con |a - b| < 0.01 caen en la misma cubeta o en una vecina."""
+    if not math.isfinite(monto):
+        return None
+    return int(round(monto * 100))
+
 class MotorExtraccionEspacial:
     # --- CONSTANTES DE LOGGING (FLAGS) ---
     LOG_GEOMETRY = 1    # Detalles de Pasada 1 (Detección de Header/Footer)
@@ -35,6 +88,9 @@ class MotorExtraccionEspacial:
     LOG_EXTRACTION = 3  # Detalles de Pasada 3 (Slicing, montos, stitching)
     LOG_RAYOS_X = 4     # Dumps masivos de palabras (como tu "Rayos X")
     LOG_SCORES = 5      # Detalles de scoring de líneas para header
+
+    # Códigos de columna usados por la asignación vectorizada (0 = sin columna)
+    COLUMNAS_MONTO = (None, "CARGO", "ABONO", "IMPORTE")
     
     def __init__(self, debug_flags: List[int] = None, banco: str = "GENERICO"):
         """
@@ -156,12 +212,59 @@ class MotorExtraccionEspacial:
         # Estado Global
         self.global_stop = False
 
+        # Cache de texto por página: cada página se extrae de MuPDF una sola vez
+        self._snapshots: Dict[int, PageTextSnapshot] = {}
+        self._snapshot_doc = None
+        self.extracciones_texto = 0  # Llamadas reales a page.get_text() del documento actual
+
     def _log_debug(self, section_flag: int, message: str):
         """Imprime logs internos SOLO si el flag está activo en la config."""
         if section_flag in self.debug_flags:
             # Usamos logger.info para que salga en el archivo, pero con prefijo DEBUG
             logger.info(f"[DEBUG-{section_flag}] {message}")
 
+    # =========================================================================
+    # CACHE DE TEXTO POR PÁGINA (Una extracción MuPDF por página)
+    # =========================================================================
+    def _obtener_snapshot(self, page: fitz.Page) -> PageTextSnapshot:
+        """
+        Devuelve las palabras y bloques de la página, extrayéndolos solo la primera vez.
+        Si cambia el documento, el cache y el contador se reinician.
+        """
+        doc = page.parent
+        if doc is not self._snapshot_doc:
+            self._snapshots = {}
+            self._snapshot_doc = doc
+            self.extracciones_texto = 0
+
+        snapshot = self._snapshots.get(page.number)
+        if snapshot is None:
+            words = page.get_text("words")
+            blocks = page.get_text("blocks")
+            self.extracciones_texto += 2
+            snapshot = PageTextSnapshot(page_num=page.number + 1, words=words, blocks=blocks)
+            self._snapshots[page.number] = snapshot
+        return snapshot
+
+    def _clasificar_bloques_stop(self, snapshot: PageTextSnapshot) -> List[Optional[str]]:
+        """Evalúa una sola vez por página qué bloques son HARD_STOP o FOOTER."""
+        if snapshot.block_stops is None:
+            stops = []
+            for clean_block in snapshot.blocks_upper:
+                if any(rx.search(clean_block) for rx in self.RX_HARD_STOP_TRIGGERS):
+                    stops.append("HARD_STOP")
+                elif any(rx.search(clean_block) for rx in self.RX_FOOTER_TRIGGERS):
+                    stops.append("FOOTER_FOUND")
+                else:
+                    stops.append(None)
+            snapshot.block_stops = stops
+        return snapshot.block_stops
+
+    def liberar_snapshots(self):
+        """Suelta el cache de texto (y la referencia al documento) al terminar."""
+        self._snapshots = {}
+        self._snapshot_doc = None
+
     def _calculate_line_score(self, text: str) -> int:
         """Calcula 'qué tanto se parece' una línea a un header de tabla."""
         clean_text = text.upper()
@@ -200,10 +303,33 @@ class MotorExtraccionEspacial:
     # =========================================================================
     # PASADA 1: DETECCIÓN DE GEOMETRÍA (STATEFUL STICKY HEADER)
     # =========================================================================
-    def pass_1_detect_geometry(self, doc: fitz.Document) -> List[PageGeometry]:
+    def _resolver_indices_paginas(self, doc: fitz.Document, rango_paginas: Optional[Tuple[int, int]] = None) -> range:
+        """
+        Traduce un rango 1-based (inclusive) a índices 0-based del documento.
+        Se incluye 1 página previa de contexto para heredar el estado sticky
+        (header, columnas, última fecha y modo SPEI) sin re-procesar todo el PDF.
+        """
+        total = len(doc)
+        if not rango_paginas:
+            return range(0, total)
+
+        start_pg, end_pg = rango_paginas
+        idx_inicio = max(0, start_pg - 2)  # -1 por base 0, -1 por página de contexto
+        idx_fin = min(total, max(end_pg, 1))
+        return range(idx_inicio, idx_fin)
+
+    def pass_1_detect_geometry(self, doc: fitz.Document, rango_paginas: Optional[Tuple[int, int]] = None) -> List[PageGeometry]:
+        """
+        Si se recibe `rango_paginas` (1-based, inclusive) solo se leen esas páginas más la previa
+        de contexto. Las Pasadas 2 y 3 trabajan sobre las geometrías devueltas, así que heredan el rango.
+        """
         logger.info("--- INICIANDO PASADA 1: GEOMETRÍA (STATEFUL STICKY HEADER) ---")
         
         geometries = []
+        indices_paginas = self._resolver_indices_paginas(doc, rango_paginas)
+        if not indices_paginas:
+            return geometries
+        pagina_semilla = indices_paginas[0]  # Primera página leída: siembra el estado sticky
         
         # Estado Persistente
         # Guardamos la Y del último header confiable encontrado.
@@ -213,7 +339,8 @@ class MotorExtraccionEspacial:
             "source_page": -1   # Dónde lo encontramos
         }
 
-        for page_num, page in enumerate(doc):
+        for page_num in indices_paginas:
+            page = doc[page_num]
             width = page.rect.width
             height = page.rect.height
             
@@ -224,7 +351,8 @@ class MotorExtraccionEspacial:
                 limit_y = height * self.cfg_geo["pn_search_limit_ratio"]
 
             # 2. ESCANEO DE CANDIDATOS LOCALES
-            words = page.get_text("words")
+            snapshot = self._obtener_snapshot(page)
+            words = snapshot.words
             lines = {}
             for w in words:
                 y_bucket = int(w[1] / 3) * 3 
@@ -255,15 +383,15 @@ class MotorExtraccionEspacial:
             used_strategy = "UNKNOWN"
             best_local = local_candidates[0] if local_candidates else None
             
-            # --- Lógica de la Página 1 ---
-            if page_num == 0:
+            # --- Lógica de la Página 1 (o primera página del rango) ---
+            if page_num == pagina_semilla:
                 if best_local and best_local['score'] >= 2:
                     final_header_y = best_local['y']
-                    active_header_state = {"y": final_header_y, "score": best_local['score'], "source_page": 0}
+                    active_header_state = {"y": final_header_y, "score": best_local['score'], "source_page": page_num}
                     used_strategy = "P1_FOUND"
                 else:
                     final_header_y = height * self.cfg_geo["fallback_header_y"] # Config
-                    active_header_state = {"y": final_header_y, "score": 1, "source_page": 0} 
+                    active_header_state = {"y": final_header_y, "score": 1, "source_page": page_num} 
                     used_strategy = "P1_FALLBACK"
 
             # --- Lógica Página 2+ ---
@@ -299,8 +427,7 @@ class MotorExtraccionEspacial:
 
             # 4. DETECCIÓN DE FOOTER
             footer_y = height
-            blocks = page.get_text("blocks")
-            for b in blocks:
+            for b in snapshot.blocks:
                 x0, y0, x1, y1, text, _, _ = b
                 if any(rx.search(text.upper()) for rx in self.RX_FOOTER_TRIGGERS):
                     if (y0 - 5) < footer_y: footer_y = y0 - 5
@@ -341,7 +468,7 @@ class MotorExtraccionEspacial:
             
             search_rect = fitz.Rect(0, y_scan_top, geo.width, y_scan_bottom)
 
-            words = page.get_text("words")
+            words = self._obtener_snapshot(page).words
             
             header_tokens = [
                 w for w in words 
@@ -480,6 +607,7 @@ class MotorExtraccionEspacial:
             
             geo = geometries[i]
             page = doc[geo.page_num - 1]
+            snapshot = self._obtener_snapshot(page)
             page_bottom = geo.footer_y 
 
             # =================================================================
@@ -489,9 +617,7 @@ class MotorExtraccionEspacial:
             
             # Solo buscamos estas palabras si el banco es MIFEL
             if self.banco == "MIFEL":
-                blocks_preventivos = page.get_text("blocks")
-                for b in blocks_preventivos:
-                    txt_bloque = b[4].upper().replace('\n', ' ').strip()
+                for b, txt_bloque in zip(snapshot.blocks, snapshot.blocks_upper):
                     if "SPEI RECIBIDOS" in txt_bloque or "DETALLE DE MOVIMIENTOS SPEI" in txt_bloque or "SPEI RECIBIDO" in txt_bloque:
                         self.triggers_spei_pagina.append({"y": b[1], "mode": "RECIBIDOS"})
                     elif "SPEI ENVIADOS" in txt_bloque or "SPEI ENVIADO" in txt_bloque:
@@ -504,9 +630,7 @@ class MotorExtraccionEspacial:
             # =================================================================
             # ESCANEO PREVENTIVO (Hard Stop Lookahead)
             # =================================================================
-            blocks_preventivos = page.get_text("blocks")
-            for b in blocks_preventivos:
-                texto_bloque = b[4].replace('\n', ' ').strip()
+            for b, texto_bloque in zip(snapshot.blocks, snapshot.blocks_clean):
                 if any(rx.search(texto_bloque) for rx in self.RX_HARD_STOP_TRIGGERS):
                     y_trigger = b[1] - 5 
                     logger.warning(f"🛑 HARD STOP EN PÁGINA {geo.page_num} (Y={y_trigger:.1f}): '{texto_bloque[:30]}...'")
@@ -515,7 +639,7 @@ class MotorExtraccionEspacial:
                         page_bottom = y_trigger
                     break 
 
-            words = page.get_text("words")
+            words = snapshot.words
             
             # --- RAYOS X (DEBUG POR FLAG) ---
             if self.LOG_RAYOS_X in self.debug_flags:
@@ -560,21 +684,12 @@ class MotorExtraccionEspacial:
                 next_stop_y = page_bottom
                 reason_stop = "END_PAGE"
                 
-                # 1. Buscar Triggers Abajo
-                blocks = page.get_text("blocks")
-                for b in blocks:
-                    if b[1] > cursor_y + 20: 
-                        clean_block = b[4].replace('\n', ' ').strip().upper() 
-                        
-                        if any(rx.search(clean_block) for rx in self.RX_HARD_STOP_TRIGGERS):
-                            if (b[1] - 5) < next_stop_y:
-                                next_stop_y = b[1] - 5
-                                reason_stop = "HARD_STOP"
-                        
-                        elif any(rx.search(clean_block) for rx in self.RX_FOOTER_TRIGGERS):
-                            if (b[1] - 5) < next_stop_y:
-                                next_stop_y = b[1] - 5
-                                reason_stop = "FOOTER_FOUND"
+                # 1. Buscar Triggers Abajo (clasificación de bloques cacheada por página)
+                for b, tipo_stop in zip(snapshot.blocks, self._clasificar_bloques_stop(snapshot)):
+                    if tipo_stop and b[1] > cursor_y + 20:
+                        if (b[1] - 5) < next_stop_y:
+                            next_stop_y = b[1] - 5
+                            reason_stop = tipo_stop
                 
                 # 2. Lookahead de Headers
                 found_next_header_y = None
@@ -685,7 +800,8 @@ class MotorExtraccionEspacial:
                 x_inicio_desc = rango_fecha_x[1] + 5
 
                 # Extraer
-                words_block = [w for w in words if y_techo_bloque <= ((w[1]+w[3])/2) <= y_suelo_bloque]
+                idx_bloque = np.flatnonzero((snapshot.word_yc >= y_techo_bloque) & (snapshot.word_yc <= y_suelo_bloque))
+                words_block = [words[k] for k in idx_bloque.tolist()]
                 anclas = self._encontrar_anclas_fechas(words_block, rango_fecha_x, geo.width)
                 
                 # --- ZONA HUÉRFANA (Usando Config) ---
@@ -833,6 +949,9 @@ class MotorExtraccionEspacial:
         """
         Cruce global de todo el documento. Modifica los dicts originales in-place
         añadiendo la descripción y retorna los IDs de memoria de los IMPORTES a eliminar.
+
+        Los NORMALES se indexan una sola vez por monto (en centavos) y por (monto, fecha);
+        las palabras clave se calculan una vez por transacción y se actualizan al fusionar.
         """
         PALABRAS_IGNORADAS = {"de", "la", "el", "en", "por", "para", "un", "una", "spei", "pago", "envio", "transferencia", "cv", "sa"}
 
@@ -862,6 +981,24 @@ class MotorExtraccionEspacial:
         self._log_debug(self.LOG_EXTRACTION, f"DEDUPLICACIÓN GLOBAL INICIADA: {len(importes)} IMPORTES vs {len(normales)} NORMALES en todo el documento.")
         
         ids_importes_fusionados = set()
+        if not importes:
+            return ids_importes_fusionados
+
+        # =================================================================
+        # ÍNDICE DE NORMALES (Se construye una vez; monto y fecha nunca se mutan)
+        # =================================================================
+        montos_norm, indice_monto, indice_monto_fecha = self._indexar_por_monto_fecha(normales)
+        palabras_norm_cache: Dict[int, set] = {}
+
+        def palabras_de_normal(pos: int) -> set:
+            if pos not in palabras_norm_cache:
+                palabras_norm_cache[pos] = obtener_palabras_clave(normales[pos].get("descripcion", ""))
+            return palabras_norm_cache[pos]
+
+        def fusionar_palabras(pos: int, palabras_extra: set):
+            # La descripción fusionada es "A | B": sus palabras clave son exactamente kw(A) ∪ kw(B)
+            if pos in palabras_norm_cache:
+                palabras_norm_cache[pos] |= palabras_extra
 
         # =================================================================
         # NUEVO PRE-FILTRO: FUSIÓN MUCHOS-A-UNO (Zonas de Crédito Fragmentadas)
@@ -887,16 +1024,14 @@ class MotorExtraccionEspacial:
                     suma_total = sum(float(imp.get("monto", 0.0)) for imp in grupo if "monto" in imp)
                     
                     # Buscar el movimiento "Padre" (ej. RECUPERACION DE CREDITO)
-                    candidatos_padre = [
-                        n for n in normales 
-                        if str(n.get("fecha", "")).strip() == fecha_str 
-                        and abs(float(n.get("monto", 0.0)) - suma_total) < 0.01
-                    ]
+                    candidatos_padre = self._candidatos_por_monto(indice_monto_fecha, montos_norm, suma_total, fecha_str)
                     
                     if len(candidatos_padre) == 1:
-                        padre = candidatos_padre[0]
+                        pos_padre = candidatos_padre[0]
+                        padre = normales[pos_padre]
                         desc_hijos = " | ".join([imp.get("descripcion", "").replace("\n", " ").strip() for imp in grupo])
                         padre["descripcion"] = f"{padre['descripcion']} | DESGLOSE: {desc_hijos}"
+                        fusionar_palabras(pos_padre, obtener_palabras_clave(f"DESGLOSE: {desc_hijos}"))
                         
                         for imp in grupo:
                             ids_importes_fusionados.add(id(imp))
@@ -920,44 +1055,90 @@ class MotorExtraccionEspacial:
             match_encontrado = False
             
             # --- 1. FILTRO DE ORO: Coincidencia EXACTA y ÚNICA de Monto y Fecha ---
-            candidatos_exactos = [
-                n for n in normales 
-                if abs(float(n.get("monto", 0.0)) - monto_imp) < 0.01 and str(n.get("fecha", "")).strip() == fecha_imp
-            ]
+            candidatos_exactos = self._candidatos_por_monto(indice_monto_fecha, montos_norm, monto_imp, fecha_imp)
 
             # Si encontramos exactamente UNO, es un match perfecto garantizado
             if len(candidatos_exactos) == 1:
-                norm = candidatos_exactos[0]
+                pos_norm = candidatos_exactos[0]
+                norm = normales[pos_norm]
                 norm["descripcion"] = f"{norm['descripcion']} | {imp['descripcion']}"
+                fusionar_palabras(pos_norm, palabras_imp)
                 ids_importes_fusionados.add(id(imp))
                 self._log_debug(self.LOG_EXTRACTION, f"   [EXITO] Fusión por Fecha+Monto Único: ${monto_imp} el {fecha_imp}")
                 continue
 
             # --- 2. FILTRO DE PLATA: Desempate por texto (Heurística clásica) ---
-            lista_busqueda = candidatos_exactos if len(candidatos_exactos) > 1 else normales
-
-            for norm in lista_busqueda:
-                try:
-                    monto_norm = float(norm.get("monto", 0.0))
-                except:
-                    continue
+            # Sin candidatos exactos se buscan todos los normales con el mismo monto (cualquier fecha)
+            if len(candidatos_exactos) > 1:
+                lista_busqueda = candidatos_exactos
+            else:
+                lista_busqueda = self._candidatos_por_monto(indice_monto, montos_norm, monto_imp)
 
-                if abs(monto_norm - monto_imp) < 0.01:
-                    palabras_norm = obtener_palabras_clave(norm.get("descripcion", ""))
-                    coincidencias = palabras_imp.intersection(palabras_norm)
-                    
-                    if len(coincidencias) >= 1:
-                        # FUSIÓN EN LA MISMA REFERENCIA DE MEMORIA
-                        norm["descripcion"] = f"{norm['descripcion']} | {imp['descripcion']}"
-                        ids_importes_fusionados.add(id(imp))
-                        match_encontrado = True
-                        self._log_debug(self.LOG_EXTRACTION, f"   [EXITO] Fusión por Texto: ${monto_imp} | Coincidencias: {coincidencias}")
-                        break 
+            for pos_norm in lista_busqueda:
+                coincidencias = palabras_imp.intersection(palabras_de_normal(pos_norm))
+                
+                if len(coincidencias) >= 1:
+                    # FUSIÓN EN LA MISMA REFERENCIA DE MEMORIA
+                    norm = normales[pos_norm]
+                    norm["descripcion"] = f"{norm['descripcion']} | {imp['descripcion']}"
+                    fusionar_palabras(pos_norm, palabras_imp)
+                    ids_importes_fusionados.add(id(imp))
+                    match_encontrado = True
+                    self._log_debug(self.LOG_EXTRACTION, f"   [EXITO] Fusión por Texto: ${monto_imp} | Coincidencias: {coincidencias}")
+                    break 
             
             if not match_encontrado and len(candidatos_exactos) != 1:
                 self._log_debug(self.LOG_EXTRACTION, f"IMPORTE SIN MATCH (HUÉRFANO GLOBAL): Monto ${monto_imp}")
 
         return ids_importes_fusionados
+
+    def _indexar_por_monto_fecha(self, transacciones: List[Dict]) -> Tuple[List[Optional[float]], Dict, Dict]:
+        """
+        Construye los índices hash de la deduplicación:
+        - montos: monto float de cada posición (None si no es parseable).
+        - por_monto: centavos -> posiciones (en orden original).
+        - por_monto_fecha: (centavos, fecha) -> posiciones (en orden original).
+        """
+        montos = []
+        por_monto: Dict[int, List[int]] = {}
+        por_monto_fecha: Dict[Tuple[int, str], List[int]] = {}
+
+        for pos, tx in enumerate(transacciones):
+            try:
+                monto = float(tx.get("monto", 0.0))
+            except (TypeError, ValueError):
+                montos.append(None)
+                continue
+            montos.append(monto)
+
+            clave = clave_centavos(monto)
+            if clave is None:
+                continue
+            fecha = str(tx.get("fecha", "")).strip()
+            por_monto.setdefault(clave, []).append(pos)
+            por_monto_fecha.setdefault((clave, fecha), []).append(pos)
+
+        return montos, por_monto, por_monto_fecha
+
+    def _candidatos_por_monto(self, indice: Dict, montos: List[Optional[float]], monto: float, fecha: Optional[str] = None) -> List[int]:
+        """
+        Posiciones (en orden original) cuyo monto cumple abs(m - monto) < 0.01,
+        opcionalmente restringidas a la misma fecha. Revisa la cubeta y sus dos vecinas.
+        """
+        clave = clave_centavos(monto)
+        if clave is None:
+            return []
+
+        posiciones = []
+        for k in (clave - 1, clave, clave + 1):
+            bucket = indice.get(k if fecha is None else (k, fecha))
+            if bucket:
+                posiciones.extend(bucket)
+
+        if not posiciones:
+            return []
+        posiciones.sort()
+        return [p for p in posiciones if abs(montos[p] - monto) < 0.01]
     
     def _encontrar_anclas_fechas(self, words: List, rango_x: Tuple[float, float], ancho_pagina: float) -> List[Dict]:
         x_min_col, x_max_col = rango_x
@@ -992,6 +1173,7 @@ class MotorExtraccionEspacial:
             lineas_candidatas.append(linea_actual)
 
         anclas = []
+        indice_y = None  # Se construye solo si aparece un candidato "Día Aislado"
 
         # 3. BARRIDO Y VALIDACIÓN
         for linea in lineas_candidatas:
@@ -1023,13 +1205,15 @@ class MotorExtraccionEspacial:
                 dia_val = int(first_token)
                 if 1 <= dia_val <= 31:
                     resto_txt = " ".join(tokens[1:]) if len(tokens) > 1 else ""
-                    texto_vecino = self._obtener_texto_vecino(words, linea["y"], x_max_scan)
+                    if indice_y is None:
+                        indice_y = WordYIndex(words)
+                    texto_vecino = self._obtener_texto_vecino(words, linea["y"], x_max_scan, indice=indice_y)
                     
                     ruido_interno = any(n in resto_txt for n in self.NOISE_DATE_TOKENS)
                     ruido_externo = any(n in texto_vecino for n in self.NOISE_DATE_TOKENS)
 
                     if not ruido_interno and not ruido_externo:
-                        tiene_dinero = self._validar_dinero_en_fila(words, linea["y"], ancho_pagina)
+                        tiene_dinero = self._validar_dinero_en_fila(words, linea["y"], ancho_pagina, indice=indice_y)
                         
                         if tiene_dinero:
                             es_ancla_valida = True
@@ -1058,8 +1242,11 @@ class MotorExtraccionEspacial:
 
         return anclas
 
-    def _obtener_texto_vecino(self, all_words: List, y_target: float, x_start: float) -> str:
+    def _obtener_texto_vecino(self, all_words: List, y_target: float, x_start: float, indice: Optional[WordYIndex] = None) -> str:
         """Devuelve el texto que está inmediatamente a la derecha (mismo Y, X mayor)."""
+        if indice is not None:
+            # Banda holgada por searchsorted; el filtro exacto de abajo decide igual que antes
+            all_words = indice.banda(y_target - 6, y_target + 6)
         vecinos = [
             w[4] for w in all_words
             if abs(w[1] - y_target) < 5 
@@ -1068,7 +1255,7 @@ class MotorExtraccionEspacial:
         ]
         return " ".join(vecinos).upper()
 
-    def _validar_dinero_en_fila(self, all_words: List, y_target: float, ancho_pagina: float) -> bool:
+    def _validar_dinero_en_fila(self, all_words: List, y_target: float, ancho_pagina: float, indice: Optional[WordYIndex] = None) -> bool:
         """
         Busca si existe un monto monetario en la zona visual del candidato.
         Usa Configuración para definir qué tan arriba/abajo mirar.
@@ -1079,6 +1266,9 @@ class MotorExtraccionEspacial:
         y_min = y_target - y_up  
         y_max = y_target + y_down 
         
+        if indice is not None:
+            all_words = indice.banda(y_min, y_max, incluir_min=False)
+
         palabras_zona = [
             w for w in all_words 
             if y_min < w[1] < y_max
@@ -1096,6 +1286,36 @@ class MotorExtraccionEspacial:
         clean = txt.replace("$", "").replace(",", "")
         return bool(self.REGEX_MONTO_SIMPLE.search(clean))
 
+    def _columna_monto(self, w, r_cargo: Tuple, r_abono: Tuple, r_importe: Tuple) -> Optional[str]:
+        """Versión escalar de la asignación de columna (para tokens re-armados por el stitching)."""
+        x_center = (w[0] + w[2]) / 2
+        if r_cargo[0] <= x_center <= r_cargo[1]: return "CARGO"
+        if r_abono[0] <= x_center <= r_abono[1]: return "ABONO"
+        if r_importe[0] <= x_center <= r_importe[1]: return "IMPORTE"
+        if r_cargo[0] <= w[0] <= r_cargo[1]: return "CARGO"
+        if r_abono[0] <= w[0] <= r_abono[1]: return "ABONO"
+        if r_importe[0] <= w[0] <= r_importe[1]: return "IMPORTE"
+        return None
+
+    def _asignar_columnas_monto(self, palabras: List, r_cargo: Tuple, r_abono: Tuple, r_importe: Tuple) -> List[Optional[str]]:
+        """
+        Columna de dinero (CARGO / ABONO / IMPORTE / None) de cada palabra, calculada con máscaras.
+        Prioridad: centro X dentro de la zona; si no cae en ninguna, borde izquierdo (x0).
+        """
+        if not palabras:
+            return []
+        x0 = np.fromiter((w[0] for w in palabras), dtype=np.float64, count=len(palabras))
+        x1 = np.fromiter((w[2] for w in palabras), dtype=np.float64, count=len(palabras))
+        x_center = (x0 + x1) / 2
+
+        condiciones = []
+        for xs in (x_center, x0):
+            for r in (r_cargo, r_abono, r_importe):
+                condiciones.append((r[0] <= xs) & (xs <= r[1]))
+
+        codigos = np.select(condiciones, [1, 2, 3, 1, 2, 3], default=0).tolist()
+        return [self.COLUMNAS_MONTO[c] for c in codigos]
+
     def _extraer_transacciones_por_slice(self, anclas: List[Dict], words: List, zonas_x: Dict, y_limite_total: float, x_inicio_desc_dinamico: float, current_columns: Dict, y_techo_bloque_origen: float = None) -> List[Dict]:
         if not anclas: return []
             
@@ -1117,6 +1337,11 @@ class MotorExtraccionEspacial:
         floor_offset = self.cfg_ext["slice_floor_offset"]
         cluster_px = self.cfg_ext["row_clustering_px"]
 
+        # Índice vertical y columna de dinero calculados UNA vez para todas las palabras del bloque
+        # (evita recorrer todas las palabras por cada ancla)
+        indice_y = WordYIndex(words)
+        cols_words = self._asignar_columnas_monto(words, r_cargo, r_abono, r_importe)
+
         for i, ancla in enumerate(anclas):
             y_actual = ancla["y_anchor"]
             
@@ -1149,10 +1374,12 @@ class MotorExtraccionEspacial:
             # self._log_debug(self.LOG_EXTRACTION, f"SLICE [{i}] Fecha: '{ancla['texto_fecha']}' Y={y_actual:.1f} | Techo: {y_techo_slice:.1f} | Suelo: {y_suelo_slice:.1f}")
 
             # Filtrar palabras dentro del slice
-            palabras_slice_raw = [w for w in words if y_techo_slice <= w[1] < y_suelo_slice]
+            pos_slice = indice_y.posiciones(y_techo_slice, y_suelo_slice)
+            palabras_slice_raw = [words[k] for k in pos_slice]
             
             # PRE-STITCHING DE SIGNOS Y MONTOS (Soporte de 3 piezas)
             palabras_slice = []
+            cols_slice = []  # Columna de dinero de cada token (paralela a palabras_slice)
             skip_count = 0
             for j, w in enumerate(palabras_slice_raw):
                 if skip_count > 0:
@@ -1173,6 +1400,7 @@ class MotorExtraccionEspacial:
                             nuevo_token[4] = signo + w_next[4] 
                             nuevo_token[0] = w[0] # Expandimos la caja visual (x0)
                             palabras_slice.append(tuple(nuevo_token))
+                            cols_slice.append(self._columna_monto(nuevo_token, r_cargo, r_abono, r_importe))
                             skip_count = 1
                             continue
                             
@@ -1191,16 +1419,18 @@ class MotorExtraccionEspacial:
                                 nuevo_token[4] = next_txt + w_next_next[4] # Forzamos la unión (ej. "+100.00")
                                 nuevo_token[0] = w[0] # La caja visual inicia desde el $
                                 palabras_slice.append(tuple(nuevo_token))
+                                cols_slice.append(self._columna_monto(nuevo_token, r_cargo, r_abono, r_importe))
                                 skip_count = 2
                                 continue
                 
                 # Si no cayó en casos especiales, lo anexamos normal
                 palabras_slice.append(w)
+                cols_slice.append(cols_words[pos_slice[j]])
             
             montos_detectados = []
             tokens_texto = []
-            
-            for w in palabras_slice:
+
+            for w, col_detectada in zip(palabras_slice, cols_slice):
                 x = w[0]
                 if x >= x_muro_saldo: continue
                 
@@ -1210,18 +1440,6 @@ class MotorExtraccionEspacial:
                 
                 # Clasificación de Monto REAL
                 if es_numero and x > x_inicio_texto:
-                    col_detectada = None
-                    x_center = (w[0] + w[2]) / 2
-                    
-                    if r_cargo[0] <= x_center <= r_cargo[1]: col_detectada = "CARGO"
-                    elif r_abono[0] <= x_center <= r_abono[1]: col_detectada = "ABONO"
-                    elif r_importe[0] <= x_center <= r_importe[1]: col_detectada = "IMPORTE"
-                    
-                    if not col_detectada: 
-                        if r_cargo[0] <= w[0] <= r_cargo[1]: col_detectada = "CARGO"
-                        elif r_abono[0] <= w[0] <= r_abono[1]: col_detectada = "ABONO"
-                        elif r_importe[0] <= w[0] <= r_importe[1]: col_detectada = "IMPORTE"
-
                     if col_detectada:
                         try:
                             val = float(clean_txt)
@@ -1288,6 +1506,13 @@ class MotorExtraccionEspacial:
                         grupo_actual = [m]
                 filas_montos.append(grupo_actual)
 
+                # Con varias filas en el slice, cada fila recorta su banda por searchsorted
+                if len(filas_montos) > 1:
+                    indice_texto = WordYIndex(tokens_texto)
+                    indice_slice = WordYIndex(palabras_slice)
+                else:
+                    indice_texto = indice_slice = None
+
                 for idx_fila, grupo in enumerate(filas_montos):
                     mejor_monto = sorted(grupo, key=lambda k: k["x"])[0]
                     y_monto = mejor_monto["y"]
@@ -1313,7 +1538,8 @@ class MotorExtraccionEspacial:
                         is_desc_right_sided = True
 
                     tokens_desc = []
-                    for w in tokens_texto:
+                    tokens_fila = indice_texto.banda(y_techo_local, y_suelo_local) if indice_texto else tokens_texto
+                    for w in tokens_fila:
                         if not (y_techo_local <= w[1] < y_suelo_local): continue
                         if not (w[0] > x_limite_lectura): continue
                         
@@ -1373,7 +1599,10 @@ class MotorExtraccionEspacial:
                         
                     # --- SÚPER FILTRO DE TOTALES Y BASURA ---
                     # 1. Visión Periférica: Leemos la fila COMPLETA (sin límites de X) para cazar el "Total"
-                    tokens_fila_completa = [w for w in palabras_slice if y_techo_local <= w[1] < y_suelo_local]
+                    if indice_slice:
+                        tokens_fila_completa = indice_slice.banda(y_techo_local, y_suelo_local)
+                    else:
+                        tokens_fila_completa = [w for w in palabras_slice if y_techo_local <= w[1] < y_suelo_local]
                     tokens_fila_completa.sort(key=lambda w: w[0])
                     texto_fila_completo = " ".join([w[4] for w in tokens_fila_completa]).upper()
                     
@@ -1448,7 +1677,7 @@ class MotorExtraccionEspacial:
         """
         Mini-Pass 2: Detecta columnas usando múltiples perfiles con ALTURAS DINÁMICAS.
         """
-        all_words = page.get_text("words")
+        all_words = self._obtener_snapshot(page).words
         
         # DEFINICIONES DE PERFIL (Podrían ir a Config si quisieras, pero aquí están bien encapsuladas)
         PROFILES_CONFIG = [
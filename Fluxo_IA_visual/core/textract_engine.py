@@ -6,6 +6,7 @@ import numpy as np
 import re
 import logging
 from .config import settings
+from .exceptions import ExtraccionCanceladaError
 
 logger = logging.getLogger(__name__)
 
@@ -98,7 +99,10 @@ def parsear_y_ordenar_textract_estructurado(respuesta_aws, umbral_interseccion=0
         
     return filas_reconstruidas
 
-def procesar_pagina_worker(num_pagina, imagen_pil):
+def procesar_pagina_worker(num_pagina, imagen_pil, cancelacion=None):
+    # Cada página es una llamada cobrada: si el pipeline ya descartó el documento, no se envía
+    if cancelacion is not None and cancelacion.activa():
+        return {"pagina": num_pagina, "exito": False, "filas_data": [], "error": "cancelada"}
     try:
         img_procesada = limpiar_imagen_para_ocr(imagen_pil)
         cliente_aws = inicializar_textract()
@@ -108,7 +112,14 @@ def procesar_pagina_worker(num_pagina, imagen_pil):
     except Exception as e:
         return {"pagina": num_pagina, "exito": False, "filas_data": [], "error": str(e)}
 
-def extraer_documento_completo(ruta_pdf):
+def extraer_documento_completo(ruta_pdf, cancelacion=None):
+    """
+    Rasteriza el PDF y manda cada página a Textract. `cancelacion` (BanderaCancelacion, opcional) se revisa
+    antes de rasterizar y antes de cada página: si se activa, lanza ExtraccionCanceladaError.
+    """
+    if cancelacion is not None and cancelacion.activa():
+        raise ExtraccionCanceladaError(f"Extracción Textract cancelada antes de empezar: {ruta_pdf}")
+
     logger.info(f"Cargando {ruta_pdf} en memoria para Textract...")
     
     # Preparamos los argumentos base
@@ -126,7 +137,7 @@ def extraer_documento_completo(ruta_pdf):
     
     with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
         futuros = {
-            executor.submit(procesar_pagina_worker, i + 1, img): i + 1 
+            executor.submit(procesar_pagina_worker, i + 1, img, cancelacion): i + 1 
             for i, img in enumerate(imagenes_pil)
         }
         
@@ -140,6 +151,10 @@ def extraer_documento_completo(ruta_pdf):
             except Exception as exc:
                 logger.error(f"[FATAL] Textract Página {num_pag} generó excepción: {exc}")
 
+    if cancelacion is not None and cancelacion.activa():
+        enviadas = sum(1 for r in resultados_globales if r["error"] != "cancelada")
+        raise ExtraccionCanceladaError(f"Extracción Textract cancelada: {enviadas}/{len(imagenes_pil)} páginas enviadas ({ruta_pdf})")
+
     resultados_globales.sort(key=lambda x: x["pagina"])
     
     filas_estructuradas_totales = []
@@ -2,6 +2,14 @@
 
 from .core.config import settings
 from .api.endpoints import router_fluxo, router_csf, router_nomi, router_precalificacion, router_front
+from .services.ia_extractor import get_cache_clasificacion, get_despachador_ia
+from .services.resiliencia_ia import metricas_llm
+from .services.cache_render import cache_render
+from .services.monitor_loop import monitor_loop
+from .services.ipc_pool import metricas_ipc_globales
+from .services.passport_service import obtener_registro_pasaportes, volcar_pasaportes_pendientes
+from .services.storage_service import get_almacen_resultados
+from .services.limpiador_ttl import limpiador_ttl
 
 import sys
 from concurrent.futures import ProcessPoolExecutor
@@ -28,6 +36,15 @@ async def lifespan(app: FastAPI):
     # Determinamos un número seguro de workers (ej. total de cores físicos menos 1)
     max_workers = max(1, os.cpu_count() - 1)
     app.state.process_pool = ProcessPoolExecutor(max_workers=max_workers)
+
+    # Medición continua del lag del event loop (expuesta en /metricas)
+    monitor_loop.iniciar()
+
+    # Un solo limpiador TTL para temporales, pasaportes y resultados (barrido completo solo al arrancar)
+    limpiador_ttl.iniciar(
+        directorios=["temp_uploads", "downloads/passports"],
+        almacenes=[get_almacen_resultados()]
+    )
     
     logger.info(f"Iniciando {settings.PROJECT_NAME} v{settings.APP_VERSION}")
     logger.info(f"Pool global de procesos iniciado con {max_workers} workers.")
@@ -37,7 +54,20 @@ async def lifespan(app: FastAPI):
     yield
     
     # Código de apagado: liberamos la RAM y cerramos procesos
+    await monitor_loop.detener()
+    await limpiador_ttl.detener()
     app.state.process_pool.shutdown(wait=True)
+
+    # Persistimos lo aprendido por el caché de clasificación IA (las escrituras normales van espaciadas)
+    cache_ia = get_cache_clasificacion()
+    cache_ia.persistir()
+    logger.info(f"Caché de clasificación IA persistido: {cache_ia.metricas()}")
+
+    # Pasaportes con cambios aún dentro de su ventana de escritura
+    volcar_pasaportes_pendientes()
+
+    # Conexiones del almacén de resultados (cliente S3 si RESULTADOS_BACKEND="objetos")
+    await get_almacen_resultados().cerrar()
     logger.info("Cerrando la aplicación y limpiando el pool de procesos.")
 
 # Definimos los tags visuales para Swagger
@@ -160,4 +190,19 @@ async def info():
             "nomiflash": f"{settings.API_V1_STR}/NomiFlash",
             "precalificacion": f"{settings.API_V1_STR}/PreCalificacion"
         }
-    }
\ No newline at end of file
+    }
+
+# Endpoint de métricas de IA
+@app.get("/metricas", tags=["General"])
+async def metricas():
+    """Contadores por modelo (llamadas, reintentos, hedges, latencias p50/p95), circuitos, despachador, cachés, lag del event loop, bytes por el pipe del pool, escrituras de pasaportes y limpieza TTL."""
+    return {
+        "llm": metricas_llm(),
+        "despachador_ia": get_despachador_ia().metricas(),
+        "cache_clasificacion": get_cache_clasificacion().metricas(),
+        "cache_render": cache_render.metricas(),
+        "loop_lag": monitor_loop.metricas(),
+        "ipc_pool": metricas_ipc_globales.resumen(),
+        "pasaportes": obtener_registro_pasaportes().metricas(),
+        "limpieza_ttl": limpiador_ttl.metricas()
+    }
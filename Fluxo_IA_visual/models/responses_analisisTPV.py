@@ -1,7 +1,9 @@
 # models/responses_analisisTPV.py
 
 from .responses_general import ErrorRespuestaBase # Por si en el futuro se rompe, quitamos esto
-from pydantic import BaseModel, Field
+from .tabla_transacciones import TablaTransacciones
+from pydantic import BaseModel, ConfigDict, Field, field_serializer
+from pydantic.json_schema import SkipJsonSchema
 from typing import Any, Dict, List, Optional, Tuple, Union
 
 # ----- Clases para respuestas de Análisis TPV (Fluxo) -----
@@ -30,9 +32,19 @@ class AnalisisTPV:
     
     class ResultadoTPV(BaseModel):
         """Representa todas las transacciones TPV encontadas dentro del documento."""
-        transacciones: List["AnalisisTPV.Transaccion"] = Field(default_factory=list)
+        model_config = ConfigDict(arbitrary_types_allowed=True)
+
+        # En el pipeline viaja la tabla columnar; la lista de `Transaccion` queda para JSON previos y pruebas
+        transacciones: Union[SkipJsonSchema[TablaTransacciones], List["AnalisisTPV.Transaccion"]] = Field(default_factory=list)
         error_transacciones: Optional[str] = None
 
+        @field_serializer("transacciones", mode="wrap", return_type=List[Dict[str, Union[str, bool]]])
+        def _serializar_transacciones(self, valor, handler):
+            # Frontera JSON/Excel: la tabla se vuelve filas con la forma de `Transaccion`
+            if isinstance(valor, TablaTransacciones):
+                return valor.a_registros()
+            return handler(valor)
+
     class ResultadoAnalisisIA(BaseModel):
         """Clase de respuesta para un análisis de carátula exitoso."""
         nombre_archivo_virtual: Optional[str] = Field(default=None, description="Nombre asignado en memoria para trazabilidad.", examples=["Estado_Cuenta_Marzo.pdf"])
@@ -127,6 +139,7 @@ class AnalisisTPV:
         file_path_origen: Optional[str] = Field(default=None, exclude=True)
         rango_paginas: Optional[Tuple[int, int]] = Field(default=None, exclude=True)
         es_digital: bool = Field(default=True, exclude=True)
+        firma_caratula: Optional[Tuple] = Field(default=None, exclude=True)  # Deduplicación del lote
 
     class ResultadoTotal(BaseModel):
         """Representa una respuesta exitosa de todos los lotes analizados."""
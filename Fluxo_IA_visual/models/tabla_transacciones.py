@@ -0,0 +1,267 @@
+# models/tabla_transacciones.py
+
+import sys
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+
+# Orden de las llaves de cada fila en el JSON/Excel (idéntico a `AnalisisTPV.Transaccion`)
+COLUMNAS_TRANSACCION = (
+    "fecha", "periodo", "descripcion", "monto", "tipo", "categoria", "es_sospechosa", "razon_clasificacion"
+)
+
+# Tipos que el motor trata como entrada de dinero (misma lista que usaban los barridos por fila)
+TIPOS_ABONO = frozenset({"abono", "deposito", "depósito", "credito", "crédito"})
+
+# Códigos fijos para los valores conocidos: son iguales en el worker y en el proceso principal.
+# Etiquetas nuevas (ej. una categoría libre de la IA) se agregan al final del catálogo de cada tabla.
+TIPOS_BASE = ("abono", "cargo", "ABONO", "CARGO")
+CATEGORIAS_BASE = (
+    "GENERAL", "TPV", "EFECTIVO", "TRASPASO", "TRASPASO_ABONO", "TRASPASO_CARGO",
+    "FINANCIAMIENTO", "PAGO_FINANCIAMIENTO", "BMRCASH", "MORATORIOS",
+    "COMISION_CR", "COMISION_DB", "COMISION_AMEX", "COMISION_TPV_MIXTA", "COMISION_PENDIENTE",
+    "IVA", "BASURA_OCR", "CARGO",
+)
+
+def monto_a_float(valor: Any) -> float:
+    """
+    Mismo parseo que hacían los totales sobre el string formateado ('$1,234.50' -> 1234.5).
+    Números pasan directo; textos inválidos o None valen 0.0.
+    """
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    try:
+        return float(str(valor).replace("$", "").replace(",", "").strip())
+    except ValueError:
+        return 0.0
+
+def _texto(valor: Any) -> str:
+    """Texto internado: descripciones y fechas se repiten mucho y así comparten un solo objeto."""
+    return sys.intern(valor if type(valor) is str else ("" if valor is None else str(valor)))
+
+class CatalogoCodigos:
+    """Codificación por diccionario de una columna de baja cardinalidad (texto <-> código entero)."""
+
+    __slots__ = ("valores", "_codigos")
+
+    def __init__(self, valores: Iterable[str] = ()):
+        self.valores: List[str] = list(valores)
+        self._codigos: Dict[str, int] = {v: i for i, v in enumerate(self.valores)}
+
+    def codigo(self, valor: str) -> int:
+        codigo = self._codigos.get(valor)
+        if codigo is None:
+            codigo = len(self.valores)
+            self.valores.append(valor)
+            self._codigos[valor] = codigo
+        return codigo
+
+    def __len__(self) -> int:
+        return len(self.valores)
+
+    def __reduce__(self):
+        # Por el pipe solo viajan los valores; el índice inverso se reconstruye al llegar
+        return (CatalogoCodigos, (tuple(self.valores),))
+
+class FilaTransaccion:
+    """
+    Vista de una fila de la tabla con la misma interfaz que `AnalisisTPV.Transaccion`.
+    Lee y escribe directo en las columnas: el motor clasificador y la IA la usan sin cambios.
+    """
+
+    __slots__ = ("tabla", "indice")
+
+    def __init__(self, tabla: "TablaTransacciones", indice: int):
+        self.tabla = tabla
+        self.indice = indice
+
+    @property
+    def fecha(self) -> str:
+        return self.tabla.fechas[self.indice]
+
+    @fecha.setter
+    def fecha(self, valor):
+        self.tabla.fechas[self.indice] = _texto(valor)
+
+    @property
+    def periodo(self) -> str:
+        return self.tabla.periodos[self.indice]
+
+    @periodo.setter
+    def periodo(self, valor):
+        self.tabla.periodos[self.indice] = _texto(valor)
+
+    @property
+    def descripcion(self) -> str:
+        return self.tabla.descripciones[self.indice]
+
+    @descripcion.setter
+    def descripcion(self, valor):
+        self.tabla.descripciones[self.indice] = _texto(valor)
+
+    @property
+    def importe(self) -> float:
+        """Monto numérico (float64) tal como vive en la columna."""
+        return self.tabla.montos[self.indice]
+
+    @property
+    def monto(self) -> str:
+        """Monto formateado igual que el campo string de `Transaccion` ('1,234.50')."""
+        return f"{self.tabla.montos[self.indice]:,.2f}"
+
+    @monto.setter
+    def monto(self, valor):
+        self.tabla.montos[self.indice] = monto_a_float(valor)
+
+    @property
+    def tipo(self) -> str:
+        return self.tabla.catalogo_tipos.valores[self.tabla.tipos[self.indice]]
+
+    @tipo.setter
+    def tipo(self, valor):
+        self.tabla.tipos[self.indice] = self.tabla.catalogo_tipos.codigo(_texto(valor))
+
+    @property
+    def categoria(self) -> str:
+        return self.tabla.catalogo_categorias.valores[self.tabla.categorias[self.indice]]
+
+    @categoria.setter
+    def categoria(self, valor):
+        self.tabla.categorias[self.indice] = self.tabla.catalogo_categorias.codigo(_texto(valor))
+
+    @property
+    def es_sospechosa(self) -> bool:
+        return bool(self.tabla.sospechosas[self.indice])
+
+    @es_sospechosa.setter
+    def es_sospechosa(self, valor):
+        self.tabla.sospechosas[self.indice] = 1 if valor else 0
+
+    @property
+    def razon_clasificacion(self) -> str:
+        return self.tabla.razones[self.indice]
+
+    @razon_clasificacion.setter
+    def razon_clasificacion(self, valor):
+        self.tabla.razones[self.indice] = _texto(valor)
+
+    def model_dump(self) -> Dict[str, Any]:
+        return self.tabla.registro(self.indice)
+
+    def __repr__(self) -> str:
+        return f"FilaTransaccion({self.model_dump()})"
+
+class TablaTransacciones:
+    """
+    Transacciones de un documento en columnas paralelas: montos float64 en `array('d')`, tipo y
+    categoría como códigos `uint16` sobre un catálogo, y descripciones/fechas internadas.
+
+    Se arma en el worker de extracción, cruza el pipe tal cual y el clasificador, los totales y el
+    cruce de traspasos trabajan sobre ella. Solo al serializar a JSON/Excel se vuelve filas con la
+    forma de `AnalisisTPV.Transaccion` (`a_registros`).
+    """
+
+    __slots__ = (
+        "fechas", "periodos", "descripciones", "montos", "tipos", "categorias",
+        "sospechosas", "razones", "catalogo_tipos", "catalogo_categorias",
+    )
+
+    def __init__(self):
+        self.fechas: List[str] = []
+        self.periodos: List[str] = []
+        self.descripciones: List[str] = []
+        self.montos = array("d")
+        self.tipos = array("H")
+        self.categorias = array("H")
+        self.sospechosas = array("b")
+        self.razones: List[str] = []
+        self.catalogo_tipos = CatalogoCodigos(TIPOS_BASE)
+        self.catalogo_categorias = CatalogoCodigos(CATEGORIAS_BASE)
+
+    def agregar(
+        self, fecha: str = "", periodo: str = "", descripcion: str = "", monto: Any = 0.0,
+        tipo: str = "", categoria: str = "GENERAL", es_sospechosa: bool = False, razon_clasificacion: str = ""
+    ):
+        self.fechas.append(_texto(fecha))
+        self.periodos.append(_texto(periodo))
+        self.descripciones.append(_texto(descripcion))
+        self.montos.append(monto_a_float(monto))
+        self.tipos.append(self.catalogo_tipos.codigo(_texto(tipo)))
+        self.categorias.append(self.catalogo_categorias.codigo(_texto(categoria)))
+        self.sospechosas.append(1 if es_sospechosa else 0)
+        self.razones.append(_texto(razon_clasificacion))
+
+    @classmethod
+    def desde_registros(cls, registros: Iterable[Any]) -> "TablaTransacciones":
+        """Arma la tabla desde dicts (JSON previo, motor) u objetos con atributos (`Transaccion`)."""
+        tabla = cls()
+        for reg in registros:
+            if isinstance(reg, dict):
+                tabla.agregar(**{c: reg[c] for c in COLUMNAS_TRANSACCION if c in reg})
+            else:
+                tabla.agregar(**{c: getattr(reg, c) for c in COLUMNAS_TRANSACCION if hasattr(reg, c)})
+        return tabla
+
+    # --- LECTURA POR CÓDIGO (una evaluación por valor distinto, no por fila) ---
+
+    def abonos_por_codigo(self) -> List[bool]:
+        """`es_abono` para cada código de tipo (tipo.lower().strip() en TIPOS_ABONO)."""
+        return [v.lower().strip() in TIPOS_ABONO for v in self.catalogo_tipos.valores]
+
+    def categorias_normalizadas(self) -> List[str]:
+        """Categoría en mayúsculas y sin espacios para cada código."""
+        return [v.upper().strip() for v in self.catalogo_categorias.valores]
+
+    def asignar_categoria(self, indice: int, categoria: str):
+        self.categorias[indice] = self.catalogo_categorias.codigo(_texto(categoria))
+
+    # --- PROTOCOLO DE SECUENCIA ---
+
+    def __len__(self) -> int:
+        return len(self.montos)
+
+    def __getitem__(self, indice: int) -> FilaTransaccion:
+        if indice < 0:
+            indice += len(self)
+        if not 0 <= indice < len(self):
+            raise IndexError("índice de transacción fuera de rango")
+        return FilaTransaccion(self, indice)
+
+    def __iter__(self) -> Iterator[FilaTransaccion]:
+        for i in range(len(self)):
+            yield FilaTransaccion(self, i)
+
+    # --- FRONTERA JSON/EXCEL ---
+
+    def registro(self, i: int) -> Dict[str, Any]:
+        return {
+            "fecha": self.fechas[i],
+            "periodo": self.periodos[i],
+            "descripcion": self.descripciones[i],
+            "monto": f"{self.montos[i]:,.2f}",
+            "tipo": self.catalogo_tipos.valores[self.tipos[i]],
+            "categoria": self.catalogo_categorias.valores[self.categorias[i]],
+            "es_sospechosa": bool(self.sospechosas[i]),
+            "razon_clasificacion": self.razones[i],
+        }
+
+    def a_registros(self) -> List[Dict[str, Any]]:
+        """Filas con la forma exacta de `AnalisisTPV.Transaccion.model_dump()`."""
+        tipos = self.catalogo_tipos.valores
+        categorias = self.catalogo_categorias.valores
+        return [
+            {
+                "fecha": fecha, "periodo": periodo, "descripcion": descripcion, "monto": f"{monto:,.2f}",
+                "tipo": tipos[codigo_tipo], "categoria": categorias[codigo_cat],
+                "es_sospechosa": sospechosa == 1, "razon_clasificacion": razon,
+            }
+            for fecha, periodo, descripcion, monto, codigo_tipo, codigo_cat, sospechosa, razon in zip(
+                self.fechas, self.periodos, self.descripciones, self.montos,
+                self.tipos, self.categorias, self.sospechosas, self.razones,
+            )
+        ]
+
+def como_tabla(transacciones: Sequence[Any]) -> TablaTransacciones:
+    """La misma tabla si ya lo es; si no, la arma desde la lista (ej. documentos rescatados del JSON)."""
+    if isinstance(transacciones, TablaTransacciones):
+        return transacciones
+    return TablaTransacciones.desde_registros(transacciones or [])
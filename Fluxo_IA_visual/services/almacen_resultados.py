@@ -0,0 +1,675 @@
+# services/almacen_resultados.py
+
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from abc import ABC, abstractmethod
+from contextlib import AsyncExitStack
+from dataclasses import dataclass
+from functools import cached_property
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, Optional
+
+import orjson
+
+from ..core.exceptions import ConflictoEscrituraError
+
+logger = logging.getLogger(__name__)
+
+TAMANO_FRAGMENTO = 1024 * 1024              # Lectura en streaming (descargas)
+TAMANO_PARTE_MULTIPART = 8 * 1024 * 1024    # S3 exige >= 5 MiB por parte (salvo la última)
+MAX_INTENTOS_CONDICIONAL = 5                # Reintentos de leer-modificar-escribir ante un conflicto de ETag
+MAX_CLAVES_POR_BORRADO = 1000               # Límite de DeleteObjects
+
+# Resultado guardado como manifiesto + un objeto por documento (ver `guardar_por_documento`)
+FORMATO_POR_DOCUMENTO = "por_documento/1"
+CAMPO_DOCUMENTOS = "resultados_individuales"
+
+# Códigos de error del protocolo S3 (AWS y MinIO)
+CODIGOS_NO_EXISTE = {"NoSuchKey", "404", "NotFound"}
+CODIGOS_CONFLICTO = {"PreconditionFailed", "412", "ConditionalRequestConflict", "409"}
+
+def serializar_json(datos) -> bytes:
+    """JSON compacto en UTF-8 (orjson): sin sangría, claves no-string y tipos numpy admitidos."""
+    return orjson.dumps(datos, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+deserializar_json = orjson.loads
+
+@dataclass
+class ObjetoAlmacenado:
+    contenido: bytes
+    etag: str
+
+async def fragmentar(contenido: bytes, tamano: int = TAMANO_PARTE_MULTIPART) -> AsyncIterator[bytes]:
+    """Entrega un buffer ya armado en partes (vistas sin copia) para `subir_flujo`."""
+    vista = memoryview(contenido)
+    for inicio in range(0, len(vista), tamano):
+        yield vista[inicio:inicio + tamano]
+
+def _codigo_error(error: Exception) -> str:
+    """Código de un ClientError de botocore sin importar botocore."""
+    return str(getattr(error, "response", {}).get("Error", {}).get("Code", ""))
+
+# ============================================================================
+# CONTRATO
+# ============================================================================
+
+class AlmacenResultados(ABC):
+    """
+    Almacén de resultados de jobs (JSON y Excel) por clave plana ("data_<job>.json").
+
+    Todas las operaciones son asíncronas. Cada escritura devuelve el ETag del objeto y acepta
+    condiciones (`si_coincide` / `si_no_existe`) para que dos réplicas que actualizan el mismo
+    job no se pisen: la que pierde recibe `ConflictoEscrituraError` y vuelve a leer.
+    """
+
+    @abstractmethod
+    async def leer(self, clave: str) -> Optional[ObjetoAlmacenado]:
+        """Contenido completo + ETag, o None si no existe."""
+
+    @abstractmethod
+    async def escribir(self, clave: str, contenido: bytes, si_coincide: Optional[str] = None, si_no_existe: bool = False) -> str:
+        """Escritura atómica de un objeto completo. Retorna el ETag nuevo."""
+
+    @abstractmethod
+    async def subir_flujo(self, clave: str, fragmentos: AsyncIterable[bytes]) -> str:
+        """Escritura atómica desde un flujo de fragmentos sin juntarlos en memoria. Retorna el ETag."""
+
+    @abstractmethod
+    async def abrir_flujo(self, clave: str) -> Optional[AsyncIterator[bytes]]:
+        """Iterador de fragmentos del objeto (para StreamingResponse), o None si no existe."""
+
+    @abstractmethod
+    async def modificado(self, clave: str) -> Optional[float]:
+        """Timestamp de la última escritura, o None si no existe (para el limpiador TTL)."""
+
+    @abstractmethod
+    async def borrar(self, clave: str) -> int:
+        """Borra el objeto. Retorna los bytes liberados."""
+
+    @abstractmethod
+    async def purgar_antiguos(self, ttl_segundos: float) -> int:
+        """Borra los objetos con más de `ttl_segundos` sin modificarse. Retorna cuántos borró."""
+
+    async def cerrar(self):
+        """Libera conexiones (apagado de la app)."""
+
+    @cached_property
+    def expiracion_por_documento(self) -> "ExpiracionPorDocumento":
+        """Fuente estable para el limpiador TTL: un manifiesto vence junto con sus documentos."""
+        return ExpiracionPorDocumento(self)
+
+    async def leer_json(self, clave: str) -> Optional[dict]:
+        objeto = await self.leer(clave)
+        return deserializar_json(objeto.contenido) if objeto else None
+
+    async def actualizar_json(self, clave: str, funcion: Callable[[dict], dict], max_intentos: int = MAX_INTENTOS_CONDICIONAL) -> dict:
+        """
+        Leer-modificar-escribir con escritura condicional sobre el ETag leído.
+        Si otra réplica escribió en medio, se relee y se vuelve a aplicar `funcion`.
+        """
+        for _ in range(max_intentos):
+            actual = await self.leer(clave)
+            datos = funcion(deserializar_json(actual.contenido) if actual else {})
+            contenido = serializar_json(datos)
+            try:
+                await self.escribir(clave, contenido, si_coincide=actual.etag if actual else None, si_no_existe=actual is None)
+                return datos
+            except ConflictoEscrituraError:
+                logger.info(f"Conflicto de escritura en {clave}: reintentando con la versión más reciente.")
+        raise ConflictoEscrituraError(f"No se pudo actualizar {clave} tras {max_intentos} intentos.")
+
+# ============================================================================
+# DISCO LOCAL (un solo nodo)
+# ============================================================================
+
+class AlmacenResultadosDisco(AlmacenResultados):
+    """
+    Implementación sobre una carpeta local (comportamiento histórico en `downloads/`).
+    El ETag es el MD5 del contenido (igual que S3 en subidas de una sola parte) y las
+    escrituras van a un temporal + `os.replace`, así un lector nunca ve un archivo a medias.
+    La comprobación de ETag es atómica dentro del proceso; entre réplicas usar el almacén de objetos.
+    """
+
+    def __init__(self, directorio: str = "downloads"):
+        self.directorio = directorio
+        os.makedirs(self.directorio, exist_ok=True)
+        self._candado = threading.Lock()
+
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, os.path.basename(str(clave)))  # Sanitización (path traversal)
+
+    @staticmethod
+    def _ruta_temporal(ruta: str) -> str:
+        return f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    @staticmethod
+    def _etag_archivo(ruta: str) -> Optional[str]:
+        try:
+            with open(ruta, "rb") as f:
+                return hashlib.md5(f.read(), usedforsecurity=False).hexdigest()
+        except FileNotFoundError:
+            return None
+
+    def _leer_sync(self, clave: str) -> Optional[ObjetoAlmacenado]:
+        try:
+            with open(self._ruta(clave), "rb") as f:
+                contenido = f.read()
+        except FileNotFoundError:
+            return None
+        return ObjetoAlmacenado(contenido, hashlib.md5(contenido, usedforsecurity=False).hexdigest())
+
+    def _escribir_sync(self, clave: str, contenido: bytes, si_coincide: Optional[str], si_no_existe: bool) -> str:
+        ruta = self._ruta(clave)
+        with self._candado:
+            if si_coincide is not None or si_no_existe:
+                etag_actual = self._etag_archivo(ruta)
+                if (si_no_existe and etag_actual is not None) or (si_coincide is not None and etag_actual != si_coincide):
+                    raise ConflictoEscrituraError(clave)
+            temporal = self._ruta_temporal(ruta)
+            with open(temporal, "wb") as f:
+                f.write(contenido)
+            os.replace(temporal, ruta)
+        return hashlib.md5(contenido, usedforsecurity=False).hexdigest()
+
+    def _modificado_sync(self, clave: str) -> Optional[float]:
+        try:
+            return os.path.getmtime(self._ruta(clave))
+        except FileNotFoundError:
+            return None
+
+    def _borrar_sync(self, clave: str) -> int:
+        ruta = self._ruta(clave)
+        liberados = os.path.getsize(ruta)
+        os.remove(ruta)
+        return liberados
+
+    def _purgar_sync(self, ttl_segundos: float) -> int:
+        ahora = time.time()
+        borrados = 0
+        for archivo in os.listdir(self.directorio):
+            ruta = os.path.join(self.directorio, archivo)
+            if os.path.isfile(ruta) and ahora - os.path.getmtime(ruta) > ttl_segundos:
+                os.remove(ruta)
+                borrados += 1
+        return borrados
+
+    async def leer(self, clave):
+        return await asyncio.to_thread(self._leer_sync, clave)
+
+    async def escribir(self, clave, contenido, si_coincide=None, si_no_existe=False):
+        return await asyncio.to_thread(self._escribir_sync, clave, contenido, si_coincide, si_no_existe)
+
+    async def subir_flujo(self, clave, fragmentos):
+        ruta = self._ruta(clave)
+        temporal = self._ruta_temporal(ruta)
+        md5 = hashlib.md5(usedforsecurity=False)
+        archivo = await asyncio.to_thread(open, temporal, "wb")
+        try:
+            async for fragmento in fragmentos:
+                md5.update(fragmento)
+                await asyncio.to_thread(archivo.write, fragmento)
+            await asyncio.to_thread(archivo.close)
+            await asyncio.to_thread(os.replace, temporal, ruta)
+        except BaseException:
+            archivo.close()
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        return md5.hexdigest()
+
+    async def abrir_flujo(self, clave):
+        try:
+            archivo = await asyncio.to_thread(open, self._ruta(clave), "rb")
+        except FileNotFoundError:
+            return None
+
+        async def iterar():
+            try:
+                while fragmento := await asyncio.to_thread(archivo.read, TAMANO_FRAGMENTO):
+                    yield fragmento
+            finally:
+                archivo.close()
+        return iterar()
+
+    async def modificado(self, clave):
+        return await asyncio.to_thread(self._modificado_sync, clave)
+
+    async def borrar(self, clave):
+        return await asyncio.to_thread(self._borrar_sync, clave)
+
+    async def purgar_antiguos(self, ttl_segundos):
+        return await asyncio.to_thread(self._purgar_sync, ttl_segundos)
+
+# ============================================================================
+# ALMACÉN DE OBJETOS (S3 / MinIO, compartido entre réplicas)
+# ============================================================================
+
+class AlmacenResultadosS3(AlmacenResultados):
+    """
+    Implementación sobre el protocolo S3 con aioboto3 (AWS o un MinIO local vía `endpoint_url`).
+
+    - Escrituras condicionales con `IfMatch` / `IfNoneMatch="*"`: 412 -> `ConflictoEscrituraError`.
+    - `subir_flujo` manda una sola petición si el flujo cabe en una parte; si no, multipart
+      con partes de `TAMANO_PARTE_MULTIPART` (abortado si el flujo falla a la mitad).
+    - Un solo cliente por proceso, abierto a la primera operación y cerrado en `cerrar()`.
+
+    `fabrica_cliente` (callable -> context manager asíncrono de un cliente S3) permite inyectar
+    otro cliente compatible; por defecto se usa `aioboto3.Session().client("s3", **opciones_cliente)`.
+    """
+
+    def __init__(self, bucket: str, prefijo: str = "", fabrica_cliente: Optional[Callable] = None, **opciones_cliente):
+        self.bucket = bucket
+        self.prefijo = prefijo
+        self._fabrica_cliente = fabrica_cliente
+        self._opciones_cliente = opciones_cliente
+        self._pila: Optional[AsyncExitStack] = None
+        self._cliente = None
+        self._candado = asyncio.Lock()
+
+    def _key(self, clave: str) -> str:
+        return f"{self.prefijo}{os.path.basename(str(clave))}"
+
+    async def _obtener_cliente(self):
+        if self._cliente is None:
+            async with self._candado:
+                if self._cliente is None:
+                    fabrica = self._fabrica_cliente
+                    if fabrica is None:
+                        import aioboto3  # Solo se requiere con RESULTADOS_BACKEND="objetos"
+                        sesion = aioboto3.Session()
+                        fabrica = lambda: sesion.client("s3", **self._opciones_cliente)
+                    pila = AsyncExitStack()
+                    self._cliente = await pila.enter_async_context(fabrica())
+                    self._pila = pila
+        return self._cliente
+
+    async def cerrar(self):
+        if self._pila is not None:
+            await self._pila.aclose()
+            self._pila, self._cliente = None, None
+
+    async def _get_object(self, clave: str) -> Optional[dict]:
+        cliente = await self._obtener_cliente()
+        try:
+            return await cliente.get_object(Bucket=self.bucket, Key=self._key(clave))
+        except Exception as e:
+            if _codigo_error(e) in CODIGOS_NO_EXISTE:
+                return None
+            raise
+
+    async def leer(self, clave):
+        respuesta = await self._get_object(clave)
+        if respuesta is None:
+            return None
+        async with respuesta["Body"] as cuerpo:
+            contenido = await cuerpo.read()
+        return ObjetoAlmacenado(contenido, respuesta["ETag"])
+
+    async def escribir(self, clave, contenido, si_coincide=None, si_no_existe=False):
+        cliente = await self._obtener_cliente()
+        condicion = {}
+        if si_coincide is not None:
+            condicion["IfMatch"] = si_coincide
+        elif si_no_existe:
+            condicion["IfNoneMatch"] = "*"
+        try:
+            respuesta = await cliente.put_object(Bucket=self.bucket, Key=self._key(clave), Body=bytes(contenido), **condicion)
+        except Exception as e:
+            if _codigo_error(e) in CODIGOS_CONFLICTO:
+                raise ConflictoEscrituraError(clave) from e
+            raise
+        return respuesta["ETag"]
+
+    async def subir_flujo(self, clave, fragmentos):
+        cliente = await self._obtener_cliente()
+        key = self._key(clave)
+        buffer = bytearray()
+        partes = []
+        upload_id = None
+        try:
+            async for fragmento in fragmentos:
+                buffer += fragmento
+                while len(buffer) >= TAMANO_PARTE_MULTIPART:
+                    if upload_id is None:
+                        upload_id = (await cliente.create_multipart_upload(Bucket=self.bucket, Key=key))["UploadId"]
+                    await self._subir_parte(cliente, key, upload_id, partes, bytes(buffer[:TAMANO_PARTE_MULTIPART]))
+                    del buffer[:TAMANO_PARTE_MULTIPART]
+
+            if upload_id is None:  # Cupo en una sola parte
+                return (await cliente.put_object(Bucket=self.bucket, Key=key, Body=bytes(buffer)))["ETag"]
+            if buffer:
+                await self._subir_parte(cliente, key, upload_id, partes, bytes(buffer))
+            respuesta = await cliente.complete_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": partes}
+            )
+            return respuesta["ETag"]
+        except BaseException:
+            if upload_id is not None:
+                try:
+                    await cliente.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+                except Exception as e:
+                    logger.warning(f"No se pudo abortar la subida multipart de {key}: {e}")
+            raise
+
+    async def _subir_parte(self, cliente, key: str, upload_id: str, partes: list, cuerpo: bytes):
+        numero = len(partes) + 1
+        respuesta = await cliente.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=numero, Body=cuerpo)
+        partes.append({"ETag": respuesta["ETag"], "PartNumber": numero})
+
+    async def abrir_flujo(self, clave):
+        respuesta = await self._get_object(clave)
+        if respuesta is None:
+            return None
+
+        async def iterar():
+            async with respuesta["Body"] as cuerpo:
+                async for fragmento in cuerpo.iter_chunks(TAMANO_FRAGMENTO):
+                    yield fragmento
+        return iterar()
+
+    async def _head_object(self, clave: str) -> Optional[dict]:
+        cliente = await self._obtener_cliente()
+        try:
+            return await cliente.head_object(Bucket=self.bucket, Key=self._key(clave))
+        except Exception as e:
+            if _codigo_error(e) in CODIGOS_NO_EXISTE:
+                return None
+            raise
+
+    async def modificado(self, clave):
+        cabecera = await self._head_object(clave)
+        return cabecera["LastModified"].timestamp() if cabecera else None
+
+    async def borrar(self, clave):
+        cabecera = await self._head_object(clave)
+        if cabecera is None:
+            return 0
+        cliente = await self._obtener_cliente()
+        await cliente.delete_object(Bucket=self.bucket, Key=self._key(clave))
+        return cabecera["ContentLength"]
+
+    async def purgar_antiguos(self, ttl_segundos):
+        # En producción conviene además una regla de ciclo de vida del bucket con la misma caducidad
+        cliente = await self._obtener_cliente()
+        limite = time.time() - ttl_segundos
+        vencidas = []
+        token = None
+        while True:
+            pagina = await cliente.list_objects_v2(
+                Bucket=self.bucket, Prefix=self.prefijo, **({"ContinuationToken": token} if token else {})
+            )
+            vencidas.extend(o["Key"] for o in pagina.get("Contents", []) if o["LastModified"].timestamp() < limite)
+            if not pagina.get("IsTruncated"):
+                break
+            token = pagina["NextContinuationToken"]
+
+        for inicio in range(0, len(vencidas), MAX_CLAVES_POR_BORRADO):
+            lote = vencidas[inicio:inicio + MAX_CLAVES_POR_BORRADO]
+            await cliente.delete_objects(Bucket=self.bucket, Delete={"Objects": [{"Key": k} for k in lote], "Quiet": True})
+        return len(vencidas)
+
+# ============================================================================
+# RESULTADO POR DOCUMENTO (manifiesto + un objeto por documento)
+# ============================================================================
+
+def _contar_transacciones(documento: dict) -> int:
+    return len((documento.get("DetalleTransacciones") or {}).get("transacciones") or [])
+
+def clave_documento(clave_manifiesto: str, digest: str) -> str:
+    """"data_<job>.json" -> "data_<job>.doc_<md5>.json" (direccionado por contenido)."""
+    return f"{clave_manifiesto.rsplit('.', 1)[0]}.doc_{digest}.json"
+
+async def guardar_por_documento(almacen: AlmacenResultados, clave: str, datos: dict, max_intentos: int = MAX_INTENTOS_CONDICIONAL) -> dict:
+    """
+    Guarda un `ResultadoTotal` serializado como un objeto por documento + un manifiesto pequeño
+    en `clave` (totales, resultados generales y la lista de documentos con su hash y tamaño).
+
+    Los documentos se direccionan por su contenido: uno que no cambió desde la escritura anterior
+    del mismo job no se vuelve a subir, así agregar un estado de cuenta a un job solo escribe ese
+    documento y el manifiesto. El manifiesto va al final y se escribe condicionado al ETag leído:
+    si otra réplica lo reemplazó en medio, se relee y se reintenta. Solo después de ganar esa
+    escritura se borran las versiones de documentos que el manifiesto reemplazado referenciaba.
+
+    Retorna cuántos documentos se escribieron/reutilizaron y los bytes escritos.
+    """
+    documentos = datos.get(CAMPO_DOCUMENTOS) or []
+    contenidos = await asyncio.to_thread(lambda: [serializar_json(doc) for doc in documentos])
+
+    entradas, contenido_por_clave = [], {}
+    for documento, contenido in zip(documentos, contenidos):
+        clave_doc = clave_documento(clave, hashlib.md5(contenido, usedforsecurity=False).hexdigest())
+        entradas.append({
+            "clave": clave_doc,
+            "hash_documento": documento.get("hash_documento"),
+            "nombre_documento": documento.get("nombre_documento"),
+            "bytes": len(contenido),
+            "transacciones": _contar_transacciones(documento),
+        })
+        contenido_por_clave[clave_doc] = contenido
+
+    manifiesto = {k: v for k, v in datos.items() if k != CAMPO_DOCUMENTOS}
+    manifiesto["formato"] = FORMATO_POR_DOCUMENTO
+    manifiesto["documentos"] = entradas
+    contenido_manifiesto = serializar_json(manifiesto)
+
+    bytes_escritos = 0
+    for _ in range(max_intentos):
+        objeto_previo = await almacen.leer(clave)
+        previo = deserializar_json(objeto_previo.contenido) if objeto_previo else None
+        claves_previas = {e["clave"] for e in previo.get("documentos", [])} if previo and previo.get("formato") == FORMATO_POR_DOCUMENTO else set()
+
+        # Solo se suben versiones nuevas, o reutilizadas que ya no existan (ej. barrido al arrancar)
+        reutilizadas = [c for c in contenido_por_clave if c in claves_previas]
+        existentes = await asyncio.gather(*(almacen.modificado(c) for c in reutilizadas))
+        faltantes = {c for c, mtime in zip(reutilizadas, existentes) if mtime is None}
+        escrituras = {c: contenido for c, contenido in contenido_por_clave.items() if c not in claves_previas or c in faltantes}
+
+        await asyncio.gather(*(almacen.subir_flujo(c, fragmentar(contenido)) for c, contenido in escrituras.items()))
+        bytes_escritos += sum(len(c) for c in escrituras.values())
+
+        try:
+            await almacen.escribir(
+                clave, contenido_manifiesto,
+                si_coincide=objeto_previo.etag if objeto_previo else None, si_no_existe=objeto_previo is None
+            )
+        except ConflictoEscrituraError:
+            logger.info(f"Conflicto de escritura en {clave}: reintentando con el manifiesto más reciente.")
+            continue
+        bytes_escritos += len(contenido_manifiesto)
+        break
+    else:
+        raise ConflictoEscrituraError(f"No se pudo guardar {clave} tras {max_intentos} intentos.")
+
+    # El manifiesto reemplazado ya no es visible: sus documentos que no reutilizamos quedan huérfanos
+    for clave_doc in claves_previas - contenido_por_clave.keys():
+        try:
+            await almacen.borrar(clave_doc)
+        except FileNotFoundError:
+            pass
+
+    return {
+        "documentos_escritos": len(escrituras),
+        "documentos_reutilizados": len(contenido_por_clave) - len(escrituras),
+        "bytes_escritos": bytes_escritos,
+    }
+
+async def leer_por_documento(almacen: AlmacenResultados, clave: str, hashes: Optional[Iterable[str]] = None) -> Optional[dict]:
+    """
+    Reconstruye el JSON completo (misma forma que antes: `resultados_individuales` al final).
+    Con `hashes` solo se cargan los documentos con esos `hash_documento` (deduplicación).
+    JSON de formato anterior (un solo objeto) se devuelve tal cual. None si el job ya no existe
+    o si expiró alguno de sus documentos.
+    """
+    datos = await almacen.leer_json(clave)
+    if datos is None or datos.get("formato") != FORMATO_POR_DOCUMENTO:
+        if datos is not None and hashes is not None:
+            hashes = set(hashes)
+            datos[CAMPO_DOCUMENTOS] = [d for d in datos.get(CAMPO_DOCUMENTOS, []) if d.get("hash_documento") in hashes]
+        return datos
+
+    entradas = datos.pop("documentos")
+    datos.pop("formato")
+    if hashes is not None:
+        hashes = set(hashes)
+        entradas = [e for e in entradas if e.get("hash_documento") in hashes]
+
+    documentos = await asyncio.gather(*(almacen.leer_json(e["clave"]) for e in entradas))
+    if hashes is None and any(d is None for d in documentos):
+        logger.warning(f"Resultado {clave} incompleto: uno de sus documentos ya expiró.")
+        return None
+    datos[CAMPO_DOCUMENTOS] = [d for d in documentos if d is not None]
+    return datos
+
+# ============================================================================
+# DESCARGA EN STREAMING (proyección, selección de documentos y paginación)
+# ============================================================================
+
+def leer_cursor(cursor: Optional[str]) -> tuple:
+    """"<indice_documento>:<indice_transaccion>" -> (int, int). ValueError si no es válido."""
+    if not cursor:
+        return 0, 0
+    documento, _, transaccion = cursor.partition(":")
+    posicion = int(documento), int(transaccion)
+    if min(posicion) < 0:
+        raise ValueError(f"Cursor inválido: {cursor}")
+    return posicion
+
+def _proyectar_documento(documento: dict, campos: Optional[set], inicio: int = 0, fin: Optional[int] = None) -> dict:
+    """Solo los `campos` del documento y, si se pagina, su rebanada de transacciones."""
+    if campos:
+        documento = {k: v for k, v in documento.items() if k in campos}
+    detalle = documento.get("DetalleTransacciones")
+    if (inicio or fin is not None) and isinstance(detalle, dict):
+        documento = {**documento, "DetalleTransacciones": {**detalle, "transacciones": (detalle.get("transacciones") or [])[inicio:fin]}}
+    return documento
+
+async def abrir_resultado_json(
+    almacen: AlmacenResultados,
+    clave: str,
+    campos: Optional[Iterable[str]] = None,
+    documentos: Optional[Iterable[str]] = None,
+    cursor: Optional[str] = None,
+    limite: Optional[int] = None,
+) -> Optional[AsyncIterator[bytes]]:
+    """
+    Flujo de bytes del JSON del job sin reconstruir el diccionario completo.
+
+    - `campos`: campos de primer nivel ("resultados_generales", ...) o de cada documento
+      ("resultados_individuales.AnalisisIA"). Sin `campos` se entrega todo.
+    - `documentos`: solo los resultados individuales con ese `hash_documento` o `nombre_documento`.
+    - `cursor`/`limite`: página de `limite` transacciones (`DetalleTransacciones.transacciones`)
+      recorriendo los documentos seleccionados en orden; `paginacion.siguiente_cursor` indica
+      dónde sigue (null en la última página).
+
+    Solo se carga el manifiesto y un documento a la vez; los documentos que van completos
+    se copian tal cual desde el almacén. None si el job no existe. ValueError si el cursor no es válido.
+    """
+    inicio_doc, inicio_tx = leer_cursor(cursor)
+    datos = await almacen.leer_json(clave)
+    if datos is None:
+        return None
+
+    campos = set(campos or ())
+    campos_raiz = {c for c in campos if "." not in c}
+    prefijo = f"{CAMPO_DOCUMENTOS}."
+    campos_doc = {c[len(prefijo):] for c in campos if c.startswith(prefijo)}
+    incluir_documentos = not campos or CAMPO_DOCUMENTOS in campos_raiz or bool(campos_doc)
+    if datos.get("formato") != FORMATO_POR_DOCUMENTO and CAMPO_DOCUMENTOS not in datos:
+        incluir_documentos = False  # Registro de estado ("processing", error): se entrega tal cual
+    if CAMPO_DOCUMENTOS in campos_raiz:
+        campos_doc = set()  # El documento completo incluye cualquier subcampo
+
+    # Manifiesto: entradas ligeras. Formato anterior: los documentos ya vienen en memoria.
+    if datos.get("formato") == FORMATO_POR_DOCUMENTO:
+        entradas = datos.pop("documentos")
+        datos.pop("formato")
+    else:
+        entradas = [{"documento": d, "hash_documento": d.get("hash_documento"), "nombre_documento": d.get("nombre_documento")}
+                    for d in datos.pop(CAMPO_DOCUMENTOS, None) or []]
+    if documentos is not None:
+        seleccion = set(documentos)
+        entradas = [e for e in entradas if e.get("hash_documento") in seleccion or e.get("nombre_documento") in seleccion]
+    datos.pop(CAMPO_DOCUMENTOS, None)
+    cabecera = {k: v for k, v in datos.items() if not campos or k in campos_raiz}
+
+    async def cargar(entrada: dict) -> Optional[dict]:
+        if "documento" in entrada:
+            return entrada["documento"]
+        documento = await almacen.leer_json(entrada["clave"])
+        if documento is None:
+            logger.warning(f"Resultado {clave}: el documento {entrada['clave']} ya expiró; se omite.")
+        return documento
+
+    paginacion = {"limite": limite, "siguiente_cursor": None}
+
+    async def emitir_documentos():
+        """Documentos de la página (o todos); deja en `paginacion` dónde sigue."""
+        restantes, primero = limite, True
+        for indice in range(inicio_doc, len(entradas)):
+            entrada = entradas[indice]
+            if limite is not None and restantes == 0:
+                paginacion["siguiente_cursor"] = f"{indice}:0"
+                return
+            documento = None
+            total = entrada.get("transacciones")
+            if total is None and limite is not None:
+                documento = await cargar(entrada)
+                total = _contar_transacciones(documento) if documento else 0
+            inicio = inicio_tx if indice == inicio_doc else 0
+            fin = None
+            if limite is not None:
+                fin = min(total, inicio + restantes)
+                restantes -= max(fin - inicio, 0)
+                if fin < total:
+                    paginacion["siguiente_cursor"] = f"{indice}:{fin}"
+
+            completo = not campos_doc and inicio == 0 and (fin is None or fin >= total)
+            flujo = await almacen.abrir_flujo(entrada["clave"]) if completo and documento is None and "clave" in entrada else None
+            if flujo is None:
+                documento = documento if documento is not None else await cargar(entrada)
+                if documento is None:
+                    continue
+                flujo = fragmentar(serializar_json(_proyectar_documento(documento, campos_doc, inicio, None if completo else fin)))
+            yield b"" if primero else b","
+            primero = False
+            async for fragmento in flujo:
+                yield bytes(fragmento)
+            if paginacion["siguiente_cursor"] is not None:
+                return
+
+    async def iterar():
+        partes = [serializar_json(k) + b":" + serializar_json(v) for k, v in cabecera.items()]
+        yield b"{" + b",".join(partes)
+        if incluir_documentos:
+            yield (b"," if partes else b"") + serializar_json(CAMPO_DOCUMENTOS) + b":["
+            async for fragmento in emitir_documentos():
+                yield fragmento
+            yield b"]"
+            if limite is not None:
+                yield b',"paginacion":' + serializar_json(paginacion)
+        yield b"}"
+
+    return iterar()
+
+class ExpiracionPorDocumento:
+    """Fuente del limpiador TTL por manifiesto: vence con el mtime del manifiesto y borra también sus documentos."""
+
+    def __init__(self, almacen: AlmacenResultados):
+        self.almacen = almacen
+
+    async def modificado(self, clave: str) -> Optional[float]:
+        return await self.almacen.modificado(clave)
+
+    async def borrar(self, clave: str) -> int:
+        liberados = 0
+        manifiesto = await self.almacen.leer_json(clave)
+        if manifiesto and manifiesto.get("formato") == FORMATO_POR_DOCUMENTO:
+            for clave_doc in {e["clave"] for e in manifiesto.get("documentos", [])}:
+                try:
+                    liberados += await self.almacen.borrar(clave_doc)
+                except FileNotFoundError:
+                    pass
+        return liberados + await self.almacen.borrar(clave)
@@ -0,0 +1,99 @@
+# services/cache_render.py
+
+import base64
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, List
+
+import fitz
+
+logger = logging.getLogger(__name__)
+
+def renderizar_paginas_base64(pdf_bytes: bytes, paginas: List[int], escala: float = 2.0) -> Dict[int, str]:
+    """
+    Rasteriza (1-based) las páginas pedidas a PNG y las devuelve en base64, listas para el payload
+    `data:image/png;base64,...`. Páginas fuera de rango se omiten con advertencia (igual que
+    `convertir_pdf_a_imagenes`). Función síncrona pensada para correr en un hilo.
+    """
+    resultado = {}
+    matriz_escala = fitz.Matrix(escala, escala)
+
+    try:
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as documento:
+            for num_pagina in paginas:
+                if 0 <= num_pagina - 1 < len(documento):
+                    pix = documento.load_page(num_pagina - 1).get_pixmap(matrix=matriz_escala)
+                    resultado[num_pagina] = base64.b64encode(pix.tobytes("png")).decode('utf-8')
+                else:
+                    logger.warning(f"Advertencia: Página {num_pagina} fuera de rango.")
+    except Exception as e:
+        raise ValueError(f"No se pudo procesar el archivo como PDF: {e}")
+
+    return resultado
+
+class CacheRenderPaginas:
+    """
+    Caché de páginas rasterizadas por (huella del documento, página, escala).
+
+    GPT-Vision y Qwen-VL analizan las mismas páginas de cada carátula en paralelo: la primera
+    llamada lanza el render (en un hilo, fuera del event loop) y la segunda espera ESA MISMA tarea,
+    así cada página se rasteriza, codifica a PNG y pasa a base64 una sola vez. La huella es el
+    SHA-256 del contenido: el caché no retiene los bytes de ningún PDF.
+    """
+
+    def __init__(self, max_entradas: int = 32):
+        self.max_entradas = max_entradas
+        self._entradas: "OrderedDict[tuple, asyncio.Future]" = OrderedDict()
+
+        # --- MÉTRICAS ---
+        self.aciertos = 0
+        self.renders = 0
+
+    @staticmethod
+    async def _huella(pdf_bytes: bytes) -> str:
+        """SHA-256 del documento, calculado en un hilo (milisegundos frente al render que ahorra)."""
+        return await asyncio.to_thread(lambda: hashlib.sha256(pdf_bytes).hexdigest())
+
+    async def obtener_base64(self, pdf_bytes: bytes, paginas: List[int], escala: float = 2.0) -> List[str]:
+        """Imágenes base64 de las páginas pedidas (en ese orden); renderiza solo las que faltan."""
+        huella = await self._huella(pdf_bytes)
+
+        faltantes = [p for p in dict.fromkeys(paginas) if (huella, p, escala) not in self._entradas]
+        if faltantes:
+            tarea = asyncio.ensure_future(asyncio.to_thread(renderizar_paginas_base64, pdf_bytes, faltantes, escala))
+            self.renders += 1
+            for p in faltantes:
+                self._entradas[(huella, p, escala)] = tarea
+
+        # Referencias locales antes de expulsar: una entrada expulsada sigue sirviendo a esta llamada
+        tareas = []
+        for p in paginas:
+            clave = (huella, p, escala)
+            if p not in faltantes:
+                self.aciertos += 1
+            self._entradas.move_to_end(clave)
+            tareas.append((clave, p, self._entradas[clave]))
+
+        while len(self._entradas) > self.max_entradas:
+            self._entradas.popitem(last=False)
+
+        imagenes = []
+        for clave, p, tarea in tareas:
+            try:
+                renderizadas = await asyncio.shield(tarea)
+            except Exception:
+                # Un render fallido no se queda en caché: el siguiente intento vuelve a rasterizar
+                if self._entradas.get(clave) is tarea:
+                    del self._entradas[clave]
+                raise
+            if p in renderizadas:
+                imagenes.append(renderizadas[p])
+        return imagenes
+
+    def metricas(self) -> dict:
+        return {"entradas": len(self._entradas), "aciertos": self.aciertos, "renders": self.renders}
+
+# Instancia Global
+cache_render = CacheRenderPaginas()
@@ -239,7 +239,7 @@ class CaratulasLightService:
                 }}
 
     async def ejecutar_pipeline_concurrente(self, job_id: str, lista_archivos: list):
-        """Orquestador background: Dispara N archivos a la vez, guardando estado en disco (JSON)."""
+        """Orquestador background: Dispara N archivos a la vez, guardando estado en el almacén de resultados (JSON)."""
         try:
             exitos = []
             errores = []
@@ -252,7 +252,7 @@ class CaratulasLightService:
             hashes_errores_cache = {}
 
             # Leemos el archivo JSON actual antes de procesar
-            resultado_anterior = self.storage.obtener_datos_json(job_id)
+            resultado_anterior = await self.storage.obtener_datos_json(job_id)
             if resultado_anterior:
                 # Mapear éxitos anteriores
                 for exito in resultado_anterior.get("resultados_exitosos", []):
@@ -271,7 +271,7 @@ class CaratulasLightService:
             # ==========================================================
             # Actualizamos el job a "procesando" pero CONSERVAMOS los resultados 
             # anteriores para que el frontend siga viéndolos durante el polling.
-            self.storage.update_job(job_id, {
+            await self.storage.update_job(job_id, {
                 "estatus": "procesando", 
                 "mensaje": "Procesando nuevos documentos...",
                 "resultados_exitosos": list(hashes_exitosos_cache.values()), 
@@ -378,7 +378,7 @@ class CaratulasLightService:
             # ==========================================================
             # ACTUALIZACIÓN DEL JOB
             # ==========================================================
-            self.storage.update_job(job_id, {
+            await self.storage.update_job(job_id, {
                 "estatus": "completado",
                 "indicador_caratulas_recientes": tiene_caratulas_recientes,
                 "mensaje_periodos": mensaje_periodos, # <--- Se inyecta Idea 1
@@ -390,7 +390,7 @@ class CaratulasLightService:
 
         except Exception as e:
             logger.error(f"Falla fatal en Job {job_id}: {e}")
-            self.storage.update_job(job_id, {"estatus": "error", "detalle_error": str(e)})
+            await self.storage.update_job(job_id, {"estatus": "error", "detalle_error": str(e)})
 
         finally:
             rutas_a_borrar = [Path(info["path"]) for info in lista_archivos]
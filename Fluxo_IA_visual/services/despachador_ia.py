@@ -0,0 +1,282 @@
+# services/despachador_ia.py
+
+import time
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from .resiliencia_ia import reserva_hedge
+
+logger = logging.getLogger(__name__)
+
+# Estimación gruesa de tokens: ~4 caracteres por token + prompt de sistema + respuesta por transacción
+TOKENS_PROMPT_SISTEMA = 2000
+TOKENS_RESPUESTA_POR_TX = 12
+
+class LimitadorTokens:
+    """
+    Cubeta de tokens (token bucket) para respetar el límite de tokens por minuto del proveedor.
+    Un valor <= 0 desactiva el límite.
+    """
+
+    def __init__(self, tokens_por_minuto: int):
+        self.capacidad = float(tokens_por_minuto)
+        self.disponibles = self.capacidad
+        self.tasa_por_seg = self.capacidad / 60.0
+        self._ultimo = time.monotonic()
+        self._candado = asyncio.Lock()
+
+    def _rellenar(self):
+        ahora = time.monotonic()
+        self.disponibles = min(self.capacidad, self.disponibles + (ahora - self._ultimo) * self.tasa_por_seg)
+        self._ultimo = ahora
+
+    async def adquirir(self, tokens: int):
+        if self.capacidad <= 0:
+            return
+        tokens = min(float(tokens), self.capacidad)  # Un lote gigante no puede esperar para siempre
+        async with self._candado:  # FIFO: el primero en pedir es el primero en pasar
+            while True:
+                self._rellenar()
+                if self.disponibles >= tokens:
+                    self.disponibles -= tokens
+                    return
+                await asyncio.sleep((tokens - self.disponibles) / self.tasa_por_seg)
+
+    def intentar_adquirir(self, tokens: int) -> bool:
+        """Como `adquirir` pero sin esperar: False si no alcanza o si alguien ya está en la fila."""
+        if self.capacidad <= 0:
+            return True
+        if self._candado.locked():
+            return False
+        tokens = min(float(tokens), self.capacidad)
+        self._rellenar()
+        if self.disponibles < tokens:
+            return False
+        self.disponibles -= tokens
+        return True
+
+class _Pendiente:
+    """Transacción en espera dentro del despachador."""
+    __slots__ = ("id_global", "id_local", "tx_data", "buzon")
+
+    def __init__(self, id_global: int, id_local: Any, tx_data: Any, buzon: asyncio.Queue):
+        self.id_global = id_global
+        self.id_local = id_local
+        self.tx_data = tx_data
+        self.buzon = buzon
+
+class DespachadorLotesIA:
+    """
+    Despachador único (por proceso) de lotes de clasificación IA.
+
+    - Mezcla las transacciones pendientes de TODOS los documentos del mismo banco en lotes llenos
+      (cada transacción viaja con un id global; al volver se traduce a su id local).
+    - Límite global de concurrencia (semáforo) y de tokens por minuto (cubeta de tokens).
+    - Entrega en flujo: cada documento recibe sus etiquetas conforme termina cada lote,
+      sin esperar a los lotes de otros documentos.
+    - Tamaño de lote adaptativo: se reduce si la latencia supera el objetivo y crece si sobra margen.
+    """
+
+    def __init__(
+        self,
+        max_concurrencia: int = 20,
+        tokens_por_minuto: int = 0,
+        tamano_lote_max: int = 100,
+        tamano_lote_min: int = 20,
+        latencia_objetivo_seg: float = 30.0,
+        ventana_seg: float = 0.05
+    ):
+        self.max_concurrencia = max_concurrencia
+        self.tamano_lote_max = tamano_lote_max
+        self.tamano_lote_min = min(tamano_lote_min, tamano_lote_max)
+        self.tamano_lote = tamano_lote_max
+        self.latencia_objetivo_seg = latencia_objetivo_seg
+        self.ventana_seg = ventana_seg
+
+        self._semaforo = asyncio.Semaphore(max_concurrencia)
+        self._limitador = LimitadorTokens(tokens_por_minuto)
+        self._colas: Dict[tuple, List[_Pendiente]] = {}  # (banco, función IA) -> pendientes
+        self._vaciados_programados: Dict[tuple, asyncio.TimerHandle] = {}
+        self._tareas = set()  # Referencias fuertes para que el GC no cancele lotes en vuelo
+        self._siguiente_id = 0
+
+        # --- MÉTRICAS ---
+        self.lotes_enviados = 0
+        self.transacciones_enviadas = 0
+        self.lotes_fallidos = 0
+        self.en_vuelo = 0
+        self.max_en_vuelo = 0
+        self.latencia_ewma: Optional[float] = None
+
+    def metricas(self) -> dict:
+        return {
+            "lotes_enviados": self.lotes_enviados,
+            "transacciones_enviadas": self.transacciones_enviadas,
+            "lotes_fallidos": self.lotes_fallidos,
+            "en_vuelo": self.en_vuelo,
+            "max_en_vuelo": self.max_en_vuelo,
+            "tamano_lote_actual": self.tamano_lote,
+            "latencia_ewma_seg": round(self.latencia_ewma, 3) if self.latencia_ewma is not None else None,
+        }
+
+    # =========================================================
+    # API PÚBLICA
+    # =========================================================
+
+    async def en_flujo(self, banco: str, lote_empaquetado: List[dict], funcion_ia_clasificadora: Callable):
+        """
+        Encola las transacciones de UN documento ({"id", "tx_data"}) y produce, conforme terminan
+        los lotes, tuplas (mapa parcial {id_local: etiqueta}, ids locales del lote, es_fallback).
+        """
+        if not lote_empaquetado:
+            return
+
+        buzon: asyncio.Queue = asyncio.Queue()
+        clave = (banco, funcion_ia_clasificadora)
+        cola = self._colas.setdefault(clave, [])
+        for item in lote_empaquetado:
+            cola.append(_Pendiente(self._siguiente_id, item["id"], item["tx_data"], buzon))
+            self._siguiente_id += 1
+
+        self._despachar_lotes_llenos(clave)
+        if self._colas.get(clave):
+            self._programar_vaciado(clave)
+
+        restantes = len(lote_empaquetado)
+        while restantes > 0:
+            mapa_parcial, ids_locales, es_fallback = await buzon.get()
+            restantes -= len(ids_locales)
+            yield mapa_parcial, ids_locales, es_fallback
+
+    async def clasificar(self, banco: str, lote_empaquetado: List[dict], funcion_ia_clasificadora: Callable) -> Dict[str, str]:
+        """Versión no-streaming: espera todas las etiquetas del documento."""
+        mapa = {}
+        async for mapa_parcial, _, _ in self.en_flujo(banco, lote_empaquetado, funcion_ia_clasificadora):
+            mapa.update(mapa_parcial)
+        return mapa
+
+    # =========================================================
+    # ARMADO DE LOTES
+    # =========================================================
+
+    def _despachar_lotes_llenos(self, clave: tuple):
+        cola = self._colas[clave]
+        while len(cola) >= self.tamano_lote:
+            lote, self._colas[clave] = cola[:self.tamano_lote], cola[self.tamano_lote:]
+            cola = self._colas[clave]
+            self._lanzar(clave, lote)
+
+    def _programar_vaciado(self, clave: tuple):
+        """Espera una ventana corta por si otros documentos completan el lote; luego envía lo que haya."""
+        if clave in self._vaciados_programados:
+            return
+        loop = asyncio.get_running_loop()
+        self._vaciados_programados[clave] = loop.call_later(self.ventana_seg, self._vaciar, clave)
+
+    def _vaciar(self, clave: tuple):
+        self._vaciados_programados.pop(clave, None)
+        cola = self._colas.pop(clave, [])
+        if not cola:
+            return
+
+        # Balanceo: N pendientes se reparten en lotes parejos que no superen el tamaño vigente
+        num_lotes = -(-len(cola) // self.tamano_lote)
+        tamano_parejo = -(-len(cola) // num_lotes)
+        for i in range(0, len(cola), tamano_parejo):
+            self._lanzar(clave, cola[i:i + tamano_parejo])
+
+    def _lanzar(self, clave: tuple, lote: List[_Pendiente]):
+        tarea = asyncio.create_task(self._enviar_lote(clave, lote))
+        self._tareas.add(tarea)
+        tarea.add_done_callback(self._tareas.discard)
+
+    @staticmethod
+    def _estimar_tokens(lote: List[_Pendiente]) -> int:
+        caracteres = 0
+        for pendiente in lote:
+            tx = pendiente.tx_data
+            desc = tx.get("descripcion", "") if isinstance(tx, dict) else getattr(tx, "descripcion", "")
+            caracteres += len(str(desc)) + 40  # id, monto, tipo y separadores JSON
+        return TOKENS_PROMPT_SISTEMA + caracteres // 4 + TOKENS_RESPUESTA_POR_TX * len(lote)
+
+    # =========================================================
+    # ENVÍO Y ENTREGA
+    # =========================================================
+
+    async def _reservar_hedge(self, tokens: int) -> Optional[Callable[[], None]]:
+        """
+        Cupo para la petición de respaldo (hedge) de un lote en vuelo: un lugar del semáforo
+        y sus tokens, sin esperar. Regresa la función que lo libera, o None si no hay cupo.
+        """
+        if self._semaforo.locked() or not self._limitador.intentar_adquirir(tokens):
+            return None
+        await self._semaforo.acquire()  # No se suspende: se verificó locked() arriba
+        self.en_vuelo += 1
+        self.max_en_vuelo = max(self.max_en_vuelo, self.en_vuelo)
+
+        def liberar():
+            self.en_vuelo -= 1
+            self._semaforo.release()
+        return liberar
+
+    async def _enviar_lote(self, clave: tuple, lote: List[_Pendiente]):
+        banco, funcion_ia_clasificadora = clave
+        resultado = None
+        try:
+            async with self._semaforo:
+                tokens = self._estimar_tokens(lote)
+                await self._limitador.adquirir(tokens)
+
+                self.en_vuelo += 1
+                self.max_en_vuelo = max(self.max_en_vuelo, self.en_vuelo)
+                t0 = time.perf_counter()
+                # El hedge de `llamar_con_resiliencia` pasa por los mismos límites que el lote
+                contexto_hedge = reserva_hedge.set(lambda: self._reservar_hedge(tokens))
+                try:
+                    resultado = await funcion_ia_clasificadora(
+                        banco, [{"id": p.id_global, "tx_data": p.tx_data} for p in lote]
+                    )
+                finally:
+                    reserva_hedge.reset(contexto_hedge)
+                    self.en_vuelo -= 1
+                    self._registrar_latencia(time.perf_counter() - t0)
+
+            self.lotes_enviados += 1
+            self.transacciones_enviadas += len(lote)
+        except Exception as e:
+            self.lotes_fallidos += 1
+            logger.error(f"[DespachadorIA] Fallo en un lote de IA ({banco}, {len(lote)} txs): {e}")
+        finally:
+            # Siempre se entrega (aunque sea vacío) para que ningún documento quede esperando
+            self._entregar(lote, resultado if isinstance(resultado, dict) else {})
+
+    def _entregar(self, lote: List[_Pendiente], resultado: Dict[str, str]):
+        por_id_global = {str(p.id_global): p for p in lote}
+        etiquetas = {}
+        for key, etiqueta in resultado.items():
+            pendiente = por_id_global.get(str(key).strip())
+            if pendiente is not None:
+                etiquetas[pendiente.id_global] = etiqueta
+
+        # Misma firma de fallo que ve el motor: todo el lote respondido como GENERAL
+        es_fallback = len(etiquetas) == len(lote) and all(str(v).strip().upper() == "GENERAL" for v in etiquetas.values())
+
+        por_buzon: Dict[int, tuple] = {}
+        for pendiente in lote:
+            buzon, mapa, ids = por_buzon.setdefault(id(pendiente.buzon), (pendiente.buzon, {}, []))
+            ids.append(str(pendiente.id_local))
+            if pendiente.id_global in etiquetas:
+                mapa[str(pendiente.id_local)] = etiquetas[pendiente.id_global]
+
+        for buzon, mapa, ids in por_buzon.values():
+            buzon.put_nowait((mapa, ids, es_fallback))
+
+    def _registrar_latencia(self, latencia: float):
+        """EWMA de la latencia por lote y ajuste multiplicativo/aditivo del tamaño de lote."""
+        self.latencia_ewma = latencia if self.latencia_ewma is None else 0.3 * latencia + 0.7 * self.latencia_ewma
+
+        if self.latencia_ewma > self.latencia_objetivo_seg:
+            self.tamano_lote = max(self.tamano_lote_min, int(self.tamano_lote * 0.75))
+        elif self.latencia_ewma < self.latencia_objetivo_seg / 2:
+            self.tamano_lote = min(self.tamano_lote_max, self.tamano_lote + 10)
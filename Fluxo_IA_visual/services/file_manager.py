@@ -1,73 +1,58 @@
 # services/file_manager.py
 
-import shutil
 import os
 import uuid
+import asyncio
 import zipfile
-import time
 import hashlib
 import logging
 from pathlib import Path
 from fastapi import UploadFile, HTTPException
-from typing import List, Dict, Any
+from typing import BinaryIO, List, Dict, Any, Optional, Tuple
 
 from ..core.config import settings
+from .limpiador_ttl import limpiador_ttl
 
 logger = logging.getLogger(__name__)
 
+TAMANO_BLOQUE = 1024 * 1024  # Lectura/escritura en bloques de 1MB (y el hash en la misma pasada)
+
+# --- PARÁMETROS DE SEGURIDAD (ANTI ZIP-BOMB) ---
+MAX_FILES_IN_ZIP = 50  # Máximo de PDFs permitidos por ZIP
+MAX_TOTAL_UNCOMPRESSED_MB = 100 # 100 MB máximo en total al extraer todo
+MAX_COMPRESSION_RATIO = 100 # Si se expande más de 100 veces su tamaño, es sospechoso
+
 class FileManagerService:
     def __init__(self, upload_dir: str = "temp_uploads"):
         self.upload_dir = Path(upload_dir)
         self.upload_dir.mkdir(parents=True, exist_ok=True)
         self.TTL_SECONDS = 3600 # 1 Hora de vida
 
-    def _limpiar_archivos_antiguos(self):
-        """
-        Limpia archivos y carpetas extraídas en temp_uploads que superen la hora de vida.
-        """
-        try:
-            ahora = time.time()
-            contador = 0
-            
-            # iterdir() lee todo lo que hay en la carpeta (archivos y subcarpetas)
-            for ruta in self.upload_dir.iterdir():
-                # Obtenemos la fecha de modificación
-                tiempo_modificacion = ruta.stat().st_mtime
-                
-                if ahora - tiempo_modificacion > self.TTL_SECONDS:
-                    if ruta.is_file():
-                        ruta.unlink() # Borra archivo
-                        contador += 1
-                    elif ruta.is_dir():
-                        shutil.rmtree(ruta) # Borra carpeta entera con su contenido
-                        contador += 1
-                        
-            if contador > 0:
-                logger.info(f"Limpieza FileManager: Se eliminaron {contador} temporales antiguos.")
-        except Exception as e:
-            logger.warning(f"Error limpiando temporales antiguos: {e}")
-    
-    def _calcular_hash_archivo(self, ruta_archivo: Path) -> str:
-        """Calcula el hash SHA-256 de un archivo en disco mediante lectura por bloques."""
-        sha256_hash = hashlib.sha256()
-        try:
-            with open(ruta_archivo, "rb") as f:
-                # Leer en bloques de 4K
-                for byte_block in iter(lambda: f.read(4096), b""):
-                    sha256_hash.update(byte_block)
-            return sha256_hash.hexdigest()
-        except Exception as e:
-            logger.warning(f"No se pudo calcular hash para {ruta_archivo}: {e}")
-            return "hash_generacion_fallida"
+    @staticmethod
+    def _escribir_bloque(destino: BinaryIO, sha256_hash, bloque: bytes):
+        """Escribe el bloque y actualiza el hash (hashlib suelta el GIL en bloques grandes)."""
+        if sha256_hash is not None:
+            sha256_hash.update(bloque)
+        destino.write(bloque)
 
-    def guardar_archivo_temporal(self, upload_file: UploadFile) -> Path:
+    @classmethod
+    def _copiar_con_hash(cls, origen: BinaryIO, destino: BinaryIO, max_bytes: int) -> Tuple[str, int]:
+        """Copia por bloques calculando el SHA-256 al vuelo. Retorna (hash, bytes copiados)."""
+        sha256_hash = hashlib.sha256()
+        copiados = 0
+        while bloque := origen.read(TAMANO_BLOQUE):
+            copiados += len(bloque)
+            if copiados > max_bytes:
+                raise HTTPException(status_code=413, detail="El contenido del ZIP es demasiado grande para procesarse.")
+            cls._escribir_bloque(destino, sha256_hash, bloque)
+        return sha256_hash.hexdigest(), copiados
+
+    async def guardar_archivo_temporal(self, upload_file: UploadFile) -> Tuple[Path, Optional[str]]:
         """
         Guarda el archivo subido en disco usando streaming para no saturar la RAM.
-        Retorna la ruta absoluta del archivo guardado.
+        La escritura va al threadpool y el SHA-256 se calcula en la misma pasada.
+        Retorna la ruta absoluta del archivo guardado y su hash (None para un ZIP: se hashea cada PDF al extraerlo).
         """
-        # Ejecutamos la limpieza silenciosa cada que suben un archivo nuevo
-        self._limpiar_archivos_antiguos()
-        
         try:
             # Generamos un nombre único para evitar colisiones
             file_extension = Path(upload_file.filename).suffix
@@ -75,8 +60,8 @@ class FileManagerService:
             file_path = self.upload_dir / unique_filename
 
             # 1. Validar Magic Bytes (El cambio que hicimos antes)
-            cabecera = upload_file.file.read(4)
-            upload_file.file.seek(0)
+            cabecera = await upload_file.read(4)
+            await upload_file.seek(0)
             
             es_zip = cabecera.startswith(b'PK\x03\x04')
             es_pdf = cabecera.startswith(b'%PDF')
@@ -85,13 +70,13 @@ class FileManagerService:
                 raise HTTPException(status_code=415, detail="Tipo de archivo no soportado o falsificado.")
 
             # 2. Control de Tamaño Máximo Dinámico (Prevención OOM)
-            # Convertimos MB a Bytes
-            max_size_bytes = settings.MAX_FILE_SIZE_MB * 1024 * 1024 
+            max_size_bytes = settings.max_file_size_bytes
             tamanio_actual = 0
+            sha256_hash = hashlib.sha256() if es_pdf else None
             
             with file_path.open("wb") as buffer:
-                # Leemos en fragmentos de 1MB para no saturar la RAM
-                while chunk := upload_file.file.read(1024 * 1024):
+                # UploadFile.read ya delega al threadpool cuando el archivo está en disco
+                while chunk := await upload_file.read(TAMANO_BLOQUE):
                     tamanio_actual += len(chunk)
                     if tamanio_actual > max_size_bytes:
                         # Si se pasa, cerramos, borramos la basura y lanzamos el error
@@ -99,86 +84,95 @@ class FileManagerService:
                         file_path.unlink(missing_ok=True)
                         logger.warning(f"Archivo rechazado por sobrepasar límite: {upload_file.filename}")
                         raise HTTPException(status_code=413, detail=f"El archivo supera el límite permitido de {settings.MAX_FILE_SIZE_MB}MB.")
-                    buffer.write(chunk)
+                    await asyncio.to_thread(self._escribir_bloque, buffer, sha256_hash, chunk)
             
-            return file_path
+            # Si el pipeline no lo borra (caída, job abandonado), lo borra el limpiador TTL
+            limpiador_ttl.programar(file_path, self.TTL_SECONDS)
+            return file_path, sha256_hash.hexdigest() if sha256_hash else None
         except HTTPException:
             raise
         except Exception as e:
             logger.error(f"Error guardando archivo temporal {upload_file.filename}: {e}")
             raise HTTPException(status_code=500, detail="Error interno al guardar el archivo.")
         finally:
-            upload_file.file.close()
+            await upload_file.close()
 
-    def procesar_entrada(self, upload_file: UploadFile) -> List[Dict[str, Any]]:
+    def _extraer_zip(self, temp_path: Path, extract_dir: Path, nombre_original: str) -> List[Dict[str, Any]]:
+        """Audita y extrae los PDFs del ZIP (en el threadpool), hasheando cada uno mientras se escribe."""
+        max_bytes = MAX_TOTAL_UNCOMPRESSED_MB * 1024 * 1024
+        archivos_listos = []
+
+        with zipfile.ZipFile(temp_path, "r") as zip_ref:
+            archivos_a_extraer = []
+            peso_total_descomprimido = 0
+            
+            # 1. Inspección de metadatos (Sin extraer nada todavía)
+            for info_archivo in zip_ref.infolist():
+                # Ignoramos carpetas y basura del sistema operativo
+                if info_archivo.is_dir() or info_archivo.filename.startswith("__MACOSX") or not info_archivo.filename.lower().endswith(".pdf"):
+                    continue
+                
+                # A. Validar Ratio de Compresión (Prevención de bombas altamente comprimidas)
+                if info_archivo.compress_size > 0:
+                    ratio = info_archivo.file_size / info_archivo.compress_size
+                    if ratio > MAX_COMPRESSION_RATIO:
+                        logger.critical(f"Alerta de Seguridad: Zip Bomb detectada. Ratio anormal: {ratio}:1")
+                        raise HTTPException(status_code=400, detail="El archivo ZIP contiene datos sospechosos o está corrupto.")
+                
+                archivos_a_extraer.append(info_archivo.filename)
+                peso_total_descomprimido += info_archivo.file_size
+            
+            # B. Validar cantidad total de archivos
+            if len(archivos_a_extraer) > MAX_FILES_IN_ZIP:
+                logger.warning(f"ZIP rechazado: Contenía {len(archivos_a_extraer)} archivos.")
+                raise HTTPException(status_code=400, detail=f"El ZIP contiene demasiados archivos. El máximo es {MAX_FILES_IN_ZIP}.")
+            
+            # C. Validar peso total en disco
+            if peso_total_descomprimido > max_bytes:
+                logger.warning(f"ZIP rechazado: Peso inflado superaría {MAX_TOTAL_UNCOMPRESSED_MB}MB.")
+                raise HTTPException(status_code=413, detail="El contenido del ZIP es demasiado grande para procesarse.")
+
+            # 2. Si pasó todas las auditorías, procedemos a extraer (el tope se revisa también con los bytes reales)
+            restantes = max_bytes
+            for member in archivos_a_extraer:
+                # --- PREVENCIÓN ZIP SLIP ---
+                target_path = (extract_dir / member).resolve()
+                if not str(target_path).startswith(str(extract_dir.resolve())):
+                    logger.critical(f"Alerta de Seguridad: Zip Slip detectado. Archivo malicioso: {member}")
+                    raise HTTPException(status_code=400, detail="El archivo ZIP contiene rutas maliciosas.")
+
+                full_path = extract_dir / member
+                full_path.parent.mkdir(parents=True, exist_ok=True)
+                with zip_ref.open(member) as origen, full_path.open("wb") as destino:
+                    hash_documento, copiados = self._copiar_con_hash(origen, destino, restantes)
+                restantes -= copiados
+                
+                archivos_listos.append({
+                    "path": full_path,
+                    "filename": Path(member).name,
+                    "original_source": nombre_original,
+                    "es_zip_content": True,
+                    "hash_documento": hash_documento
+                })
+
+        return archivos_listos
+
+    async def procesar_entrada(self, upload_file: UploadFile) -> List[Dict[str, Any]]:
         """
         Maneja la lógica de si es ZIP o PDF y retorna una lista de diccionarios
         con la ruta del archivo y su nombre original.
         """
-        temp_path = self.guardar_archivo_temporal(upload_file)
+        temp_path, hash_subida = await self.guardar_archivo_temporal(upload_file)
         archivos_listos = []
 
         # Caso 1: Es un ZIP
         if str(temp_path).lower().endswith(".zip"):
             try:
-                # --- PARÁMETROS DE SEGURIDAD (ANTI ZIP-BOMB) ---
-                MAX_FILES_IN_ZIP = 50  # Máximo de PDFs permitidos por ZIP
-                MAX_TOTAL_UNCOMPRESSED_MB = 100 # 100 MB máximo en total al extraer todo
-                MAX_COMPRESSION_RATIO = 100 # Si se expande más de 100 veces su tamaño, es sospechoso
-                
-                max_bytes = MAX_TOTAL_UNCOMPRESSED_MB * 1024 * 1024
-                
                 extract_dir = self.upload_dir / f"extracted_{uuid.uuid4()}"
                 extract_dir.mkdir(exist_ok=True)
+                limpiador_ttl.programar(extract_dir, self.TTL_SECONDS)
 
-                with zipfile.ZipFile(temp_path, "r") as zip_ref:
-                    archivos_a_extraer = []
-                    peso_total_descomprimido = 0
-                    
-                    # 1. Inspección de metadatos (Sin extraer nada todavía)
-                    for info_archivo in zip_ref.infolist():
-                        # Ignoramos carpetas y basura del sistema operativo
-                        if info_archivo.is_dir() or info_archivo.filename.startswith("__MACOSX") or not info_archivo.filename.lower().endswith(".pdf"):
-                            continue
-                        
-                        # A. Validar Ratio de Compresión (Prevención de bombas altamente comprimidas)
-                        if info_archivo.compress_size > 0:
-                            ratio = info_archivo.file_size / info_archivo.compress_size
-                            if ratio > MAX_COMPRESSION_RATIO:
-                                logger.critical(f"Alerta de Seguridad: Zip Bomb detectada. Ratio anormal: {ratio}:1")
-                                raise HTTPException(status_code=400, detail="El archivo ZIP contiene datos sospechosos o está corrupto.")
-                        
-                        archivos_a_extraer.append(info_archivo.filename)
-                        peso_total_descomprimido += info_archivo.file_size
-                    
-                    # B. Validar cantidad total de archivos
-                    if len(archivos_a_extraer) > MAX_FILES_IN_ZIP:
-                        logger.warning(f"ZIP rechazado: Contenía {len(archivos_a_extraer)} archivos.")
-                        raise HTTPException(status_code=400, detail=f"El ZIP contiene demasiados archivos. El máximo es {MAX_FILES_IN_ZIP}.")
-                    
-                    # C. Validar peso total en disco
-                    if peso_total_descomprimido > max_bytes:
-                        logger.warning(f"ZIP rechazado: Peso inflado superaría {MAX_TOTAL_UNCOMPRESSED_MB}MB.")
-                        raise HTTPException(status_code=413, detail="El contenido del ZIP es demasiado grande para procesarse.")
-
-                    # 2. Si pasó todas las auditorías, procedemos a extraer
-                    for member in archivos_a_extraer:
-                        # --- PREVENCIÓN ZIP SLIP ---
-                        target_path = (extract_dir / member).resolve()
-                        if not str(target_path).startswith(str(extract_dir.resolve())):
-                            logger.critical(f"Alerta de Seguridad: Zip Slip detectado. Archivo malicioso: {member}")
-                            raise HTTPException(status_code=400, detail="El archivo ZIP contiene rutas maliciosas.")
-
-                        zip_ref.extract(member, path=extract_dir)
-                        full_path = extract_dir / member
-                        
-                        archivos_listos.append({
-                            "path": full_path,
-                            "filename": Path(member).name,
-                            "original_source": upload_file.filename,
-                            "es_zip_content": True,
-                            "hash_documento": self._calcular_hash_archivo(full_path)
-                        })
+                archivos_listos = await asyncio.to_thread(self._extraer_zip, temp_path, extract_dir, upload_file.filename)
                 
                 # Borrar el .zip original para ahorrar espacio
                 os.remove(temp_path)
@@ -197,7 +191,7 @@ class FileManagerService:
                 "filename": upload_file.filename,
                 "original_source": upload_file.filename,
                 "es_zip_content": False,
-                "hash_documento": self._calcular_hash_archivo(temp_path)
+                "hash_documento": hash_subida
             })
         
         else:
@@ -1,10 +1,13 @@
 # services/ia_extractor.py
 
-from .pdf_processor import convertir_pdf_a_imagenes
 from ..core.config import settings
 from ..utils.helpers import _crear_prompt_agente_unificado, parsear_respuesta_json_ocr
 from ..utils.helpers_texto_fluxo import PROMPT_FASE_3_AUDITOR_TEMPLATE, PROMPT_GENERICO, PROMPTS_POR_BANCO
 from ..utils.helpers_texto_precalificación import prompt_sistema
+from ..utils.cache_clasificacion import CacheClasificacionIA
+from .despachador_ia import DespachadorLotesIA
+from .cache_render import cache_render
+from .resiliencia_ia import llamar_con_resiliencia
 
 from openai import AsyncOpenAI
 from typing import List, Dict, Any
@@ -20,10 +23,16 @@ logger = logging.getLogger(__name__)
 # Configuración de Timeouts para evitar cuelgues en paralelismo masivo
 HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
 
+# Los reintentos los maneja `llamar_con_resiliencia` (backoff + Retry-After + circuito por proveedor);
+# se apagan los del SDK para no multiplicar intentos.
+SDK_MAX_RETRIES = 0
+
 # SINGLETONS DE CLIENTES (Para reutilizar conexiones TCP)
 _fluxo_client_instance = None
 _openrouter_client_instance = None
 _nomi_client_instance = None
+_cache_clasificacion_instance = None
+_despachador_ia_instance = None
 
 def get_fluxo_client():
     """Retorna una instancia única del cliente Fluxo (OpenAI)."""
@@ -31,7 +40,8 @@ def get_fluxo_client():
     if _fluxo_client_instance is None:
         _fluxo_client_instance = AsyncOpenAI(
             api_key=settings.OPENAI_API_KEY_FLUXO.get_secret_value(),
-            timeout=HTTP_TIMEOUT
+            timeout=HTTP_TIMEOUT,
+            max_retries=SDK_MAX_RETRIES
         )
     return _fluxo_client_instance
 
@@ -46,7 +56,8 @@ def get_openrouter_client():
                 "HTTP-Referer": "https://github.com/Asfilcnx3", 
                 "X-Title": "Fluxo IA Test", 
             },
-            timeout=HTTP_TIMEOUT
+            timeout=HTTP_TIMEOUT,
+            max_retries=SDK_MAX_RETRIES
         )
     return _openrouter_client_instance
 
@@ -55,10 +66,43 @@ def get_nomi_client():
     if _nomi_client_instance is None:
         _nomi_client_instance = AsyncOpenAI(
             api_key=settings.OPENAI_API_KEY_NOMI.get_secret_value(),
-            timeout=HTTP_TIMEOUT
+            timeout=HTTP_TIMEOUT,
+            max_retries=SDK_MAX_RETRIES
         )
     return _nomi_client_instance
 
+def get_cache_clasificacion():
+    """Retorna el caché único (por proceso) de clasificaciones IA, cargado desde disco."""
+    global _cache_clasificacion_instance
+    if _cache_clasificacion_instance is None:
+        _cache_clasificacion_instance = CacheClasificacionIA(
+            ruta=settings.CACHE_IA_RUTA,
+            max_entradas=settings.CACHE_IA_MAX_ENTRADAS,
+            ttl_segundos=settings.CACHE_IA_TTL_DIAS * 86400
+        )
+    return _cache_clasificacion_instance
+
+def get_despachador_ia():
+    """Retorna el despachador único de lotes IA: un solo límite de concurrencia y tokens por proceso."""
+    global _despachador_ia_instance
+    if _despachador_ia_instance is None:
+        _despachador_ia_instance = DespachadorLotesIA(
+            max_concurrencia=settings.IA_MAX_CONCURRENCIA,
+            tokens_por_minuto=settings.IA_TOKENS_POR_MINUTO,
+            latencia_objetivo_seg=settings.IA_LATENCIA_OBJETIVO_SEG
+        )
+    return _despachador_ia_instance
+
+async def crear_completion(client, proveedor: str, hedge: bool = False, **kwargs):
+    """`chat.completions.create` envuelto en la capa de resiliencia (reintentos, hedge y circuito)."""
+    return await llamar_con_resiliencia(
+        lambda: client.chat.completions.create(**kwargs),
+        proveedor=proveedor,
+        modelo=kwargs.get("model", "desconocido"),
+        max_reintentos=settings.IA_MAX_REINTENTOS,
+        hedge=hedge
+    )
+
 # --- FUNCIONES DE CLASIFICACIÓN (FLUXO) ---
 
 async def clasificar_lote_con_ia(
@@ -108,7 +152,9 @@ async def clasificar_lote_con_ia(
         # Usamos el cliente inyectado o el singleton
         ai_client = client or get_fluxo_client()
         
-        response = await ai_client.chat.completions.create(
+        # Lotes de texto cortos: un hedge cuesta poco y recorta la cola de latencia
+        response = await crear_completion(
+            ai_client, "openai", hedge=settings.IA_HEDGE_CLASIFICACION,
             model="gpt-5.2", # Asegúrate que este modelo exista o usa gpt-4o-mini / gpt-3.5-turbo
             messages=[
                 {"role": "system", "content": prompt_sistema},
@@ -132,17 +178,17 @@ async def llamar_agente_ocr_vision(banco: str, pdf_bytes: bytes, paginas: List[i
     logger.info(f"Agente OCR: {banco} (Págs {paginas})")
     
     prompt = _crear_prompt_agente_unificado(banco, tipo="vision")
-    imagen_buffers = convertir_pdf_a_imagenes(pdf_bytes, paginas=paginas)
-    if not imagen_buffers: return []
+    imagenes_b64 = await cache_render.obtener_base64(pdf_bytes, paginas)
+    if not imagenes_b64: return []
 
     content = [{"type": "text", "text": prompt}]
-    for buffer in imagen_buffers:
-        b64 = base64.b64encode(buffer.read()).decode('utf-8')
+    for b64 in imagenes_b64:
         content.append({"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64}", "detail": "high"}})
 
     try:
         client = get_openrouter_client()
-        res = await client.chat.completions.create(
+        res = await crear_completion(
+            client, "openrouter",
             model="qwen/qwen3-vl-235b-a22b-instruct",
             messages=[{"role": "user", "content": content}]
         )
@@ -154,17 +200,17 @@ async def llamar_agente_ocr_vision(banco: str, pdf_bytes: bytes, paginas: List[i
 # --- FUNCIONES DE ANALISIS DE PORTADA Y OCR (OPENROUTER/GPT-V) ---
 
 async def analizar_gpt_fluxo(prompt: str, pdf_bytes: bytes, paginas_a_procesar: List[int], razonamiento: str = "low", detail: str = "high") -> str:
-    """Envía PDF a GPT-Vision (Fluxo)."""
-    imagen_buffers = convertir_pdf_a_imagenes(pdf_bytes, paginas=paginas_a_procesar)
-    if not imagen_buffers: return ""
+    """Envía PDF a GPT-Vision (Fluxo). Las páginas salen del caché de render (compartido con Qwen)."""
+    imagenes_b64 = await cache_render.obtener_base64(pdf_bytes, paginas_a_procesar)
+    if not imagenes_b64: return ""
     
     content = [{"type": "text", "text": prompt}]
-    for buffer in imagen_buffers:
-        b64 = base64.b64encode(buffer.read()).decode('utf-8')
+    for b64 in imagenes_b64:
         content.append({"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64}", "detail": detail}})
     
     client = get_fluxo_client()
-    res = await client.chat.completions.create(
+    res = await crear_completion(
+        client, "openai",
         model="gpt-5.2",
         messages=[{"role": "user", "content": content}],
         reasoning_effort=razonamiento
@@ -172,17 +218,17 @@ async def analizar_gpt_fluxo(prompt: str, pdf_bytes: bytes, paginas_a_procesar:
     return res.choices[0].message.content
 
 async def analizar_con_ocr_fluxo(prompt: str, pdf_bytes: bytes, paginas_a_procesar: List[int]) -> str:
-    """Envía PDF a OpenRouter (Gemini/Qwen)."""
-    imagen_buffers = convertir_pdf_a_imagenes(pdf_bytes, paginas=paginas_a_procesar)
-    if not imagen_buffers: return ""
+    """Envía PDF a OpenRouter (Gemini/Qwen). Las páginas salen del caché de render (compartido con GPT)."""
+    imagenes_b64 = await cache_render.obtener_base64(pdf_bytes, paginas_a_procesar)
+    if not imagenes_b64: return ""
     
     content = [{"type": "text", "text": prompt}]
-    for buffer in imagen_buffers:
-        b64 = base64.b64encode(buffer.read()).decode('utf-8')
+    for b64 in imagenes_b64:
         content.append({"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64}", "detail": "high"}})
     
     client = get_openrouter_client()
-    res = await client.chat.completions.create(
+    res = await crear_completion(
+        client, "openrouter",
         model="qwen/qwen3-vl-235b-a22b-instruct",
         messages=[{"role": "user", "content": content}],
     )
@@ -194,7 +240,8 @@ async def _extraer_datos_con_ia(texto: str) -> Dict:
     prompt = f"Extrae JSON ('identificacion_contribuyente', 'domicilio_registrado') de:\n{texto[:4000]}"
     try:
         client = get_fluxo_client()
-        res = await client.chat.completions.create(
+        res = await crear_completion(
+            client, "openai",
             model="gpt-5.2",
             messages=[{"role": "user", "content": prompt}]
         )
@@ -212,7 +259,8 @@ async def analizar_gpt_nomi(prompt: str, imagen_buffers: List[BytesIO], razonami
         content.append({"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64}", "detail": detalle}})
     
     client = get_nomi_client()
-    res = await client.chat.completions.create(
+    res = await crear_completion(
+        client, "openai",
         model="gpt-5.2",
         messages=[{"role": "user", "content": content}],
         reasoning_effort=razonamiento
@@ -232,7 +280,8 @@ async def analizar_productos_y_tendencias_llm(payload_json: dict) -> Dict[str, s
 
     try:
         client = get_fluxo_client()
-        response = await client.chat.completions.create(
+        response = await crear_completion(
+            client, "openai",
             model="gpt-5.2", 
             messages=[
                 {"role": "system", "content": prompt_sistema},
@@ -0,0 +1,272 @@
+# services/ipc_pool.py
+
+import os
+import pickle
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from concurrent.futures import Executor, Future, InvalidStateError
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+import fitz
+
+from ..core.config import settings
+from ..models.tabla_transacciones import como_tabla
+
+logger = logging.getLogger(__name__)
+
+# =========================================================
+# DOCUMENTOS EN MEMORIA COMPARTIDA
+# =========================================================
+
+@dataclass(frozen=True)
+class RefDocumento:
+    """
+    Lo único que viaja por el pipe hacia el worker: nombre del segmento de memoria compartida,
+    tamaño real del PDF y la ruta en disco (respaldo si no hay segmento).
+    """
+    ruta: str
+    nombre_shm: Optional[str] = None
+    tamano: int = 0
+
+def _hay_espacio_en_shm(tamano: int, directorio: str = "/dev/shm") -> bool:
+    """
+    Escribir en un tmpfs lleno no lanza OSError: el proceso muere con SIGBUS al tocar la página.
+    Por eso el espacio libre se revisa antes de crear el segmento.
+    """
+    try:
+        estado = os.statvfs(directorio)
+    except (OSError, AttributeError):
+        return True  # Sin /dev/shm (macOS/Windows): SharedMemory decide y reporta con OSError
+    return estado.f_bavail * estado.f_frsize >= tamano
+
+class PresupuestoMemoriaCompartida:
+    """Tope de bytes que este proceso mantiene publicados a la vez en memoria compartida."""
+
+    def __init__(self, max_bytes: int):
+        self._lock = threading.Lock()
+        self.max_bytes = max_bytes
+        self.en_uso = 0
+
+    def reservar(self, tamano: int) -> bool:
+        with self._lock:
+            if self.en_uso + tamano > self.max_bytes or not _hay_espacio_en_shm(tamano):
+                return False
+            self.en_uso += tamano
+            return True
+
+    def devolver(self, tamano: int):
+        with self._lock:
+            self.en_uso = max(0, self.en_uso - tamano)
+
+presupuesto_shm_global = PresupuestoMemoriaCompartida(settings.SHM_PRESUPUESTO_MB * 1024 * 1024)
+
+class DocumentoCompartido:
+    """
+    Publica los bytes de un PDF en `multiprocessing.shared_memory` mientras los workers lo leen.
+    Los workers lo abren sin copiar con `abrir_pdf(ref)`; el dueño (proceso principal) libera el
+    segmento con `liberar()` en cuanto termina la extracción, o al salir del `with` a más tardar.
+    Si se rebasa el presupuesto o la memoria compartida no está disponible, degrada a la ruta.
+    """
+
+    def __init__(self, pdf_bytes: bytes, ruta: str, presupuesto: Optional[PresupuestoMemoriaCompartida] = None):
+        self._shm = None
+        self._reservado = 0
+        self._presupuesto = presupuesto or presupuesto_shm_global
+        self.ref = RefDocumento(ruta=ruta)
+        if not pdf_bytes:
+            return
+        if not self._presupuesto.reservar(len(pdf_bytes)):
+            logger.info(f"Presupuesto de memoria compartida agotado para {ruta}, los workers leerán de disco")
+            return
+        self._reservado = len(pdf_bytes)
+        try:
+            self._shm = shared_memory.SharedMemory(create=True, size=len(pdf_bytes))
+            self._shm.buf[:len(pdf_bytes)] = pdf_bytes
+            self.ref = RefDocumento(ruta=ruta, nombre_shm=self._shm.name, tamano=len(pdf_bytes))
+        except OSError as e:
+            logger.warning(f"Memoria compartida no disponible para {ruta}, los workers leerán de disco: {e}")
+            self.liberar()
+
+    def liberar(self):
+        if self._reservado:
+            self._presupuesto.devolver(self._reservado)
+            self._reservado = 0
+        if self._shm is None:
+            return
+        try:
+            self._shm.close()
+            self._shm.unlink()  # Workers que sigan leyendo conservan su mapeo; solo desaparece el nombre
+        except FileNotFoundError:
+            pass
+        self._shm = None
+
+    def __enter__(self) -> RefDocumento:
+        return self.ref
+
+    def __exit__(self, *exc):
+        self.liberar()
+
+def _adjuntar_shm(nombre: str) -> shared_memory.SharedMemory:
+    try:
+        # Python 3.13+: el proceso que solo adjunta no debe registrar el segmento en el resource tracker
+        return shared_memory.SharedMemory(name=nombre, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=nombre)
+
+@contextmanager
+def vista_pdf(documento: Union[RefDocumento, str]) -> Iterator[Union[bytes, memoryview]]:
+    """
+    Bytes del PDF dentro del worker. Con segmento compartido entrega un `memoryview` sobre la memoria
+    compartida (sin copia); con ruta, o si el segmento ya no existe, lee el archivo de disco.
+    Quien lo use no debe conservar referencias a la vista fuera del `with`.
+    """
+    ref = documento if isinstance(documento, RefDocumento) else RefDocumento(ruta=str(documento))
+
+    shm = None
+    if ref.nombre_shm:
+        try:
+            shm = _adjuntar_shm(ref.nombre_shm)
+        except FileNotFoundError:
+            logger.warning(f"Segmento {ref.nombre_shm} ya no existe, leyendo {ref.ruta} de disco.")
+
+    if shm is None:
+        with open(ref.ruta, "rb") as f:
+            yield f.read()
+        return
+
+    vista = shm.buf[:ref.tamano]
+    try:
+        yield vista
+    finally:
+        try:
+            vista.release()
+            shm.close()
+        except BufferError:
+            # Alguien retiene la vista: el mapeo se libera cuando el recolector suelte esa referencia
+            logger.debug(f"Segmento {ref.nombre_shm} con referencias vivas; se cierra al recolectarse.")
+
+@contextmanager
+def abrir_pdf(documento: Union[RefDocumento, str]) -> Iterator[fitz.Document]:
+    """Abre el PDF en el worker con `fitz.open(stream=...)` directo sobre la memoria compartida."""
+    with vista_pdf(documento) as datos:
+        doc = fitz.open(stream=datos, filetype="pdf")
+        try:
+            yield doc
+        finally:
+            doc.close()
+            doc.stream = None  # Suelta la referencia al buffer para poder cerrar el mapeo
+
+# =========================================================
+# CANCELACIÓN ENTRE PROCESOS
+# =========================================================
+
+@dataclass(frozen=True)
+class BanderaCancelacion:
+    """
+    Bandera de cancelación que cruza el pipe (solo viaja la ruta del archivo marcador). `future.cancel()`
+    no detiene una tarea que ya corre en el ProcessPool: el worker revisa `activa()` antes de cada paso caro.
+    """
+    ruta: str
+
+    def activar(self):
+        open(self.ruta, "a").close()
+
+    def activa(self) -> bool:
+        return os.path.exists(self.ruta)
+
+    def limpiar(self):
+        try:
+            os.remove(self.ruta)
+        except FileNotFoundError:
+            pass
+
+# =========================================================
+# RESULTADOS COMPACTOS (COLUMNARES)
+# =========================================================
+
+def compactar_resultado(resultado_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Deja las transacciones como `TablaTransacciones` (columnas) antes de cruzar el pipe.
+    Sin grafos Pydantic ni llaves repetidas por fila: el proceso principal la usa tal cual.
+    """
+    compacto = dict(resultado_dict)
+    compacto["transacciones"] = como_tabla(compacto.get("transacciones"))
+    return compacto
+
+# =========================================================
+# EJECUTOR CON MEDICIÓN DE BYTES POR EL PIPE
+# =========================================================
+
+def _ejecutar_serializado(fn, *args, **kwargs) -> Tuple[int, bytes]:
+    """
+    Corre en el worker: mide ahí lo que llegó por el pipe (sin bloquear el event loop del dueño)
+    y serializa el resultado para conocer su tamaño exacto de vuelta.
+    """
+    enviados = len(pickle.dumps((fn, args, kwargs), protocol=pickle.HIGHEST_PROTOCOL))
+    return enviados, pickle.dumps(fn(*args, **kwargs), protocol=pickle.HIGHEST_PROTOCOL)
+
+class MetricasIPC:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tareas = 0
+        self.bytes_enviados = 0
+        self.bytes_recibidos = 0
+
+    def registrar(self, enviados: int, recibidos: int):
+        with self._lock:
+            self.tareas += 1
+            self.bytes_enviados += enviados
+            self.bytes_recibidos += recibidos
+
+    def resumen(self) -> dict:
+        return {"tareas": self.tareas, "bytes_enviados": self.bytes_enviados, "bytes_recibidos": self.bytes_recibidos}
+
+# Acumulado del proceso (expuesto en /metricas)
+metricas_ipc_globales = MetricasIPC()
+
+class EjecutorMedido(Executor):
+    """
+    Envoltura de un ProcessPoolExecutor que mide los bytes que cruzan el pipe en cada tarea
+    (argumentos de ida, resultado de vuelta). Compatible con `loop.run_in_executor`; la
+    deserialización del resultado ocurre en el hilo del pool, fuera del event loop.
+    """
+
+    def __init__(self, base: Executor):
+        self.base = base
+        self.metricas = MetricasIPC()
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        futuro_base = self.base.submit(_ejecutar_serializado, fn, *args, **kwargs)
+        futuro = Future()
+
+        def _al_terminar(f: Future):
+            try:
+                if f.cancelled():
+                    futuro.cancel()
+                    return
+                error = f.exception()
+                if error is not None:
+                    futuro.set_exception(error)
+                    return
+                enviados, carga = f.result()
+                self.metricas.registrar(enviados, len(carga))
+                metricas_ipc_globales.registrar(enviados, len(carga))
+                futuro.set_result(pickle.loads(carga))
+            except InvalidStateError:
+                pass  # El consumidor ya canceló su futuro
+            except Exception as e:
+                try:
+                    futuro.set_exception(e)
+                except InvalidStateError:
+                    pass
+
+        futuro.add_done_callback(lambda f: f.cancelled() and futuro_base.cancel())
+        futuro_base.add_done_callback(_al_terminar)
+        return futuro
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        # El pool base es compartido por la aplicación: su ciclo de vida lo maneja main.lifespan
+        pass
@@ -0,0 +1,190 @@
+# services/limpiador_ttl.py
+
+import os
+import time
+import heapq
+import shutil
+import asyncio
+import logging
+import threading
+import itertools
+from typing import Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TTL_DEFECTO_SEG = 3600.0    # 1 hora de vida (igual que los barridos anteriores)
+INTERVALO_CICLO_SEG = 30.0
+
+class FuenteLocal:
+    """Rutas del disco local (archivos o carpetas completas, ej. las extraídas de un ZIP)."""
+
+    @staticmethod
+    def _modificado_sync(ruta: str) -> Optional[float]:
+        try:
+            return os.stat(ruta).st_mtime
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _borrar_sync(ruta: str) -> int:
+        if os.path.isdir(ruta):
+            liberados = sum(
+                os.path.getsize(os.path.join(raiz, nombre)) for raiz, _, nombres in os.walk(ruta) for nombre in nombres
+            )
+            shutil.rmtree(ruta)
+            return liberados
+        liberados = os.path.getsize(ruta)
+        os.remove(ruta)
+        return liberados
+
+    @staticmethod
+    def _purgar_sync(directorio: str, ttl_segundos: float) -> Tuple[int, int]:
+        ahora = time.time()
+        borrados, liberados = 0, 0
+        for nombre in os.listdir(directorio):
+            ruta = os.path.join(directorio, nombre)
+            if ahora - os.stat(ruta).st_mtime > ttl_segundos:
+                liberados += FuenteLocal._borrar_sync(ruta)
+                borrados += 1
+        return borrados, liberados
+
+    async def modificado(self, ruta: str) -> Optional[float]:
+        return await asyncio.to_thread(self._modificado_sync, ruta)
+
+    async def borrar(self, ruta: str) -> int:
+        return await asyncio.to_thread(self._borrar_sync, ruta)
+
+FUENTE_LOCAL = FuenteLocal()
+
+class LimpiadorTTL:
+    """
+    Limpieza programada de temporales, pasaportes y resultados vencidos (una tarea en `main.lifespan`).
+
+    Los servicios avisan al crear un archivo (`programar`, O(log n)) en lugar de listar y hacer `stat`
+    de todo el directorio en cada request. El limpiador guarda los vencimientos en un heap y cada ciclo
+    solo atiende lo que ya venció: si el objeto se modificó después de programarse (pasaporte que siguió
+    avanzando, JSON reescrito) se reprograma con su mtime real; si ya no existe (el pipeline limpió sus
+    temporales) solo se descarta.
+
+    Lo que quedó de una ejecución anterior no está en el heap: se cubre con un barrido completo,
+    una sola vez, al iniciar.
+
+    Una fuente es cualquier objeto con `async modificado(clave) -> mtime | None` y
+    `async borrar(clave) -> bytes liberados`: `FUENTE_LOCAL` para rutas o un `AlmacenResultados`.
+    """
+
+    def __init__(self, intervalo_seg: float = INTERVALO_CICLO_SEG):
+        self.intervalo_seg = intervalo_seg
+        self._heap: list = []               # (vence, secuencia, fuente, clave, ttl)
+        self._programados: set = set()       # (id(fuente), clave) ya en el heap
+        self._secuencia = itertools.count()
+        self._candado = threading.Lock()     # `programar` también se llama desde hilos del threadpool
+        self._tarea: Optional[asyncio.Task] = None
+
+        # --- MÉTRICAS ---
+        self.archivos_borrados = 0
+        self.bytes_recuperados = 0
+        self.reprogramados = 0
+        self.ciclos = 0
+        self.errores = 0
+        self.duracion_ultimo_ciclo_seg = 0.0
+
+    def programar(self, clave, ttl_segundos: float = TTL_DEFECTO_SEG, fuente=FUENTE_LOCAL, mtime: Optional[float] = None):
+        """Agenda el borrado de `clave` a `ttl_segundos` de su última modificación (ahora, si no se da)."""
+        clave = str(clave)
+        vence = (mtime if mtime is not None else time.time()) + ttl_segundos
+        with self._candado:
+            if (id(fuente), clave) in self._programados:
+                return  # Ya agendado: al vencer se revisa el mtime real
+            self._programados.add((id(fuente), clave))
+            heapq.heappush(self._heap, (vence, next(self._secuencia), fuente, clave, ttl_segundos))
+
+    def _sacar_vencido(self, ahora: float):
+        with self._candado:
+            if self._heap and self._heap[0][0] <= ahora:
+                return heapq.heappop(self._heap)
+        return None
+
+    async def ciclo(self, ahora: Optional[float] = None) -> int:
+        """Atiende solo los vencimientos cumplidos. Retorna cuántos objetos borró."""
+        inicio = time.perf_counter()
+        ahora = time.time() if ahora is None else ahora
+        borrados = 0
+        while (entrada := self._sacar_vencido(ahora)) is not None:
+            _, _, fuente, clave, ttl = entrada
+            try:
+                mtime = await fuente.modificado(clave)
+                if mtime is not None and mtime + ttl > ahora:
+                    with self._candado:  # Se modificó después de programarse: vence más tarde
+                        heapq.heappush(self._heap, (mtime + ttl, next(self._secuencia), fuente, clave, ttl))
+                    self.reprogramados += 1
+                    continue
+                if mtime is not None:
+                    self.bytes_recuperados += await fuente.borrar(clave)
+                    self.archivos_borrados += 1
+                    borrados += 1
+            except FileNotFoundError:
+                pass  # Lo borró alguien más entre la consulta y el borrado
+            except Exception as e:
+                self.errores += 1
+                logger.warning(f"Limpieza TTL: no se pudo borrar {clave}: {e}")
+            with self._candado:
+                self._programados.discard((id(fuente), clave))
+
+        self.ciclos += 1
+        self.duracion_ultimo_ciclo_seg = time.perf_counter() - inicio
+        if borrados:
+            logger.info(f"Limpieza TTL: {borrados} objetos vencidos eliminados.")
+        return borrados
+
+    async def barrido_inicial(self, directorios: Iterable[str] = (), almacenes: Iterable = (), ttl_segundos: float = TTL_DEFECTO_SEG):
+        """Un solo barrido completo al arrancar, para lo que dejó una ejecución anterior."""
+        for directorio in directorios:
+            try:
+                if os.path.isdir(directorio):
+                    borrados, liberados = await asyncio.to_thread(FuenteLocal._purgar_sync, directorio, ttl_segundos)
+                    self.archivos_borrados += borrados
+                    self.bytes_recuperados += liberados
+            except Exception as e:
+                self.errores += 1
+                logger.warning(f"Limpieza TTL: error en el barrido inicial de {directorio}: {e}")
+        for almacen in almacenes:
+            try:
+                self.archivos_borrados += await almacen.purgar_antiguos(ttl_segundos)
+            except Exception as e:
+                self.errores += 1
+                logger.warning(f"Limpieza TTL: error en el barrido inicial del almacén de resultados: {e}")
+
+    async def _ejecutar(self, directorios, almacenes):
+        await self.barrido_inicial(directorios, almacenes)
+        while True:
+            await asyncio.sleep(self.intervalo_seg)
+            await self.ciclo()
+
+    def iniciar(self, directorios: Iterable[str] = (), almacenes: Iterable = ()):
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.get_running_loop().create_task(self._ejecutar(list(directorios), list(almacenes)))
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+
+    def metricas(self) -> dict:
+        return {
+            "pendientes": len(self._heap),
+            "proximo_vencimiento_seg": round(self._heap[0][0] - time.time(), 1) if self._heap else None,
+            "archivos_borrados": self.archivos_borrados,
+            "bytes_recuperados": self.bytes_recuperados,
+            "reprogramados": self.reprogramados,
+            "ciclos": self.ciclos,
+            "errores": self.errores,
+            "duracion_ultimo_ciclo_seg": round(self.duracion_ultimo_ciclo_seg, 4),
+        }
+
+# Instancia Global
+limpiador_ttl = LimpiadorTTL()
@@ -0,0 +1,70 @@
+# services/monitor_loop.py
+
+import asyncio
+import logging
+from collections import deque
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class MonitorLagLoop:
+    """
+    Mide cuánto se retrasa el event loop: duerme `intervalo_seg` y compara contra el tiempo real
+    transcurrido. Cualquier exceso es tiempo en que una corrutina bloqueó el loop (ej. fitz o lecturas
+    síncronas) y los endpoints de polling no pudieron responder.
+    """
+
+    def __init__(self, intervalo_seg: float = 0.1, ventana: int = 600, umbral_alerta_seg: float = 0.5):
+        self.intervalo_seg = intervalo_seg
+        self.umbral_alerta_seg = umbral_alerta_seg
+        self.lags = deque(maxlen=ventana)
+        self.lag_maximo = 0.0
+        self.muestras = 0
+        self._tarea: Optional[asyncio.Task] = None
+
+    def registrar(self, lag: float):
+        lag = max(0.0, lag)
+        self.lags.append(lag)
+        self.muestras += 1
+        self.lag_maximo = max(self.lag_maximo, lag)
+        if lag >= self.umbral_alerta_seg:
+            logger.warning(f"Event loop bloqueado {lag:.3f}s.")
+
+    async def _medir(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            esperado = loop.time() + self.intervalo_seg
+            await asyncio.sleep(self.intervalo_seg)
+            self.registrar(loop.time() - esperado)
+
+    def iniciar(self):
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.get_running_loop().create_task(self._medir())
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+
+    def percentil(self, p: float) -> Optional[float]:
+        if not self.lags:
+            return None
+        ordenados = sorted(self.lags)
+        return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+    def metricas(self) -> dict:
+        p50, p99 = self.percentil(0.50), self.percentil(0.99)
+        return {
+            "muestras": self.muestras,
+            "lag_ultimo_seg": round(self.lags[-1], 4) if self.lags else None,
+            "lag_p50_seg": round(p50, 4) if p50 is not None else None,
+            "lag_p99_seg": round(p99, 4) if p99 is not None else None,
+            "lag_maximo_seg": round(self.lag_maximo, 4),
+        }
+
+# Instancia Global
+monitor_loop = MonitorLagLoop()
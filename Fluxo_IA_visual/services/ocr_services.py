@@ -11,6 +11,7 @@ from typing import Any, Dict, List, Optional
 import openai
 from ..core.config import settings 
 from .pdf_processor import convertir_pdf_a_imagenes_mejorada 
+from .resiliencia_ia import llamar_con_resiliencia, proveedor_de_cliente
 
 logger = logging.getLogger(__name__)
 
@@ -78,7 +79,8 @@ class OCRService:
     @property
     def client(self):
         if self._client is None:
-            self._client = openai.AsyncOpenAI(api_key=self._api_key, base_url=self._base_url)
+            # max_retries=0: los reintentos viven en llamar_con_resiliencia (circuito del proveedor de base_url)
+            self._client = openai.AsyncOpenAI(api_key=self._api_key, base_url=self._base_url, max_retries=0)
         return self._client
         
     async def extraer_con_vision(
@@ -112,12 +114,18 @@ class OCRService:
                     "image_url": {"url": f"data:image/png;base64,{b64}", "detail": "high"}
                 })
 
-            # 4. Request
-            res = await self.client.chat.completions.create(
-                model=modelo or self.modelo_default,
-                messages=[{"role": "user", "content": content}],
-                temperature=0.1,
-                max_tokens=4000
+            # 4. Request (con reintentos/backoff y circuito por proveedor)
+            modelo_final = modelo or self.modelo_default
+            res = await llamar_con_resiliencia(
+                lambda: self.client.chat.completions.create(
+                    model=modelo_final,
+                    messages=[{"role": "user", "content": content}],
+                    temperature=0.1,
+                    max_tokens=4000
+                ),
+                proveedor=proveedor_de_cliente(self.client),
+                modelo=modelo_final,
+                max_reintentos=settings.IA_MAX_REINTENTOS
             )
             
             raw = res.choices[0].message.content
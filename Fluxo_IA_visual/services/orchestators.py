@@ -1,9 +1,8 @@
 # services/orchestators.py
 
 from ..utils.helpers import (
-    limpiar_monto, detectar_tipo_contribuyente, crear_objeto_resultado,
-    construir_fecha_completa, separar_fecha_y_ruido, calcular_periodo
-    
+    limpiar_monto, detectar_tipo_contribuyente,
+    ContextoFechasCuenta
 )
 from .ia_extractor import (
     _extraer_datos_con_ia
@@ -27,6 +26,8 @@ from ..models.responses_analisisTPV import AnalisisTPV
 from ..models.responses_csf import CSF
 
 from ..core.textract_engine import extraer_documento_completo, extraer_saldo_inicial_poc
+from ..models.tabla_transacciones import TablaTransacciones
+from .ipc_pool import BanderaCancelacion, RefDocumento, abrir_pdf, compactar_resultado
 from ..core.extractor_determinista import ExtractorDeterministaOCR
 
 from fastapi import UploadFile
@@ -67,9 +68,8 @@ def clasificar_transacciones_extraidas(
     nombre_cuenta = f"{filename} (Págs {start_pg}-{end_pg})"
     logger.info(f"Clasificando {len(transacciones_objetos)} movs para: {nombre_cuenta}")
     
-    # Metadata Fechas
-    p_inicio = ia_data_cuenta.get("periodo_inicio")
-    p_fin = ia_data_cuenta.get("periodo_fin")
+    # Metadata Fechas: el periodo se parsea una vez por cuenta y los días repetidos salen del memo
+    contexto_fechas = ContextoFechasCuenta(ia_data_cuenta.get("periodo_inicio"), ia_data_cuenta.get("periodo_fin"))
 
     # 1. SI NO HAY TRANSACCIONES
     if not transacciones_objetos:
@@ -90,13 +90,14 @@ def clasificar_transacciones_extraidas(
     total_entradas_bmrcash = 0.0
     total_entradas_tpv = 0.0
     total_moratorios = 0.0
-    todas_las_transacciones = []
+    todas_las_transacciones = TablaTransacciones()
 
     for trx in transacciones_objetos:
         # --- ACCESO POR ATRIBUTOS ---
         monto_float = trx.monto  
-        # 1. SEPARAMOS LA FECHA SUCIA DE LA BASURA
-        fecha_pura_raw, basura_texto = separar_fecha_y_ruido(trx.fecha)
+        # 1. SEPARAMOS LA FECHA SUCIA DE LA BASURA, CONSTRUIMOS LA FECHA CON LA PARTE LIMPIA Y SU PERIODO
+        # (separar_fecha_y_ruido -> construir_fecha_completa -> calcular_periodo, memoizado por fecha cruda)
+        fecha_final, periodo_calculado, basura_texto = contexto_fechas.resolver(trx.fecha)
         
         # 2. INYECTAMOS LA BASURA AL INICIO DE LA DESCRIPCIÓN
         desc_original = trx.descripcion
@@ -111,22 +112,7 @@ def clasificar_transacciones_extraidas(
         # Manejo seguro del Enum de tipo
         tipo_detectado = trx.tipo.value if hasattr(trx.tipo, 'value') else str(trx.tipo)
         
-        # 3. CONSTRUIMOS LA FECHA USANDO SOLO LA PARTE LIMPIA
-        # Tu función 'construir_fecha_completa' ahora recibe "01-DIC-25", que sabe manejar perfecto.
-        fecha_final = construir_fecha_completa(fecha_pura_raw, p_inicio, p_fin)
-        
-        # 4. CALCULAMOS EL PERIODO
-        periodo_calculado = calcular_periodo(fecha_final, p_inicio)
-        
-        trx_procesada = {
-            "fecha": fecha_final,
-            "periodo": periodo_calculado,
-            "descripcion": descripcion_full,
-            "monto": f"{monto_float:,.2f}", 
-            "tipo": tipo_detectado,
-            "categoria": "GENERAL",
-            "debug_match": trx.metodo_match.value if hasattr(trx.metodo_match, 'value') else str(trx.metodo_match)
-        }
+        categoria = "GENERAL"
 
         # --- LÓGICA DE CLASIFICACIÓN (KEYWORDS - IGUAL QUE ANTES) ---
         if tipo_detectado == "abono":
@@ -135,26 +121,33 @@ def clasificar_transacciones_extraidas(
             else:
                 if any(p in descripcion_limpia for p in PALABRAS_EFECTIVO):
                     total_depositos_efectivo += monto_float
-                    trx_procesada["categoria"] = "EFECTIVO"
+                    categoria = "EFECTIVO"
                 elif any(p in descripcion_limpia for p in PALABRAS_TRASPASO_ENTRE_CUENTAS):
                     total_traspaso_entre_cuentas += monto_float
-                    trx_procesada["categoria"] = "TRASPASO"
+                    categoria = "TRASPASO"
                 elif any(p in descripcion_limpia for p in PALABRAS_TRASPASO_FINANCIAMIENTO):
                     total_entradas_financiamiento += monto_float
-                    trx_procesada["categoria"] = "FINANCIAMIENTO"
+                    categoria = "FINANCIAMIENTO"
                 elif any(p in descripcion_limpia for p in PALABRAS_BMRCASH):
                     total_entradas_bmrcash += monto_float
-                    trx_procesada["categoria"] = "BMRCASH"
+                    categoria = "BMRCASH"
                 elif any(p in descripcion_limpia for p in PALABRAS_TRASPASO_MORATORIO):
                     total_moratorios += monto_float
-                    trx_procesada["categoria"] = "MORATORIOS"
-                else:
-                    trx_procesada["categoria"] = "GENERAL" 
+                    categoria = "MORATORIOS"
         
         elif tipo_detectado == "cargo":
-            trx_procesada["categoria"] = "CARGO"
-
-        todas_las_transacciones.append(trx_procesada)
+            categoria = "CARGO"
+
+        # El monto se guarda como float64 redondeado a centavos (el mismo valor que antes se
+        # formateaba a string y se volvía a parsear en cada suma)
+        todas_las_transacciones.agregar(
+            fecha=fecha_final,
+            periodo=periodo_calculado,
+            descripcion=descripcion_full,
+            monto=round(monto_float, 2),
+            tipo=tipo_detectado,
+            categoria=categoria
+        )
 
     # 3. CÁLCULO DE TOTALES (Igual que antes)
     comisiones_str = ia_data_cuenta.get("comisiones", "0.0")
@@ -177,11 +170,22 @@ def clasificar_transacciones_extraidas(
         "error_transacciones": None
     }
 
+def extraer_textract_worker_sync(file_path: str, cancelacion: Optional[BanderaCancelacion] = None) -> Tuple[List[dict], List[str]]:
+    """
+    Parte del OCR que NO depende de la carátula: rasteriza el PDF y lo pasa por AWS Textract.
+    Se lanza una vez por documento: en paralelo a la carátula si la sonda está segura de que es un
+    escaneado, o cuando la carátula lo confirma. Si el pipeline lo descarta (digital, duplicado, carátula
+    fallida), `cancelacion` evita enviar las páginas que faltan. El resultado se comparte entre las
+    cuentas del documento vía `procesar_ocr_worker_sync`.
+    """
+    return extraer_documento_completo(file_path, cancelacion)
+
 def procesar_ocr_worker_sync(
     ia_data: dict, 
     file_path: str, 
-    filename: str
-) -> Union[AnalisisTPV.ResultadoExtraccion, Exception]:
+    filename: str,
+    extraccion_previa: Optional[Tuple[List[dict], List[str]]] = None
+) -> Union[Dict[str, Any], Exception]:
     """
     Ejecuta la extracción de transacciones utilizando el motor OCR determinista de AWS Textract.
     
@@ -193,10 +197,12 @@ def procesar_ocr_worker_sync(
         ia_data (dict): Metadatos iniciales obtenidos del análisis de la carátula (ej. Banco, RFC).
         file_path (str): Ruta absoluta temporal donde se encuentra el documento físico.
         filename (str): Nombre original del archivo para propósitos de trazabilidad y logging.
+        extraccion_previa (Tuple, optional): Salida de `extraer_textract_worker_sync` si ya se corrió
+                                            (compartida entre cuentas). Si es None, se llama a Textract aquí.
 
     Returns:
-        Union[AnalisisTPV.ResultadoExtraccion, Exception]: Objeto estructurado con las transacciones
-        y metadatos técnicos en caso de éxito. Retorna una instancia de Exception si ocurre 
+        Union[Dict, Exception]: Resultado compacto (transacciones en columnas, ver `ipc_pool`)
+        con los metadatos técnicos en caso de éxito. Retorna una instancia de Exception si ocurre 
         un fallo crítico durante el proceso.
     """
     
@@ -221,8 +227,11 @@ def procesar_ocr_worker_sync(
     try:
         logger.info(f"[TextractWorker] Iniciando POC Determinista para: {filename}")
         
-        # 1. Extracción concurrente con AWS Textract
-        filas_estructuradas, textos_crudos = extraer_documento_completo(file_path)
+        # 1. Extracción concurrente con AWS Textract (o la pasada ya compartida del documento)
+        if extraccion_previa is not None:
+            filas_estructuradas, textos_crudos = extraccion_previa
+        else:
+            filas_estructuradas, textos_crudos = extraer_documento_completo(file_path)
         
         if not filas_estructuradas:
             raise ValueError("Textract no devolvió información útil o falló la conversión del PDF.")
@@ -265,14 +274,8 @@ def procesar_ocr_worker_sync(
             "alertas": "Procesado con motor OCR Determinista AWS"
         }]
         
-        # 7. Creación del objeto final
-        obj_res = crear_objeto_resultado(resultado_dict) 
-        
-        # 8. Restauramos campos de trazabilidad
-        obj_res.file_path_origen = file_path
-        obj_res.es_digital = False
-        
-        return obj_res
+        # 7. Resultado compacto (columnar): el objeto Pydantic se arma en el proceso principal
+        return compactar_resultado(resultado_dict)
         
     except Exception as e:
         logger.error(f"Error Worker OCR Textract ({filename}): {e}", exc_info=True)
@@ -282,7 +285,8 @@ def procesar_digital_worker_sync(
     ia_data_inicial: dict,
     filename: str,
     file_path: str,
-    rango_paginas: Tuple[int, int]
+    rango_paginas: Tuple[int, int],
+    documento: Optional[RefDocumento] = None
 ) -> Union[Any, Exception]: # Retorna AnalisisTPV.ResultadoExtraccion o Exception
     
     # --- CLASE ADAPTADORA INTERNA ---
@@ -319,19 +323,22 @@ def procesar_digital_worker_sync(
         t_inicio = time.time()
 
         # 2. EJECUCIÓN DEL PIPELINE (3 PASADAS)
-        # Usamos un bloque try/finally para asegurar que el PDF se cierra en memoria
-        doc = fitz.open(file_path)
-        try:
-            # Pasada 1: Geometría (Header/Footer)
-            geometries = engine.pass_1_detect_geometry(doc)
-            
-            # Pasada 2: Columnas (Detección horizontal)
-            layouts = engine.pass_2_detect_columns(doc, geometries)
-            
-            # Pasada 3: Extracción (Slicing y Datos)
-            raw_results = engine.pass_3_extract_rows(doc, geometries, layouts)
-        finally:
-            doc.close()
+        # El PDF se abre directo sobre la memoria compartida publicada por el orquestador (o de disco si
+        # no la hay); el `with` + try/finally aseguran que el PDF se cierra en memoria
+        with abrir_pdf(documento or file_path) as doc:
+            try:
+                # Pasada 1: Geometría (Header/Footer)
+                # Solo las páginas de esta cuenta (+1 de contexto): las pasadas 2 y 3 heredan el rango
+                geometries = engine.pass_1_detect_geometry(doc, rango_paginas=rango_paginas)
+                
+                # Pasada 2: Columnas (Detección horizontal)
+                layouts = engine.pass_2_detect_columns(doc, geometries)
+                
+                # Pasada 3: Extracción (Slicing y Datos)
+                raw_results = engine.pass_3_extract_rows(doc, geometries, layouts)
+            finally:
+                logger.info(f"[DigitalWorker] Extracciones de texto MuPDF: {engine.extracciones_texto} ({len(doc)} págs)")
+                engine.liberar_snapshots()
 
         # --- FIN DEL CRONÓMETRO Y CÁLCULO PROMEDIO ---
         t_fin = time.time()
@@ -388,14 +395,9 @@ def procesar_digital_worker_sync(
         # 5. INYECCIÓN DE METADATA TÉCNICA
         resultado_dict["metadata_tecnica"] = metricas_consolidado 
         
-        # 6. CREACIÓN DEL OBJETO RESULTADO FINAL
-        # (Llama a tu función existente que convierte el dict en objeto Pydantic/Dataclass)
-        obj_res = crear_objeto_resultado(resultado_dict) 
-        
-        # Restaurar campos de trazabilidad
-        obj_res.file_path_origen = file_path 
-        
-        return obj_res
+        # 6. RESULTADO COMPACTO (columnar) PARA CRUZAR EL PIPE
+        # El objeto Pydantic se arma en el proceso principal (`crear_objeto_resultado`), con la tabla dentro
+        return compactar_resultado(resultado_dict)
         
     except Exception as e:
         logger.error(f"Error Crítico en Worker Digital (Motor V2): {e}", exc_info=True)
@@ -1,47 +1,210 @@
 # services/passport_service.py
 import json
 import os
+import asyncio
 import logging
 import time
 from pathlib import Path
 from datetime import datetime, timedelta
+from typing import Dict, Optional
 from ..models.passport import PassportData, DetalleFase, MetricasTecnicas
+from .limpiador_ttl import limpiador_ttl
 
 logger = logging.getLogger(__name__)
 
+# Ventana mínima entre escrituras del mismo pasaporte. Los cambios de fase/estado y el cierre
+# (terminado o error) se escriben al momento; lo demás se junta en una sola escritura por ventana.
+INTERVALO_VOLCADO_SEG = 0.5
+# Cada cuánto se permite el barrido de pasaportes vencidos al crear uno nuevo
+INTERVALO_LIMPIEZA_SEG = 300.0
+
+class AlmacenPasaportesDisco:
+    """Backend por defecto: un JSON por job. Es lo que ven los demás procesos (workers de uvicorn)."""
+
+    def __init__(self, passport_dir: str):
+        self.passport_dir = Path(passport_dir)
+        self.passport_dir.mkdir(parents=True, exist_ok=True)
+
+    def ruta(self, job_id: str) -> str:
+        # os.path.basename extrae solo el archivo final, destruyendo rutas maliciosas
+        safe_job_id = os.path.basename(str(job_id))
+        return str(self.passport_dir / f"{safe_job_id}.json")
+
+    def leer(self, job_id: str) -> Optional[dict]:
+        path = self.ruta(job_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"[{job_id}] Error leyendo pasaporte: {e}")
+            return None
+
+    def escribir(self, job_id: str, contenido: str):
+        """Escritura atómica (temporal + rename): un lector de otro proceso nunca ve un JSON a medias."""
+        path = self.ruta(job_id)
+        ruta_tmp = f"{path}.{os.getpid()}.tmp"
+        with open(ruta_tmp, "w", encoding="utf-8") as f:
+            f.write(contenido)
+        os.replace(ruta_tmp, path)
+
+class RegistroPasaportes:
+    """
+    Pasaportes vivos en memoria del proceso que corre el job. `actualizar` muta el objeto y el
+    registro decide cuándo escribirlo: al momento si cambió la fase/estado o se pidió forzar, y si
+    no, a lo más una vez por `intervalo_volcado` (con un volcado diferido en el event loop para que
+    el último cambio de una ráfaga no se quede sin escribir).
+
+    La lectura se sirve de memoria; si el job no vive en este proceso se lee del almacén, que
+    nunca va más de `intervalo_volcado` atrás del proceso dueño.
+    """
+
+    def __init__(self, almacen: AlmacenPasaportesDisco, intervalo_volcado: float = INTERVALO_VOLCADO_SEG):
+        self.almacen = almacen
+        self.intervalo_volcado = intervalo_volcado
+        self._pasaportes: Dict[str, PassportData] = {}
+        self._sucios = set()
+        self._ultimo_volcado: Dict[str, float] = {}
+        self._volcados_programados: Dict[str, asyncio.TimerHandle] = {}
+        self._ultima_limpieza = float("-inf")
+
+        # --- MÉTRICAS ---
+        self.actualizaciones = 0
+        self.escrituras = 0
+
+    def obtener(self, job_id: str) -> Optional[PassportData]:
+        """Pasaporte vivo para modificar. Si no está en memoria (ej. tras un reinicio) se adopta el del almacén."""
+        passport = self._pasaportes.get(job_id)
+        if passport is None:
+            datos = self.almacen.leer(job_id)
+            if datos is None:
+                return None
+            passport = PassportData(**datos)
+            self._pasaportes[job_id] = passport
+        return passport
+
+    def leer(self, job_id: str) -> Optional[dict]:
+        passport = self._pasaportes.get(job_id)
+        if passport is not None:
+            return passport.model_dump()
+        return self.almacen.leer(job_id)
+
+    def guardar(self, passport: PassportData, forzar: bool = False):
+        """Registra el cambio y lo escribe ahora o en el siguiente volcado de la ventana."""
+        job_id = passport.job_id
+        self._pasaportes[job_id] = passport
+        self._sucios.add(job_id)
+        self.actualizaciones += 1
+
+        transcurrido = time.monotonic() - self._ultimo_volcado.get(job_id, float("-inf"))
+        if forzar or transcurrido >= self.intervalo_volcado:
+            self.volcar(job_id)
+        else:
+            self._programar_volcado(job_id, self.intervalo_volcado - transcurrido)
+
+    def volcar(self, job_id: str):
+        """Escribe el pasaporte si tiene cambios pendientes."""
+        programado = self._volcados_programados.pop(job_id, None)
+        if programado is not None:
+            programado.cancel()
+
+        passport = self._pasaportes.get(job_id)
+        if passport is None or job_id not in self._sucios:
+            return
+        self._sucios.discard(job_id)
+        self._ultimo_volcado[job_id] = time.monotonic()
+        try:
+            self.almacen.escribir(job_id, passport.model_dump_json())
+            self.escrituras += 1
+        except Exception as e:
+            self._sucios.add(job_id)  # Se reintenta en el siguiente volcado
+            logger.warning(f"[{job_id}] No se pudo escribir el pasaporte: {e}")
+
+    def _programar_volcado(self, job_id: str, espera: float):
+        if job_id in self._volcados_programados:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Sin event loop: lo escribe el siguiente cambio fuera de ventana o `volcar_todo`
+        self._volcados_programados[job_id] = loop.call_later(espera, self.volcar, job_id)
+
+    def soltar(self, job_id: str):
+        """Escribe lo pendiente y saca el pasaporte de memoria (job cerrado)."""
+        self.volcar(job_id)
+        self._pasaportes.pop(job_id, None)
+        self._ultimo_volcado.pop(job_id, None)
+
+    def volcar_todo(self):
+        """Escritura inmediata de todo lo pendiente (ej. al apagar la aplicación)."""
+        for job_id in list(self._sucios):
+            self.volcar(job_id)
+
+    def toca_limpieza(self) -> bool:
+        """True a lo más una vez por INTERVALO_LIMPIEZA_SEG."""
+        ahora = time.monotonic()
+        if ahora - self._ultima_limpieza < INTERVALO_LIMPIEZA_SEG:
+            return False
+        self._ultima_limpieza = ahora
+        return True
+
+    def expirar(self, ttl_segundos: float) -> int:
+        """Suelta de memoria los pasaportes sin actualizaciones en `ttl_segundos` (jobs abandonados)."""
+        limite = datetime.now() - timedelta(seconds=ttl_segundos)
+        vencidos = [
+            job_id for job_id, passport in self._pasaportes.items()
+            if datetime.fromisoformat(passport.ultima_actualizacion) < limite
+        ]
+        for job_id in vencidos:
+            # Se descartan sin escribir: el almacén ya tiene su última versión y así su TTL no se renueva
+            programado = self._volcados_programados.pop(job_id, None)
+            if programado is not None:
+                programado.cancel()
+            self._pasaportes.pop(job_id, None)
+            self._ultimo_volcado.pop(job_id, None)
+            self._sucios.discard(job_id)
+        return len(vencidos)
+
+    def metricas(self) -> dict:
+        return {
+            "en_memoria": len(self._pasaportes),
+            "pendientes": len(self._sucios),
+            "actualizaciones": self.actualizaciones,
+            "escrituras": self.escrituras,
+        }
+
+# Un registro por directorio y por proceso: `PassportService` se instancia por request y todos comparten este
+_REGISTROS: Dict[str, RegistroPasaportes] = {}
+
+def obtener_registro_pasaportes(passport_dir: str = "downloads/passports") -> RegistroPasaportes:
+    clave = os.path.abspath(passport_dir)
+    registro = _REGISTROS.get(clave)
+    if registro is None:
+        registro = RegistroPasaportes(AlmacenPasaportesDisco(passport_dir))
+        _REGISTROS[clave] = registro
+    return registro
+
+def volcar_pasaportes_pendientes():
+    """Al apagar: escribe todo lo que quedó en ventana de espera."""
+    for registro in _REGISTROS.values():
+        registro.volcar_todo()
+
 class PassportService:
     def __init__(self, passport_dir: str = "downloads/passports"):
         self.passport_dir = Path(passport_dir)
         self.passport_dir.mkdir(parents=True, exist_ok=True)
         self.TTL_SECONDS = 3600 # 1 hora de vida
-    
-    def _limpiar_archivos_antiguos(self):
-        """Limpia pasaportes (JSON) que tengan más de 1 hora de antigüedad."""
-        try:
-            ahora = time.time()
-            contador = 0
-            
-            # iterdir() recorre el contenido usando la elegancia de pathlib
-            for ruta in self.passport_dir.iterdir():
-                if ruta.is_file() and ruta.suffix == ".json":
-                    tiempo_modificacion = ruta.stat().st_mtime
-                    if ahora - tiempo_modificacion > self.TTL_SECONDS:
-                        ruta.unlink() # Equivale a os.remove()
-                        contador += 1
-                        
-            if contador > 0:
-                logger.info(f"Limpieza de Pasaportes: Se eliminaron {contador} archivos antiguos.")
-        except Exception as e:
-            logger.warning(f"Error limpiando pasaportes antiguos: {e}")
+        self.registro = obtener_registro_pasaportes(passport_dir)
     
     def _get_path(self, job_id: str) -> str:
-        # os.path.basename extrae solo el archivo final, destruyendo rutas maliciosas
-        safe_job_id = os.path.basename(str(job_id))
-        return str(self.passport_dir / f"{safe_job_id}.json")
+        return self.registro.almacen.ruta(job_id)
 
     def crear_pasaporte(self, job_id: str):
-        """Inicializa el archivo JSON en disco."""
-        self._limpiar_archivos_antiguos() # Disparamos la limpieza aquí
+        """Inicializa el pasaporte en memoria y lo escribe al almacén."""
+        # Vencidos en memoria: espaciado (ya no en cada job nuevo). Los archivos los borra el limpiador TTL
+        if self.registro.toca_limpieza():
+            self.registro.expirar(self.TTL_SECONDS)
         
         now = datetime.now()
         passport = PassportData(
@@ -52,20 +215,13 @@ class PassportService:
             detalle=DetalleFase(fase_actual=1, nombre_fase="Inicio", descripcion="Validando archivos..."),
             metricas=MetricasTecnicas()
         )
-        self._guardar(passport)
+        self.registro.guardar(passport, forzar=True)
+        limpiador_ttl.programar(self._get_path(job_id), self.TTL_SECONDS)
         logger.info(f"[{job_id}] Pasaporte creado exitosamente.")
 
     def leer_pasaporte(self, job_id: str) -> dict:
-        """Lee el JSON del disco. Si no existe, retorna None."""
-        path = self._get_path(job_id)
-        if not os.path.exists(path):
-            return None
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"[{job_id}] Error leyendo pasaporte: {e}")
-            return None
+        """Pasaporte desde memoria (o del almacén si el job corre en otro proceso). Si no existe, retorna None."""
+        return self.registro.leer(job_id)
 
     def actualizar(self, job_id: str, 
                     fase: int = None, 
@@ -78,18 +234,21 @@ class PassportService:
                     terminado: bool = False,
                     error: str = None):
         
-        path = self._get_path(job_id)
-        if not os.path.exists(path):
+        try:
+            passport = self.registro.obtener(job_id)
+        except Exception as e:
+            logger.error(f"[{job_id}] Pasaporte ilegible: {e}")
+            return
+        if passport is None:
             logger.warning(f"[{job_id}] Intento de actualizar un pasaporte que no existe o expiró.")
             return
 
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        
-        passport = PassportData(**data)
         now = datetime.now()
         passport.ultima_actualizacion = now.isoformat()
 
+        # Cambios de fase o de estado se escriben de inmediato; el resto espera la ventana
+        forzar = bool((fase and fase != passport.detalle.fase_actual) or (estado and estado != passport.estado))
+
         # 1. Actualizar Estado (Prioridad al argumento explícito)
         if estado: 
             passport.estado = estado
@@ -107,7 +266,8 @@ class PassportService:
         if error:
             passport.estado = "ERROR"
             passport.detalle.descripcion = f"Error: {error}"
-            self._guardar(passport)
+            self.registro.guardar(passport, forzar=True)
+            self.registro.soltar(job_id)
             logger.error(f"[{job_id}] Pasaporte marcado con ERROR: {error}")
             return
 
@@ -116,7 +276,8 @@ class PassportService:
             passport.progreso_porcentaje = 100.0
             passport.detalle.descripcion = "Proceso finalizado con éxito."
             passport.eta_estimado = "Completado"
-            self._guardar(passport)
+            self.registro.guardar(passport, forzar=True)
+            self.registro.soltar(job_id)
             logger.info(f"[{job_id}] Pasaporte completado al 100%.")
             return
 
@@ -151,8 +312,4 @@ class PassportService:
             # Imprimimos en terminal un log en nivel DEBUG para no saturar si hay muchas actualizaciones
             logger.debug(f"[{job_id}] Fase {fase if fase else 'N/A'}: {descripcion}")
 
-        self._guardar(passport)
-
-    def _guardar(self, passport: PassportData):
-        with open(self._get_path(passport.job_id), "w", encoding="utf-8") as f:
-            f.write(passport.model_dump_json(indent=2))
\ No newline at end of file
+        self.registro.guardar(passport, forzar=forzar)
@@ -2,36 +2,97 @@
 
 import asyncio
 import logging
-import copy
-import re
+from typing import Optional
 from fastapi.encoders import jsonable_encoder
 from concurrent.futures import ProcessPoolExecutor
 
 # Imports del proyecto
+from ..core.config import settings
 from ..models.responses_analisisTPV import AnalisisTPV
-from ..core.exceptions import PDFCifradoError
+from ..core.exceptions import PDFCifradoError, ExtraccionCanceladaError
 from ..core.motor_clasificador import MotorClasificador
+from ..core.metricas_documento import sumar_categorias
+from ..core.cruce_traspasos import MOTIVO_CUENTA, MOTIVO_NOMBRE, IndiceTraspasosPropios
 from ..services.storage_service import StorageService
 from ..utils.xlsx_converter import generar_excel_reporte
 
 from .passport_service import PassportService
+from .ipc_pool import BanderaCancelacion, DocumentoCompartido, EjecutorMedido, RefDocumento
+from ..models.tabla_transacciones import TablaTransacciones, como_tabla
 
-from ..core.motor_caratulas import MotorCaratulas
+from ..core.motor_caratulas import MotorCaratulas, analizar_estructura_worker_sync, sondear_documento_worker_sync
 from ..utils.helpers_texto_fluxo import (
     TRIGGERS_CONFIG, PALABRAS_CLAVE_VERIFICACION, 
     ALIAS_A_BANCO_MAP, BANCO_DETECTION_REGEX, 
     PATRONES_COMPILADOS, prompt_base_fluxo,
 )
-from ..utils.helpers import extraer_json_del_markdown, sanitizar_datos_ia, filtrar_caratulas_duplicadas, total_depositos_verificacion
-from ..services.ia_extractor import clasificar_lote_con_ia, analizar_gpt_fluxo, analizar_con_ocr_fluxo
+from ..utils.helpers import extraer_json_del_markdown, sanitizar_datos_ia, firma_caratula, total_depositos_verificacion, crear_objeto_resultado
+from ..services.ia_extractor import clasificar_lote_con_ia, analizar_gpt_fluxo, analizar_con_ocr_fluxo, get_cache_clasificacion, get_despachador_ia
 
 from ..services.orchestators import (
     procesar_digital_worker_sync, 
-    procesar_ocr_worker_sync
+    procesar_ocr_worker_sync,
+    extraer_textract_worker_sync
 )
 
 logger = logging.getLogger(__name__)
 
+# Categorías fuertes que el cruce global de traspasos propios no sobrescribe
+CATEGORIAS_PROTEGIDAS_TRASPASO = {
+    "TPV", "EFECTIVO", "BMRCASH", "FINANCIAMIENTO", 
+    "PAGO_FINANCIAMIENTO", "COMISION_CR", "COMISION_DB", 
+    "COMISION_AMEX", "COMISION_TPV_MIXTA", "MORATORIOS", "IVA" 
+}
+
+def leer_bytes_archivo(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+class RegistroFirmasLote:
+    """
+    Deduplicación global del Job sin barreras: cada documento reclama las firmas de sus carátulas en cuanto
+    termina su carátula y sigue de inmediato. Si dos documentos chocan gana el de menor posición en
+    `lista_archivos` (y dentro del documento, la primera cuenta), no el que terminó primero, así el DUPLICADO
+    es siempre el mismo entre corridas. El perdedor suelta esas cuentas en el punto de control tras la
+    extracción (`conserva`) o, a más tardar, en la barrera del cruce global de traspasos.
+    """
+
+    def __init__(self, hashes_documentos: list):
+        self._duenos = {}  # firma -> (índice del documento, índice de la cuenta)
+        self._hashes = hashes_documentos
+        self._primer_indice_por_hash = {}
+        for indice, hash_documento in enumerate(hashes_documentos):
+            if hash_documento:
+                self._primer_indice_por_hash.setdefault(hash_documento, indice)
+
+    def es_copia_exacta(self, indice: int) -> bool:
+        """Mismo hash (mismos bytes) que un documento anterior del lote: se sabe antes de la carátula."""
+        hash_documento = self._hashes[indice]
+        return bool(hash_documento) and self._primer_indice_por_hash[hash_documento] != indice
+
+    def reclamar(self, indice: int, lista_cuentas: list) -> list:
+        """Registra las firmas del documento y devuelve [(cuenta, firma)] de las que hoy le pertenecen."""
+        firmas = [firma_caratula(cuenta) for cuenta in lista_cuentas]
+        for idx_cuenta, firma in enumerate(firmas):
+            dueno = self._duenos.get(firma)
+            if dueno is None or (indice, idx_cuenta) < dueno:
+                if dueno is not None and dueno[0] != indice:
+                    logger.info(f"[Filtro Duplicados] El documento #{indice} precede al #{dueno[0]}: éste queda como duplicado.")
+                self._duenos[firma] = (indice, idx_cuenta)
+
+        vigentes = []
+        for idx_cuenta, (cuenta, firma) in enumerate(zip(lista_cuentas, firmas)):
+            if self._duenos[firma] == (indice, idx_cuenta):
+                vigentes.append((cuenta, firma))
+            else:
+                banco, rfc, _, _, p_fin, _, _ = firma
+                logger.info(f"[Filtro Duplicados] Se omitió un estado de cuenta duplicado: {banco.upper()} | RFC: {rfc} | Periodo: {p_fin}")
+        return vigentes
+
+    def conserva(self, indice: int, firma: Optional[tuple]) -> bool:
+        """¿La cuenta sigue siendo de este documento? (un documento anterior pudo reclamarla después)."""
+        return firma is None or self._duenos.get(firma, (indice,))[0] == indice
+
 class ProcessingService:
     # Aceptamos las dependencias por constructor
     def __init__(self, file_manager, passport_service, storage_service):
@@ -39,9 +100,6 @@ class ProcessingService:
         self.passport = passport_service 
         self.storage = storage_service
 
-        # --- SEMÁFORO DE CONCURRENCIA ---
-        self.sem_ia = asyncio.Semaphore(20)
-
         # --- INSTANCIA DEL MOTOR DE CARÁTULAS ---
         self.motor_caratulas = MotorCaratulas(
             triggers_config=TRIGGERS_CONFIG,
@@ -49,12 +107,15 @@ class ProcessingService:
             alias_banco_map=ALIAS_A_BANCO_MAP,
             banco_detection_regex=BANCO_DETECTION_REGEX,
             patrones_compilados=PATRONES_COMPILADOS,
-            debug_flags=None
+            debug_flags=None,
+            max_cuentas_concurrentes=settings.CARATULAS_MAX_CUENTAS_CONCURRENTES
         )
 
         # --- INSTANCIA DEL MOTOR CLASIFICADOR (HÍBRIDO V2) ---
         self.motor_clasificador = MotorClasificador(
-            debug_flags=None # Se usará [1, 2, 3, 4] para debuguear si es necesario
+            debug_flags=None, # Se usará [1, 2, 3, 4] para debuguear si es necesario
+            cache_ia=get_cache_clasificacion(), # Compartido por proceso y persistido en disco
+            despachador_ia=get_despachador_ia() # Concurrencia y tokens acotados a nivel proceso (no por documento)
         )
 
     async def ejecutar_pipeline_background(self, job_id: str, lista_archivos: list, pool_global = None):
@@ -63,7 +124,8 @@ class ProcessingService:
         
         Esta función coordina 6 etapas: Análisis de carátulas (I/O Bound), enrutamiento OCR vs Digital,
         extracción paralela en CPU, clasificación masiva con IA, reconciliación global de traspasos
-        y generación de reportes finales (Excel/JSON).
+        y generación de reportes finales (Excel/JSON). Las etapas 1 a 5 corren como pipeline por documento;
+        solo el cruce global de traspasos y los reportes esperan a que terminen todos.
 
         Args:
             job_id (str): Identificador único del proceso asíncrono. Usado para rastrear el pasaporte y archivos.
@@ -92,9 +154,9 @@ class ProcessingService:
         archivos_nuevos = []
         resultados_cacheados_obj = []
         
-        # Obtenemos el JSON de la sesión actual
-        datos_previos = self.storage.obtener_datos_json(job_id) or {}
-        resultados_previos = datos_previos.get("resultados_individuales", [])
+        # De la sesión actual solo cargamos los documentos que se volvieron a subir (por hash)
+        hashes_subidos = {d.get("hash_documento") for d in lista_archivos if d.get("hash_documento")}
+        resultados_previos = await self.storage.obtener_documentos(job_id, hashes_subidos) if hashes_subidos else []
         
         # Mapeamos los resultados previos por su hash
         cache_general = { item.get("hash_documento"): item for item in resultados_previos if item.get("hash_documento") }
@@ -107,6 +169,13 @@ class ProcessingService:
                 logger.info(f"Deduplicación: Rescatando documento de caché -> {filename}")
                 dict_recuperado = cache_general[h_actual].copy()
                 dict_recuperado["nombre_documento"] = filename
+
+                # Las filas del JSON previo vuelven a la tabla columnar (no a objetos Transaccion)
+                detalle_previo = dict_recuperado.get("DetalleTransacciones")
+                if isinstance(detalle_previo, dict) and isinstance(detalle_previo.get("transacciones"), list):
+                    dict_recuperado["DetalleTransacciones"] = {
+                        **detalle_previo, "transacciones": TablaTransacciones.desde_registros(detalle_previo["transacciones"])
+                    }
                 
                 # Parseamos el diccionario de vuelta a un objeto Pydantic para el pipeline
                 resultados_cacheados_obj.append(AnalisisTPV.ResultadoExtraccion(**dict_recuperado))
@@ -119,305 +188,62 @@ class ProcessingService:
         # Aislamos el pipeline: Las Etapas 1 a 5 SOLO trabajarán con esta nueva lista
         lista_archivos = archivos_nuevos
         
-        tareas_analisis = []
-
-        # --- ETAPA 1: PORTADAS (I/O Bound -> Threads o Async nativo) ---
-        self.passport.actualizar(job_id, fase=1, nombre_fase="Análisis Inicial", descripcion="Escaneando estructura de archivos...")
-
-        for doc_info in lista_archivos:
-            self.passport.actualizar(job_id, descripcion=f"Analizando carátula: {doc_info['filename']}")
-            path = doc_info["path"]
-            try:
-                with open(path, "rb") as f:
-                    pdf_bytes = f.read()
-                    
-                    # --- LLAMADA AL MOTOR CENTRALIZADO ---
-                    tarea = self.motor_caratulas.procesar_caratula_completa(
-                        pdf_bytes=pdf_bytes,
-                        prompt_base=prompt_base_fluxo,
-                        analizar_gpt_fn=analizar_gpt_fluxo,
-                        analizar_qwen_fn=analizar_con_ocr_fluxo,
-                        extraer_json_fn=extraer_json_del_markdown,
-                        sanitizar_fn=sanitizar_datos_ia
-                    ) 
-                    tareas_analisis.append(tarea)
-                    
-            except Exception as e:
-                logger.error(f"Error lectura {path}: {e}")
-                # Agregamos una excepción a la lista para manejarla después
-                tareas_analisis.append(asyncio.create_task(self._return_exception(e)))
-
-        # Ejecutamos análisis de portadas en paralelo (I/O bound + API Calls)
-        try:
-            resultados_portada = await asyncio.gather(*tareas_analisis, return_exceptions=True)
-
-        except Exception as e:
-            logger.critical(f"Error crítico en Etapa 1: {e}")
-            self.passport.actualizar(job_id, error=f"Fallo crítico inicial: {e}")
-            return # Detener pipeline
-
-        # --- ETAPA 2: SEPARACIÓN (Digital vs OCR) ---
-        self.passport.actualizar(job_id, fase=2, nombre_fase="Extracción", descripcion="Calculando carga de trabajo...", estado="PROCESANDO")
-        
-        documentos_digitales = []
-        documentos_escaneados = []
-        resultados_finales = [None] * len(lista_archivos)
-
-        # Set global en memoria para la deduplicación de todo el Job
-        firmas_vistas_globales = set() 
-
-        # Calculamos totales globales para decidir estrategia OCR
-        total_depositos, es_mayor = total_depositos_verificacion(resultados_portada)
-
-        for i, resultado_bruto in enumerate(resultados_portada):
-            doc_meta = lista_archivos[i]
-            filename = doc_meta["filename"]
-            file_path = str(doc_meta["path"])
-            hash_actual = doc_meta.get("hash_documento")
-
-            # Manejo de Errores de Etapa 1
-            if isinstance(resultado_bruto, Exception):
-                error_msg = str(resultado_bruto)
-                banco_error = "ERROR_LECTURA"
-                
-                if isinstance(resultado_bruto, PDFCifradoError):
-                    error_msg = "Documento protegido con contraseña."
-                    banco_error = "ERROR_CIFRADO"
-                
-                # Inyectamos el AnalisisIA dummy para que no se pierda en el reporte
-                ia_dummy = AnalisisTPV.ResultadoAnalisisIA(
-                    banco=banco_error,
-                    nombre_archivo_virtual=filename
-                )
-                
-                resultados_finales[i] = AnalisisTPV.ResultadoExtraccion(
-                    nombre_documento=filename,
-                    estatus_documento="fallido",
-                    hash_documento=hash_actual, 
-                    AnalisisIA=ia_dummy, 
-                    DetalleTransacciones=AnalisisTPV.ErrorRespuesta(
-                        nombre_documento=filename,
-                        detalle_error=error_msg,
-                        hash_documento=hash_actual 
-                    )
-                )
-                continue
-
-            # Desempaquetado exitoso
-            lista_cuentas, es_digital, texto_paginas, movimientos_paginas, texto_por_pagina, rangos = resultado_bruto
-
-            # --- LÓGICA DE DEDUPLICACIÓN ---
-            cantidad_original = len(lista_cuentas)
-            lista_cuentas = filtrar_caratulas_duplicadas(lista_cuentas, firmas_vistas_globales)
-            
-            # Si el documento se vació por completo debido a que era un duplicado exacto
-            if cantidad_original > 0 and len(lista_cuentas) == 0:
-                logger.info(f"♻️ Documento omitido por duplicidad global: {filename}")
-                
-                ia_dummy = AnalisisTPV.ResultadoAnalisisIA(
-                    banco="DUPLICADO",
-                    nombre_archivo_virtual=filename
-                )
-                resultados_finales[i] = AnalisisTPV.ResultadoExtraccion(
-                    nombre_documento=filename,
-                    estatus_documento="exitoso", # Se marca exitoso para no disparar alarmas rojas de fallo técnico
-                    hash_documento=hash_actual,
-                    AnalisisIA=ia_dummy, 
-                    DetalleTransacciones=AnalisisTPV.ErrorRespuesta(
-                        nombre_documento=filename,
-                        detalle_error="Omitido: Es un duplicado exacto de otro estado de cuenta en este lote.",
-                        hash_documento=hash_actual
-                    )
-                )
-                continue
-
-            try:
-                for idx_cuenta, datos_cuenta in enumerate(lista_cuentas):
-                    rango = rangos[idx_cuenta]
-                    movimientos_seguros = movimientos_paginas if movimientos_paginas is not None else {}
-                    
-                    item_info = {
-                        "index": i, 
-                        "sub_index": idx_cuenta,
-                        "filename": f"{filename} (Cta {idx_cuenta + 1})",
-                        "file_path": file_path, 
-                        "hash_documento": hash_actual,
-                        "ia_data": datos_cuenta,
-                        "texto_por_pagina": texto_por_pagina,
-                        "movimientos": movimientos_seguros,
-                        "rango_paginas": rango
-                    }
-
-                    if es_digital:
-                        documentos_digitales.append(item_info)
-                    else:
-                        documentos_escaneados.append(item_info)
-
-            except Exception as e:
-                logger.error(f"Error separando cuentas {filename}: {e}")
-                resultados_finales[i] = AnalisisTPV.ResultadoExtraccion(
-                    nombre_documento=filename,
-                    estatus_documento="fallido",
-                    hash_documento=hash_actual,
-                    DetalleTransacciones=AnalisisTPV.ErrorRespuesta(
-                        nombre_documento=filename,
-                        detalle_error="Error interno separando cuentas.",
-                        hash_documento=hash_actual
-                    )
-                )
-
-        # [IMPLEMENTACIÓN DE LÓGICA MATEMÁTICA 1]
-        # Recorremos para saber cuántas páginas digitales vamos a procesar y ajustar el tiempo estimado
-        total_pags_digitales = 0
-        for doc in documentos_digitales:
-            if "rango_paginas" in doc and doc["rango_paginas"]:
-                start, end = doc["rango_paginas"]
-                # Calculamos páginas reales (ej: de la 2 a la 5 son 4 páginas)
-                total_pags_digitales += (end - start + 1)
-        
-        # Actualizamos el pasaporte con la carga de trabajo digital inicial
-        self.passport.actualizar(
-            job_id, 
-            sumar_paginas_digitales=total_pags_digitales,
-            descripcion=f"Carga detectada: {total_pags_digitales} páginas digitales."
-        )
+        # Si por alguna razón no viene el pool global (ej. tests unitarios), creamos uno temporal.
+        # La envoltura mide los bytes que cruzan el pipe del pool en este Job.
+        executor = EjecutorMedido(pool_global if pool_global else ProcessPoolExecutor())
 
-        # --- ETAPA 3: EJECUCIÓN PARALELA (CPU Bound -> ProcessPool) ---
-        self.passport.actualizar(job_id, descripcion="Ejecutando motores de lectura...")
-
-        loop = asyncio.get_running_loop()
-        tareas_digitales = []
-        tareas_ocr = []
-        
         # Lógica OCR
         # Vamos a permitir OCR solo si el monto es mayor a 250k Y no hay más de 15 documentos escaneados (para evitar sobrecarga y tiempos excesivos)
         # procesar_ocr = es_mayor and documentos_escaneados and len(documentos_escaneados) <= 15
         # Para debugueo, puedes forzar el OCR con: procesar_ocr = True
         procesar_ocr = True
 
-        logger.info(f"Ejecutando Workers. Digitales: {len(documentos_digitales)} | OCR: {len(documentos_escaneados)}")
-
-        # Si por alguna razón no viene el pool global (ej. tests unitarios), creamos uno temporal
-        executor = pool_global if pool_global else ProcessPoolExecutor()
-        
-        # ELIMINAMOS el `with ProcessPoolExecutor() as executor:` y desindentamos el bloque interior
-        # A. Digitales
-        for doc in documentos_digitales:
-            tarea = loop.run_in_executor(
-                executor, # Usamos el executor global
-                procesar_digital_worker_sync, 
-                doc["ia_data"],     
-                doc["filename"],
-                str(doc["file_path"]),   
-                doc["rango_paginas"]
-            )
-            tareas_digitales.append((doc["index"], tarea))
-
-        # B. OCR
-        if procesar_ocr:
-            for doc in documentos_escaneados:
-                tarea = loop.run_in_executor(
-                    executor, # Usamos el executor global
-                    procesar_ocr_worker_sync,
-                    doc["ia_data"],
-                    str(doc["file_path"]),
-                    doc["filename"]
-                )
-                tareas_ocr.append((doc["index"], tarea))
-        else:
-            self._manejar_ocr_omitidos(documentos_escaneados, resultados_finales, es_mayor)
-
-        # C. Esperar resultados y actualizar Pasaporte dinámicamente
-        todos_los_futuros = []
-        if tareas_digitales: todos_los_futuros.extend([t[1] for t in tareas_digitales])
-        if tareas_ocr: todos_los_futuros.extend([t[1] for t in tareas_ocr])
+        # Deduplicación de todo el Job: gana el primer documento de la lista, no la primera carátula en terminar
+        deduplicacion = RegistroFirmasLote([d.get("hash_documento") for d in lista_archivos])
 
-        if todos_los_futuros:
-            # [IMPLEMENTACIÓN DE LÓGICA MATEMÁTICA 2]
-            # as_completed nos permite actualizar la barra de progreso conforme termina cada archivo
-            for futuro_completado in asyncio.as_completed(todos_los_futuros):
-                try:
-                    res = await futuro_completado
-                    
-                    # Intentamos extraer el nombre para el log
-                    nombre_archivo = "Desconocido"
-                    if hasattr(res, 'AnalisisIA') and res.AnalisisIA:
-                        nombre_archivo = res.AnalisisIA.nombre_archivo_virtual or "Archivo"
-
-                    # Verificamos si es OCR o Digital
-                    # (Asegúrate de que tu modelo ResultadoExtraccion tenga 'es_digital' o úsalo por defecto)
-                    es_digital = getattr(res, 'es_digital', True) 
-                    
-                    if es_digital:
-                        # Digital: Ya sumamos las páginas al inicio, solo logueamos
-                        self.passport.actualizar(job_id, descripcion=f"Leído: {nombre_archivo}")
-                    else:
-                        # OCR: Sumamos al contador de páginas OCR (que valen 1.5s cada una)
-                        self.passport.actualizar(
-                            job_id, 
-                            descripcion=f"OCR Finalizado: {nombre_archivo}", 
-                            sumar_paginas_ocr=1 # Asumimos 1 página por tarea OCR simple
-                        )
-                        
-                except Exception as e:
-                    logger.error(f"Error en tarea individual: {e}")
-
-        # D. Recoger resultados finales ordenados
-        # (Requerido porque as_completed pierde el orden)
-        resultados_brutos_digitales = []
-        if tareas_digitales:
-            resultados_brutos_digitales = await asyncio.gather(*[t[1] for t in tareas_digitales], return_exceptions=True)
-
-        resultados_brutos_ocr = []
-        ocr_timed_out = False
-        if tareas_ocr:
-            try:
-                resultados_brutos_ocr = await asyncio.wait_for(
-                    asyncio.gather(*[t[1] for t in tareas_ocr], return_exceptions=True),
-                    timeout=13 * 60
-                )
-            except asyncio.TimeoutError:
-                ocr_timed_out = True
-                self._manejar_timeout_ocr(tareas_ocr, documentos_escaneados, resultados_finales)
-
-        # --- ETAPA 4: RECOLECCIÓN ---
-        resultados_fase_2 = self._ensamblar_resultados_crudos(
-            resultados_finales, 
-            tareas_digitales, resultados_brutos_digitales, 
-            tareas_ocr, resultados_brutos_ocr, ocr_timed_out,
-            lista_archivos,
-            documentos_digitales, 
-            documentos_escaneados 
-        )
-
-        # --- ETAPA INTERMEDIA: INYECCIÓN GEOMÉTRICA (SOLO OCR) ---
-        for resultado_doc in resultados_fase_2:
-            if not hasattr(resultado_doc, "file_path_origen"):
-                continue
-
-            if isinstance(resultado_doc.DetalleTransacciones, AnalisisTPV.ErrorRespuesta):
-                continue
-
-            # Si es digital, el Worker Sync YA HIZO la geometría perfecta.
-            # Solo ejecutamos este bloque si NO es digital (es decir, OCR que vino de la IA antigua)
-            if getattr(resultado_doc, "es_digital", True):
-                continue 
+        # ==========================================================
+        # --- ETAPAS 1 A 5: PIPELINE POR DOCUMENTO ---
+        # ==========================================================
+        # Cada PDF avanza carátula -> extracción (ProcessPool) -> clasificación IA en cuanto termina SU etapa
+        # anterior, sin esperar al resto del lote: una llamada de visión lenta ya no frena a los demás.
+        # Solo el cruce global de traspasos (5.5) y los reportes (6) esperan a todos los documentos.
+        self.passport.actualizar(job_id, fase=1, nombre_fase="Análisis Inicial", descripcion="Escaneando estructura de archivos...")
+        avance = {"fase": 1}
 
-        # --- ETAPA 5: CLASIFICACIÓN FINAL Y REGLAS DE NEGOCIO ---
-        self.passport.actualizar(job_id, fase=3, nombre_fase="Clasificación IA", descripcion="Analizando transacciones en paralelo...")
-        logger.info(f"Disparando clasificación masiva para {len(resultados_fase_2)} documentos...")
+        try:
+            resultados_por_documento = await asyncio.gather(*[
+                self._procesar_documento(job_id, i, doc_info, executor, deduplicacion, procesar_ocr, avance)
+                for i, doc_info in enumerate(lista_archivos)
+            ])
 
-        tareas_documentos = []
-        BATCH_SIZE = 100 
-        
-        # Creamos todas las tareas (promesas) sin ejecutarlas aún
-        for resultado_doc in resultados_fase_2:
-            tarea = self._clasificar_documento_async(job_id, resultado_doc, BATCH_SIZE)
-            tareas_documentos.append(tarea)
+        except Exception as e:
+            logger.critical(f"Error crítico en pipeline por documento: {e}")
+            self.passport.actualizar(job_id, error=f"Fallo crítico inicial: {e}")
+            return # Detener pipeline
 
-        # Ejecutamos todos los documentos simultáneamente
-        if tareas_documentos:
-            await asyncio.gather(*tareas_documentos)
+        # --- ETAPA 4: RECOLECCIÓN (en el orden original de los archivos) ---
+        resultados_fase_2 = []
+        ocr_omitidos = []
+        # Con todos los documentos reclamados, la deduplicación queda resuelta: las cuentas que un documento
+        # anterior reclamó después de su punto de control se sueltan aquí
+        for i, (_, resultados_doc, omitidos_doc) in enumerate(resultados_por_documento):
+            vigentes = [r for r in resultados_doc if deduplicacion.conserva(i, r.firma_caratula)]
+            if resultados_doc and not vigentes:
+                logger.info(f"♻️ Documento omitido por duplicidad global: {lista_archivos[i]['filename']}")
+                vigentes = [self._resultado_duplicado(lista_archivos[i]["filename"], lista_archivos[i].get("hash_documento"))]
+            resultados_fase_2.extend(vigentes)
+            ocr_omitidos.extend(c for c in omitidos_doc if deduplicacion.conserva(i, c.get("firma")))
+
+        # La política de OCR depende del total de depósitos del lote: se resuelve cuando ya están todas las carátulas
+        if ocr_omitidos:
+            _, es_mayor = total_depositos_verificacion([res[0] for res in resultados_por_documento])
+            resultados_omitidos = [None] * len(lista_archivos)
+            self._manejar_ocr_omitidos(ocr_omitidos, resultados_omitidos, es_mayor)
+            resultados_fase_2.extend(res for res in resultados_omitidos if res is not None)
+
+        logger.info(f"Pipeline por documento terminado: {len(resultados_fase_2)} resultados.")
+        logger.info(f"IPC ProcessPool (Job {job_id}): {executor.metricas.resumen()}")
+        logger.info(f"Despachador IA: {self.motor_clasificador.despachador_ia.metricas()}")
 
         # =====================================================================
         # --- ETAPA 5.4: INYECCIÓN DE CACHÉ (IDEMPOTENCIA) ---
@@ -458,74 +284,57 @@ class ProcessingService:
 
         logger.info(f"Pool Nombres: {len(nombres_clientes_lote)} | Pool Cuentas: {len(cuentas_lote)}")
 
+        # Nombres limpios e índice de bigramas una sola vez para todo el lote
+        indice_traspasos = IndiceTraspasosPropios(nombres_clientes_lote, cuentas_lote)
+        matches_por_motivo = {MOTIVO_CUENTA: 0, MOTIVO_NOMBRE: 0}
+        cuentas_encontradas = set()
+
         # 2. Segunda pasada masiva sobre todas las transacciones ya procesadas
         for res in resultados_fase_2:
             if not res or isinstance(res.DetalleTransacciones, AnalisisTPV.ErrorRespuesta):
                 continue
 
             ia = res.AnalisisIA
-            transacciones = res.DetalleTransacciones.transacciones
+            transacciones = como_tabla(res.DetalleTransacciones.transacciones)
+            res.DetalleTransacciones.transacciones = transacciones
+
+            # Tipo y categoría vienen codificados: se normalizan una vez por código, no por fila
+            abonos_por_tipo = transacciones.abonos_por_codigo()
+            categorias_norm = transacciones.categorias_normalizadas()
+
+            # Solo el cruce necesita recorrer fila por fila; sin nombres ni cuentas se va directo a las sumas
+            filas_a_cruzar = transacciones.descripciones if indice_traspasos else ()
 
-            suma_abonos_traspaso = 0.0
-            suma_cargos_traspaso = 0.0
+            for i, descripcion in enumerate(filas_a_cruzar):
+                # 3. Cruce por cuenta (prioridad alta) y por nombre del cliente (prioridad media)
+                motivo = indice_traspasos.motivo(descripcion)
+                if not motivo:
+                    continue
+
+                matches_por_motivo[motivo] += 1
+                if motivo == MOTIVO_CUENTA:
+                    cuentas_encontradas.add(indice_traspasos.cuenta_en_descripcion(descripcion))
 
-            for tx in transacciones:
-                tipo_lower = str(tx.tipo).lower().strip()
-                es_abono = tipo_lower in ["abono", "deposito", "depósito", "credito", "crédito"]
+                # 4. Asignación por el match
+                transacciones.sospechosas[i] = 1
                 
-                try:
-                    monto_val = float(str(tx.monto).replace("$", "").replace(",", "").strip())
-                except ValueError:
-                    monto_val = 0.0
-
-                es_propia_global = False
-                desc_lower = str(tx.descripcion).lower()
-
-                # --- 3A. CRUCE POR NÚMERO DE CUENTA (PRIORIDAD ALTA) ---
-                if cuentas_lote:
-                    # Extraemos secuencias numéricas de 10 o más dígitos de la descripción
-                    # Esto ignora montos pequeños, fechas o referencias cortas.
-                    secuencias_numericas = re.findall(r'\b\d{10,18}\b', desc_lower)
-                    
-                    for num_en_desc in secuencias_numericas:
-                        if num_en_desc in cuentas_lote:
-                            es_propia_global = True
-                            self.passport.actualizar(job_id, descripcion=f"Match numérico encontrado: {num_en_desc}")
-                            break # Encontramos la cuenta, no necesitamos buscar más
-
-                # --- 3B. CRUCE POR NOMBRE DEL CLIENTE (PRIORIDAD MEDIA) ---
-                if not es_propia_global and nombres_clientes_lote:
-                    for nombre_original in nombres_clientes_lote:
-                        if self.motor_clasificador._es_transaccion_propia(tx.descripcion, nombre_original):
-                            es_propia_global = True
-                            break
-
-                # 4. Asignación si hubo match
-                if es_propia_global:
-                    tx.es_sospechosa = True
-                    
-                    # PROTEGER CATEGORÍAS FUERTES
-                    cat_previa = str(getattr(tx, "categoria", "GENERAL")).upper().strip()
-                    categorias_protegidas = {
-                        "TPV", "EFECTIVO", "BMRCASH", "FINANCIAMIENTO", 
-                        "PAGO_FINANCIAMIENTO", "COMISION_CR", "COMISION_DB", 
-                        "COMISION_AMEX", "COMISION_TPV_MIXTA", "MORATORIOS", "IVA" 
-                    }
-                    
-                    # Solo sobrescribimos si era GENERAL o un traspaso previo
-                    if cat_previa not in categorias_protegidas:
-                        tx.categoria = "TRASPASO_ABONO" if es_abono else "TRASPASO_CARGO"
+                # PROTEGER CATEGORÍAS FUERTES
+                # Solo sobrescribimos si era GENERAL o un traspaso previo
+                if categorias_norm[transacciones.categorias[i]] not in CATEGORIAS_PROTEGIDAS_TRASPASO:
+                    es_abono = abonos_por_tipo[transacciones.tipos[i]]
+                    transacciones.asignar_categoria(i, "TRASPASO_ABONO" if es_abono else "TRASPASO_CARGO")
 
-                # 5. Sumatorias
-                cat_actual = str(getattr(tx, "categoria", "GENERAL")).upper().strip()
-                if cat_actual == "TRASPASO_ABONO":
-                    suma_abonos_traspaso += monto_val
-                elif cat_actual == "TRASPASO_CARGO":
-                    suma_cargos_traspaso += monto_val
+            # 5. Sumatorias: group-by vectorizado sobre la categoría ya reasignada
+            traspasos = sumar_categorias(transacciones, ("TRASPASO_ABONO", "TRASPASO_CARGO"))
 
             # Actualizamos el objeto AnalisisIA
-            ia.traspasos_abonos = suma_abonos_traspaso
-            ia.traspasos_cargos = suma_cargos_traspaso
+            ia.traspasos_abonos = traspasos["TRASPASO_ABONO"]
+            ia.traspasos_cargos = traspasos["TRASPASO_CARGO"]
+
+        # Un solo aviso al pasaporte con todas las cuentas encontradas (no una escritura por match)
+        logger.info(f"Cruce global: {matches_por_motivo[MOTIVO_CUENTA]} matches por cuenta | {matches_por_motivo[MOTIVO_NOMBRE]} por nombre")
+        if cuentas_encontradas:
+            self.passport.actualizar(job_id, descripcion=f"Match numérico encontrado: {', '.join(sorted(cuentas_encontradas))}")
 
         # --- SAFETY CHECK ---
         conteo_validos = len([r for r in resultados_fase_2 if r is not None])
@@ -533,7 +342,7 @@ class ProcessingService:
         
         # --- ETAPA 6: GENERACIÓN DE REPORTES ---
         self.passport.actualizar(job_id, fase=4, nombre_fase="Generando Reportes", descripcion="Escribiendo Excel y JSON...")
-        self._generar_y_guardar_reportes(resultados_fase_2, job_id)
+        await self._generar_y_guardar_reportes(resultados_fase_2, job_id)
 
         # --- LIMPIEZA FINAL ---
         self.file_manager.limpiar_temporales(todas_las_rutas_temporales) # <-- Usamos la variable de la Etapa 0
@@ -543,9 +352,335 @@ class ProcessingService:
         self.passport.actualizar(job_id, fase=5, nombre_fase="Completado", terminado=True)
 
     # --- MÉTODOS AUXILIARES PRIVADOS (Para mantener limpio el método principal) ---
-    async def _return_exception(self, e):
-        logger.error(f"Error en tarea asíncrona: {e}")
-        return e
+    async def _analizar_caratula(self, pdf_bytes: bytes, ref_documento: RefDocumento, executor):
+        """
+        Etapa 1 de un documento. La parte CPU (texto por página, rangos, digital vs escaneado) corre en el
+        ProcessPool sobre la memoria compartida; en el event loop solo quedan las llamadas a los modelos.
+        Cualquier excepción (ej. PDFCifradoError) se propaga al pipeline del documento.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            estructura = await loop.run_in_executor(executor, analizar_estructura_worker_sync, self.motor_caratulas, ref_documento)
+        except Exception as e:
+            logger.error(f"Error lectura {ref_documento.ruta}: {e}")
+            raise
+
+        return await self.motor_caratulas.procesar_caratula_completa(
+            pdf_bytes=pdf_bytes,
+            prompt_base=prompt_base_fluxo,
+            analizar_gpt_fn=analizar_gpt_fluxo,
+            analizar_qwen_fn=analizar_con_ocr_fluxo,
+            extraer_json_fn=extraer_json_del_markdown,
+            sanitizar_fn=sanitizar_datos_ia,
+            estructura=estructura
+        )
+
+    async def _iniciar_ocr_temprano(self, ref_documento: RefDocumento, filename: str, executor):
+        """
+        Corre la sonda digital/escaneado en el pool y, solo si está segura de que el documento es un escaneado
+        (umbrales estrictos de texto y cobertura de imagen), lanza Textract en paralelo a la carátula.
+        Devuelve (futuro, bandera de cancelación) o (None, None).
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            sonda = await loop.run_in_executor(executor, sondear_documento_worker_sync, self.motor_caratulas, ref_documento)
+        except Exception as e:
+            # Cifrados o PDFs corruptos: la carátula reportará el error; aquí solo no hay ruteo temprano
+            logger.debug(f"Sonda de ruteo omitida para {filename}: {e}")
+            return None, None
+
+        logger.info(f"Sonda de ruteo {filename}: {sonda}")
+        if not sonda.get("escaneado_confiable"):
+            return None, None
+        # Textract rasteriza con poppler desde la ruta: este worker sí lee de disco
+        cancelacion = BanderaCancelacion(f"{ref_documento.ruta}.cancelar")
+        cancelacion.limpiar()
+        return asyncio.ensure_future(loop.run_in_executor(executor, extraer_textract_worker_sync, ref_documento.ruta, cancelacion)), cancelacion
+
+    @staticmethod
+    def _descartar_extraccion(extraccion, cancelacion: BanderaCancelacion):
+        """
+        Descarta una extracción Textract temprana que el pipeline ya no usará. `cancel()` no detiene al worker:
+        la bandera hace que no envíe las páginas que faltan; el marcador se borra cuando el worker termina.
+        """
+        cancelacion.activar()
+
+        def _al_terminar(futuro):
+            cancelacion.limpiar()
+            if not futuro.cancelled() and isinstance(futuro.exception(), ExtraccionCanceladaError):
+                logger.info(f"Extracción Textract temprana detenida: {futuro.exception()}")
+
+        extraccion.add_done_callback(_al_terminar)
+
+    async def _ejecutar_ocr_cuenta(self, cuenta: dict, executor, extraccion_ocr=None, timeout_seg: float = 13 * 60):
+        """
+        Extracción OCR de una cuenta. Reutiliza la pasada de Textract del documento (compartida entre
+        sus cuentas); si esa pasada falló, cae al flujo normal dentro del worker.
+        """
+        loop = asyncio.get_running_loop()
+
+        async def _ejecutar():
+            extraccion_previa = None
+            if extraccion_ocr is not None:
+                try:
+                    extraccion_previa = await asyncio.shield(extraccion_ocr)
+                except Exception as e:
+                    logger.warning(f"Extracción Textract compartida falló para {cuenta['filename']}, reintentando en el worker: {e}")
+            return await loop.run_in_executor(
+                executor, procesar_ocr_worker_sync,
+                cuenta["ia_data"], cuenta["file_path"], cuenta["filename"], extraccion_previa
+            )
+
+        return await asyncio.wait_for(_ejecutar(), timeout=timeout_seg)
+
+    def _avanzar_fase(self, job_id: str, avance: dict, fase: int, nombre_fase: str, **kwargs):
+        """Con documentos en etapas distintas, la fase del pasaporte solo avanza (nunca retrocede)."""
+        if fase > avance["fase"]:
+            avance["fase"] = fase
+            self.passport.actualizar(job_id, fase=fase, nombre_fase=nombre_fase, **kwargs)
+
+    @staticmethod
+    def _resultado_duplicado(filename: str, hash_documento: Optional[str]) -> AnalisisTPV.ResultadoExtraccion:
+        ia_dummy = AnalisisTPV.ResultadoAnalisisIA(
+            banco="DUPLICADO",
+            nombre_archivo_virtual=filename
+        )
+        return AnalisisTPV.ResultadoExtraccion(
+            nombre_documento=filename,
+            estatus_documento="exitoso", # Se marca exitoso para no disparar alarmas rojas de fallo técnico
+            hash_documento=hash_documento,
+            AnalisisIA=ia_dummy,
+            DetalleTransacciones=AnalisisTPV.ErrorRespuesta(
+                nombre_documento=filename,
+                detalle_error="Omitido: Es un duplicado exacto de otro estado de cuenta en este lote.",
+                hash_documento=hash_documento
+            )
+        )
+
+    async def _procesar_documento(self, job_id, indice, doc_info, executor, deduplicacion, procesar_ocr, avance):
+        """
+        Lee el PDF una sola vez y lo publica en memoria compartida mientras dura su pipeline: los workers
+        (estructura, sonda, extracción espacial) lo abren de ahí en vez de releer el archivo de disco.
+        """
+        file_path = str(doc_info["path"])
+
+        # Copia byte a byte de un documento anterior del lote: DUPLICADO sin leerla, sin carátula ni extracción
+        if deduplicacion.es_copia_exacta(indice):
+            logger.info(f"♻️ Documento omitido por duplicidad global (mismo hash): {doc_info['filename']}")
+            return ([], False, "", {}, {}, []), [self._resultado_duplicado(doc_info["filename"], doc_info.get("hash_documento"))], []
+
+        try:
+            pdf_bytes = await asyncio.to_thread(leer_bytes_archivo, file_path)
+        except Exception as e:
+            logger.error(f"Error lectura {file_path}: {e}")
+            pdf_bytes = e
+
+        documento = DocumentoCompartido(pdf_bytes if isinstance(pdf_bytes, bytes) else b"", file_path)
+        with documento as ref_documento:
+            return await self._pipeline_documento(
+                job_id, indice, doc_info, pdf_bytes, ref_documento, executor, deduplicacion, procesar_ocr, avance,
+                liberar_memoria=documento.liberar
+            )
+
+    async def _pipeline_documento(self, job_id, indice, doc_info, pdf_bytes, ref_documento, executor, deduplicacion, procesar_ocr, avance, liberar_memoria=None):
+        """
+        Pipeline de UN documento: carátula -> separación digital/OCR -> extracción en el ProcessPool ->
+        clasificación IA. Cada etapa arranca en cuanto termina la anterior de este mismo documento.
+        `liberar_memoria` suelta el segmento compartido del PDF en cuanto los workers terminan de leerlo.
+
+        Returns:
+            Tuple:
+                - Resultado bruto de la carátula (o la excepción), para el cálculo global de depósitos.
+                - List[ResultadoExtraccion]: Resultados del documento (uno por cuenta, o el de error).
+                - List[Dict]: Cuentas escaneadas que no pasaron a OCR (se resuelven al final del lote).
+        """
+        filename = doc_info["filename"]
+        file_path = str(doc_info["path"])
+        hash_actual = doc_info.get("hash_documento")
+
+        # --- ETAPA 1: PORTADA + SONDA DE RUTEO TEMPRANO ---
+        self.passport.actualizar(job_id, descripcion=f"Analizando carátula: {filename}")
+        extraccion_ocr, cancelacion_ocr = None, None
+        if isinstance(pdf_bytes, Exception):
+            resultado_bruto = pdf_bytes  # Falló la lectura: se reporta como error de Etapa 1
+        else:
+            tarea_caratula = asyncio.ensure_future(self._analizar_caratula(pdf_bytes, ref_documento, executor))
+
+            # Si la sonda (primeras páginas, sin LLM) está segura de que es escaneado, Textract arranca YA, en
+            # paralelo a la carátula
+            if procesar_ocr:
+                extraccion_ocr, cancelacion_ocr = await self._iniciar_ocr_temprano(ref_documento, filename, executor)
+
+            try:
+                resultado_bruto = await tarea_caratula
+            except Exception as e:
+                resultado_bruto = e
+
+        # El veredicto definitivo es el de la carátula: si no es escaneado (o falló), la extracción temprana se detiene
+        if extraccion_ocr is not None and (isinstance(resultado_bruto, Exception) or resultado_bruto[1]):
+            logger.info(f"Ruteo temprano descartado para {filename}: la carátula no lo confirmó como escaneado.")
+            self._descartar_extraccion(extraccion_ocr, cancelacion_ocr)
+            extraccion_ocr = None
+
+        # --- ETAPA 2: SEPARACIÓN (Digital vs OCR) ---
+        self._avanzar_fase(job_id, avance, 2, "Extracción", descripcion="Calculando carga de trabajo...", estado="PROCESANDO")
+
+        # Manejo de Errores de Etapa 1
+        if isinstance(resultado_bruto, Exception):
+            error_msg = str(resultado_bruto)
+            banco_error = "ERROR_LECTURA"
+            
+            if isinstance(resultado_bruto, PDFCifradoError):
+                error_msg = "Documento protegido con contraseña."
+                banco_error = "ERROR_CIFRADO"
+            
+            # Inyectamos el AnalisisIA dummy para que no se pierda en el reporte
+            ia_dummy = AnalisisTPV.ResultadoAnalisisIA(
+                banco=banco_error,
+                nombre_archivo_virtual=filename
+            )
+            
+            return resultado_bruto, [AnalisisTPV.ResultadoExtraccion(
+                nombre_documento=filename,
+                estatus_documento="fallido",
+                hash_documento=hash_actual, 
+                AnalisisIA=ia_dummy, 
+                DetalleTransacciones=AnalisisTPV.ErrorRespuesta(
+                    nombre_documento=filename,
+                    detalle_error=error_msg,
+                    hash_documento=hash_actual 
+                )
+            )], []
+
+        # Desempaquetado exitoso
+        lista_cuentas, es_digital, texto_paginas, movimientos_paginas, texto_por_pagina, rangos = resultado_bruto
+
+        # --- LÓGICA DE DEDUPLICACIÓN ---
+        # Sin esperar a nadie: si un documento anterior de la lista ya tiene la firma, esta cuenta se omite;
+        # si un anterior la reclama después, esta cuenta se suelta en el punto de control tras la extracción
+        cantidad_original = len(lista_cuentas)
+        vigentes = deduplicacion.reclamar(indice, lista_cuentas)
+        lista_cuentas = [cuenta for cuenta, _ in vigentes]
+        firmas_cuentas = [firma for _, firma in vigentes]
+        
+        # Si el documento se vació por completo debido a que era un duplicado exacto
+        if cantidad_original > 0 and len(lista_cuentas) == 0:
+            logger.info(f"♻️ Documento omitido por duplicidad global: {filename}")
+            if extraccion_ocr is not None:
+                self._descartar_extraccion(extraccion_ocr, cancelacion_ocr)
+            return resultado_bruto, [self._resultado_duplicado(filename, hash_actual)], []
+
+        try:
+            movimientos_seguros = movimientos_paginas if movimientos_paginas is not None else {}
+            cuentas = [
+                {
+                    "index": indice, 
+                    "sub_index": idx_cuenta,
+                    "filename": f"{filename} (Cta {idx_cuenta + 1})",
+                    "file_path": file_path, 
+                    "hash_documento": hash_actual,
+                    "ia_data": datos_cuenta,
+                    "texto_por_pagina": texto_por_pagina,
+                    "movimientos": movimientos_seguros,
+                    "rango_paginas": rangos[idx_cuenta],
+                    "firma": firmas_cuentas[idx_cuenta]
+                }
+                for idx_cuenta, datos_cuenta in enumerate(lista_cuentas)
+            ]
+        except Exception as e:
+            logger.error(f"Error separando cuentas {filename}: {e}")
+            if extraccion_ocr is not None:
+                self._descartar_extraccion(extraccion_ocr, cancelacion_ocr)
+            return resultado_bruto, [AnalisisTPV.ResultadoExtraccion(
+                nombre_documento=filename,
+                estatus_documento="fallido",
+                hash_documento=hash_actual,
+                DetalleTransacciones=AnalisisTPV.ErrorRespuesta(
+                    nombre_documento=filename,
+                    detalle_error="Error interno separando cuentas.",
+                    hash_documento=hash_actual
+                )
+            )], []
+
+        if not es_digital and not procesar_ocr:
+            return resultado_bruto, [], cuentas
+
+        # --- ETAPA 3: EXTRACCIÓN (CPU Bound -> ProcessPool) ---
+        loop = asyncio.get_running_loop()
+        if es_digital:
+            # Páginas reales de cada rango (ej: de la 2 a la 5 son 4 páginas) para ajustar el tiempo estimado
+            total_pags_digitales = sum(fin - inicio + 1 for inicio, fin in (c["rango_paginas"] for c in cuentas if c["rango_paginas"]))
+            self.passport.actualizar(
+                job_id, 
+                sumar_paginas_digitales=total_pags_digitales,
+                descripcion=f"Carga detectada: {total_pags_digitales} páginas digitales ({filename})."
+            )
+            tareas = [
+                (c["index"], loop.run_in_executor(
+                    executor, procesar_digital_worker_sync,
+                    c["ia_data"], c["filename"], c["file_path"], c["rango_paginas"], ref_documento
+                ))
+                for c in cuentas
+            ]
+        else:
+            # Si la sonda no estaba segura, Textract se lanza hasta ahora (escaneado confirmado y no duplicado).
+            # Una sola pasada por documento, compartida entre sus cuentas (rasteriza con poppler desde la ruta)
+            if extraccion_ocr is None:
+                extraccion_ocr = asyncio.ensure_future(loop.run_in_executor(executor, extraer_textract_worker_sync, file_path))
+            tareas = [
+                (c["index"], self._ejecutar_ocr_cuenta(c, executor, extraccion_ocr))
+                for c in cuentas
+            ]
+
+        resultados_brutos = await asyncio.gather(*[t[1] for t in tareas], return_exceptions=True)
+
+        # Ningún worker vuelve a leer el PDF: el segmento no debe ocupar /dev/shm durante la clasificación IA
+        if liberar_memoria is not None:
+            liberar_memoria()
+
+        # Los workers devuelven resultados compactos (TablaTransacciones); aquí se arma el objeto Pydantic
+        # que la envuelve, sin convertir fila por fila
+        resultados_brutos = [
+            crear_objeto_resultado(res) if isinstance(res, dict) else res
+            for res in resultados_brutos
+        ]
+
+        # --- PUNTO DE CONTROL DE DUPLICADOS ---
+        # Un documento anterior de la lista pudo reclamar estas firmas mientras se extraía: esas cuentas se
+        # descartan aquí, antes de gastar en la clasificación IA
+        conservadas = [k for k, c in enumerate(cuentas) if deduplicacion.conserva(indice, c["firma"])]
+        if len(conservadas) < len(cuentas):
+            logger.info(f"♻️ {len(cuentas) - len(conservadas)} cuenta(s) de {filename} resultaron duplicadas de un documento anterior.")
+            if not conservadas:
+                return resultado_bruto, [self._resultado_duplicado(filename, hash_actual)], []
+            tareas = [tareas[k] for k in conservadas]
+            resultados_brutos = [resultados_brutos[k] for k in conservadas]
+            cuentas = [cuentas[k] for k in conservadas]
+
+        if es_digital:
+            self.passport.actualizar(job_id, descripcion=f"Leído: {filename}")
+        else:
+            if any(isinstance(res, asyncio.TimeoutError) for res in resultados_brutos):
+                resultados_timeout = {}
+                self._manejar_timeout_ocr(tareas, cuentas, resultados_timeout)
+                return resultado_bruto, list(resultados_timeout.values()), []
+            # OCR: Sumamos al contador de páginas OCR (que valen 1.5s cada una)
+            self.passport.actualizar(job_id, descripcion=f"OCR Finalizado: {filename}", sumar_paginas_ocr=len(tareas))
+
+        resultados_doc = self._ensamblar_resultados_crudos(
+            [],
+            tareas if es_digital else [], resultados_brutos if es_digital else [],
+            [] if es_digital else tareas, [] if es_digital else resultados_brutos, False,
+            [doc_info],
+            cuentas if es_digital else [],
+            [] if es_digital else cuentas
+        )
+
+        # --- ETAPA 5: CLASIFICACIÓN (el despachador IA mezcla los lotes de todos los documentos en vuelo) ---
+        self._avanzar_fase(job_id, avance, 3, "Clasificación IA", descripcion="Analizando transacciones en paralelo...")
+        await asyncio.gather(*[self._clasificar_documento_async(job_id, res) for res in resultados_doc])
+
+        return resultado_bruto, resultados_doc, []
 
     def _manejar_ocr_omitidos(self, docs_escaneados, resultados_finales, es_mayor):
         if not docs_escaneados: return
@@ -625,6 +760,7 @@ class ProcessingService:
                     res_model.file_path_origen = contexto["file_path"]
                     res_model.rango_paginas = contexto.get("rango_paginas", (1, 100))
                     res_model.es_digital = es_digital_flag
+                    res_model.firma_caratula = contexto.get("firma")
                     acumulados.append(res_model)
                     continue
 
@@ -636,20 +772,20 @@ class ProcessingService:
                             # Mapeamos la salida del Engine a la estructura de Fluxo
                             txs_raw = item.get("transacciones", [])
                             
-                            # Crear objetos Transaccion
-                            txs_objs = []
+                            # Tabla columnar de transacciones
+                            tabla_txs = TablaTransacciones()
                             for t in txs_raw:
-                                txs_objs.append(AnalisisTPV.Transaccion(
+                                tabla_txs.agregar(
                                     fecha=t.get("fecha", ""),
                                     periodo=t.get("periodo", ""),
                                     descripcion=t.get("descripcion", ""),
-                                    monto=str(t.get("monto", "0.0")),
+                                    monto=t.get("monto", 0.0),
                                     tipo=t.get("tipo", "DESCONOCIDO"),
                                     categoria="GENERAL" # Default
-                                ))
+                                )
 
                             # Crear ResultadoTPV
-                            detalle_tpv = AnalisisTPV.ResultadoTPV(transacciones=txs_objs)
+                            detalle_tpv = AnalisisTPV.ResultadoTPV(transacciones=tabla_txs)
                             
                             # Crear ResultadoAnalisisIA (Caratula dummy o parcial si la tienes)
                             analisis_ia = AnalisisTPV.ResultadoAnalisisIA(
@@ -677,6 +813,7 @@ class ProcessingService:
                         item_obj.file_path_origen = contexto["file_path"]
                         item_obj.rango_paginas = contexto.get("rango_paginas", (1, 100))
                         item_obj.es_digital = es_digital_flag
+                        item_obj.firma_caratula = contexto.get("firma")
                         acumulados.append(item_obj)
 
                 # --- CASO 3: OBJETO ÚNICO ---
@@ -693,6 +830,7 @@ class ProcessingService:
                     res.file_path_origen = contexto["file_path"]
                     res.rango_paginas = contexto.get("rango_paginas", (1, 100))
                     res.es_digital = es_digital_flag
+                    res.firma_caratula = contexto.get("firma")
                     acumulados.append(res)
 
         # Procesamos Digitales
@@ -713,7 +851,7 @@ class ProcessingService:
                 
         return acumulados
 
-    def _generar_y_guardar_reportes(self, resultados_acumulados, job_id):
+    async def _generar_y_guardar_reportes(self, resultados_acumulados, job_id):
         # 1. Filtro estricto
         resultados_validos = [r for r in resultados_acumulados if r is not None]
         
@@ -752,14 +890,14 @@ class ProcessingService:
             datos_dict = jsonable_encoder(respuesta_final)
 
         # 4. Generar Archivos
-        # Pasamos el DICCIONARIO YA SERIALIZADO al excel, no el objeto
+        # Pasamos el DICCIONARIO YA SERIALIZADO al excel, no el objeto (solo lo lee: no hace falta copiarlo)
         try:
-            excel_bytes = generar_excel_reporte(copy.deepcopy(datos_dict)) 
-            self.storage.guardar_excel_local(excel_bytes, job_id)
+            excel_bytes = await asyncio.to_thread(generar_excel_reporte, datos_dict)
+            await self.storage.guardar_excel(excel_bytes, job_id)
         except Exception as e:
             logger.error(f"Error generando Excel: {e}")
 
-        self.storage.guardar_json_local(datos_dict, job_id)
+        await self.storage.guardar_resultado(datos_dict, job_id)
     
     async def _clasificar_documento_async(self, job_id, resultado_doc, BATCH_SIZE=100):
         """
@@ -783,27 +921,29 @@ class ProcessingService:
             raw_dict = resultado_doc.DetalleTransacciones
             lista_cruda = raw_dict.get("transacciones", [])
             
-            tx_objs = []
+            tabla_txs = TablaTransacciones()
             for tx in lista_cruda:
                 if isinstance(tx, dict):
                     # --- NORMALIZACIÓN FUERTE DE TIPO ---
                     tipo_raw = str(tx.get("tipo", "")).lower().strip()
                     tipo_limpio = "abono" if tipo_raw in ["abono", "deposito", "depósito", "credito", "crédito"] else "cargo"
                     
-                    tx_objs.append(AnalisisTPV.Transaccion(
+                    tabla_txs.agregar(
                         fecha=tx.get("fecha", ""),
                         periodo=tx.get("periodo", ""),
                         descripcion=tx.get("descripcion", ""),
-                        monto=str(tx.get("monto", "0.0")),
+                        monto=tx.get("monto", 0.0),
                         tipo=tipo_limpio, 
                         categoria="GENERAL"
-                    ))
+                    )
                 else:
-                    tx_objs.append(tx)
+                    tabla_txs.agregar(**tx.model_dump())
             
-            resultado_doc.DetalleTransacciones = AnalisisTPV.ResultadoTPV(transacciones=tx_objs)
+            resultado_doc.DetalleTransacciones = AnalisisTPV.ResultadoTPV(transacciones=tabla_txs)
 
-        transacciones = resultado_doc.DetalleTransacciones.transacciones
+        # Clasificación, totales y confianza trabajan sobre la tabla columnar (misma instancia que irá al reporte)
+        transacciones = como_tabla(resultado_doc.DetalleTransacciones.transacciones)
+        resultado_doc.DetalleTransacciones.transacciones = transacciones
         # --- LOGS MOMENTANEOS ---
         if not transacciones:
             logger.warning(f"[TRACKING OCR - 4] {nombre_doc} descartado: 0 transacciones para clasificar.")
@@ -818,7 +958,7 @@ class ProcessingService:
         self.passport.actualizar(job_id, sumar_transacciones=len(transacciones), descripcion=f"Clasificando {len(transacciones)} movs...")
 
         # --- MAGIA DEL MOTOR CLASIFICADOR ---
-        totales = await self.motor_clasificador.clasificar_y_sumar_transacciones(
+        await self.motor_clasificador.clasificar_transacciones(
             transacciones=transacciones,
             banco=banco_actual,
             funcion_ia_clasificadora=clasificar_lote_con_ia,
@@ -826,8 +966,24 @@ class ProcessingService:
             nombre_cliente=resultado_doc.AnalisisIA.nombre_cliente or ""
         )
 
-        # --- INYECCIÓN DE RESULTADOS AL OBJETO PADRE ---
         analisis_ia = resultado_doc.AnalisisIA
+
+        # Totales declarados en la carátula (referencia para confianza y descuadres)
+        depositos_caratula = 0.0
+        cargos_caratula = 0.0
+        try:
+            if analisis_ia.depositos:
+                depositos_caratula = float(str(analisis_ia.depositos).replace(',', '').replace('$', ''))
+            if analisis_ia.cargos:
+                cargos_caratula = float(str(analisis_ia.cargos).replace(',', '').replace('$', ''))
+        except ValueError:
+            pass
+
+        # --- AGREGACIÓN ÚNICA (NumPy group-by): totales por categoría, confianza, tasa y descuadres ---
+        metricas = self.motor_clasificador.calcular_metricas(transacciones, depositos_caratula, cargos_caratula)
+        totales = metricas.totales
+
+        # --- INYECCIÓN DE RESULTADOS AL OBJETO PADRE ---
         analisis_ia.depositos_en_efectivo = totales.get("EFECTIVO", 0.0)
         
         # --- INYECCIÓN DE COMISIONES TPV ---
@@ -868,76 +1024,25 @@ class ProcessingService:
         analisis_ia.entradas_TPV_neto = totales.get("TPV", 0.0) - comisiones
 
         # =========================================================
-        # CÁLCULO DE CONFIANZA DE EXTRACCIÓN
+        # CÁLCULO DE CONFIANZA DE EXTRACCIÓN (ya agregado en `metricas`)
         # =========================================================
-        suma_abonos = 0.0
-        suma_cargos = 0.0
-
-        total_txs = len(transacciones)
-        txs_clasificadas = 0
-        
-        # 1. Sumar los movimientos reales y contar categorías
-        for tx in transacciones:
-            # Contar categorización
-            if hasattr(tx, 'categoria') and tx.categoria != "GENERAL":
-                txs_clasificadas += 1
-
-            # Sumar montos
-            try:
-                monto_val = float(str(tx.monto).replace(',', '').replace('$', ''))
-                # FORZAMOS MAYÚSCULA
-                tipo_limpio = str(tx.tipo).upper().strip() 
-                
-                if tipo_limpio == "ABONO":
-                    suma_abonos += monto_val
-                elif tipo_limpio == "CARGO":
-                    suma_cargos += monto_val
-            except ValueError:
-                continue
-
-        # 2. Obtener los totales declarados en la carátula
-        depositos_caratula = 0.0
-        cargos_caratula = 0.0
-        try:
-            if analisis_ia.depositos:
-                depositos_caratula = float(str(analisis_ia.depositos).replace(',', '').replace('$', ''))
-            if analisis_ia.cargos:
-                cargos_caratula = float(str(analisis_ia.cargos).replace(',', '').replace('$', ''))
-        except ValueError:
-            pass
-
-        # 3. Función auxiliar para calcular similitud (0 a 100%)
-        def calcular_similitud(extraido: float, caratula: float) -> float:
-            if caratula == 0 and extraido == 0:
-                return 100.0 # Perfecto, no había nada y no extrajimos nada
-            if caratula == 0 or extraido == 0:
-                return 0.0   # Descuadre total (algo vs nada)
-            # El ratio siempre es el menor entre el mayor, para no superar el 100%
-            return (min(extraido, caratula) / max(extraido, caratula)) * 100.0
-
-        # 4. Calcular métricas por columna y promediar
-        confianza_dep = calcular_similitud(suma_abonos, depositos_caratula)
-        confianza_car = calcular_similitud(suma_cargos, cargos_caratula)
-        
-        confianza_global = round((confianza_dep + confianza_car) / 2.0, 2)
-        
-        # 5. Inyectar al objeto
+        # Similitud 0-100% por columna (depósitos y cargos) promediada
+        confianza_global = metricas.confianza_global
         analisis_ia.confianza_extraccion = confianza_global
 
-        # 6. Inyectar las sumas 
-        analisis_ia.total_depositos_extraidos = suma_abonos
-        analisis_ia.total_cargos_extraidos = suma_cargos
+        # Sumas de movimientos reales (tipo ABONO / CARGO)
+        analisis_ia.total_depositos_extraidos = metricas.suma_abonos
+        analisis_ia.total_cargos_extraidos = metricas.suma_cargos
         
         # --- MÉTRICA 1: DESCUADRE MONETARIO ---
-        # Usamos abs() para que siempre sea positivo, sin importar si faltó o sobró dinero
-        descuadre_dep = abs(depositos_caratula - suma_abonos)
-        descuadre_car = abs(cargos_caratula - suma_cargos)
+        descuadre_dep = metricas.descuadre_depositos
+        descuadre_car = metricas.descuadre_cargos
         
         analisis_ia.descuadre_depositos = descuadre_dep
         analisis_ia.descuadre_cargos = descuadre_car
         
-        # --- MÉTRICA 2: CÁLCULO FINAL DE TASA DE CATEGORIZACIÓN ---
-        tasa_cat = (txs_clasificadas / total_txs * 100.0) if total_txs > 0 else 0.0
+        # --- MÉTRICA 2: TASA DE CATEGORIZACIÓN ---
+        tasa_cat = metricas.tasa_categorizacion
         analisis_ia.tasa_categorizacion = round(tasa_cat, 2)
 
         # --- MÉTRICA 3: CONTEO DE PÁGINAS FALLIDAS ---
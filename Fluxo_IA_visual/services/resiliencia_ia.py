@@ -0,0 +1,282 @@
+# services/resiliencia_ia.py
+
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional
+from urllib.parse import urlparse
+
+from ..core.exceptions import CircuitoAbiertoError
+
+logger = logging.getLogger(__name__)
+
+# Errores HTTP que vale la pena reintentar: rate limit, timeout del upstream y fallas del servidor
+ESTADOS_REINTENTABLES = {408, 409, 429, 500, 502, 503, 504}
+
+# Quien acota la concurrencia (ej. DespachadorLotesIA) publica aquí cómo reservar un cupo para el hedge:
+# una corrutina sin argumentos que regresa la función de liberación, o None si no hay cupo libre.
+# Sin valor (llamadas fuera del despachador) el hedge no tiene límites que respetar.
+reserva_hedge: ContextVar[Optional[Callable[[], Awaitable[Optional[Callable[[], None]]]]]] = ContextVar("reserva_hedge", default=None)
+
+class MetricasModelo:
+    """Contadores por modelo: llamadas, reintentos, fallos, hedges y ventana de latencias (p50/p95)."""
+
+    def __init__(self, ventana: int = 200):
+        self.llamadas = 0
+        self.exitos = 0
+        self.fallos = 0
+        self.reintentos = 0
+        self.hedges = 0
+        self.hedges_ganados = 0
+        self.hedges_sin_cupo = 0
+        self.latencias = deque(maxlen=ventana)
+
+    def percentil(self, p: float) -> Optional[float]:
+        if not self.latencias:
+            return None
+        ordenadas = sorted(self.latencias)
+        return ordenadas[min(len(ordenadas) - 1, int(p * len(ordenadas)))]
+
+    def resumen(self) -> dict:
+        p50, p95 = self.percentil(0.50), self.percentil(0.95)
+        return {
+            "llamadas": self.llamadas,
+            "exitos": self.exitos,
+            "fallos": self.fallos,
+            "reintentos": self.reintentos,
+            "hedges": self.hedges,
+            "hedges_ganados": self.hedges_ganados,
+            "hedges_sin_cupo": self.hedges_sin_cupo,
+            "latencia_p50_seg": round(p50, 3) if p50 is not None else None,
+            "latencia_p95_seg": round(p95, 3) if p95 is not None else None,
+        }
+
+class CircuitBreaker:
+    """
+    Cortacircuitos por proveedor (OpenAI, OpenRouter...).
+    CERRADO -> (N fallos seguidos) -> ABIERTO -> (reposo) -> SEMI_ABIERTO -> 1 prueba decide.
+    Mientras está ABIERTO las llamadas fallan al instante en vez de esperar timeouts.
+    """
+
+    def __init__(self, umbral_fallos: int = 5, segundos_reposo: float = 30.0):
+        self.umbral_fallos = umbral_fallos
+        self.segundos_reposo = segundos_reposo
+        self.estado = "CERRADO"
+        self.fallos_consecutivos = 0
+        self._abierto_desde = 0.0
+        self._prueba_en_curso = False
+
+    def permitir(self) -> bool:
+        if self.estado == "CERRADO":
+            return True
+        if self.estado == "ABIERTO" and time.monotonic() - self._abierto_desde >= self.segundos_reposo:
+            self.estado = "SEMI_ABIERTO"
+            self._prueba_en_curso = False
+        if self.estado == "SEMI_ABIERTO" and not self._prueba_en_curso:
+            self._prueba_en_curso = True  # Solo una llamada de prueba a la vez
+            return True
+        return False
+
+    def liberar_prueba(self):
+        """La llamada de prueba se canceló sin veredicto: otra puede tomar su lugar."""
+        self._prueba_en_curso = False
+
+    def registrar_exito(self):
+        self.estado = "CERRADO"
+        self.fallos_consecutivos = 0
+        self._prueba_en_curso = False
+
+    def registrar_fallo(self):
+        self.fallos_consecutivos += 1
+        self._prueba_en_curso = False
+        if self.estado == "SEMI_ABIERTO" or self.fallos_consecutivos >= self.umbral_fallos:
+            if self.estado != "ABIERTO":
+                logger.warning(f"Circuito abierto tras {self.fallos_consecutivos} fallos consecutivos.")
+            self.estado = "ABIERTO"
+            self._abierto_desde = time.monotonic()
+
+# Registro global (por proceso)
+_METRICAS_POR_MODELO: Dict[str, MetricasModelo] = {}
+_CIRCUITOS_POR_PROVEEDOR: Dict[str, CircuitBreaker] = {}
+
+def obtener_metricas(modelo: str) -> MetricasModelo:
+    if modelo not in _METRICAS_POR_MODELO:
+        _METRICAS_POR_MODELO[modelo] = MetricasModelo()
+    return _METRICAS_POR_MODELO[modelo]
+
+def obtener_circuito(proveedor: str) -> CircuitBreaker:
+    if proveedor not in _CIRCUITOS_POR_PROVEEDOR:
+        _CIRCUITOS_POR_PROVEEDOR[proveedor] = CircuitBreaker()
+    return _CIRCUITOS_POR_PROVEEDOR[proveedor]
+
+# Host de la API -> circuito. Un host desconocido (gateway propio, proxy) tiene su propio circuito.
+PROVEEDORES_POR_HOST = {"openrouter.ai": "openrouter", "api.openai.com": "openai"}
+
+def proveedor_de_cliente(client) -> str:
+    """Proveedor real de un cliente OpenAI-compatible, según el host de su `base_url`."""
+    host = (urlparse(str(getattr(client, "base_url", ""))).hostname or "").lower()
+    for dominio, proveedor in PROVEEDORES_POR_HOST.items():
+        if host == dominio or host.endswith(f".{dominio}"):
+            return proveedor
+    return host or "desconocido"
+
+def metricas_llm() -> dict:
+    """Snapshot exportable: métricas por modelo y estado de cada circuito."""
+    return {
+        "modelos": {modelo: m.resumen() for modelo, m in _METRICAS_POR_MODELO.items()},
+        "circuitos": {proveedor: c.estado for proveedor, c in _CIRCUITOS_POR_PROVEEDOR.items()},
+    }
+
+# =========================================================
+# CLASIFICACIÓN DE ERRORES
+# =========================================================
+
+def _estado_http(error: Exception) -> Optional[int]:
+    estado = getattr(error, "status_code", None)
+    if estado is None:
+        estado = getattr(getattr(error, "response", None), "status_code", None)
+    return estado if isinstance(estado, int) else None
+
+def es_reintentable(error: Exception) -> bool:
+    """429/5xx, timeouts y errores de conexión sí; 400/401/404 (error nuestro) no."""
+    estado = _estado_http(error)
+    if estado is not None:
+        return estado in ESTADOS_REINTENTABLES
+    nombre = type(error).__name__
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError)) or nombre in ("APIConnectionError", "APITimeoutError")
+
+def segundos_retry_after(error: Exception) -> Optional[float]:
+    """Lee `retry-after-ms` / `retry-after` (segundos o fecha HTTP) de la respuesta, si viene."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        valor_ms = headers.get("retry-after-ms")
+        if valor_ms is not None:
+            return max(0.0, float(valor_ms) / 1000.0)
+        valor = headers.get("retry-after")
+        if valor is None:
+            return None
+        try:
+            return max(0.0, float(valor))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+    except Exception:
+        return None
+
+def calcular_espera(intento: int, base_seg: float, max_seg: float, retry_after: Optional[float] = None) -> float:
+    """Backoff exponencial con 'full jitter'; si el proveedor pide Retry-After, se respeta como mínimo."""
+    espera = random.uniform(0, min(max_seg, base_seg * (2 ** intento)))
+    if retry_after is not None:
+        espera = max(espera, min(retry_after, max_seg))
+    return espera
+
+# =========================================================
+# LLAMADA RESILIENTE
+# =========================================================
+
+async def _llamada_con_hedge(fabrica_llamada: Callable[[], Awaitable], metricas: MetricasModelo, umbral_hedge: float):
+    """
+    Lanza la llamada; si no termina antes del p95 histórico, lanza una segunda idéntica y se queda
+    con la primera que responda bien. La segunda solo sale si hay cupo (ver `reserva_hedge`).
+    Al salir (incluso por cancelación) no queda ninguna petición corriendo.
+    """
+    principal = asyncio.ensure_future(fabrica_llamada())
+    tareas = [principal]
+    liberar = None
+    try:
+        hechas, _ = await asyncio.wait({principal}, timeout=umbral_hedge)
+        if hechas:
+            return principal.result()
+
+        reservar = reserva_hedge.get()
+        liberar = await reservar() if reservar is not None else (lambda: None)
+        if liberar is None:
+            metricas.hedges_sin_cupo += 1  # Límites saturados: se espera a la principal
+            return await principal
+
+        metricas.hedges += 1
+        respaldo = asyncio.ensure_future(fabrica_llamada())
+        tareas.append(respaldo)
+        pendientes = {principal, respaldo}
+        error = None
+        while pendientes:
+            hechas, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+            for tarea in hechas:
+                if tarea.exception() is None:
+                    if tarea is respaldo:
+                        metricas.hedges_ganados += 1
+                    return tarea.result()
+                error = tarea.exception()
+        raise error
+    finally:
+        for tarea in tareas:
+            if not tarea.done():
+                tarea.cancel()
+        if liberar is not None:
+            liberar()
+
+async def llamar_con_resiliencia(
+    fabrica_llamada: Callable[[], Awaitable],
+    proveedor: str,
+    modelo: str,
+    max_reintentos: int = 3,
+    base_seg: float = 1.0,
+    max_espera_seg: float = 30.0,
+    hedge: bool = False,
+    min_muestras_hedge: int = 20
+):
+    """
+    Ejecuta `fabrica_llamada()` (una corrutina nueva por intento) con:
+    - Backoff exponencial con jitter en 429/5xx/timeouts, respetando Retry-After.
+    - Hedge opcional: segunda petición si la primera supera el p95 observado del modelo.
+    - Cortacircuitos por proveedor: si está abierto, lanza CircuitoAbiertoError sin llamar.
+    Los errores no reintentables (400, 401...) se propagan de inmediato.
+    """
+    metricas = obtener_metricas(modelo)
+    circuito = obtener_circuito(proveedor)
+
+    for intento in range(max_reintentos + 1):
+        if not circuito.permitir():
+            metricas.fallos += 1
+            raise CircuitoAbiertoError(f"Circuito de {proveedor} abierto: se omite la llamada a {modelo}.")
+        es_prueba = circuito.estado == "SEMI_ABIERTO"
+
+        metricas.llamadas += 1
+        t0 = time.perf_counter()
+        try:
+            p95 = metricas.percentil(0.95) if hedge and len(metricas.latencias) >= min_muestras_hedge else None
+            if p95 is not None:
+                resultado = await _llamada_con_hedge(fabrica_llamada, metricas, p95)
+            else:
+                resultado = await fabrica_llamada()
+        except asyncio.CancelledError:
+            if es_prueba:
+                circuito.liberar_prueba()  # Sin esto el circuito quedaría SEMI_ABIERTO para siempre
+            raise
+        except Exception as e:
+            reintentable = es_reintentable(e)
+            if reintentable:
+                circuito.registrar_fallo()
+            else:
+                # Error del cliente (payload/credenciales): el proveedor sí respondió, el circuito no se toca
+                circuito.registrar_exito()
+
+            if not reintentable or intento == max_reintentos:
+                metricas.fallos += 1
+                raise
+
+            espera = calcular_espera(intento, base_seg, max_espera_seg, segundos_retry_after(e))
+            metricas.reintentos += 1
+            logger.warning(f"[{proveedor}/{modelo}] Intento {intento + 1} falló ({_estado_http(e) or type(e).__name__}). Reintentando en {espera:.1f}s.")
+            await asyncio.sleep(espera)
+            continue
+
+        metricas.latencias.append(time.perf_counter() - t0)
+        metricas.exitos += 1
+        circuito.registrar_exito()
+        return resultado
@@ -1,124 +1,145 @@
 # Fluxo_IA_visual/services/storage_service.py
 import os
-import json
 import logging
 import uuid
-import time
-from typing import Optional
+from typing import AsyncIterator, Iterable, List, Optional
+
+from ..core.config import settings
+from .almacen_resultados import (
+    AlmacenResultados, AlmacenResultadosDisco, AlmacenResultadosS3,
+    CAMPO_DOCUMENTOS, abrir_resultado_json, fragmentar, guardar_por_documento, leer_por_documento, serializar_json,
+)
+from .limpiador_ttl import limpiador_ttl
 
 logger = logging.getLogger(__name__)
 
+_almacen_resultados_instance = None
+
+def get_almacen_resultados() -> AlmacenResultados:
+    """Retorna el almacén de resultados único (por proceso) según RESULTADOS_BACKEND."""
+    global _almacen_resultados_instance
+    if _almacen_resultados_instance is None:
+        if settings.RESULTADOS_BACKEND == "objetos":
+            _almacen_resultados_instance = AlmacenResultadosS3(
+                bucket=settings.RESULTADOS_BUCKET,
+                prefijo=settings.RESULTADOS_PREFIJO,
+                endpoint_url=settings.RESULTADOS_ENDPOINT_URL,
+                region_name=settings.RESULTADOS_REGION,
+                aws_access_key_id=settings.AWS_ACCESS_KEY_ID.get_secret_value(),
+                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY.get_secret_value()
+            )
+        else:
+            _almacen_resultados_instance = AlmacenResultadosDisco(settings.RESULTADOS_DIR)
+    return _almacen_resultados_instance
+
 class StorageService:
     """
-    Servicio encargado de gestionar el almacenamiento temporal en disco 
-    de los resultados JSON y archivos Excel generados.
+    Servicio encargado de gestionar los resultados JSON y archivos Excel generados.
+    Delega en un `AlmacenResultados` (disco local o almacén de objetos), de modo que
+    lo que escribe una réplica lo puede servir cualquier otra.
     """
-    def __init__(self):
-        self.DOWNLOADS_DIR = "downloads"
-        os.makedirs(self.DOWNLOADS_DIR, exist_ok=True)
+    def __init__(self, almacen: Optional[AlmacenResultados] = None):
+        self.almacen = almacen or get_almacen_resultados()
         self.TTL_SECONDS = 3600 # 1 Hora de vida para los archivos
 
-    def _limpiar_archivos_antiguos(self):
+    def _programar_expiracion(self, clave: str):
+        """Agenda el borrado en el limpiador TTL (sin barrer el almacén en el request)."""
+        limpiador_ttl.programar(clave, self.TTL_SECONDS, fuente=self.almacen)
+
+    def _programar_expiracion_json(self, job_id: str):
+        """El JSON del job vence completo: manifiesto y documentos."""
+        limpiador_ttl.programar(self._clave_json(job_id), self.TTL_SECONDS, fuente=self.almacen.expiracion_por_documento)
+
+    @staticmethod
+    def _clave_json(job_id: str) -> str:
+        return f"data_{os.path.basename(str(job_id))}.json" # <--- Sanitización interna
+
+    @staticmethod
+    def _clave_excel(job_id: str) -> str:
+        return f"reporte_{os.path.basename(str(job_id))}.xlsx"
+
+    # =========================================================
+    # MÉTODOS FLUXO
+    # =========================================================
+
+    async def guardar_resultado(self, datos: dict, job_id: str):
         """
-        Recorre la carpeta de descargas y elimina archivos que superen el tiempo de vida.
-        Se ejecuta de manera silenciosa de forma interna.
+        Guarda el `ResultadoTotal` serializado: un objeto por documento + manifiesto (data_<job>.json).
+        Los documentos que no cambiaron desde la corrida anterior del job no se reescriben.
         """
+        clave = self._clave_json(job_id)
         try:
-            ahora = time.time()
-            archivos = os.listdir(self.DOWNLOADS_DIR)
-            contador_borrados = 0
-
-            for archivo in archivos:
-                ruta_completa = os.path.join(self.DOWNLOADS_DIR, archivo)
-                if os.path.isfile(ruta_completa):
-                    tiempo_modificacion = os.path.getmtime(ruta_completa)
-                    if ahora - tiempo_modificacion > self.TTL_SECONDS:
-                        os.remove(ruta_completa)
-                        contador_borrados += 1
-
-            if contador_borrados > 0:
-                    logger.info(f"Limpieza automática: Se eliminaron {contador_borrados} archivos antiguos.")
+            escritura = await guardar_por_documento(self.almacen, clave, datos)
+            self._programar_expiracion_json(job_id)
+            logger.info(f"JSON guardado: {clave} | {escritura}")
         except Exception as e:
-            logger.warning(f"Error menor durante la limpieza de archivos antiguos: {e}")
+            logger.error(f"Error guardando JSON: {e}")
 
-    # =========================================================
-    # MÉTODOS FLUXO
-    # =========================================================
+    async def obtener_datos_json(self, job_id: str) -> Optional[dict]:
+        """Lee el JSON del almacén (reensamblando sus documentos) y lo devuelve como diccionario."""
+        try:
+            return await leer_por_documento(self.almacen, self._clave_json(job_id))
+        except Exception as e:
+            logger.error(f"Error leyendo JSON: {e}")
+            return None
 
-    def guardar_json_local(self, datos: dict, job_id: str):
-        """Guarda el objeto de respuesta completo en JSON."""
-        self._limpiar_archivos_antiguos()
-        safe_job_id = os.path.basename(str(job_id)) # <--- Sanitización interna
-        filename = f"data_{safe_job_id}.json"
-        filepath = os.path.join(self.DOWNLOADS_DIR, filename)
-        
+    async def abrir_json(
+        self, job_id: str, campos: Optional[Iterable[str]] = None, documentos: Optional[Iterable[str]] = None,
+        cursor: Optional[str] = None, limite: Optional[int] = None
+    ) -> Optional[AsyncIterator[bytes]]:
+        """Flujo del JSON del job con proyección/paginación (ver `abrir_resultado_json`), o None si no existe."""
+        return await abrir_resultado_json(self.almacen, self._clave_json(job_id), campos, documentos, cursor, limite)
+
+    async def obtener_documentos(self, job_id: str, hashes: Iterable[str]) -> List[dict]:
+        """Solo los resultados individuales del job con esos `hash_documento` (caché de deduplicación)."""
         try:
-            with open(filepath, "w", encoding="utf-8") as f:
-                json.dump(datos, f, ensure_ascii=False, indent=4)
-            logger.info(f"JSON guardado localmente: {filepath}")
+            datos = await leer_por_documento(self.almacen, self._clave_json(job_id), hashes=hashes)
+            return datos.get(CAMPO_DOCUMENTOS, []) if datos else []
         except Exception as e:
-            logger.error(f"Error guardando JSON local: {e}")
-
-    def obtener_datos_json(self, job_id: str) -> Optional[dict]:
-        """Lee el JSON del disco y lo devuelve como diccionario."""
-        safe_job_id = os.path.basename(str(job_id)) # <--- Sanitización interna
-        filename = f"data_{safe_job_id}.json"
-        filepath = os.path.join(self.DOWNLOADS_DIR, filename)
-        
-        if os.path.exists(filepath):
-            try:
-                with open(filepath, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"Error leyendo JSON: {e}")
-                return None
-        return None
-
-    def guardar_excel_local(self, contenido_bytes: bytes, job_id: str) -> Optional[str]:
-        """Guarda el archivo Excel en disco local (Modo Binario)."""
-        self._limpiar_archivos_antiguos()
-        filename = f"reporte_{job_id}.xlsx"
-        filepath = os.path.join(self.DOWNLOADS_DIR, filename)
-        
+            logger.error(f"Error leyendo documentos previos del Job {job_id}: {e}")
+            return []
+
+    async def guardar_excel(self, contenido_bytes: bytes, job_id: str) -> Optional[str]:
+        """Guarda el archivo Excel (subida en partes). Retorna su ETag."""
+        clave = self._clave_excel(job_id)
         try:
-            with open(filepath, "wb") as f: 
-                f.write(contenido_bytes)
-            logger.info(f"Excel guardado localmente: {filepath}")
-            return filepath
+            etag = await self.almacen.subir_flujo(clave, fragmentar(contenido_bytes))
+            self._programar_expiracion(clave)
+            logger.info(f"Excel guardado: {clave}")
+            return etag
         except Exception as e:
-            logger.error(f"Error guardando Excel local: {e}")
+            logger.error(f"Error guardando Excel: {e}")
             return None
 
-    def obtener_ruta_archivo(self, job_id: str) -> Optional[str]:
-        """Busca el archivo .xlsx"""
-        filename = f"reporte_{job_id}.xlsx"
-        filepath = os.path.join(self.DOWNLOADS_DIR, filename)
-        
-        if os.path.exists(filepath):
-            return filepath
-        return None
+    async def abrir_excel(self, job_id: str) -> Optional[AsyncIterator[bytes]]:
+        """Flujo de bytes del .xlsx para descargarlo sin cargarlo completo, o None si no existe."""
+        return await self.almacen.abrir_flujo(self._clave_excel(job_id))
 
     # =========================================================
-    # MÉTODOS DE ESTADO 
+    # MÉTODOS DE ESTADO
     # =========================================================
 
-    def create_pending_job(self, rfc: str) -> str:
-        """Crea un archivo temporal indicando que el proceso inició."""
-        self._limpiar_archivos_antiguos()
+    async def create_pending_job(self, rfc: str) -> str:
+        """Crea un registro indicando que el proceso inició."""
         job_id = str(uuid.uuid4())
-        filepath = os.path.join(self.DOWNLOADS_DIR, f"data_{job_id}.json")
-        
         initial_data = {"status": "processing", "rfc": rfc}
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(initial_data, f, ensure_ascii=False)
-            
+        await self.almacen.escribir(self._clave_json(job_id), serializar_json(initial_data), si_no_existe=True)
+        self._programar_expiracion_json(job_id)
         return job_id
 
-    def update_job(self, job_id: str, data: dict):
-        """Sobrescribe el archivo temporal con los datos finales (o error)."""
-        filepath = os.path.join(self.DOWNLOADS_DIR, f"data_{job_id}.json")
+    async def update_job(self, job_id: str, data: dict):
+        """Sobrescribe el registro del job con los datos finales (o error); borra los documentos que ya no refiera."""
         try:
-            with open(filepath, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
+            await guardar_por_documento(self.almacen, self._clave_json(job_id), data)
+            self._programar_expiracion_json(job_id)
         except Exception as e:
-            logger.error(f"Error actualizando Job {job_id}: {e}")
\ No newline at end of file
+            logger.error(f"Error actualizando Job {job_id}: {e}")
+
+    async def actualizar_campos_job(self, job_id: str, campos: dict) -> dict:
+        """
+        Mezcla `campos` sobre el JSON actual del job sin perder el historial.
+        Escritura condicional por ETag: si otra réplica lo modificó en medio, se reintenta.
+        """
+        datos = await self.almacen.actualizar_json(self._clave_json(job_id), lambda previos: {**previos, **campos})
+        self._programar_expiracion_json(job_id)
+        return datos
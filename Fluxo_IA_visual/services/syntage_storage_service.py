@@ -1,68 +1,51 @@
 import os
-import json
 import logging
 import uuid
-import time
+from typing import Optional
+
+from .almacen_resultados import AlmacenResultados, serializar_json
+from .storage_service import get_almacen_resultados
+from .limpiador_ttl import limpiador_ttl
 
 logger = logging.getLogger(__name__)
 
 class StorageService:
-    def __init__(self):
-        self.DOWNLOADS_DIR = "downloads"
-        os.makedirs(self.DOWNLOADS_DIR, exist_ok=True)
+    """Resultados de precalificación (syntage_<job>.json) sobre el mismo almacén de resultados."""
+    def __init__(self, almacen: Optional[AlmacenResultados] = None):
+        self.almacen = almacen or get_almacen_resultados()
         self.TTL_SECONDS = 3600 # 1 Hora
 
-    def _limpiar_archivos_antiguos(self):
-        """Borra archivos viejos."""
-        try:
-            ahora = time.time()
-            archivos = os.listdir(self.DOWNLOADS_DIR)
-            for archivo in archivos:
-                ruta = os.path.join(self.DOWNLOADS_DIR, archivo)
-                if os.path.isfile(ruta):
-                    if ahora - os.path.getmtime(ruta) > self.TTL_SECONDS:
-                        os.remove(ruta)
-        except Exception as e:
-            logger.warning(f"Error limpieza storage: {e}")
+    @staticmethod
+    def _clave(job_id: str) -> str:
+        return f"syntage_{os.path.basename(str(job_id))}.json"
 
-    def create_pending_job(self, rfc: str) -> str:
-        """Crea un archivo temporal indicando que el proceso inició."""
-        self._limpiar_archivos_antiguos()
+    def _programar_expiracion(self, job_id: str):
+        """Borrado a cargo del limpiador TTL."""
+        limpiador_ttl.programar(self._clave(job_id), self.TTL_SECONDS, fuente=self.almacen)
+
+    async def create_pending_job(self, rfc: str) -> str:
+        """Crea un registro indicando que el proceso inició."""
         job_id = str(uuid.uuid4())
-        filepath = os.path.join(self.DOWNLOADS_DIR, f"syntage_{job_id}.json")
-        
         initial_data = {"status": "processing", "rfc": rfc}
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(initial_data, f, ensure_ascii=False)
-            
+        await self.almacen.escribir(self._clave(job_id), serializar_json(initial_data), si_no_existe=True)
+        self._programar_expiracion(job_id)
         return job_id
 
-    def save_json_result(self, data: dict) -> str:
+    async def save_json_result(self, data: dict) -> str:
         """Guarda el JSON y retorna un JOB ID único."""
-        self._limpiar_archivos_antiguos()
         job_id = str(uuid.uuid4())
-        filename = f"syntage_{job_id}.json"
-        filepath = os.path.join(self.DOWNLOADS_DIR, filename)
-        
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-        
+        await self.almacen.escribir(self._clave(job_id), serializar_json(data), si_no_existe=True)
+        self._programar_expiracion(job_id)
         return job_id
 
-    def get_json_result(self, job_id: str) -> dict | None:
+    async def get_json_result(self, job_id: str) -> dict | None:
         """Recupera el JSON por Job ID."""
-        filename = f"syntage_{job_id}.json"
-        filepath = os.path.join(self.DOWNLOADS_DIR, filename)
-        if os.path.exists(filepath):
-            with open(filepath, "r", encoding="utf-8") as f:
-                return json.load(f)
-        return None
-    
-    def update_job(self, job_id: str, data: dict):
-        """Sobrescribe el archivo temporal con los datos finales (o error)."""
-        filepath = os.path.join(self.DOWNLOADS_DIR, f"syntage_{job_id}.json")
+        return await self.almacen.leer_json(self._clave(job_id))
+
+    async def update_job(self, job_id: str, data: dict):
+        """Sobrescribe el registro del job con los datos finales (o error)."""
         try:
-            with open(filepath, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
+            await self.almacen.escribir(self._clave(job_id), serializar_json(data))
+            self._programar_expiracion(job_id)
         except Exception as e:
-            logger.error(f"Error actualizando Job {job_id}: {e}")
\ No newline at end of file
+            logger.error(f"Error actualizando Job {job_id}: {e}")
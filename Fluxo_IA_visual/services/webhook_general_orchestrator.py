@@ -36,10 +36,10 @@ class OrquestadorWebhooks:
                 
         except Exception as e:
             logger.error(f"Error crítico en background job {job_id}: {e}")
-            self.storage.update_job(job_id, {"estatus": "error", "detalle_error": str(e)})
+            await self.storage.update_job(job_id, {"estatus": "error", "detalle_error": str(e)})
 
         # 2. Rescatar el estado final del storage (Asumimos que siempre se guarda en JSON)
-        resultado_final = self.storage.obtener_datos_json(job_id)
+        resultado_final = await self.storage.obtener_datos_json(job_id)
         
         # 3. Disparar el Webhook (Solo si hay URL y hay un resultado válido)
         if webhook_url and resultado_final:
@@ -0,0 +1,74 @@
+# tests/benchmarks/bench_cruce_traspasos.py
+"""
+Benchmark del cruce global de traspasos propios (Etapa 5.5) al crecer el lote de estados de cuenta.
+
+Uso:
+    python -m Fluxo_IA_visual.tests.benchmarks.bench_cruce_traspasos
+
+Compara el barrido anterior (regex de cuentas + `_es_transaccion_propia` contra cada nombre del lote,
+limpiando el nombre en cada llamada) con `IndiceTraspasosPropios`. Cada estado trae su propio cliente,
+así que los nombres del lote crecen con el lote. Ambas variantes deben marcar exactamente las mismas filas.
+"""
+import time
+import random
+
+from Fluxo_IA_visual.core.cruce_traspasos import IndiceTraspasosPropios
+from Fluxo_IA_visual.tests.tests_unitarios.test_cruce_traspasos import cruce_legado, ruido_ocr
+
+TAMANOS_LOTE = (10, 50, 200, 400)
+TRANSACCIONES_POR_ESTADO = 250
+
+GIROS = ["COMERCIALIZADORA", "TRANSPORTES", "FERRETERA", "PANIFICADORA", "DISTRIBUIDORA", "SERVICIOS", "ALIMENTOS"]
+APELLIDOS = [
+    "GARZA", "LOZANO", "TREVIÑO", "SALINAS", "VILLARREAL", "CANTU", "ELIZONDO", "RAMOS", "ORTIZ", "MEDINA",
+    "ZAMORA", "BARRAGAN", "IBARRA", "CORTES", "DELGADO", "FUENTES", "GALINDO", "HINOJOSA", "LEAL", "MONTES",
+    "NAVARRO", "OCHOA", "PALACIOS", "QUIROGA", "RIVAS", "SEPULVEDA", "TAPIA", "URIBE", "VALDEZ", "YAÑEZ",
+]
+
+def generar_lote(num_estados: int, semilla: int = 21):
+    """Nombre y CLABE por estado + descripciones con conceptos repetitivos, terceros y algún traspaso propio."""
+    rnd = random.Random(semilla)
+    nombres, cuentas, descripciones = set(), set(), []
+    for _ in range(num_estados):
+        nombre = f"{rnd.choice(GIROS)} {rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)} SA DE CV"
+        clabe = f"{rnd.randrange(10**17, 10**18)}"
+        nombres.add(nombre)
+        cuentas.update({clabe, clabe[-10:], clabe[-11:]})
+        for _ in range(TRANSACCIONES_POR_ESTADO):
+            r = rnd.random()
+            if r < 0.05:
+                descripciones.append(f"SPEI ENVIADO {ruido_ocr(nombre, rnd)} REF{rnd.randint(1, 999)}")
+            elif r < 0.08:
+                descripciones.append(f"TRASPASO CTA {clabe[-10:]}")
+            elif r < 0.40:
+                descripciones.append(f"SPEI RECIBIDO {rnd.choice(APELLIDOS)} {rnd.choice(GIROS)} REF{rnd.randint(1, 99999)}")
+            else:
+                descripciones.append(rnd.choice(["VENTAS TPV", "DEPOSITO EN EFECTIVO", "COMISION TPV CREDITO", "PAGO DE LUZ CFE", "IVA COMISION"]))
+    return nombres, cuentas, descripciones
+
+def medir(funcion) -> tuple:
+    inicio = time.perf_counter()
+    resultado = funcion()
+    return resultado, time.perf_counter() - inicio
+
+def main():
+    print(f"{'estados':>8} | {'filas':>7} | {'nombres':>7} | {'legado µs/fila':>14} | {'índice µs/fila':>14} | {'matches':>7}")
+    for num_estados in TAMANOS_LOTE:
+        nombres, cuentas, descripciones = generar_lote(num_estados)
+        n = len(descripciones)
+
+        # El legado crece con nombres x filas: en lotes grandes se mide sobre una muestra
+        muestra = descripciones[:min(n, 2_000)]
+        legado, seg_legado = medir(lambda: [cruce_legado(d, nombres, cuentas) for d in muestra])
+
+        def cruzar_con_indice():
+            indice = IndiceTraspasosPropios(nombres, cuentas)
+            return [indice.motivo(d) for d in descripciones]
+        con_indice, seg_indice = medir(cruzar_con_indice)
+
+        assert con_indice[:len(muestra)] == legado, "Los cruces difieren"
+        print(f"{num_estados:>8} | {n:>7,} | {len(nombres):>7} | {seg_legado / len(muestra) * 1e6:>14.1f} | "
+              f"{seg_indice / n * 1e6:>14.1f} | {sum(1 for m in con_indice if m):>7,}")
+
+if __name__ == "__main__":
+    main()
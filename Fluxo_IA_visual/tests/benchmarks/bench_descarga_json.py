@@ -0,0 +1,61 @@
+# tests/benchmarks/bench_descarga_json.py
+"""
+Benchmark de `GET /fluxo/descargar-resultado/{job_id}?formato=json` a distintos tamaños de job.
+
+Uso:
+    python -m Fluxo_IA_visual.tests.benchmarks.bench_descarga_json
+
+Antes: `leer_por_documento` (JSON completo en memoria) y respuesta de una sola pieza.
+Ahora: `abrir_resultado_json` en streaming; se mide la descarga completa, solo `resultados_generales`
+y una página de 500 transacciones. Memoria pico con tracemalloc.
+"""
+import os
+import time
+import random
+import asyncio
+import tempfile
+import tracemalloc
+
+from Fluxo_IA_visual.services.almacen_resultados import (
+    AlmacenResultadosDisco, abrir_resultado_json, guardar_por_documento, leer_por_documento, serializar_json,
+)
+from Fluxo_IA_visual.tests.benchmarks.bench_resultado_job import documento, resultado_total
+
+TAMANOS = [5, 20, 40]  # Documentos de 2,000 transacciones
+
+async def consumir(flujo) -> int:
+    return sum([len(f) async for f in flujo])
+
+async def medir(corrutina) -> tuple:
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    await corrutina
+    segundos = time.perf_counter() - inicio
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return segundos * 1e3, pico / 1e6
+
+async def main():
+    rnd = random.Random(5)
+    directorio = tempfile.mkdtemp()
+    print(f"{'docs':>5} | {'antes completo':>20} | {'ahora completo':>20} | {'ahora generales':>20} | {'ahora página 500':>20}")
+    for num in TAMANOS:
+        almacen = AlmacenResultadosDisco(os.path.join(directorio, str(num)))
+        await guardar_por_documento(almacen, "data_job.json", resultado_total([documento(i, rnd) for i in range(num)]))
+
+        async def antes():
+            serializar_json(await leer_por_documento(almacen, "data_job.json"))  # FastAPI serializa el dict completo
+
+        async def ahora(**parametros):
+            await consumir(await abrir_resultado_json(almacen, "data_job.json", **parametros))
+
+        filas = [
+            await medir(antes()),
+            await medir(ahora()),
+            await medir(ahora(campos=["resultados_generales"])),
+            await medir(ahora(campos=["resultados_individuales"], cursor=f"{num // 2}:0", limite=500)),
+        ]
+        print(f"{num:>5} | " + " | ".join(f"{ms:>7.1f} ms {mb:>7.1f} MB" for ms, mb in filas))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+# tests/benchmarks/bench_fechas_cuenta.py
+"""
+Benchmark de resolución de fechas en un estado de cuenta de 10k movimientos: funciones sueltas por
+fila (`separar_fecha_y_ruido` -> `construir_fecha_completa` -> `calcular_periodo`, reparseando el
+periodo en cada llamada) contra un `ContextoFechasCuenta` por cuenta con memo de tokens.
+
+Uso:
+    python -m Fluxo_IA_visual.tests.benchmarks.bench_fechas_cuenta
+
+Ambas variantes deben dar exactamente las mismas fechas, periodos y ruido.
+"""
+import time
+import random
+
+from Fluxo_IA_visual.utils.helpers import (
+    ContextoFechasCuenta, calcular_periodo, construir_fecha_completa, separar_fecha_y_ruido,
+)
+
+TOTAL_TRANSACCIONES = 10_000
+REPETICIONES = 5
+
+# (periodo_inicio, periodo_fin, generador del token crudo de fecha como lo deja el motor)
+CUENTAS = {
+    "dia_suelto": ("20/12/2024", "19/01/2025", lambda rnd: f"{rnd.randint(1, 31):02d}"),
+    "bbva": ("01/12/2024", "31/12/2024", lambda rnd: f"{rnd.randint(1, 31):02d}/{rnd.choice(['DIC', 'ENE'])}"),
+    "banorte": ("2025-03-01", "2025-03-31", lambda rnd: f"{rnd.randint(1, 31):02d}-MAR-25 {rnd.choice(['', 'COMISION', 'SPEI'])}"),
+}
+
+def por_fila(tokens, inicio, fin) -> list:
+    resultado = []
+    for token in tokens:
+        fecha_pura, ruido = separar_fecha_y_ruido(token)
+        fecha = construir_fecha_completa(fecha_pura, inicio, fin)
+        resultado.append((fecha, calcular_periodo(fecha, inicio), ruido))
+    return resultado
+
+def con_contexto(tokens, inicio, fin) -> list:
+    contexto = ContextoFechasCuenta(inicio, fin)
+    return [contexto.resolver(token) for token in tokens]
+
+def medir(funcion, *args) -> tuple:
+    mejor, resultado = float("inf"), None
+    for _ in range(REPETICIONES):
+        inicio = time.perf_counter()
+        resultado = funcion(*args)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return resultado, mejor
+
+def main():
+    print(f"{TOTAL_TRANSACCIONES:,} transacciones por cuenta (mejor de {REPETICIONES})")
+    print(f"{'cuenta':>11} | {'por fila ms':>11} | {'contexto ms':>11} | {'µs/fila antes':>13} | {'µs/fila ahora':>13}")
+    for nombre, (inicio, fin, generar) in CUENTAS.items():
+        rnd = random.Random(7)
+        tokens = [generar(rnd) for _ in range(TOTAL_TRANSACCIONES)]
+
+        esperado, seg_por_fila = medir(por_fila, tokens, inicio, fin)
+        obtenido, seg_contexto = medir(con_contexto, tokens, inicio, fin)
+        assert obtenido == esperado, "Las fechas difieren"
+
+        print(f"{nombre:>11} | {seg_por_fila * 1e3:>11.1f} | {seg_contexto * 1e3:>11.1f} | "
+              f"{seg_por_fila / TOTAL_TRANSACCIONES * 1e6:>13.2f} | {seg_contexto / TOTAL_TRANSACCIONES * 1e6:>13.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# tests/benchmarks/bench_pre_clasificacion.py
+"""
+Benchmark de la Capa 1 del MotorClasificador sobre 100k descripciones sintéticas.
+
+Uso:
+    python -m Fluxo_IA_visual.tests.benchmarks.bench_pre_clasificacion
+
+Compara el barrido original (un `any(p in desc)` por tag + NFKD por transacción) contra
+`_pre_clasificar_transacciones` con el autómata Aho-Corasick y la normalización memoizada.
+Ambas versiones deben producir exactamente las mismas categorías.
+"""
+import re
+import time
+import random
+import unicodedata
+
+from Fluxo_IA_visual.core import motor_clasificador as mc
+from Fluxo_IA_visual.core.motor_clasificador import MotorClasificador
+from Fluxo_IA_visual.utils.tags_y_pesos_fluxo import CONFIGURACION_TAGS, CategoriaTag
+
+TOTAL_DESCRIPCIONES = 100_000
+
+class TxSintetica:
+    def __init__(self, descripcion, tipo):
+        self.descripcion = descripcion
+        self.tipo = tipo
+        self.categoria = "GENERAL"
+        self.razon_clasificacion = ""
+
+def generar_transacciones(n: int, semilla: int = 42) -> list:
+    """Descripciones tipo estado de cuenta; ~35% contiene alguna palabra de los diccionarios."""
+    rnd = random.Random(semilla)
+    palabras = [p for cfg in CONFIGURACION_TAGS.values() for p in cfg["palabras"]]
+    relleno = ["SPEI", "RECIBIDO", "ENVIADO", "REF", "CLIENTE", "COMERCIAL", "DEL", "NORTE",
+               "SA DE CV", "Operación", "Crédito", "Depósito", "BNET", "RASTREO"]
+    txs = []
+    for i in range(n):
+        tokens = rnd.sample(relleno, 5) + [str(rnd.randint(10**5, 10**9))]
+        if rnd.random() < 0.35:
+            tokens.insert(rnd.randint(0, len(tokens)), rnd.choice(palabras).upper())
+        txs.append(TxSintetica(" ".join(tokens), rnd.choice(["abono", "cargo"])))
+    return txs
+
+def pre_clasificar_original(motor: MotorClasificador, transacciones: list) -> list:
+    """Réplica del barrido previo: NFKD por fila y un `any()` por cada tag."""
+    categorias = []
+    for tx in transacciones:
+        tipo_lower = str(tx.tipo).lower().strip()
+        desc_raw = str(tx.descripcion).lower()
+        desc_norm = unicodedata.normalize('NFKD', desc_raw).encode('ASCII', 'ignore').decode('utf-8')
+        desc_plana = re.sub(r'\s+', ' ', desc_norm).strip()
+
+        tags = {}
+        for tag, config in CONFIGURACION_TAGS.items():
+            if any(p in desc_plana for p in config["palabras"]):
+                tags[tag] = config["peso"]
+        if CategoriaTag.PAGO_FINANCIAMIENTO not in tags and re.search(r'\bdru\d+\s*domiciliacion\b', desc_plana):
+            tags[CategoriaTag.PAGO_FINANCIAMIENTO] = CONFIGURACION_TAGS[CategoriaTag.PAGO_FINANCIAMIENTO]["peso"]
+
+        es_abono = tipo_lower in ["abono", "deposito", "depósito", "credito", "crédito"]
+        categoria, _ = motor._aplicar_matriz_conflictos(tags, es_abono)
+        categorias.append(categoria)
+    return categorias
+
+def pre_clasificar_automata(motor: MotorClasificador, transacciones: list) -> list:
+    resueltas, _ = motor._pre_clasificar_transacciones(transacciones)
+    por_indice = {idx: tx.categoria for idx, tx in resueltas}
+    return [por_indice.get(i) for i in range(len(transacciones))]
+
+if __name__ == "__main__":
+    motor = MotorClasificador(debug_flags=[])
+    txs = generar_transacciones(TOTAL_DESCRIPCIONES)
+
+    t0 = time.perf_counter()
+    antes = pre_clasificar_original(motor, txs)
+    t_antes = time.perf_counter() - t0
+
+    mc._normalizar_descripcion.cache_clear()  # Medición en frío (sin memo previa)
+    t0 = time.perf_counter()
+    despues = pre_clasificar_automata(motor, txs)
+    t_despues = time.perf_counter() - t0
+
+    assert antes == despues, "El autómata cambió alguna categoría"
+    print(f"Descripciones: {TOTAL_DESCRIPCIONES:,}")
+    print(f"Antes  (any por tag):   {t_antes:6.2f} s | {t_antes / TOTAL_DESCRIPCIONES * 1e6:6.1f} µs/tx")
+    print(f"Después (Aho-Corasick): {t_despues:6.2f} s | {t_despues / TOTAL_DESCRIPCIONES * 1e6:6.1f} µs/tx")
+    print(f"Speedup: {t_antes / t_despues:.1f}x")
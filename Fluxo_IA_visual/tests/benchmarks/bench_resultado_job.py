@@ -0,0 +1,119 @@
+# tests/benchmarks/bench_resultado_job.py
+"""
+Benchmark de escritura/lectura del resultado de un job de 20k transacciones (10 estados de cuenta).
+
+Uso:
+    python -m Fluxo_IA_visual.tests.benchmarks.bench_resultado_job
+
+Antes: `copy.deepcopy` para el Excel + `json.dump(indent=4)` del `ResultadoTotal` completo en un solo
+archivo, `json.load` completo en cada lectura y reescritura total al agregar un documento.
+Ahora: orjson compacto, un objeto por documento + manifiesto (`guardar_por_documento`) y sin copia.
+"""
+import os
+import copy
+import json
+import time
+import random
+import asyncio
+import tempfile
+
+from Fluxo_IA_visual.services.almacen_resultados import AlmacenResultadosDisco, guardar_por_documento, leer_por_documento
+
+DOCUMENTOS = 10
+TRANSACCIONES_POR_DOCUMENTO = 2_000
+REPETICIONES = 3
+
+CATEGORIAS = ["GENERAL", "TPV", "EFECTIVO", "TRASPASO_ABONO", "COMISION_CR", "IVA"]
+
+def documento(i: int, rnd: random.Random) -> dict:
+    analisis = {
+        "nombre_archivo_virtual": f"estado_{i}.pdf", "banco": "BBVA", "tipo_moneda": "MXN", "rfc": "GODE561231GR8",
+        "nombre_cliente": "COMERCIALIZADORA GODE SA DE CV", "clabe_interbancaria": f"0123200{i:011d}",
+        "periodo_inicio": "01/03/2025", "periodo_fin": "31/03/2025",
+        **{f"campo_{k}": rnd.random() * 1e5 for k in range(40)},
+    }
+    return {
+        "nombre_documento": f"estado_{i}.pdf",
+        "estatus_documento": "exitoso",
+        "hash_documento": f"{rnd.getrandbits(256):064x}",
+        "AnalisisIA": analisis,
+        "DetalleTransacciones": {"transacciones": [
+            {
+                "fecha": f"{rnd.randint(1, 31):02d}/03/2025", "periodo": "MARZO 2025",
+                "descripcion": f"SPEI RECIBIDO CLIENTE {rnd.randint(1, 9999)} REF{rnd.randint(1, 10**7)}",
+                "monto": f"{rnd.random() * 50_000:.2f}", "tipo": rnd.choice(["abono", "cargo"]),
+                "categoria": rnd.choice(CATEGORIAS), "es_sospechosa": False, "razon_clasificacion": "Regla determinista",
+            }
+            for _ in range(TRANSACCIONES_POR_DOCUMENTO)
+        ], "error_transacciones": None},
+        "metadata_tecnica": [{"pagina": p, "calidad_score": 0.95, "tiempo_ms": 120, "transacciones": 40} for p in range(50)],
+    }
+
+def resultado_total(documentos: list) -> dict:
+    return {
+        "total_depositos": 1.0, "es_mayor_a_250": True,
+        "resultados_generales": [d["AnalisisIA"] for d in documentos],
+        "resultados_individuales": documentos,
+    }
+
+def medir(funcion) -> tuple:
+    mejor, resultado = float("inf"), None
+    for _ in range(REPETICIONES):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return resultado, mejor
+
+def main():
+    rnd = random.Random(5)
+    documentos = [documento(i, rnd) for i in range(DOCUMENTOS + 1)]
+    datos = resultado_total(documentos[:DOCUMENTOS])
+    datos_ampliados = resultado_total(documentos)
+    directorio = tempfile.mkdtemp()
+    ruta_antes = os.path.join(directorio, "data_antes.json")
+
+    # --- ANTES ---
+    def escribir_antes(d):
+        copy.deepcopy(d)  # Copia para el Excel
+        with open(ruta_antes, "w", encoding="utf-8") as f:
+            json.dump(d, f, ensure_ascii=False, indent=4)
+        return os.path.getsize(ruta_antes)
+
+    def leer_antes():
+        with open(ruta_antes, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    bytes_antes, seg_escritura_antes = medir(lambda: escribir_antes(datos))
+    leido_antes, seg_lectura_antes = medir(leer_antes)
+    bytes_agregar_antes, seg_agregar_antes = medir(lambda: escribir_antes(datos_ampliados))
+
+    # --- AHORA ---
+    almacen = AlmacenResultadosDisco(os.path.join(directorio, "ahora"))
+
+    def escribir_ahora(d, limpiar=True):
+        if limpiar:
+            for archivo in os.listdir(almacen.directorio):
+                os.remove(os.path.join(almacen.directorio, archivo))
+        return asyncio.run(guardar_por_documento(almacen, "data_job.json", d))["bytes_escritos"]
+
+    bytes_ahora, seg_escritura_ahora = medir(lambda: escribir_ahora(datos))
+    leido_ahora, seg_lectura_ahora = medir(lambda: asyncio.run(leer_por_documento(almacen, "data_job.json")))
+
+    def agregar_ahora():
+        escribir_ahora(datos)
+        inicio = time.perf_counter()
+        escritos = escribir_ahora(datos_ampliados, limpiar=False)
+        return escritos, time.perf_counter() - inicio
+    (bytes_agregar_ahora, seg_agregar_ahora), _ = medir(agregar_ahora)
+
+    assert leido_antes == leido_ahora == datos, "El resultado leído difiere"
+    print(f"{DOCUMENTOS} documentos x {TRANSACCIONES_POR_DOCUMENTO:,} transacciones (mejor de {REPETICIONES})")
+    print(f"{'operación':>26} | {'antes':>14} | {'ahora':>14}")
+    print(f"{'escritura (bytes)':>26} | {bytes_antes:>14,} | {bytes_ahora:>14,}")
+    print(f"{'escritura (ms)':>26} | {seg_escritura_antes * 1e3:>14.1f} | {seg_escritura_ahora * 1e3:>14.1f}")
+    print(f"{'lectura completa (ms)':>26} | {seg_lectura_antes * 1e3:>14.1f} | {seg_lectura_ahora * 1e3:>14.1f}")
+    print(f"{'agregar 1 doc (bytes)':>26} | {bytes_agregar_antes:>14,} | {bytes_agregar_ahora:>14,}")
+    print(f"{'agregar 1 doc (ms)':>26} | {seg_agregar_antes * 1e3:>14.1f} | {seg_agregar_ahora * 1e3:>14.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# tests/benchmarks/bench_spatial_slices.py
+"""
+Micro-benchmark del slicing de la Pasada 3 sobre una página sintética densa.
+
+Uso:
+    python -m Fluxo_IA_visual.tests.benchmarks.bench_spatial_slices
+
+Mide el tiempo por fila de `_encontrar_anclas_fechas` + `_extraer_transacciones_por_slice`
+para páginas de 50 a 1,000 renglones. Con el índice vertical (searchsorted) el costo por
+fila debe mantenerse casi plano al crecer la densidad.
+"""
+import time
+import random
+
+from Fluxo_IA_visual.core.spatial_bank import MotorExtraccionEspacial
+
+ANCHO_PAGINA = 600.0
+ZONAS_X = {
+    "cargo": (260.0, 350.0),
+    "abono": (350.0, 440.0),
+    "importe": (9999, 9999),
+    "saldo": (490.0, 560.0),
+    "desc_center": 180.0,
+}
+COLUMNAS = {
+    "FECHA": {"x0": 50, "x1": 80, "center": 65},
+    "DESCRIPCION": {"x0": 150, "x1": 210, "center": 180},
+    "CARGO": {"x0": 300, "x1": 330, "center": 315},
+    "ABONO": {"x0": 400, "x1": 430, "center": 415},
+    "SALDO": {"x0": 500, "x1": 530, "center": 515},
+}
+
+def generar_palabras(filas: int, alto_fila: float = 12.0, semilla: int = 7) -> list:
+    """Genera tuplas tipo page.get_text('words') para N renglones de movimientos."""
+    rnd = random.Random(semilla)
+    words = []
+    y = 100.0
+    for i in range(filas):
+        dia = f"{(i % 28) + 1:02d}/03"
+        words.append((50.0, y, 78.0, y + 9, dia, 0, 0, 0))
+        x = 150.0
+        for token in ("SPEI", "RECIBIDO", f"REF{rnd.randint(1000, 9999)}", "CLIENTE", f"S{i}"):
+            words.append((x, y, x + 6 * len(token), y + 9, token, 0, 0, 1))
+            x += 6 * len(token) + 4
+        monto = f"{rnd.randint(1, 99999):,}.{rnd.randint(0, 99):02d}"
+        x_monto = 300.0 if i % 2 else 400.0
+        words.append((x_monto, y, x_monto + 40, y + 9, monto, 0, 0, 2))
+        words.append((500.0, y, 545.0, y + 9, "10,000.00", 0, 0, 3))
+        y += alto_fila
+    return words
+
+def medir(filas: int, repeticiones: int = 5) -> float:
+    motor = MotorExtraccionEspacial(debug_flags=None)
+    words = generar_palabras(filas)
+    y_limite = words[-1][3] + 20
+
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        anclas = motor._encontrar_anclas_fechas(words, (40.0, 90.0), ANCHO_PAGINA)
+        txs = motor._extraer_transacciones_por_slice(anclas, words, ZONAS_X, y_limite, 95.0, COLUMNAS)
+        mejor = min(mejor, time.perf_counter() - t0)
+
+    assert len(txs) == filas, f"Se esperaban {filas} transacciones, hubo {len(txs)}"
+    return mejor
+
+if __name__ == "__main__":
+    print(f"{'filas':>6} | {'total ms':>9} | {'µs/fila':>8}")
+    for filas in (50, 100, 400, 1000):
+        t = medir(filas)
+        print(f"{filas:>6} | {t * 1000:>9.2f} | {t / filas * 1e6:>8.1f}")
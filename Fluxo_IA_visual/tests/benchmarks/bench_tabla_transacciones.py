@@ -0,0 +1,119 @@
+# tests/benchmarks/bench_tabla_transacciones.py
+"""
+Benchmark de memoria y CPU por fila de un job de 20k transacciones: objetos Pydantic por fila
+(flujo anterior) contra `TablaTransacciones` columnar.
+
+Uso:
+    python -m Fluxo_IA_visual.tests.benchmarks.bench_tabla_transacciones
+
+Cada variante corre en un proceso nuevo (spawn) para que el pico de RSS (`ru_maxrss`) sea solo suyo.
+Recorrido medido: armar las filas como las deja el worker -> totales por categoría -> sumas de
+confianza -> volcado JSON del documento. Ambas variantes deben dar los mismos totales y el mismo JSON.
+"""
+import time
+import random
+import hashlib
+import resource
+import multiprocessing
+
+TOTAL_TRANSACCIONES = 20_000
+
+def generar_filas(n: int, semilla: int = 11) -> list:
+    """Salida cruda del motor espacial: monto numérico, tipo en mayúsculas, descripciones repetitivas."""
+    rnd = random.Random(semilla)
+    conceptos = ["SPEI RECIBIDO", "DEPOSITO EN EFECTIVO", "VENTAS TPV", "COMISION TPV CREDITO",
+                 "PAGO DE LUZ", "TRASPASO A TERCEROS", "IVA COMISION", "RETIRO CAJERO"]
+    return [
+        {
+            "fecha": f"{(i % 28) + 1:02d}/03/2026", "periodo": "MARZO 2026",
+            "descripcion": f"{rnd.choice(conceptos)} REF {rnd.randint(1, 400)}",
+            "monto": rnd.uniform(1, 250_000),
+            "tipo": rnd.choice(["ABONO", "CARGO"]),
+            "categoria": rnd.choice(["GENERAL", "TPV", "EFECTIVO", "COMISION_CR", "TRASPASO_ABONO"]),
+        }
+        for i in range(n)
+    ]
+
+def totales_legado(transacciones: list) -> tuple:
+    """Réplica del barrido anterior: parseo del string de monto y normalización de texto por fila."""
+    totales, suma_abonos, suma_cargos = {}, 0.0, 0.0
+    for tx in transacciones:
+        monto = float(str(tx.monto).replace("$", "").replace(",", "").strip())
+        if str(tx.tipo).lower().strip() in ["abono", "deposito", "depósito", "credito", "crédito"]:
+            totales["DEPOSITOS"] = totales.get("DEPOSITOS", 0.0) + monto
+        cat = str(tx.categoria).upper().strip()
+        totales[cat] = totales.get(cat, 0.0) + monto
+        tipo = str(tx.tipo).upper().strip()
+        if tipo == "ABONO":
+            suma_abonos += monto
+        elif tipo == "CARGO":
+            suma_cargos += monto
+    return totales, suma_abonos, suma_cargos
+
+def totales_tabla(tabla) -> tuple:
+    totales, suma_abonos, suma_cargos = {}, 0.0, 0.0
+    abonos = tabla.abonos_por_codigo()
+    categorias = tabla.categorias_normalizadas()
+    tipos_mayus = [t.upper().strip() for t in tabla.catalogo_tipos.valores]
+    for monto, codigo_tipo, codigo_cat in zip(tabla.montos, tabla.tipos, tabla.categorias):
+        if abonos[codigo_tipo]:
+            totales["DEPOSITOS"] = totales.get("DEPOSITOS", 0.0) + monto
+        cat = categorias[codigo_cat]
+        totales[cat] = totales.get(cat, 0.0) + monto
+        if tipos_mayus[codigo_tipo] == "ABONO":
+            suma_abonos += monto
+        elif tipos_mayus[codigo_tipo] == "CARGO":
+            suma_cargos += monto
+    return totales, suma_abonos, suma_cargos
+
+def correr_variante(variante: str, n: int) -> dict:
+    """Corre dentro del proceso hijo; importa aquí para que la línea base de RSS incluya los módulos."""
+    import json
+    from Fluxo_IA_visual.models.responses_analisisTPV import AnalisisTPV
+    from Fluxo_IA_visual.models.tabla_transacciones import TablaTransacciones
+
+    filas = generar_filas(n)
+    rss_base_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    cpu_inicio = time.process_time()
+
+    if variante == "pydantic":
+        transacciones = [
+            AnalisisTPV.Transaccion(**{**f, "monto": f"{f['monto']:,.2f}"}) for f in filas
+        ]
+        resumen = totales_legado(transacciones)
+    else:
+        tabla = TablaTransacciones()
+        for f in filas:
+            tabla.agregar(f["fecha"], f["periodo"], f["descripcion"], round(f["monto"], 2), f["tipo"], f["categoria"])
+        transacciones = tabla
+        resumen = totales_tabla(tabla)
+
+    volcado = AnalisisTPV.ResultadoTPV(transacciones=transacciones).model_dump(mode="json")
+    cpu_seg = time.process_time() - cpu_inicio
+    rss_pico_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {
+        "cpu_us_por_fila": cpu_seg / n * 1e6,
+        "rss_pico_mb": rss_pico_kb / 1024,
+        "rss_incremento_mb": (rss_pico_kb - rss_base_kb) / 1024,
+        "resumen": resumen,
+        "huella_json": hashlib.sha256(json.dumps(volcado, sort_keys=True).encode()).hexdigest(),
+    }
+
+def main():
+    ctx = multiprocessing.get_context("spawn")
+    resultados = {}
+    for variante in ("pydantic", "tabla"):
+        with ctx.Pool(1) as pool:
+            resultados[variante] = pool.apply(correr_variante, (variante, TOTAL_TRANSACCIONES))
+
+    assert resultados["pydantic"]["resumen"] == resultados["tabla"]["resumen"], "Los totales difieren"
+    assert resultados["pydantic"]["huella_json"] == resultados["tabla"]["huella_json"], "El JSON difiere"
+
+    print(f"{TOTAL_TRANSACCIONES:,} transacciones")
+    print(f"{'variante':>10} | {'CPU µs/fila':>12} | {'RSS pico MB':>12} | {'Δ RSS MB':>9}")
+    for variante, r in resultados.items():
+        print(f"{variante:>10} | {r['cpu_us_por_fila']:>12.2f} | {r['rss_pico_mb']:>12.1f} | {r['rss_incremento_mb']:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+import os
+
+# core/config.py termina el proceso si faltan credenciales. Las pruebas no llaman a ningún proveedor:
+# valores de relleno (solo si el entorno no trae los reales) para poder importar los servicios.
+CREDENCIALES_DE_PRUEBA = {
+    "OPENAI_API_KEY_FLUXO": "sk-pruebas",
+    "OPENAI_API_KEY_NOMI": "sk-pruebas",
+    "OPENROUTER_API_KEY": "sk-pruebas",
+    "SYNTAGE_API_KEY": "pruebas",
+    "AWS_ACCESS_KEY_ID": "AKIAPRUEBASPRUEBAS00",
+    "AWS_SECRET_ACCESS_KEY": "pruebas-pruebas-pruebas-pruebas-pruebas0",
+}
+for variable, valor in CREDENCIALES_DE_PRUEBA.items():
+    os.environ.setdefault(variable, valor)
+os.environ.setdefault("ENVIRONMENT", "testing")
@@ -0,0 +1,445 @@
+import os
+import time
+import asyncio
+import hashlib
+from datetime import datetime, timezone
+
+import pytest
+from Fluxo_IA_visual.core.exceptions import ConflictoEscrituraError
+from Fluxo_IA_visual.services.almacen_resultados import (
+    TAMANO_PARTE_MULTIPART, AlmacenResultadosDisco, AlmacenResultadosS3,
+    abrir_resultado_json, clave_documento, deserializar_json, fragmentar, guardar_por_documento, leer_por_documento,
+    serializar_json,
+)
+
+# ============================================================================
+# FIXTURES: servidor S3 en memoria (sustituto tipo MinIO del protocolo que usa el almacén)
+# ============================================================================
+
+class ErrorS3(Exception):
+    """Imita botocore.exceptions.ClientError (solo el atributo `response`)."""
+
+    def __init__(self, codigo):
+        super().__init__(codigo)
+        self.response = {"Error": {"Code": codigo}}
+
+class CuerpoS3:
+    def __init__(self, contenido):
+        self._contenido = contenido
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def read(self):
+        return self._contenido
+
+    async def iter_chunks(self, tamano):
+        for inicio in range(0, len(self._contenido), tamano):
+            yield self._contenido[inicio:inicio + tamano]
+
+class ClienteS3EnMemoria:
+    def __init__(self):
+        self.objetos = {}       # key -> (contenido, etag, mtime)
+        self.multipart = {}     # upload_id -> {numero: bytes}
+        self.peticiones = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @staticmethod
+    def _etag(contenido):
+        return f'"{hashlib.md5(contenido).hexdigest()}"'
+
+    async def get_object(self, Bucket, Key):
+        self.peticiones.append("get_object")
+        if Key not in self.objetos:
+            raise ErrorS3("NoSuchKey")
+        contenido, etag, _ = self.objetos[Key]
+        return {"Body": CuerpoS3(contenido), "ETag": etag}
+
+    async def head_object(self, Bucket, Key):
+        if Key not in self.objetos:
+            raise ErrorS3("404")
+        contenido, etag, mtime = self.objetos[Key]
+        return {"ETag": etag, "ContentLength": len(contenido), "LastModified": datetime.fromtimestamp(mtime, tz=timezone.utc)}
+
+    async def delete_object(self, Bucket, Key):
+        self.objetos.pop(Key, None)
+
+    async def put_object(self, Bucket, Key, Body, IfMatch=None, IfNoneMatch=None):
+        self.peticiones.append("put_object")
+        actual = self.objetos.get(Key)
+        if (IfNoneMatch == "*" and actual) or (IfMatch is not None and (not actual or actual[1] != IfMatch)):
+            raise ErrorS3("PreconditionFailed")
+        self.objetos[Key] = (Body, self._etag(Body), time.time())
+        return {"ETag": self._etag(Body)}
+
+    async def create_multipart_upload(self, Bucket, Key):
+        upload_id = f"up-{len(self.multipart)}"
+        self.multipart[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    async def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.peticiones.append("upload_part")
+        self.multipart[UploadId][PartNumber] = Body
+        return {"ETag": self._etag(Body)}
+
+    async def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        partes = self.multipart.pop(UploadId)
+        contenido = b"".join(partes[p["PartNumber"]] for p in MultipartUpload["Parts"])
+        etag = f'"{hashlib.md5(contenido).hexdigest()}-{len(partes)}"'
+        self.objetos[Key] = (contenido, etag, time.time())
+        return {"ETag": etag}
+
+    async def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.multipart.pop(UploadId, None)
+
+    async def list_objects_v2(self, Bucket, Prefix, ContinuationToken=None):
+        return {"Contents": [
+            {"Key": k, "LastModified": datetime.fromtimestamp(m, tz=timezone.utc)}
+            for k, (_, _, m) in self.objetos.items() if k.startswith(Prefix)
+        ]}
+
+    async def delete_objects(self, Bucket, Delete):
+        for obj in Delete["Objects"]:
+            self.objetos.pop(obj["Key"], None)
+
+@pytest.fixture(params=["disco", "objetos"])
+def almacen(request, tmp_path):
+    if request.param == "disco":
+        return AlmacenResultadosDisco(str(tmp_path))
+    cliente = ClienteS3EnMemoria()
+    almacen = AlmacenResultadosS3("bucket", prefijo="resultados/", fabrica_cliente=lambda: cliente)
+    almacen.cliente_prueba = cliente
+    return almacen
+
+def resultado_total(num_documentos, transacciones_por_documento=3):
+    individuales = [
+        {
+            "nombre_documento": f"estado_{i}.pdf",
+            "hash_documento": f"hash{i}",
+            "AnalisisIA": {"banco": "BBVA", "depositos": 1000.0 * i},
+            "DetalleTransacciones": {"transacciones": [
+                {"fecha": "01/03/2025", "descripcion": f"SPEI {i}-{j}", "monto": "10.00", "tipo": "abono", "categoria": "GENERAL"}
+                for j in range(transacciones_por_documento)
+            ]},
+        }
+        for i in range(num_documentos)
+    ]
+    return {
+        "total_depositos": sum(d["AnalisisIA"]["depositos"] for d in individuales),
+        "es_mayor_a_250": False,
+        "resultados_generales": [d["AnalisisIA"] for d in individuales],
+        "resultados_individuales": individuales,
+    }
+
+async def juntar(flujo):
+    return b"".join([bytes(f) async for f in flujo])
+
+async def descargar(almacen, **parametros):
+    return deserializar_json(await juntar(await abrir_resultado_json(almacen, "data_job.json", **parametros)))
+
+# ============================================================================
+# PRUEBAS (ambas implementaciones cumplen el mismo contrato)
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_escribir_y_leer_con_etag(almacen):
+    assert await almacen.leer("data_x.json") is None
+
+    etag = await almacen.escribir("data_x.json", b'{"estatus": "procesando"}')
+    objeto = await almacen.leer("data_x.json")
+
+    assert objeto.contenido == b'{"estatus": "procesando"}'
+    assert objeto.etag == etag
+    assert await almacen.leer_json("data_x.json") == {"estatus": "procesando"}
+
+@pytest.mark.asyncio
+async def test_escritura_condicional_rechaza_etag_viejo(almacen):
+    etag_v1 = await almacen.escribir("data_x.json", b"1", si_no_existe=True)
+    with pytest.raises(ConflictoEscrituraError):
+        await almacen.escribir("data_x.json", b"otro", si_no_existe=True)
+
+    await almacen.escribir("data_x.json", b"2", si_coincide=etag_v1)
+    with pytest.raises(ConflictoEscrituraError):
+        await almacen.escribir("data_x.json", b"3", si_coincide=etag_v1)  # Alguien escribió "2" en medio
+
+    assert (await almacen.leer("data_x.json")).contenido == b"2"
+
+@pytest.mark.asyncio
+async def test_actualizar_json_reaplica_el_cambio_tras_un_conflicto(almacen):
+    await almacen.escribir("data_x.json", b'{"resultados": [1]}')
+    escribir_original = almacen.escribir
+    intentos = []
+
+    async def escribir_con_carrera(clave, contenido, **condicion):
+        if not intentos:  # Otra réplica agrega un resultado justo antes de nuestra primera escritura
+            await escribir_original(clave, b'{"resultados": [1, 2]}')
+        intentos.append(condicion)
+        return await escribir_original(clave, contenido, **condicion)
+
+    almacen.escribir = escribir_con_carrera
+    datos = await almacen.actualizar_json("data_x.json", lambda d: {**d, "estatus": "procesando"})
+
+    assert len(intentos) == 2
+    assert datos == {"resultados": [1, 2], "estatus": "procesando"}
+    assert await almacen.leer_json("data_x.json") == datos
+
+@pytest.mark.asyncio
+async def test_subir_flujo_grande_y_descargar_en_fragmentos(almacen):
+    contenido = os.urandom(2 * TAMANO_PARTE_MULTIPART + 123)
+
+    await almacen.subir_flujo("reporte_x.xlsx", fragmentar(contenido, 1024 * 1024))
+
+    assert await juntar(await almacen.abrir_flujo("reporte_x.xlsx")) == contenido
+    assert await almacen.abrir_flujo("reporte_no_existe.xlsx") is None
+    if isinstance(almacen, AlmacenResultadosS3):
+        assert almacen.cliente_prueba.peticiones.count("upload_part") == 3
+        assert not almacen.cliente_prueba.multipart
+
+@pytest.mark.asyncio
+async def test_subir_flujo_pequeno_va_en_una_peticion(almacen):
+    etag = await almacen.subir_flujo("data_x.json", fragmentar(b'{"a": 1}'))
+
+    assert (await almacen.leer("data_x.json")).etag == etag
+    if isinstance(almacen, AlmacenResultadosS3):
+        assert "upload_part" not in almacen.cliente_prueba.peticiones
+
+@pytest.mark.asyncio
+async def test_subida_fallida_no_deja_objeto_a_medias(almacen):
+    async def flujo_roto():
+        yield os.urandom(TAMANO_PARTE_MULTIPART + 1)
+        raise IOError("cliente desconectado")
+
+    with pytest.raises(IOError):
+        await almacen.subir_flujo("reporte_x.xlsx", flujo_roto())
+
+    assert await almacen.leer("reporte_x.xlsx") is None
+    if isinstance(almacen, AlmacenResultadosS3):
+        assert not almacen.cliente_prueba.multipart  # Multipart abortado
+
+@pytest.mark.asyncio
+async def test_purgar_antiguos(almacen, tmp_path):
+    await almacen.escribir("data_viejo.json", b"{}")
+    await almacen.escribir("data_nuevo.json", b"{}")
+    hace_dos_horas = time.time() - 7200
+    if isinstance(almacen, AlmacenResultadosDisco):
+        os.utime(tmp_path / "data_viejo.json", (hace_dos_horas, hace_dos_horas))
+    else:
+        contenido, etag, _ = almacen.cliente_prueba.objetos["resultados/data_viejo.json"]
+        almacen.cliente_prueba.objetos["resultados/data_viejo.json"] = (contenido, etag, hace_dos_horas)
+
+    assert await almacen.purgar_antiguos(3600) == 1
+    assert await almacen.leer("data_viejo.json") is None
+    assert await almacen.leer("data_nuevo.json") is not None
+
+@pytest.mark.asyncio
+async def test_modificado_y_borrar_para_el_limpiador(almacen):
+    assert await almacen.modificado("data_x.json") is None
+
+    await almacen.escribir("data_x.json", b"12345")
+    assert abs(await almacen.modificado("data_x.json") - time.time()) < 5
+
+    assert await almacen.borrar("data_x.json") == 5
+    assert await almacen.modificado("data_x.json") is None
+
+@pytest.mark.asyncio
+async def test_clave_no_escapa_del_almacen(tmp_path):
+    almacen = AlmacenResultadosDisco(str(tmp_path / "resultados"))
+    await almacen.escribir("../../data_x.json", b"{}")
+
+    assert (tmp_path / "resultados" / "data_x.json").exists()
+    assert not (tmp_path / "data_x.json").exists()
+
+@pytest.mark.asyncio
+async def test_escrituras_concurrentes_condicionales_no_pierden_cambios(almacen):
+    await almacen.escribir("data_x.json", b'{"n": 0}')
+
+    await asyncio.gather(*[
+        almacen.actualizar_json("data_x.json", lambda d: {"n": d["n"] + 1}, max_intentos=50) for _ in range(10)
+    ])
+
+    assert await almacen.leer_json("data_x.json") == {"n": 10}
+
+# ============================================================================
+# RESULTADO POR DOCUMENTO
+# ============================================================================
+
+def test_serializacion_compacta_sin_sangria():
+    assert serializar_json({"monto": 1.5, "nombre": "AÑO"}) == '{"monto":1.5,"nombre":"AÑO"}'.encode("utf-8")
+
+@pytest.mark.asyncio
+async def test_resultado_por_documento_se_reensambla_igual(almacen):
+    datos = resultado_total(4)
+
+    escritura = await guardar_por_documento(almacen, "data_job.json", datos)
+
+    assert escritura["documentos_escritos"] == 4
+    assert await leer_por_documento(almacen, "data_job.json") == datos
+    manifiesto = await almacen.leer_json("data_job.json")
+    assert "resultados_individuales" not in manifiesto
+    assert [e["hash_documento"] for e in manifiesto["documentos"]] == ["hash0", "hash1", "hash2", "hash3"]
+
+@pytest.mark.asyncio
+async def test_agregar_un_documento_solo_escribe_ese_y_el_manifiesto(almacen):
+    datos = resultado_total(5, transacciones_por_documento=200)
+    await guardar_por_documento(almacen, "data_job.json", datos)
+    tamano_documento = len(serializar_json(datos["resultados_individuales"][0]))
+
+    datos_ampliados = resultado_total(6, transacciones_por_documento=200)
+    escritura = await guardar_por_documento(almacen, "data_job.json", datos_ampliados)
+
+    assert escritura["documentos_escritos"] == 1
+    assert escritura["documentos_reutilizados"] == 5
+    assert escritura["bytes_escritos"] < 2 * tamano_documento
+    assert await leer_por_documento(almacen, "data_job.json") == datos_ampliados
+
+@pytest.mark.asyncio
+async def test_version_reemplazada_de_un_documento_se_borra(almacen):
+    datos = resultado_total(2)
+    await guardar_por_documento(almacen, "data_job.json", datos)
+    clave_vieja = (await almacen.leer_json("data_job.json"))["documentos"][1]["clave"]
+
+    datos["resultados_individuales"][1]["DetalleTransacciones"]["transacciones"][0]["categoria"] = "TRASPASO_ABONO"
+    escritura = await guardar_por_documento(almacen, "data_job.json", datos)
+
+    assert escritura["documentos_escritos"] == 1
+    assert await almacen.leer(clave_vieja) is None
+    assert await leer_por_documento(almacen, "data_job.json") == datos
+
+@pytest.mark.asyncio
+async def test_manifiesto_reemplazado_en_medio_se_reintenta_y_borra_lo_correcto(almacen):
+    """Otra réplica guarda el mismo job entre nuestra lectura y nuestra escritura del manifiesto."""
+    await guardar_por_documento(almacen, "data_job.json", resultado_total(2))
+    datos_otra_replica = resultado_total(2)
+    datos_otra_replica["resultados_individuales"][0]["AnalisisIA"]["banco"] = "BANORTE"
+    escribir_original = almacen.escribir
+    condiciones = []
+
+    async def escribir_con_carrera(clave, contenido, **condicion):
+        if clave == "data_job.json":
+            if not condiciones:
+                almacen.escribir = escribir_original
+                await guardar_por_documento(almacen, "data_job.json", datos_otra_replica)
+                almacen.escribir = escribir_con_carrera
+            condiciones.append(condicion)
+        return await escribir_original(clave, contenido, **condicion)
+
+    almacen.escribir = escribir_con_carrera
+    datos = resultado_total(3)
+    await guardar_por_documento(almacen, "data_job.json", datos)
+    almacen.escribir = escribir_original
+
+    assert len(condiciones) == 2 and all(c["si_coincide"] for c in condiciones)
+    assert await leer_por_documento(almacen, "data_job.json") == datos
+    referenciadas = {e["clave"] for e in (await almacen.leer_json("data_job.json"))["documentos"]}
+    clave_banorte = clave_documento("data_job.json", hashlib.md5(
+        serializar_json(datos_otra_replica["resultados_individuales"][0]), usedforsecurity=False
+    ).hexdigest())
+    assert clave_banorte not in referenciadas and await almacen.leer(clave_banorte) is None
+
+@pytest.mark.asyncio
+async def test_conflicto_persistente_no_borra_documentos_del_manifiesto_vigente(almacen):
+    datos = resultado_total(2)
+    await guardar_por_documento(almacen, "data_job.json", datos)
+    escribir_original = almacen.escribir
+
+    async def escribir_siempre_en_conflicto(clave, contenido, **condicion):
+        if clave == "data_job.json":
+            raise ConflictoEscrituraError(clave)
+        return await escribir_original(clave, contenido, **condicion)
+
+    almacen.escribir = escribir_siempre_en_conflicto
+    with pytest.raises(ConflictoEscrituraError):
+        await guardar_por_documento(almacen, "data_job.json", resultado_total(1, transacciones_por_documento=5))
+    almacen.escribir = escribir_original
+
+    assert await leer_por_documento(almacen, "data_job.json") == datos
+
+@pytest.mark.asyncio
+async def test_leer_solo_documentos_por_hash(almacen):
+    await guardar_por_documento(almacen, "data_job.json", resultado_total(5))
+
+    datos = await leer_por_documento(almacen, "data_job.json", hashes={"hash1", "hash3", "otro"})
+
+    assert [d["hash_documento"] for d in datos["resultados_individuales"]] == ["hash1", "hash3"]
+
+@pytest.mark.asyncio
+async def test_json_de_formato_anterior_se_sigue_leyendo(almacen):
+    datos = resultado_total(3)
+    await almacen.escribir("data_job.json", serializar_json(datos))
+
+    assert await leer_por_documento(almacen, "data_job.json") == datos
+    filtrado = await leer_por_documento(almacen, "data_job.json", hashes={"hash2"})
+    assert [d["hash_documento"] for d in filtrado["resultados_individuales"]] == ["hash2"]
+
+@pytest.mark.asyncio
+async def test_expiracion_borra_manifiesto_y_documentos(almacen):
+    await guardar_por_documento(almacen, "data_job.json", resultado_total(3))
+    claves = [e["clave"] for e in (await almacen.leer_json("data_job.json"))["documentos"]]
+
+    liberados = await almacen.expiracion_por_documento.borrar("data_job.json")
+
+    assert liberados > 0
+    assert await almacen.leer("data_job.json") is None
+    assert all([await almacen.leer(c) is None for c in claves])
+    assert almacen.expiracion_por_documento is almacen.expiracion_por_documento  # Misma fuente para el limpiador
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("formato_anterior", [False, True])
+async def test_descarga_en_streaming_completa_es_el_mismo_json(almacen, formato_anterior):
+    datos = resultado_total(3)
+    if formato_anterior:
+        await almacen.escribir("data_job.json", serializar_json(datos))
+    else:
+        await guardar_por_documento(almacen, "data_job.json", datos)
+
+    assert await descargar(almacen) == datos
+    assert await abrir_resultado_json(almacen, "data_otro.json") is None
+
+@pytest.mark.asyncio
+async def test_descarga_proyecta_campos_y_selecciona_documentos(almacen):
+    await guardar_por_documento(almacen, "data_job.json", resultado_total(4))
+
+    assert await descargar(almacen, campos=["resultados_generales"]) == {"resultados_generales": resultado_total(4)["resultados_generales"]}
+    parcial = await descargar(almacen, campos=["total_depositos", "resultados_individuales.AnalisisIA"], documentos=["hash2", "estado_0.pdf"])
+    assert parcial == {
+        "total_depositos": 6000.0,
+        "resultados_individuales": [{"AnalisisIA": {"banco": "BBVA", "depositos": 0.0}}, {"AnalisisIA": {"banco": "BBVA", "depositos": 2000.0}}],
+    }
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("formato_anterior", [False, True])
+async def test_paginacion_por_cursor_recorre_todas_las_transacciones(almacen, formato_anterior):
+    datos = resultado_total(3, transacciones_por_documento=5)
+    if formato_anterior:
+        await almacen.escribir("data_job.json", serializar_json(datos))
+    else:
+        await guardar_por_documento(almacen, "data_job.json", datos)
+
+    vistas, paginas, cursor = [], [], None
+    while True:
+        pagina = await descargar(almacen, campos=["resultados_individuales"], cursor=cursor, limite=4)
+        paginas.append([d["hash_documento"] for d in pagina["resultados_individuales"]])
+        for documento in pagina["resultados_individuales"]:
+            vistas += [t["descripcion"] for t in documento["DetalleTransacciones"]["transacciones"]]
+        cursor = pagina["paginacion"]["siguiente_cursor"]
+        if cursor is None:
+            break
+
+    assert vistas == [t["descripcion"] for d in datos["resultados_individuales"] for t in d["DetalleTransacciones"]["transacciones"]]
+    assert paginas == [["hash0"], ["hash0", "hash1"], ["hash1", "hash2"], ["hash2"]]
+
+@pytest.mark.asyncio
+async def test_registro_de_estado_se_entrega_tal_cual_y_cursor_invalido(almacen):
+    await almacen.escribir("data_job.json", serializar_json({"status": "processing", "rfc": "XAXX010101000"}))
+
+    assert await descargar(almacen) == {"status": "processing", "rfc": "XAXX010101000"}
+    with pytest.raises(ValueError):
+        await abrir_resultado_json(almacen, "data_job.json", cursor="abc")
@@ -0,0 +1,112 @@
+import asyncio
+import base64
+import sys
+
+import fitz
+import pytest
+from Fluxo_IA_visual.services import cache_render as modulo_render
+from Fluxo_IA_visual.services.cache_render import CacheRenderPaginas, renderizar_paginas_base64
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+@pytest.fixture
+def pdf_bytes():
+    """PDF de 3 páginas, cada una con texto distinto (renders distinguibles)."""
+    doc = fitz.open()
+    for i in range(3):
+        page = doc.new_page(width=300, height=400)
+        page.insert_text((50, 100), f"CARATULA PAGINA {i + 1}", fontsize=12)
+    datos = doc.tobytes()
+    doc.close()
+    return datos
+
+def render_directo(pdf_bytes, num_pagina):
+    """Mismo render que hacía `convertir_pdf_a_imagenes` (Matrix 2x, PNG) codificado a base64."""
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        pix = doc.load_page(num_pagina - 1).get_pixmap(matrix=fitz.Matrix(2, 2))
+        return base64.b64encode(pix.tobytes("png")).decode("utf-8")
+
+# ============================================================================
+# PRUEBAS
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_gpt_y_qwen_concurrentes_comparten_un_solo_render(pdf_bytes, monkeypatch):
+    """Dos llamadas simultáneas (como el gather GPT + Qwen) rasterizan cada página una sola vez."""
+    llamadas = []
+    original = modulo_render.renderizar_paginas_base64
+
+    def render_contado(datos, paginas, escala):
+        llamadas.append(list(paginas))
+        return original(datos, paginas, escala)
+
+    monkeypatch.setattr(modulo_render, "renderizar_paginas_base64", render_contado)
+    cache = CacheRenderPaginas()
+
+    imagenes_gpt, imagenes_qwen = await asyncio.gather(
+        cache.obtener_base64(pdf_bytes, [1, 2]),
+        cache.obtener_base64(pdf_bytes, [1, 2]),
+    )
+
+    assert llamadas == [[1, 2]]
+    assert imagenes_gpt == imagenes_qwen == [render_directo(pdf_bytes, 1), render_directo(pdf_bytes, 2)]
+    assert cache.metricas() == {"entradas": 2, "aciertos": 2, "renders": 1}
+
+@pytest.mark.asyncio
+async def test_solo_renderiza_paginas_faltantes_y_respeta_orden(pdf_bytes):
+    cache = CacheRenderPaginas()
+    await cache.obtener_base64(pdf_bytes, [2])
+
+    imagenes = await cache.obtener_base64(pdf_bytes, [3, 2, 9])  # La 9 no existe: se omite
+
+    assert imagenes == [render_directo(pdf_bytes, 3), render_directo(pdf_bytes, 2)]
+    assert cache.renders == 2
+
+@pytest.mark.asyncio
+async def test_mismo_contenido_en_otro_buffer_reutiliza_por_huella(pdf_bytes):
+    """La clave es el hash del documento, no la identidad del objeto bytes."""
+    cache = CacheRenderPaginas()
+    await cache.obtener_base64(pdf_bytes, [1])
+    await cache.obtener_base64(bytes(bytearray(pdf_bytes)), [1])
+
+    assert cache.renders == 1
+
+@pytest.mark.asyncio
+async def test_cache_no_retiene_los_bytes_del_pdf(pdf_bytes):
+    """Las entradas guardan la huella y los renders, nunca el buffer completo del documento."""
+    cache = CacheRenderPaginas()
+    buffers = [bytes(bytearray(pdf_bytes)) for _ in range(3)]
+    referencias_antes = [sys.getrefcount(b) for b in buffers]
+
+    for i in range(len(buffers)):
+        await cache.obtener_base64(buffers[i], [1])
+    for _ in range(100):  # El hilo del hash suelta su referencia un instante después de responder
+        if [sys.getrefcount(b) for b in buffers] == referencias_antes:
+            break
+        await asyncio.sleep(0.01)
+
+    assert [sys.getrefcount(b) for b in buffers] == referencias_antes
+    assert cache.renders == 1
+
+@pytest.mark.asyncio
+async def test_expulsion_lru_por_maximo_de_entradas(pdf_bytes):
+    cache = CacheRenderPaginas(max_entradas=2)
+    await cache.obtener_base64(pdf_bytes, [1, 2, 3])
+
+    assert cache.metricas()["entradas"] == 2
+    await cache.obtener_base64(pdf_bytes, [1])  # Expulsada: vuelve a renderizar
+    assert cache.renders == 2
+
+@pytest.mark.asyncio
+async def test_render_fallido_no_queda_en_cache():
+    cache = CacheRenderPaginas()
+
+    with pytest.raises(ValueError):
+        await cache.obtener_base64(b"no soy un pdf", [1])
+
+    assert cache.metricas()["entradas"] == 0
+
+def test_render_sincrono_omite_paginas_fuera_de_rango(pdf_bytes):
+    assert list(renderizar_paginas_base64(pdf_bytes, [0, 3, 4])) == [3]
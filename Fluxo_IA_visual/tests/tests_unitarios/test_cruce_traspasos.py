@@ -0,0 +1,134 @@
+import re
+import random
+import difflib
+import unicodedata
+
+import pytest
+from Fluxo_IA_visual.core.cruce_traspasos import (
+    MOTIVO_CUENTA, MOTIVO_NOMBRE, IndiceTraspasosPropios, limpiar_nombre_empresa,
+)
+from Fluxo_IA_visual.core.motor_clasificador import MotorClasificador
+
+# ============================================================================
+# RÉPLICA DEL CRUCE ANTERIOR (referencia exacta)
+# ============================================================================
+
+def limpiar_nombre_legado(nombre):
+    if not nombre or nombre.lower() in ["n/a", "desc.", "desconocido", ""]:
+        return ""
+    nombre_limpio = unicodedata.normalize('NFKD', nombre.lower()).encode('ASCII', 'ignore').decode('utf-8')
+    sufijos = [
+        r"\bs\.a\. de c\.v\.\b", r"\bsa de cv\b", r"\bs\.a\.\b", r"\bs a\b",
+        r"\bs\.a\.p\.i\. de c\.v\.\b", r"\bsapi de cv\b", r"\bsapi\b",
+        r"\bs\. de r\.l\. de c\.v\.\b", r"\bs de rl de cv\b", r"\bs de rl\b", r"\bs\. de r\.l\.\b",
+        r"\bc\.v\.\b", r"\bcv\b", r"\bde c\.v\.\b", r"\bde cv\b"
+    ]
+    for sufijo in sufijos:
+        nombre_limpio = re.sub(sufijo, "", nombre_limpio)
+    nombre_limpio = re.sub(r"[^\w\s]", "", nombre_limpio)
+    return re.sub(r"\s+", " ", nombre_limpio).strip()
+
+def es_propia_legado(descripcion, nombre):
+    nombre_limpio = limpiar_nombre_legado(nombre)
+    if len(nombre_limpio) < 4:
+        return False
+    desc_norm = unicodedata.normalize('NFKD', descripcion.lower()).encode('ASCII', 'ignore').decode('utf-8')
+    desc_limpia = re.sub(r"[^\w\s]", "", desc_norm)
+    if nombre_limpio in desc_limpia:
+        return True
+    palabras_desc = desc_limpia.split()
+    largo_nombre = len(nombre_limpio.split())
+    if largo_nombre == 0 or len(palabras_desc) < largo_nombre:
+        return False
+    for i in range(len(palabras_desc) - largo_nombre + 1):
+        fragmento = " ".join(palabras_desc[i:i + largo_nombre])
+        if difflib.SequenceMatcher(None, nombre_limpio, fragmento).ratio() >= 0.85:
+            return True
+    return False
+
+def cruce_legado(descripcion, nombres, cuentas):
+    if cuentas:
+        for num in re.findall(r'\b\d{10,18}\b', descripcion.lower()):
+            if num in cuentas:
+                return MOTIVO_CUENTA
+    if nombres and any(es_propia_legado(descripcion, n) for n in nombres):
+        return MOTIVO_NOMBRE
+    return ""
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+NOMBRES = [
+    "Comercializadora Del Norte, S.A. de C.V.", "PANADERÍA LA ESPIGA SAPI DE CV", "José Núñez Peña",
+    "Grupo Ferretero Álamo S. de R.L.", "TRANSPORTES RAPIDOS DE OCCIDENTE", "N/A", "ABC", "Soluciones Iñaki SA",
+]
+
+def ruido_ocr(texto, rnd):
+    """Sustituciones, borrados y espacios de más como los que deja un OCR."""
+    chars = list(texto)
+    for _ in range(rnd.randint(0, 3)):
+        if not chars:
+            break
+        pos = rnd.randrange(len(chars))
+        accion = rnd.random()
+        if accion < 0.4:
+            chars[pos] = rnd.choice("abcdefghijklmnopqrstuvwxyz01 ")
+        elif accion < 0.7:
+            del chars[pos]
+        else:
+            chars.insert(pos, rnd.choice(".- x"))
+    return "".join(chars)
+
+def descripciones_aleatorias(n, semilla):
+    rnd = random.Random(semilla)
+    prefijos = ["SPEI ENVIADO A", "TRASPASO DE", "DEPOSITO", "PAGO PROVEEDOR", "SPEI RECIBIDO", "COMPRA"]
+    descripciones = []
+    for _ in range(n):
+        partes = [rnd.choice(prefijos)]
+        if rnd.random() < 0.6:
+            partes.append(ruido_ocr(rnd.choice(NOMBRES).upper(), rnd))
+        if rnd.random() < 0.3:
+            partes.append(rnd.choice(["0123456789", "646180157000000004", "5555555555", "REF 998877"]))
+        partes.append(f"REF{rnd.randint(1, 99999)}")
+        descripciones.append(" ".join(partes))
+    return descripciones
+
+# ============================================================================
+# PRUEBAS
+# ============================================================================
+
+@pytest.mark.parametrize("semilla", [1, 2, 3])
+def test_indice_da_el_mismo_motivo_que_el_cruce_por_nombre_y_cuenta(semilla):
+    cuentas = {"646180157000000004", "7000000004", "57000000004"}
+    indice = IndiceTraspasosPropios(NOMBRES, cuentas)
+
+    for descripcion in descripciones_aleatorias(2000, semilla):
+        assert indice.motivo(descripcion) == cruce_legado(descripcion, NOMBRES, cuentas), descripcion
+
+def test_limpieza_de_nombre_identica_a_la_anterior():
+    for nombre in NOMBRES + ["S.A. de C.V.", "Mi Empresa S.A.P.I. de C.V.", "", "Desconocido"]:
+        assert limpiar_nombre_empresa(nombre) == limpiar_nombre_legado(nombre)
+
+def test_nombres_cortos_o_vacios_no_entran_al_indice():
+    indice = IndiceTraspasosPropios(["N/A", "ABC", "", "Comercializadora Del Norte SA de CV"], [])
+
+    assert indice.nombres == ["comercializadora del norte"]
+    assert indice.motivo("SPEI ABC N/A") == ""
+
+def test_cuenta_tiene_prioridad_y_se_reporta():
+    indice = IndiceTraspasosPropios(["Comercializadora Del Norte"], {"7000000004"})
+    descripcion = "SPEI COMERCIALIZADORA DEL NORTE 7000000004"
+
+    assert indice.motivo(descripcion) == MOTIVO_CUENTA
+    assert indice.cuenta_en_descripcion(descripcion) == "7000000004"
+    assert indice.motivo("SPEI COMERCIALIZADORA DEL N0RTE") == MOTIVO_NOMBRE
+
+def test_sin_nombres_ni_cuentas_el_indice_es_falso():
+    assert not IndiceTraspasosPropios(["N/A"], [])
+
+def test_motor_conserva_la_validacion_por_nombre():
+    motor = MotorClasificador(debug_flags=None)
+    for descripcion in descripciones_aleatorias(300, 7):
+        for nombre in NOMBRES:
+            assert motor._es_transaccion_propia(descripcion, nombre) == es_propia_legado(descripcion, nombre)
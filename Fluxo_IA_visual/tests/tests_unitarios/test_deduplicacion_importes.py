@@ -0,0 +1,144 @@
+import copy
+import json
+import random
+import re
+from pathlib import Path
+
+import pytest
+from Fluxo_IA_visual.core.spatial_bank import MotorExtraccionEspacial
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+# ============================================================================
+# IMPLEMENTACIÓN DE REFERENCIA (Versión cuadrática original, usada como oráculo)
+# ============================================================================
+
+def deduplicar_importes_referencia(todas_las_transacciones):
+    """Copia fiel del algoritmo previo al índice hash (normales x importes)."""
+    PALABRAS_IGNORADAS = {"de", "la", "el", "en", "por", "para", "un", "una", "spei", "pago", "envio", "transferencia", "cv", "sa"}
+
+    def obtener_palabras_clave(texto):
+        limpio = re.sub(r'[^\w\s]', ' ', str(texto).lower())
+        return set(p for p in limpio.split() if len(p) > 2 and p not in PALABRAS_IGNORADAS)
+
+    normales = [
+        tx for tx in todas_las_transacciones
+        if not tx.get("es_importe_original") or tx.get("tiene_signo")
+        or (tx.get("es_columna_unica") and not tx.get("spei_mode"))
+    ]
+    importes = [
+        tx for tx in todas_las_transacciones
+        if tx.get("es_importe_original") and not tx.get("tiene_signo")
+        and (not tx.get("es_columna_unica") or tx.get("spei_mode"))
+    ]
+    ids_importes_fusionados = set()
+
+    importes_credito = [imp for imp in importes if imp.get("spei_mode") == "DETALLE_CREDITO"]
+    grupos = {}
+    for imp in importes_credito:
+        fecha_str = str(imp.get("fecha", "")).strip()
+        match = re.search(r'\d{8,15}', imp.get("descripcion", "").replace('-', '').replace('\n', ''))
+        grupos.setdefault((fecha_str, match.group(0) if match else "GENERICO"), []).append(imp)
+
+    for (fecha_str, _), grupo in grupos.items():
+        if len(grupo) > 1:
+            suma_total = sum(float(imp.get("monto", 0.0)) for imp in grupo if "monto" in imp)
+            candidatos_padre = [
+                n for n in normales
+                if str(n.get("fecha", "")).strip() == fecha_str
+                and abs(float(n.get("monto", 0.0)) - suma_total) < 0.01
+            ]
+            if len(candidatos_padre) == 1:
+                padre = candidatos_padre[0]
+                desc_hijos = " | ".join([imp.get("descripcion", "").replace("\n", " ").strip() for imp in grupo])
+                padre["descripcion"] = f"{padre['descripcion']} | DESGLOSE: {desc_hijos}"
+                for imp in grupo:
+                    ids_importes_fusionados.add(id(imp))
+
+    for imp in [imp for imp in importes if id(imp) not in ids_importes_fusionados]:
+        monto_imp = float(imp.get("monto", 0.0))
+        fecha_imp = str(imp.get("fecha", "")).strip()
+        palabras_imp = obtener_palabras_clave(imp.get("descripcion", ""))
+
+        candidatos_exactos = [
+            n for n in normales
+            if abs(float(n.get("monto", 0.0)) - monto_imp) < 0.01 and str(n.get("fecha", "")).strip() == fecha_imp
+        ]
+        if len(candidatos_exactos) == 1:
+            norm = candidatos_exactos[0]
+            norm["descripcion"] = f"{norm['descripcion']} | {imp['descripcion']}"
+            ids_importes_fusionados.add(id(imp))
+            continue
+
+        lista_busqueda = candidatos_exactos if len(candidatos_exactos) > 1 else normales
+        for norm in lista_busqueda:
+            if abs(float(norm.get("monto", 0.0)) - monto_imp) < 0.01:
+                if palabras_imp.intersection(obtener_palabras_clave(norm.get("descripcion", ""))):
+                    norm["descripcion"] = f"{norm['descripcion']} | {imp['descripcion']}"
+                    ids_importes_fusionados.add(id(imp))
+                    break
+
+    return ids_importes_fusionados
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+def correr_y_resumir(funcion, transacciones):
+    """Ejecuta la deduplicación sobre una copia y devuelve (descripciones finales, posiciones eliminadas)."""
+    txs = copy.deepcopy(transacciones)
+    ids = funcion(txs)
+    eliminadas = [i for i, tx in enumerate(txs) if id(tx) in ids]
+    return [tx["descripcion"] for tx in txs], eliminadas
+
+def generar_transacciones(rnd, n):
+    """Mezcla aleatoria de normales e importes con montos y fechas repetidos (fuerza empates)."""
+    palabras = ["ACME", "GODE", "NORTE", "FARMACIA", "SPEI", "PAGO", "CLIENTE", "RASTREO"]
+    txs = []
+    for _ in range(n):
+        es_importe = rnd.random() < 0.45
+        txs.append({
+            "fecha": f"{rnd.randint(1, 4):02d}-ENE-26",
+            "descripcion": " ".join(rnd.sample(palabras, 2)) + f"\n{rnd.randint(10**8, 10**9)}",
+            "monto": rnd.choice([100.0, 100.01, 99.99, 250.5, 0.07, 0.06, 1.1, 1.09]),
+            "es_importe_original": es_importe,
+            "tiene_signo": es_importe and rnd.random() < 0.1,
+            "es_columna_unica": rnd.random() < 0.1,
+            "spei_mode": rnd.choice([None, "RECIBIDOS", "ENVIADOS", "DETALLE_CREDITO"]) if es_importe else None,
+        })
+    return txs
+
+# ============================================================================
+# PRUEBAS: EQUIVALENCIA CONTRA LA IMPLEMENTACIÓN ORIGINAL
+# ============================================================================
+
+def test_deduplicacion_indexada_igual_a_referencia_en_fixture_mifel():
+    """Sobre movimientos grabados de un estado MIFEL, el índice hash debe fusionar exactamente igual."""
+    transacciones = json.loads((FIXTURES_DIR / "dedup_importes_mifel.json").read_text(encoding="utf-8"))
+    motor = MotorExtraccionEspacial(debug_flags=None, banco="MIFEL")
+
+    esperado = correr_y_resumir(deduplicar_importes_referencia, transacciones)
+    obtenido = correr_y_resumir(motor._deduplicar_importes_global, transacciones)
+
+    assert obtenido == esperado
+    assert len(obtenido[1]) > 0  # El fixture sí ejercita fusiones
+
+@pytest.mark.parametrize("semilla", range(25))
+def test_deduplicacion_indexada_igual_a_referencia_aleatoria(semilla):
+    """Casos aleatorios con empates de monto/fecha, montos a 1 centavo y zonas de crédito."""
+    rnd = random.Random(semilla)
+    transacciones = generar_transacciones(rnd, rnd.randint(5, 120))
+    motor = MotorExtraccionEspacial(debug_flags=None, banco="MIFEL")
+
+    assert correr_y_resumir(motor._deduplicar_importes_global, transacciones) == \
+        correr_y_resumir(deduplicar_importes_referencia, transacciones)
+
+def test_candidatos_por_monto_respeta_tolerancia_de_un_centavo():
+    """La búsqueda por cubetas debe aceptar exactamente lo mismo que abs(a - b) < 0.01."""
+    motor = MotorExtraccionEspacial(debug_flags=None)
+    txs = [{"monto": m, "fecha": "01"} for m in (0.06, 0.07, 1.09, 1.1, 5.0, float("nan"), "N/A")]
+    montos, por_monto, _ = motor._indexar_por_monto_fecha(txs)
+
+    for objetivo in (0.06, 0.07, 1.1, 5.0, 5.01):
+        esperado = [i for i, m in enumerate(montos) if m is not None and abs(m - objetivo) < 0.01]
+        assert motor._candidatos_por_monto(por_monto, montos, objetivo) == esperado
@@ -0,0 +1,204 @@
+import asyncio
+import time
+
+import pytest
+from Fluxo_IA_visual.core.motor_clasificador import MotorClasificador
+from Fluxo_IA_visual.services.despachador_ia import DespachadorLotesIA, LimitadorTokens
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+class TransaccionMock:
+    def __init__(self, descripcion, monto, tipo):
+        self.descripcion = descripcion
+        self.monto = monto
+        self.tipo = tipo
+        self.categoria = "GENERAL"
+        self.razon_clasificacion = ""
+
+def empaquetar(prefijo, n):
+    """Lote de un documento con ids locales 0..n-1 (se repiten entre documentos a propósito)."""
+    return [{"id": i, "tx_data": {"descripcion": f"{prefijo} {i}", "tipo": "abono"}} for i in range(n)]
+
+def ia_eco(registro_lotes, demora=0.0):
+    """IA falsa que responde con la descripción de cada transacción como etiqueta."""
+    async def _ia(banco, lote):
+        registro_lotes.append(len(lote))
+        await asyncio.sleep(demora)
+        return {str(item["id"]): item["tx_data"]["descripcion"] for item in lote}
+    return _ia
+
+# ============================================================================
+# PRUEBAS: MEZCLA DE LOTES ENTRE DOCUMENTOS
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_mezcla_documentos_en_lotes_llenos_y_traduce_ids():
+    """Dos documentos de 30 txs con tope de 50 viajan en 2 lotes (no 2 por documento) y cada uno recibe lo suyo."""
+    despachador = DespachadorLotesIA(tamano_lote_max=50)
+    lotes = []
+    ia = ia_eco(lotes)
+
+    mapa_a, mapa_b = await asyncio.gather(
+        despachador.clasificar("bbva", empaquetar("DOC A", 30), ia),
+        despachador.clasificar("bbva", empaquetar("DOC B", 30), ia),
+    )
+
+    assert sorted(lotes) == [10, 50]
+    assert mapa_a == {str(i): f"DOC A {i}" for i in range(30)}
+    assert mapa_b == {str(i): f"DOC B {i}" for i in range(30)}
+
+@pytest.mark.asyncio
+async def test_bancos_distintos_no_se_mezclan():
+    """El prompt depende del banco: cada banco arma sus propios lotes."""
+    despachador = DespachadorLotesIA(tamano_lote_max=100)
+    bancos_vistos = []
+
+    async def ia(banco, lote):
+        bancos_vistos.append((banco, len(lote)))
+        return {}
+
+    await asyncio.gather(
+        despachador.clasificar("bbva", empaquetar("A", 5), ia),
+        despachador.clasificar("banorte", empaquetar("B", 7), ia),
+    )
+
+    assert sorted(bancos_vistos) == [("banorte", 7), ("bbva", 5)]
+
+# ============================================================================
+# PRUEBAS: LÍMITES GLOBALES Y ENTREGA EN FLUJO
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_concurrencia_global_acotada():
+    """10 documentos x 2 lotes con límite 3: nunca hay más de 3 llamadas en vuelo."""
+    despachador = DespachadorLotesIA(max_concurrencia=3, tamano_lote_max=10)
+    lotes = []
+    ia = ia_eco(lotes, demora=0.01)
+
+    await asyncio.gather(*[despachador.clasificar("bbva", empaquetar(f"D{d}", 20), ia) for d in range(10)])
+
+    assert sum(lotes) == 200
+    assert despachador.metricas()["max_en_vuelo"] == 3
+
+@pytest.mark.asyncio
+async def test_entrega_en_flujo_por_lote_terminado():
+    """El documento recibe cada lote conforme termina, sin esperar al resto."""
+    despachador = DespachadorLotesIA(tamano_lote_max=2)
+
+    async def ia(banco, lote):
+        await asyncio.sleep(0.05 if lote[0]["id"] == 0 else 0.0)
+        return {str(item["id"]): "TPV" for item in lote}
+
+    llegadas = []
+    async for mapa_parcial, ids_lote, es_fallback in despachador.en_flujo("bbva", empaquetar("X", 4), ia):
+        llegadas.append(ids_lote)
+        assert not es_fallback
+
+    assert llegadas == [["2", "3"], ["0", "1"]]
+
+@pytest.mark.asyncio
+async def test_lote_con_excepcion_no_deja_documentos_colgados():
+    """Si la función IA truena, el documento recibe sus ids sin etiqueta y el fallo queda en métricas."""
+    despachador = DespachadorLotesIA()
+
+    async def ia_caida(banco, lote):
+        raise RuntimeError("429 Too Many Requests")
+
+    mapa = await asyncio.wait_for(despachador.clasificar("bbva", empaquetar("X", 3), ia_caida), timeout=1)
+
+    assert mapa == {}
+    assert despachador.metricas()["lotes_fallidos"] == 1
+
+@pytest.mark.asyncio
+async def test_fallback_general_se_marca_por_lote():
+    """Un lote respondido completo como GENERAL se reporta como fallback (para no cachearlo)."""
+    despachador = DespachadorLotesIA()
+
+    async def ia_fallback(banco, lote):
+        return {str(item["id"]): "GENERAL" for item in lote}
+
+    resultados = [r async for r in despachador.en_flujo("bbva", empaquetar("X", 3), ia_fallback)]
+
+    assert resultados == [({"0": "GENERAL", "1": "GENERAL", "2": "GENERAL"}, ["0", "1", "2"], True)]
+
+# ============================================================================
+# PRUEBAS: ADAPTACIÓN Y LÍMITE DE TOKENS
+# ============================================================================
+
+def test_tamano_de_lote_se_adapta_a_la_latencia():
+    """Latencia alta reduce el lote hasta el mínimo; latencia baja lo regresa al máximo."""
+    despachador = DespachadorLotesIA(tamano_lote_max=100, tamano_lote_min=20, latencia_objetivo_seg=10.0)
+
+    for _ in range(20):
+        despachador._registrar_latencia(60.0)
+    assert despachador.tamano_lote == 20
+
+    for _ in range(40):
+        despachador._registrar_latencia(0.5)
+    assert despachador.tamano_lote == 100
+
+@pytest.mark.asyncio
+async def test_limitador_de_tokens_espera_al_agotar_la_cubeta():
+    """Con 6,000 tokens/min (100/s), pedir 20 tokens tras vaciar la cubeta espera ~0.2 s."""
+    limitador = LimitadorTokens(tokens_por_minuto=6000)
+    await limitador.adquirir(6000)
+
+    t0 = time.monotonic()
+    await limitador.adquirir(20)
+    assert 0.15 <= time.monotonic() - t0 < 1.0
+
+# ============================================================================
+# PRUEBAS: INTEGRACIÓN CON EL MOTOR CLASIFICADOR
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_motor_con_despachador_comparte_lotes_entre_documentos():
+    """Dos documentos clasificados a la vez por el motor viajan en un solo lote del despachador."""
+    motor = MotorClasificador(debug_flags=None, despachador_ia=DespachadorLotesIA(tamano_lote_max=100))
+    llamadas = []
+
+    async def ia(banco, lote):
+        llamadas.append(len(lote))
+        return {str(item["id"]): "TPV" for item in lote}
+
+    doc_a = [TransaccionMock(f"MOV ZQX {i}", "10", "abono") for i in range(4)]
+    doc_b = [TransaccionMock(f"MOV WQY {i}", "5", "abono") for i in range(3)]
+
+    totales_a, totales_b = await asyncio.gather(
+        motor.clasificar_y_sumar_transacciones(doc_a, "bbva", ia),
+        motor.clasificar_y_sumar_transacciones(doc_b, "bbva", ia),
+    )
+
+    assert llamadas == [7]
+    assert all(tx.categoria == "TPV" for tx in doc_a + doc_b)
+    assert totales_a["TPV"] == 40.0 and totales_b["TPV"] == 15.0
+
+# ============================================================================
+# PRUEBAS: EL HEDGE RESPETA LOS LÍMITES DEL DESPACHADOR
+# ============================================================================
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("max_concurrencia, llamadas_esperadas", [(1, 1), (2, 2)])
+async def test_hedge_toma_cupo_del_despachador(max_concurrencia, llamadas_esperadas):
+    from Fluxo_IA_visual.services import resiliencia_ia
+    resiliencia_ia._METRICAS_POR_MODELO.clear()
+    resiliencia_ia._CIRCUITOS_POR_PROVEEDOR.clear()
+    resiliencia_ia.obtener_metricas("gpt-lotes").latencias.extend([0.01] * 20)
+    despachador = DespachadorLotesIA(max_concurrencia=max_concurrencia, tamano_lote_max=10)
+    llamadas = []
+
+    async def ia(banco, lote):
+        async def peticion():
+            llamadas.append(1)
+            await asyncio.sleep(0.1 if len(llamadas) == 1 else 0.0)
+            return {str(item["id"]): "GENERAL" for item in lote}
+        return await resiliencia_ia.llamar_con_resiliencia(peticion, "openai", "gpt-lotes", hedge=True)
+
+    await despachador.clasificar("bbva", empaquetar("D", 10), ia)
+
+    assert len(llamadas) == llamadas_esperadas
+    assert despachador.metricas()["max_en_vuelo"] == llamadas_esperadas
+    assert despachador.metricas()["en_vuelo"] == 0
+    resiliencia_ia._METRICAS_POR_MODELO.clear()
@@ -0,0 +1,117 @@
+import copy
+import json
+import random
+import re
+from pathlib import Path
+
+import pytest
+from Fluxo_IA_visual.core.extractor_determinista import ExtractorDeterministaOCR
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+# ============================================================================
+# IMPLEMENTACIÓN DE REFERENCIA (Versión original con escaneo anidado, usada como oráculo)
+# ============================================================================
+
+def deduplicar_referencia(todas_las_transacciones):
+    """Copia fiel del cruce padre/hijo SPEI previo al índice por (día, importe)."""
+    PALABRAS_IGNORADAS = {"de", "la", "el", "en", "por", "para", "un", "una", "spei", "pago", "envio", "transferencia", "cv", "sa", "banco"}
+
+    def obtener_palabras_clave(texto):
+        limpio = re.sub(r'[^\w\s]', ' ', str(texto).lower())
+        return set(p for p in limpio.split() if len(p) > 2 and p not in PALABRAS_IGNORADAS)
+
+    kw_transferencias = ["SPEI", "SPEL", "TRASPASO", "TRANSF", "TRANSFERENCIA", "PAGO", "NETNM", "SOBRANTE"]
+    padres_candidatos = [
+        tx for tx in todas_las_transacciones
+        if tx.get("seccion") == "PRINCIPAL" and any(k in tx.get("descripcion", "").upper() for k in kw_transferencias)
+    ]
+    padres_intocables = [
+        tx for tx in todas_las_transacciones
+        if tx.get("seccion") == "PRINCIPAL" and not any(k in tx.get("descripcion", "").upper() for k in kw_transferencias)
+    ]
+    hijos = [tx for tx in todas_las_transacciones if tx.get("seccion") == "SPEI_RECIBIDOS"] + \
+            [tx for tx in todas_las_transacciones if tx.get("seccion") == "SPEI_ENVIADOS"]
+    ids_hijos_fusionados = set()
+
+    for hijo in hijos:
+        importe_hijo = float(hijo["importe"])
+        palabras_hijo = obtener_palabras_clave(hijo["descripcion"])
+        candidatos = [
+            p for p in padres_candidatos
+            if p["fecha"][:2] == hijo["fecha"][:2] and abs(float(p["importe"]) - importe_hijo) < 0.01
+        ]
+        if len(candidatos) == 1:
+            candidatos[0]["descripcion"] = f"{candidatos[0]['descripcion']} | DETALLE: {hijo['descripcion']}"
+            ids_hijos_fusionados.add(id(hijo))
+            continue
+        for padre in candidatos:
+            if palabras_hijo.intersection(obtener_palabras_clave(padre["descripcion"])):
+                padre["descripcion"] = f"{padre['descripcion']} | DETALLE: {hijo['descripcion']}"
+                ids_hijos_fusionados.add(id(hijo))
+                break
+
+    lista_final = padres_candidatos + padres_intocables + [h for h in hijos if id(h) not in ids_hijos_fusionados]
+    for tx in lista_final:
+        tx.pop("seccion", None)
+    lista_final.sort(key=lambda x: x["fecha"])
+    return lista_final
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+def generar_transacciones(rnd, n):
+    """Padres PRINCIPAL e hijos SPEI con días e importes repetidos para forzar empates."""
+    nombres = ["ACME", "GODE NORTE", "FARMACIA CENTRO", "JUAN PEREZ", "DETALLE"]
+    txs = []
+    for _ in range(n):
+        seccion = rnd.choice(["PRINCIPAL", "PRINCIPAL", "SPEI_RECIBIDOS", "SPEI_ENVIADOS"])
+        prefijo = rnd.choice(["SPEI", "TRASPASO", "COMISION", ""]) if seccion == "PRINCIPAL" else ""
+        txs.append({
+            "fecha": f"{rnd.randint(1, 3):02d}",
+            "descripcion": f"{prefijo} {rnd.choice(nombres)} {rnd.randint(100, 999)}".strip(),
+            "importe": rnd.choice([100.0, 100.01, 99.99, 1.1, 1.09, 2500.0]),
+            "tipo": "ABONO",
+            "seccion": seccion,
+        })
+    return txs
+
+# ============================================================================
+# PRUEBAS: REGRESIÓN SOBRE FILAS TEXTRACT GRABADAS
+# ============================================================================
+
+def test_deduplicar_igual_a_referencia_en_filas_textract_mifel():
+    """Filas Textract grabadas -> transacciones -> deduplicación: el índice debe dar la misma salida."""
+    fixture = json.loads((FIXTURES_DIR / "textract_filas_mifel.json").read_text(encoding="utf-8"))
+    extractor = ExtractorDeterministaOCR(banco=fixture["banco"])
+    transacciones = extractor.procesar_transacciones(fixture["filas"], fixture["saldo_inicial"])
+
+    esperado = deduplicar_referencia(copy.deepcopy(transacciones))
+    obtenido = extractor.deduplicar_transacciones(copy.deepcopy(transacciones))
+
+    assert obtenido == esperado
+    assert len(obtenido) < len(transacciones)  # El fixture sí ejercita fusiones padre/hijo
+
+@pytest.mark.parametrize("semilla", range(25))
+def test_deduplicar_igual_a_referencia_aleatoria(semilla):
+    """Casos aleatorios con varios padres candidatos y montos separados por 1 centavo."""
+    rnd = random.Random(semilla)
+    transacciones = generar_transacciones(rnd, rnd.randint(3, 150))
+    extractor = ExtractorDeterministaOCR(banco="MIFEL")
+
+    assert extractor.deduplicar_transacciones(copy.deepcopy(transacciones)) == \
+        deduplicar_referencia(copy.deepcopy(transacciones))
+
+def test_deduplicar_banorte_no_fusiona():
+    """BANORTE no usa tablas SPEI separadas: solo limpia la sección y ordena por fecha."""
+    extractor = ExtractorDeterministaOCR(banco="BANORTE")
+    txs = [
+        {"fecha": "02", "descripcion": "SPEI A", "importe": 10.0, "seccion": "PRINCIPAL"},
+        {"fecha": "01", "descripcion": "A", "importe": 10.0, "seccion": "SPEI_RECIBIDOS"},
+    ]
+
+    resultado = extractor.deduplicar_transacciones(txs)
+
+    assert [tx["fecha"] for tx in resultado] == ["01", "02"]
+    assert all("seccion" not in tx for tx in resultado)
@@ -0,0 +1,124 @@
+import io
+import os
+import hashlib
+import zipfile
+import tempfile
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from Fluxo_IA_visual.core.config import settings
+from Fluxo_IA_visual.services import file_manager as modulo_file_manager
+from Fluxo_IA_visual.services.file_manager import FileManagerService
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+def pdf_falso(tamano: int) -> bytes:
+    return b"%PDF-1.7\n" + os.urandom(tamano)
+
+def zip_con(miembros: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archivo_zip:
+        for nombre, contenido in miembros.items():
+            archivo_zip.writestr(nombre, contenido)
+    return buffer.getvalue()
+
+def subida(contenido: bytes, nombre: str) -> UploadFile:
+    """UploadFile como lo arma Starlette: en memoria hasta 1MB, luego a disco."""
+    archivo = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    archivo.write(contenido)
+    archivo.seek(0)
+    return UploadFile(file=archivo, filename=nombre)
+
+@pytest.fixture
+def file_manager(tmp_path):
+    return FileManagerService(upload_dir=str(tmp_path / "temp_uploads"))
+
+def archivos_en(directorio):
+    return sorted(p.name for p in directorio.rglob("*") if p.is_file())
+
+# ============================================================================
+# PRUEBAS: HASH EN LA MISMA PASADA
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_hash_del_pdf_es_el_sha256_del_archivo(file_manager):
+    contenido = pdf_falso(3 * 1024 * 1024 + 17)  # Varios bloques y un resto
+
+    archivos = await file_manager.procesar_entrada(subida(contenido, "estado.pdf"))
+
+    assert len(archivos) == 1
+    assert archivos[0]["hash_documento"] == hashlib.sha256(contenido).hexdigest()
+    assert archivos[0]["path"].read_bytes() == contenido
+
+@pytest.mark.asyncio
+async def test_hash_de_cada_pdf_del_zip_es_su_sha256(file_manager):
+    miembros = {
+        "marzo.pdf": pdf_falso(1500 * 1024),
+        "carpeta/abril.pdf": pdf_falso(10),
+        "__MACOSX/basura.pdf": pdf_falso(10),
+        "notas.txt": b"no es pdf",
+    }
+
+    archivos = await file_manager.procesar_entrada(subida(zip_con(miembros), "estados.zip"))
+
+    esperados = {os.path.basename(n): hashlib.sha256(c).hexdigest() for n, c in miembros.items() if n in ("marzo.pdf", "carpeta/abril.pdf")}
+    assert {a["filename"]: a["hash_documento"] for a in archivos} == esperados
+    assert all(a["es_zip_content"] and a["original_source"] == "estados.zip" for a in archivos)
+    assert all(a["path"].read_bytes() == miembros[n] for a, n in zip(archivos, ["marzo.pdf", "carpeta/abril.pdf"]))
+    assert not list(file_manager.upload_dir.glob("*.zip"))  # El .zip original ya no se necesita
+
+# ============================================================================
+# PRUEBAS: LÍMITES Y RECHAZOS
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_archivo_mayor_al_limite_da_413_y_no_deja_basura(file_manager, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE_MB", 1)
+
+    with pytest.raises(HTTPException) as error:
+        await file_manager.procesar_entrada(subida(pdf_falso(2 * 1024 * 1024), "grande.pdf"))
+
+    assert error.value.status_code == 413
+    assert archivos_en(file_manager.upload_dir) == []
+
+@pytest.mark.asyncio
+async def test_zip_que_excede_el_total_descomprimido_da_413_y_se_borra(file_manager, monkeypatch):
+    monkeypatch.setattr(modulo_file_manager, "MAX_TOTAL_UNCOMPRESSED_MB", 1)
+    miembros = {"a.pdf": pdf_falso(700 * 1024), "b.pdf": pdf_falso(700 * 1024)}
+
+    with pytest.raises(HTTPException) as error:
+        await file_manager.procesar_entrada(subida(zip_con(miembros), "estados.zip"))
+
+    assert error.value.status_code == 413
+    assert archivos_en(file_manager.upload_dir) == []
+
+def test_tope_descomprimido_se_revisa_con_los_bytes_reales():
+    """Aunque la cabecera del ZIP mienta sobre el tamaño, la copia se corta al rebasar el tope."""
+    destino = io.BytesIO()
+    with pytest.raises(HTTPException) as error:
+        FileManagerService._copiar_con_hash(io.BytesIO(b"x" * (3 * 1024 * 1024)), destino, max_bytes=2 * 1024 * 1024)
+
+    assert error.value.status_code == 413
+    assert len(destino.getvalue()) <= 2 * 1024 * 1024
+
+@pytest.mark.asyncio
+async def test_zip_slip_se_rechaza_sin_escribir_fuera(file_manager, tmp_path):
+    miembros = {"bueno.pdf": pdf_falso(10), "../../fuera.pdf": pdf_falso(10)}
+
+    with pytest.raises(HTTPException) as error:
+        await file_manager.procesar_entrada(subida(zip_con(miembros), "malicioso.zip"))
+
+    assert error.value.status_code == 400
+    assert not (tmp_path / "fuera.pdf").exists()
+    assert not list(file_manager.upload_dir.glob("*.zip"))
+
+@pytest.mark.asyncio
+async def test_magic_bytes_invalidos_dan_415(file_manager):
+    with pytest.raises(HTTPException) as error:
+        await file_manager.procesar_entrada(subida(b"MZ\x90\x00ejecutable", "factura.pdf"))
+
+    assert error.value.status_code == 415
+    assert archivos_en(file_manager.upload_dir) == []
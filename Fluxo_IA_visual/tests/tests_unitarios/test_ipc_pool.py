@@ -0,0 +1,178 @@
+import asyncio
+import pickle
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import fitz
+import pytest
+from Fluxo_IA_visual.core.motor_caratulas import MotorCaratulas, analizar_estructura_worker_sync
+from Fluxo_IA_visual.models.responses_analisisTPV import AnalisisTPV
+from Fluxo_IA_visual.services import ipc_pool
+from Fluxo_IA_visual.services.ipc_pool import (
+    DocumentoCompartido, EjecutorMedido, PresupuestoMemoriaCompartida, RefDocumento, abrir_pdf,
+    compactar_resultado, vista_pdf,
+)
+from Fluxo_IA_visual.models.tabla_transacciones import TablaTransacciones
+
+# ============================================================================
+# FIXTURES Y FUNCIONES DE WORKER (deben ser importables para el pool)
+# ============================================================================
+
+@pytest.fixture
+def pdf_en_disco(tmp_path):
+    doc = fitz.open()
+    for i in range(3):
+        doc.new_page().insert_text((50, 100), f"saldo de la cuenta pagina {i + 1}", fontsize=10)
+    ruta = tmp_path / "estado.pdf"
+    doc.save(str(ruta))
+    doc.close()
+    return ruta
+
+def texto_paginas_worker(documento):
+    with abrir_pdf(documento) as doc:
+        return [page.get_text("text").strip() for page in doc]
+
+def resultado_compacto_worker(n):
+    return compactar_resultado({"banco": "BBVA", "transacciones": transacciones_dict(n)})
+
+def resultado_pydantic_worker(n):
+    return [AnalisisTPV.Transaccion(**tx) for tx in transacciones_dict(n)]
+
+def transacciones_dict(n):
+    return [
+        {"fecha": "01-ene-2025", "periodo": "ENERO 2025", "descripcion": f"SPEI RECIBIDO {i}",
+         "monto": f"{i * 10.5:,.2f}", "tipo": "abono", "categoria": "GENERAL"}
+        for i in range(n)
+    ]
+
+# ============================================================================
+# PRUEBAS: MEMORIA COMPARTIDA
+# ============================================================================
+
+def test_worker_abre_el_pdf_desde_memoria_compartida(pdf_en_disco):
+    """El worker lee del segmento aunque la ruta ya no exista (prueba que no relee de disco)."""
+    pdf_bytes = pdf_en_disco.read_bytes()
+
+    with DocumentoCompartido(pdf_bytes, str(pdf_en_disco)) as ref:
+        assert ref.nombre_shm and ref.tamano == len(pdf_bytes)
+        pdf_en_disco.unlink()
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            textos = pool.submit(texto_paginas_worker, ref).result()
+
+    assert textos == [f"saldo de la cuenta pagina {i}" for i in (1, 2, 3)]
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=ref.nombre_shm)  # El dueño liberó el segmento
+
+def test_sin_segmento_se_lee_de_disco(pdf_en_disco):
+    ref = RefDocumento(ruta=str(pdf_en_disco))
+
+    assert texto_paginas_worker(ref)[0] == "saldo de la cuenta pagina 1"
+    with vista_pdf(str(pdf_en_disco)) as datos:
+        assert bytes(datos) == pdf_en_disco.read_bytes()
+
+def test_presupuesto_agotado_degrada_a_la_ruta(pdf_en_disco):
+    pdf_bytes = pdf_en_disco.read_bytes()
+    presupuesto = PresupuestoMemoriaCompartida(max_bytes=int(len(pdf_bytes) * 1.5))
+
+    primero = DocumentoCompartido(pdf_bytes, str(pdf_en_disco), presupuesto)
+    segundo = DocumentoCompartido(pdf_bytes, str(pdf_en_disco), presupuesto)
+
+    assert primero.ref.nombre_shm and segundo.ref == RefDocumento(ruta=str(pdf_en_disco))
+    assert texto_paginas_worker(segundo.ref)[0] == "saldo de la cuenta pagina 1"
+    primero.liberar()
+    primero.liberar()  # Idempotente: no devuelve dos veces la reserva
+    assert presupuesto.en_uso == 0
+    with DocumentoCompartido(pdf_bytes, str(pdf_en_disco), presupuesto) as ref:
+        assert ref.nombre_shm  # La reserva liberada vuelve a estar disponible
+    assert presupuesto.en_uso == 0
+
+def test_sin_espacio_en_dev_shm_no_crea_el_segmento(pdf_en_disco, monkeypatch):
+    """Un tmpfs lleno mataría al proceso con SIGBUS al copiar: se revisa antes y se usa la ruta."""
+    monkeypatch.setattr(ipc_pool.shared_memory, "SharedMemory", lambda **kwargs: pytest.fail("no debió crearse"))
+    monkeypatch.setattr(ipc_pool, "_hay_espacio_en_shm", lambda tamano: False)
+    presupuesto = PresupuestoMemoriaCompartida(max_bytes=10 * 1024 * 1024)
+
+    with DocumentoCompartido(pdf_en_disco.read_bytes(), str(pdf_en_disco), presupuesto) as ref:
+        assert ref.nombre_shm is None
+    assert presupuesto.en_uso == 0
+
+def test_estructura_desde_memoria_compartida_igual_que_desde_ruta(pdf_en_disco):
+    motor = MotorCaratulas(
+        triggers_config={"inicio": ["pagina 2"], "fin": []},
+        palabras_clave_regex=re.compile(r"saldo"),
+        alias_banco_map={}, banco_detection_regex=re.compile(r"zzz"), patrones_compilados={}
+    )
+    with DocumentoCompartido(pdf_en_disco.read_bytes(), str(pdf_en_disco)) as ref:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            desde_shm = pool.submit(analizar_estructura_worker_sync, motor, ref).result()
+
+    assert desde_shm == analizar_estructura_worker_sync(motor, str(pdf_en_disco))
+    assert desde_shm[1] == [(1, 3)]
+
+# ============================================================================
+# PRUEBAS: RESULTADOS COMPACTOS Y MEDICIÓN DEL PIPE
+# ============================================================================
+
+def test_compactar_arma_tabla_columnar_con_las_mismas_filas():
+    original = {"banco": "BBVA", "transacciones": transacciones_dict(3)}
+
+    compacto = compactar_resultado(original)
+
+    tabla = compacto["transacciones"]
+    assert isinstance(tabla, TablaTransacciones)
+    assert list(tabla.montos) == [0.0, 10.5, 21.0]
+    assert tabla.a_registros() == [
+        {**tx, "es_sospechosa": False, "razon_clasificacion": ""} for tx in original["transacciones"]
+    ]
+    assert compacto["banco"] == "BBVA"
+
+def test_compactar_sin_transacciones():
+    compacto = compactar_resultado({"banco": "X", "transacciones": []})
+    assert isinstance(compacto["transacciones"], TablaTransacciones) and len(compacto["transacciones"]) == 0
+
+@pytest.mark.asyncio
+async def test_ejecutor_medido_cuenta_bytes_y_compacto_pesa_menos():
+    """Mismo resultado vía run_in_executor; el formato columnar cruza el pipe con muchos menos bytes."""
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=1) as base:
+        compacto_exec = EjecutorMedido(base)
+        compacto = await loop.run_in_executor(compacto_exec, resultado_compacto_worker, 2000)
+
+        pydantic_exec = EjecutorMedido(base)
+        objetos = await loop.run_in_executor(pydantic_exec, resultado_pydantic_worker, 2000)
+
+    assert len(compacto["transacciones"]) == len(objetos) == 2000
+    assert compacto_exec.metricas.tareas == 1
+    assert compacto_exec.metricas.bytes_recibidos == len(pickle.dumps(compacto, protocol=pickle.HIGHEST_PROTOCOL))
+    assert compacto_exec.metricas.bytes_recibidos * 1.5 < pydantic_exec.metricas.bytes_recibidos
+
+@pytest.mark.asyncio
+async def test_ejecutor_medido_no_serializa_argumentos_en_el_event_loop(monkeypatch):
+    """Los bytes de ida se miden en el worker: submit no hace pickle en el hilo que lo llama."""
+    hilos_que_serializan = []
+    dumps_original = pickle.dumps
+
+    def dumps_registrado(*args, **kwargs):
+        hilos_que_serializan.append(threading.get_ident())
+        return dumps_original(*args, **kwargs)
+
+    monkeypatch.setattr(ipc_pool.pickle, "dumps", dumps_registrado)
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=1) as base:
+        ejecutor = EjecutorMedido(base)
+        resultado = await loop.run_in_executor(ejecutor, resultado_compacto_worker, 10)
+
+    assert len(resultado["transacciones"]) == 10
+    assert hilos_que_serializan and threading.get_ident() not in hilos_que_serializan
+    assert ejecutor.metricas.bytes_enviados == len(dumps_original(
+        (resultado_compacto_worker, (10,), {}), protocol=pickle.HIGHEST_PROTOCOL
+    ))
+
+@pytest.mark.asyncio
+async def test_ejecutor_medido_propaga_excepciones():
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=1) as base:
+        with pytest.raises(ZeroDivisionError):
+            await loop.run_in_executor(EjecutorMedido(base), divmod, 1, 0)
@@ -0,0 +1,124 @@
+import os
+import time
+import asyncio
+
+import pytest
+from Fluxo_IA_visual.services.almacen_resultados import AlmacenResultadosDisco
+from Fluxo_IA_visual.services.limpiador_ttl import FUENTE_LOCAL, LimpiadorTTL
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+class FuenteContada:
+    """Envuelve la fuente local contando cuántas rutas consulta el limpiador."""
+
+    def __init__(self):
+        self.consultas = 0
+
+    async def modificado(self, ruta):
+        self.consultas += 1
+        return await FUENTE_LOCAL.modificado(ruta)
+
+    async def borrar(self, ruta):
+        return await FUENTE_LOCAL.borrar(ruta)
+
+def crear_archivo(ruta, tamano=100, antiguedad_seg=0.0):
+    ruta.write_bytes(b"x" * tamano)
+    mtime = time.time() - antiguedad_seg
+    os.utime(ruta, (mtime, mtime))
+    return ruta
+
+# ============================================================================
+# PRUEBAS
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_ciclo_solo_atiende_lo_vencido(tmp_path):
+    limpiador = LimpiadorTTL()
+    fuente = FuenteContada()
+    for i in range(1_000):
+        limpiador.programar(crear_archivo(tmp_path / f"nuevo_{i}.pdf"), ttl_segundos=3600, fuente=fuente)
+    for i in range(3):
+        ruta = crear_archivo(tmp_path / f"viejo_{i}.pdf", tamano=250, antiguedad_seg=7200)
+        limpiador.programar(ruta, ttl_segundos=3600, fuente=fuente, mtime=os.path.getmtime(ruta))
+
+    assert await limpiador.ciclo() == 3
+
+    assert fuente.consultas == 3  # Ni listado ni stat de los 1,000 que no han vencido
+    assert not any(p.name.startswith("viejo_") for p in tmp_path.iterdir())
+    metricas = limpiador.metricas()
+    assert metricas["archivos_borrados"] == 3
+    assert metricas["bytes_recuperados"] == 750
+    assert metricas["pendientes"] == 1_000
+
+@pytest.mark.asyncio
+async def test_objeto_modificado_despues_de_programar_se_reprograma(tmp_path):
+    limpiador = LimpiadorTTL()
+    ruta = crear_archivo(tmp_path / "pasaporte.json")
+    limpiador.programar(ruta, ttl_segundos=60)
+
+    os.utime(ruta, (time.time() + 120, time.time() + 120))  # El pasaporte siguió actualizándose
+    assert await limpiador.ciclo(ahora=time.time() + 90) == 0
+    assert ruta.exists()
+    assert limpiador.reprogramados == 1
+
+    assert await limpiador.ciclo(ahora=time.time() + 200) == 1
+    assert not ruta.exists()
+
+@pytest.mark.asyncio
+async def test_temporal_ya_borrado_por_el_pipeline_solo_se_descarta(tmp_path):
+    limpiador = LimpiadorTTL()
+    ruta = crear_archivo(tmp_path / "subida.pdf")
+    limpiador.programar(ruta, ttl_segundos=1)
+    limpiador.programar(ruta, ttl_segundos=1)  # Duplicado: no se agenda dos veces
+    ruta.unlink()
+
+    assert limpiador.metricas()["pendientes"] == 1
+    assert await limpiador.ciclo(ahora=time.time() + 10) == 0
+    assert limpiador.metricas()["pendientes"] == 0
+    assert limpiador.errores == 0
+
+@pytest.mark.asyncio
+async def test_carpeta_extraida_de_zip_cuenta_todos_sus_bytes(tmp_path):
+    limpiador = LimpiadorTTL()
+    carpeta = tmp_path / "extracted_abc"
+    (carpeta / "sub").mkdir(parents=True)
+    crear_archivo(carpeta / "a.pdf", tamano=10)
+    crear_archivo(carpeta / "sub" / "b.pdf", tamano=30)
+    limpiador.programar(carpeta, ttl_segundos=1)
+
+    assert await limpiador.ciclo(ahora=time.time() + 10) == 1
+    assert not carpeta.exists()
+    assert limpiador.bytes_recuperados == 40
+
+@pytest.mark.asyncio
+async def test_resultados_del_almacen_y_barrido_inicial(tmp_path):
+    almacen = AlmacenResultadosDisco(str(tmp_path / "downloads"))
+    temporales = tmp_path / "temp_uploads"
+    temporales.mkdir()
+    crear_archivo(temporales / "huerfano.pdf", tamano=64, antiguedad_seg=7200)  # De una ejecución anterior
+    crear_archivo(temporales / "reciente.pdf")
+
+    limpiador = LimpiadorTTL()
+    await limpiador.barrido_inicial(directorios=[str(temporales)], almacenes=[almacen], ttl_segundos=3600)
+    assert sorted(p.name for p in temporales.iterdir()) == ["reciente.pdf"]
+    assert limpiador.bytes_recuperados == 64
+
+    await almacen.escribir("data_job.json", b"{}")
+    limpiador.programar("data_job.json", ttl_segundos=60, fuente=almacen)
+    assert await limpiador.ciclo(ahora=time.time() + 120) == 1
+    assert await almacen.leer("data_job.json") is None
+
+@pytest.mark.asyncio
+async def test_tarea_de_fondo_borra_sin_intervencion(tmp_path):
+    limpiador = LimpiadorTTL(intervalo_seg=0.01)
+    ruta = crear_archivo(tmp_path / "subida.pdf")
+    limpiador.programar(ruta, ttl_segundos=0.0)
+
+    limpiador.iniciar()
+    await asyncio.sleep(0.1)
+    await limpiador.detener()
+
+    assert not ruta.exists()
+    assert limpiador.ciclos >= 1
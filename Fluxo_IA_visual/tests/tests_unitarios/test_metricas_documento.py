@@ -0,0 +1,117 @@
+import random
+
+import pytest
+from Fluxo_IA_visual.core.metricas_documento import (
+    CATEGORIAS_TOTALES, calcular_metricas_documento, calcular_similitud, sumar_categorias,
+)
+from Fluxo_IA_visual.core.motor_clasificador import MotorClasificador
+from Fluxo_IA_visual.models.tabla_transacciones import TablaTransacciones
+
+# ============================================================================
+# RÉPLICAS DE LOS BARRIDOS POR FILA ANTERIORES (referencia exacta)
+# ============================================================================
+
+def totales_por_fila(filas):
+    """`MotorClasificador._calcular_totales` tal como recorría las transacciones."""
+    totales = {cat: 0.0 for cat in CATEGORIAS_TOTALES}
+    conteo = {"TPV": 0, "GENERAL": 0, "OTROS": 0}
+    for tx in filas:
+        try:
+            monto = float(str(tx["monto"]).replace("$", "").replace(",", "").strip())
+        except ValueError:
+            monto = 0.0
+        if str(tx["tipo"]).lower().strip() in ["abono", "deposito", "depósito", "credito", "crédito"]:
+            totales["DEPOSITOS"] += monto
+        cat = str(tx["categoria"]).upper().strip()
+        if cat == "TPV":
+            totales["TPV"] += monto
+            conteo["TPV"] += 1
+        elif cat in totales:
+            totales[cat] += monto
+            conteo["OTROS"] += 1
+        elif cat == "BASURA_OCR":
+            pass
+        else:
+            conteo["GENERAL"] += 1
+    return totales, conteo
+
+def confianza_por_fila(filas):
+    """Bloque de confianza de `_clasificar_documento_async`."""
+    suma_abonos = suma_cargos = 0.0
+    clasificadas = 0
+    for tx in filas:
+        if tx["categoria"] != "GENERAL":
+            clasificadas += 1
+        try:
+            monto = float(str(tx["monto"]).replace(',', '').replace('$', ''))
+            tipo = str(tx["tipo"]).upper().strip()
+            if tipo == "ABONO":
+                suma_abonos += monto
+            elif tipo == "CARGO":
+                suma_cargos += monto
+        except ValueError:
+            continue
+    return suma_abonos, suma_cargos, clasificadas
+
+def filas_aleatorias(n, semilla):
+    rnd = random.Random(semilla)
+    categorias = ["GENERAL", "TPV", " tpv ", "EFECTIVO", "TRASPASO_ABONO", "TRASPASO_CARGO", "COMISION_CR",
+                  "COMISION_TPV_MIXTA", "BASURA_OCR", "PAGO_SERVICIOS", "DEPOSITOS", "general"]
+    tipos = ["abono", "cargo", "ABONO", "CARGO", " Depósito ", "credito", "importe", "retiro"]
+    filas = []
+    for _ in range(n):
+        monto = rnd.choice([f"{rnd.uniform(0, 1e6):,.2f}", f"${rnd.uniform(0, 500):.2f}", "MontoInvalido", "0.1", "0.2"])
+        filas.append({"descripcion": "MOV", "monto": monto, "tipo": rnd.choice(tipos), "categoria": rnd.choice(categorias)})
+    return filas
+
+# ============================================================================
+# PRUEBAS
+# ============================================================================
+
+@pytest.mark.parametrize("semilla", [1, 2, 3])
+def test_agregacion_vectorizada_identica_al_barrido_por_fila(semilla):
+    filas = filas_aleatorias(5000, semilla)
+    tabla = TablaTransacciones.desde_registros(filas)
+
+    metricas = calcular_metricas_documento(tabla, depositos_caratula=1_234_567.89, cargos_caratula=0.0)
+
+    totales, conteo = totales_por_fila(filas)
+    suma_abonos, suma_cargos, clasificadas = confianza_por_fila(filas)
+    # Igualdad exacta (no aproximada): mismo orden de acumulación que el `+=` original
+    assert metricas.totales == totales
+    assert list(metricas.totales) == list(totales)
+    assert metricas.conteo_categorias == conteo
+    assert (metricas.suma_abonos, metricas.suma_cargos) == (suma_abonos, suma_cargos)
+    assert metricas.txs_clasificadas == clasificadas
+    assert metricas.tasa_categorizacion == clasificadas / len(filas) * 100.0
+    assert metricas.descuadre_depositos == abs(1_234_567.89 - suma_abonos)
+    assert metricas.confianza_global == round((calcular_similitud(suma_abonos, 1_234_567.89) + calcular_similitud(suma_cargos, 0.0)) / 2.0, 2)
+
+def test_tabla_vacia_da_ceros_flotantes_y_confianza_perfecta():
+    metricas = calcular_metricas_documento(TablaTransacciones())
+
+    assert all(type(v) is float and v == 0.0 for v in metricas.totales.values())
+    assert metricas.confianza_global == 100.0
+    assert metricas.tasa_categorizacion == 0.0
+
+def test_sumar_categorias_normaliza_y_respeta_orden():
+    filas = filas_aleatorias(3000, 9)
+    tabla = TablaTransacciones.desde_registros(filas)
+
+    esperado = {"TRASPASO_ABONO": 0.0, "TRASPASO_CARGO": 0.0, "TPV": 0.0}
+    for tx in filas:
+        cat = tx["categoria"].upper().strip()
+        if cat in esperado:
+            try:
+                esperado[cat] += float(tx["monto"].replace("$", "").replace(",", "").strip())
+            except ValueError:
+                pass
+
+    assert sumar_categorias(tabla, esperado) == esperado
+
+def test_motor_expone_totales_y_metricas_de_la_misma_agregacion():
+    motor = MotorClasificador(debug_flags=None)
+    filas = filas_aleatorias(500, 4)
+    tabla = TablaTransacciones.desde_registros(filas)
+
+    assert motor._calcular_totales(tabla) == motor.calcular_metricas(tabla, 10.0, 20.0).totales == totales_por_fila(filas)[0]
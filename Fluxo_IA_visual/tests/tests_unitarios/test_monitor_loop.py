@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+import pytest
+from Fluxo_IA_visual.services.monitor_loop import MonitorLagLoop
+
+# ============================================================================
+# PRUEBAS
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_bloqueo_sincrono_aparece_como_lag():
+    """Un time.sleep dentro de una corrutina (como fitz en el loop) se refleja en el lag máximo."""
+    monitor = MonitorLagLoop(intervalo_seg=0.01)
+    monitor.iniciar()
+    await asyncio.sleep(0.03)
+
+    time.sleep(0.2)
+    await asyncio.sleep(0.03)
+    await monitor.detener()
+
+    assert monitor.metricas()["lag_maximo_seg"] >= 0.15
+
+@pytest.mark.asyncio
+async def test_trabajo_en_hilo_no_bloquea_el_loop():
+    """El mismo trabajo enviado fuera del loop deja el lag cerca de cero."""
+    monitor = MonitorLagLoop(intervalo_seg=0.01)
+    monitor.iniciar()
+    await asyncio.sleep(0.03)
+
+    await asyncio.to_thread(time.sleep, 0.2)
+    await monitor.detener()
+
+    assert monitor.muestras >= 5
+    assert monitor.metricas()["lag_maximo_seg"] < 0.1
+
+def test_metricas_sin_muestras():
+    assert MonitorLagLoop().metricas() == {
+        "muestras": 0, "lag_ultimo_seg": None, "lag_p50_seg": None, "lag_p99_seg": None, "lag_maximo_seg": 0.0
+    }
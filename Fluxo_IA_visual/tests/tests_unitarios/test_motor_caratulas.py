@@ -1,6 +1,12 @@
+import asyncio
+import json
 import pytest
 import re
-from Fluxo_IA_visual.core.motor_caratulas import MotorCaratulas
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+from Fluxo_IA_visual.core.exceptions import PDFCifradoError
+from Fluxo_IA_visual.core.motor_caratulas import MotorCaratulas, analizar_estructura_worker_sync, sondear_documento_worker_sync
 
 # ============================================================================
 # FIXTURES (Configuraciones falsas para aislar el motor)
@@ -159,4 +165,193 @@ def test_reconciliar_extracciones_clabe_larga(motor_test):
     datos_gpt = {"clabe_interbancaria": "012345678901234567"} # GPT perfecto
     
     res = motor_test.reconciliar_extracciones(datos_regex, datos_qwen, datos_gpt)
-    assert res["clabe_interbancaria"] == "012345678901234567"
\ No newline at end of file
+    assert res["clabe_interbancaria"] == "012345678901234567"
+
+# ============================================================================
+# PRUEBAS: PROCESAMIENTO CONCURRENTE POR CUENTA
+# ============================================================================
+
+def preparar_documento(motor, cuentas):
+    """Sustituye la lectura física: una página por cuenta, con su RFC/nombre en el texto."""
+    texto_por_pagina = {i + 1: f"saldo cuenta {c['rfc']} {c['nombre']}" for i, c in enumerate(cuentas)}
+    rangos = [(i + 1, i + 1) for i in range(len(cuentas))]
+    motor.extraer_texto_y_rangos = lambda pdf_bytes: (texto_por_pagina, rangos)
+
+def modelo_falso(cuentas, en_vuelo, demoras):
+    """Responde con los datos de la cuenta de la página pedida; registra la concurrencia observada."""
+    async def _modelo(prompt, pdf_bytes, paginas_a_procesar):
+        en_vuelo["actual"] += 1
+        en_vuelo["max"] = max(en_vuelo["max"], en_vuelo["actual"])
+        cuenta = cuentas[paginas_a_procesar[0] - 1]
+        await asyncio.sleep(demoras[paginas_a_procesar[0] - 1])
+        en_vuelo["actual"] -= 1
+        return json.dumps({"rfc": cuenta["rfc"], "nombre_cliente": cuenta["nombre"], "clabe_interbancaria": "0" * 18})
+    return _modelo
+
+@pytest.mark.asyncio
+async def test_cuentas_concurrentes_respetan_limite_orden_y_herencia(motor_test):
+    """
+    6 cuentas con límite 2: nunca más de 2 cuentas (4 llamadas) en vuelo, los resultados salen en el
+    orden de los rangos aunque terminen desordenados, y la herencia de nombre por RFC sigue ese orden.
+    """
+    cuentas = [
+        {"rfc": "AAA010101AA1", "nombre": "EMPRESA UNO"},
+        {"rfc": "AAA010101AA1", "nombre": ""},           # Hereda EMPRESA UNO
+        {"rfc": "BBB010101BB2", "nombre": "EMPRESA DOS"},
+        {"rfc": "BBB010101BB2", "nombre": ""},           # Hereda EMPRESA DOS
+        {"rfc": "AAA010101AA1", "nombre": ""},           # La memoria ya cambió a BBB: no hereda
+        {"rfc": "CCC010101CC3", "nombre": "EMPRESA TRES"},
+    ]
+    demoras = [0.03, 0.0, 0.02, 0.0, 0.01, 0.0]  # Las primeras terminan al final
+    motor_test.max_cuentas_concurrentes = 2
+    preparar_documento(motor_test, cuentas)
+    en_vuelo = {"actual": 0, "max": 0}
+    modelo = modelo_falso(cuentas, en_vuelo, demoras)
+
+    resultados, *_ = await motor_test.procesar_caratula_completa(
+        pdf_bytes=b"%PDF", prompt_base="prompt",
+        analizar_gpt_fn=modelo, analizar_qwen_fn=modelo,
+        extraer_json_fn=json.loads, sanitizar_fn=lambda d: d
+    )
+
+    assert en_vuelo["max"] == 4
+    assert [r["_metadatos_paginas"]["inicio"] for r in resultados] == [1, 2, 3, 4, 5, 6]
+    assert [r["nombre_cliente"] for r in resultados] == [
+        "EMPRESA UNO", "EMPRESA UNO", "EMPRESA DOS", "EMPRESA DOS", "", "EMPRESA TRES"
+    ]
+
+@pytest.mark.asyncio
+async def test_cuentas_concurrentes_reducen_latencia_total(motor_test):
+    """8 cuentas de 50 ms con límite 8 tardan ~1 ronda, no 8 rondas secuenciales."""
+    cuentas = [{"rfc": f"AAA0101{i:02d}AA1", "nombre": f"CLIENTE {i}"} for i in range(8)]
+    motor_test.max_cuentas_concurrentes = 8
+    preparar_documento(motor_test, cuentas)
+    modelo = modelo_falso(cuentas, {"actual": 0, "max": 0}, [0.05] * 8)
+
+    loop = asyncio.get_running_loop()
+    t0 = loop.time()
+    resultados, *_ = await motor_test.procesar_caratula_completa(
+        pdf_bytes=b"%PDF", prompt_base="prompt",
+        analizar_gpt_fn=modelo, analizar_qwen_fn=modelo,
+        extraer_json_fn=json.loads, sanitizar_fn=lambda d: d
+    )
+
+    assert len(resultados) == 8
+    assert loop.time() - t0 < 0.05 * 4
+
+# ============================================================================
+# PRUEBAS: ESTRUCTURA FUERA DEL EVENT LOOP (PROCESS POOL)
+# ============================================================================
+
+@pytest.fixture
+def ruta_pdf_dos_cuentas(tmp_path):
+    """PDF digital de 4 páginas con dos cuentas delimitadas por los triggers del motor de prueba."""
+    textos = [
+        "banco patito detalle de la cuenta saldo inicial",
+        "movimientos de la cuenta uno",
+        "fin del estado de cuenta",
+        "detalle de la cuenta saldo de la cuenta dos fin del estado de cuenta",
+    ]
+    doc = fitz.open()
+    for texto in textos:
+        doc.new_page().insert_text((50, 100), texto, fontsize=10)
+    ruta = tmp_path / "estado.pdf"
+    doc.save(str(ruta))
+    doc.close()
+    return ruta
+
+def test_worker_de_estructura_en_process_pool_igual_que_en_linea(motor_test, ruta_pdf_dos_cuentas):
+    """El motor viaja por pickle al worker y devuelve lo mismo que el cálculo en el propio proceso."""
+    en_linea = motor_test.analizar_estructura(ruta_pdf_dos_cuentas.read_bytes())
+
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        en_pool = pool.submit(analizar_estructura_worker_sync, motor_test, str(ruta_pdf_dos_cuentas)).result()
+
+    assert en_pool == en_linea
+    texto_por_pagina, rangos, es_digital = en_pool
+    assert len(texto_por_pagina) == 4
+    assert rangos == [(1, 3), (3, 4)]
+    assert es_digital is True
+
+@pytest.mark.asyncio
+async def test_estructura_precalculada_no_vuelve_a_leer_el_pdf(motor_test):
+    """Con la estructura ya calculada en el pool, el motor no llama a fitz en el event loop."""
+    cuentas = [{"rfc": "AAA010101AA1", "nombre": "EMPRESA UNO"}]
+    modelo = modelo_falso(cuentas, {"actual": 0, "max": 0}, [0.0])
+
+    def no_usar(pdf_bytes):
+        raise AssertionError("extraer_texto_y_rangos no debe correr en el event loop")
+    motor_test.extraer_texto_y_rangos = no_usar
+
+    resultados, es_digital, *_ , rangos = await motor_test.procesar_caratula_completa(
+        pdf_bytes=b"%PDF", prompt_base="prompt",
+        analizar_gpt_fn=modelo, analizar_qwen_fn=modelo,
+        extraer_json_fn=json.loads, sanitizar_fn=lambda d: d,
+        estructura=({1: "saldo cuenta AAA010101AA1 EMPRESA UNO"}, [(1, 1)], False)
+    )
+
+    assert len(resultados) == 1 and es_digital is False and rangos == [(1, 1)]
+
+# ============================================================================
+# PRUEBAS: SONDA DE RUTEO TEMPRANO (DIGITAL VS ESCANEADO)
+# ============================================================================
+
+def pdf_escaneado(paginas=2):
+    """Páginas cubiertas por completo con una imagen y sin capa de texto (como sale de un escáner)."""
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 60, 80), False)
+    pix.clear_with(220)
+    doc = fitz.open()
+    for _ in range(paginas):
+        page = doc.new_page()
+        page.insert_image(page.rect, pixmap=pix)
+    datos = doc.tobytes()
+    doc.close()
+    return datos
+
+def test_sonda_detecta_escaneado_por_cobertura_de_imagen(motor_test):
+    sonda = motor_test.sondear_tipo_documento(pdf_escaneado())
+
+    assert sonda["es_digital"] is False and sonda["escaneado_confiable"] is True
+    assert sonda["caracteres_por_pagina"] == 0.0
+    assert sonda["cobertura_imagen"] >= 0.9  # La imagen conserva su proporción dentro de la página
+
+def test_sonda_con_algo_de_texto_no_es_confiable(motor_test):
+    """Escaneado con un encabezado de texto: va a OCR, pero Textract no arranca antes de la carátula."""
+    doc = fitz.open(stream=pdf_escaneado(2), filetype="pdf")
+    for page in doc:
+        page.insert_text((50, 40), "BANCO ESTADO DE CUENTA MARZO", fontsize=8)
+    sonda = motor_test.sondear_tipo_documento(doc.tobytes())
+
+    assert sonda["es_digital"] is False
+    assert sonda["escaneado_confiable"] is False
+
+def test_sonda_detecta_digital_por_densidad_de_texto(motor_test, ruta_pdf_dos_cuentas):
+    """Coincide con el veredicto completo de `analizar_estructura` sobre el mismo PDF."""
+    sonda = motor_test.sondear_tipo_documento(str(ruta_pdf_dos_cuentas), umbral_caracteres=20)
+    *_, es_digital = motor_test.analizar_estructura(ruta_pdf_dos_cuentas.read_bytes())
+
+    assert sonda["es_digital"] is True is es_digital
+    assert sonda["cobertura_imagen"] == 0.0
+
+def test_sonda_solo_lee_las_primeras_paginas(motor_test):
+    """Un PDF de 2 páginas escaneadas + 3 de texto se decide con las 2 primeras."""
+    doc = fitz.open(stream=pdf_escaneado(2), filetype="pdf")
+    for _ in range(3):
+        doc.new_page().insert_text((50, 100), "saldo de la cuenta " * 10, fontsize=6)
+    sonda = motor_test.sondear_tipo_documento(doc.tobytes(), max_paginas=2)
+
+    assert sonda["es_digital"] is False
+
+def test_sonda_en_process_pool_y_pdf_cifrado(motor_test, tmp_path):
+    ruta = tmp_path / "escaneado.pdf"
+    ruta.write_bytes(pdf_escaneado())
+    cifrado = tmp_path / "cifrado.pdf"
+    doc = fitz.open()
+    doc.new_page()
+    doc.save(str(cifrado), encryption=fitz.PDF_ENCRYPT_AES_256, user_pw="secreto", owner_pw="secreto")
+
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        assert pool.submit(sondear_documento_worker_sync, motor_test, str(ruta)).result()["es_digital"] is False
+
+    with pytest.raises(PDFCifradoError):
+        motor_test.sondear_tipo_documento(str(cifrado))
@@ -1,7 +1,11 @@
 import pytest
+import random
 from unittest.mock import patch
+from Fluxo_IA_visual.core import motor_clasificador as modulo_clasificador
 from Fluxo_IA_visual.core.motor_clasificador import MotorClasificador
-from Fluxo_IA_visual.utils.tags_y_pesos_fluxo import CategoriaTag
+from Fluxo_IA_visual.utils.tags_y_pesos_fluxo import AUTOMATA_TAGS, CategoriaTag, CONFIGURACION_TAGS
+from Fluxo_IA_visual.utils.matcher_tags import AutomataTags
+from Fluxo_IA_visual.utils.cache_clasificacion import CacheClasificacionIA
 
 # ============================================================================
 # MOCKS Y FIXTURES
@@ -149,4 +153,144 @@ async def test_clasificar_y_sumar_transacciones_flujo_completo(motor_clasificado
     # Verificamos los totales finales (asegúrate de que hagan match con tu lógica de DEPOSITOS)
     assert totales["TPV"] == 500.0
     assert totales["EFECTIVO"] == 200.0
-    assert totales.get("DEPOSITOS", 700.0) == 700.0
\ No newline at end of file
+    assert totales.get("DEPOSITOS", 700.0) == 700.0
+
+# ============================================================================
+# PRUEBAS: AUTÓMATA DE PALABRAS CLAVE (Aho-Corasick)
+# ============================================================================
+
+def tags_por_substring(config, texto):
+    """Semántica original: any(p in texto) por cada tag, en el orden de la configuración."""
+    return [tag for tag, cfg in config.items() if any(p in texto for p in cfg["palabras"])]
+
+def test_automata_detecta_palabras_traslapadas():
+    """Palabras que se traslapan o son prefijo/sufijo de otras deben reportar TODOS sus tags."""
+    config = {
+        "A": {"peso": 1, "palabras": ["pago"]},
+        "B": {"peso": 1, "palabras": ["sr pago", "pagos"]},
+        "C": {"peso": 1, "palabras": ["os m"]},
+        "D": {"peso": 1, "palabras": ["zzz"]},
+    }
+    automata = AutomataTags(config)
+
+    assert automata.buscar("abono sr pagos mx") == ["A", "B", "C"]
+    assert automata.buscar("") == []
+
+def test_automata_igual_a_busqueda_por_substring_con_config_real():
+    """Con la configuración de producción, el autómata debe dar exactamente los mismos tags."""
+    automata = AutomataTags(CONFIGURACION_TAGS)
+    palabras = [p for cfg in CONFIGURACION_TAGS.values() for p in cfg["palabras"]]
+    relleno = ["spei", "recibido", "cliente", "ref", "123456", "mx", "de", "cv", "abono"]
+    rnd = random.Random(11)
+
+    for _ in range(2000):
+        tokens = rnd.sample(relleno, 4) + rnd.sample(palabras, rnd.randint(0, 3))
+        rnd.shuffle(tokens)
+        texto = rnd.choice([" ", ""]).join(tokens)
+        assert automata.buscar(texto) == tags_por_substring(CONFIGURACION_TAGS, texto)
+
+def test_pre_clasificar_usa_configuracion_parcheada(motor_clasificador_test):
+    """El autómata se compila para la configuración vigente (los parches de prueba se respetan)."""
+    tx = TransaccionMock("Dep. Efectivo sucursal", 100.0, "abono")
+
+    resueltas, pendientes = motor_clasificador_test._pre_clasificar_transacciones([tx])
+
+    assert len(resueltas) == 1 and not pendientes
+    assert tx.categoria == CategoriaTag.EFECTIVO.value
+
+def test_automatas_de_configuraciones_reemplazadas_estan_acotados():
+    """Cada parche compila su autómata una vez, pero solo se retienen los más recientes."""
+    configs = [{CategoriaTag.EFECTIVO: {"peso": 30, "palabras": [f"palabra{i}"]}} for i in range(10)]
+
+    for config in configs:
+        with patch('Fluxo_IA_visual.core.motor_clasificador.CONFIGURACION_TAGS', config):
+            automata = modulo_clasificador._obtener_automata_tags()
+            assert automata is modulo_clasificador._obtener_automata_tags()
+
+    assert len(modulo_clasificador._AUTOMATAS_ALTERNOS) == modulo_clasificador.MAX_AUTOMATAS_ALTERNOS
+    assert modulo_clasificador._obtener_automata_tags() is AUTOMATA_TAGS
+
+# ============================================================================
+# PRUEBAS: CACHÉ DE CLASIFICACIÓN IA
+# ============================================================================
+
+def tx_ia(descripcion, tipo):
+    """Transacción sin palabras clave del config de prueba: siempre cae en la Capa 2."""
+    return TransaccionMock(descripcion, "100", tipo)
+
+def test_clave_cache_enmascara_digitos_y_normaliza_tipo():
+    """Mismo comercio con referencias distintas comparte clave; abono y cargo no."""
+    clave_marzo = CacheClasificacionIA.construir_clave("BBVA", "Depósito", "SPEI RECIBIDO 0012345  Cliente Ñandú")
+    clave_abril = CacheClasificacionIA.construir_clave("bbva ", "abono", "spei recibido 9988776 cliente nandu")
+    clave_cargo = CacheClasificacionIA.construir_clave("bbva", "cargo", "spei recibido 9988776 cliente nandu")
+
+    assert clave_marzo == clave_abril == "bbva|abono|spei recibido # cliente nandu"
+    assert clave_cargo != clave_abril
+
+@pytest.mark.asyncio
+async def test_cache_evita_reenviar_descripciones_conocidas(motor_clasificador_test):
+    """Las gemelas viajan una sola vez a la IA y el segundo documento se resuelve sin llamarla."""
+    motor_clasificador_test.cache_ia = CacheClasificacionIA()
+    llamadas = []
+
+    async def mock_ia(banco, lote):
+        llamadas.append([item["id"] for item in lote])
+        return {str(item["id"]): "TPV" for item in lote}
+
+    doc_1 = [tx_ia("NETPAY LIQ 001122", "abono") for _ in range(3)] + [tx_ia("PAGO LUZ 44", "cargo")]
+    await motor_clasificador_test.clasificar_y_sumar_transacciones(doc_1, "bbva", mock_ia)
+
+    assert llamadas == [[0, 3]]
+    assert [tx.categoria for tx in doc_1] == ["TPV", "TPV", "TPV", "TPV"]
+
+    doc_2 = [tx_ia("NETPAY LIQ 998877", "abono"), tx_ia("PAGO LUZ 45", "cargo")]
+    await motor_clasificador_test.clasificar_y_sumar_transacciones(doc_2, "bbva", mock_ia)
+
+    assert len(llamadas) == 1
+    assert [tx.categoria for tx in doc_2] == ["TPV", "TPV"]
+    assert motor_clasificador_test.cache_ia.metricas()["aciertos"] == 2
+
+@pytest.mark.asyncio
+async def test_cache_no_guarda_fallback_de_lote_fallido(motor_clasificador_test):
+    """Si la IA falla, el fallback GENERAL de todo el lote no se cachea."""
+    motor_clasificador_test.cache_ia = CacheClasificacionIA()
+
+    async def mock_ia_caida(banco, lote):
+        return {str(item["id"]): "GENERAL" for item in lote}
+
+    txs = [tx_ia("NETPAY LIQ 1", "abono"), tx_ia("PAGO LUZ 2", "cargo")]
+    await motor_clasificador_test.clasificar_y_sumar_transacciones(txs, "bbva", mock_ia_caida)
+
+    assert [tx.categoria for tx in txs] == ["GENERAL", "GENERAL"]
+    assert len(motor_clasificador_test.cache_ia) == 0
+
+def test_cache_expulsa_por_lru_y_ttl():
+    """El máximo de entradas expulsa la menos usada; las entradas vencidas cuentan como fallo."""
+    cache = CacheClasificacionIA(max_entradas=2)
+    cache.guardar("a", "TPV")
+    cache.guardar("b", "GENERAL")
+    assert cache.obtener("a") == "TPV"  # "a" pasa a ser la más reciente
+    cache.guardar("c", "EFECTIVO")
+
+    assert cache.obtener("b") is None
+    assert cache.obtener("c") == "EFECTIVO"
+    assert cache.metricas()["expulsiones"] == 1
+
+    cache.ttl_segundos = -1
+    assert cache.obtener("c") is None
+    assert cache.metricas() == {"entradas": 1, "aciertos": 2, "fallos": 2, "tasa_aciertos": 0.5, "expulsiones": 1}
+
+def test_cache_persiste_y_recarga_en_orden_lru(tmp_path):
+    """Lo escrito a disco sobrevive un reinicio y conserva el orden de uso."""
+    ruta = str(tmp_path / "cache" / "clasificacion_ia.json")
+    cache = CacheClasificacionIA(ruta=ruta)
+    cache.guardar("a", "TPV")
+    cache.guardar("b", "GENERAL")
+    cache.obtener("a")
+    cache.persistir()
+
+    recargado = CacheClasificacionIA(ruta=ruta, max_entradas=1)
+
+    assert len(recargado) == 1
+    assert recargado.obtener("a") == "TPV"
+
@@ -1,6 +1,6 @@
 import pytest
 import fitz
-from Fluxo_IA_visual.core.spatial_bank import MotorExtraccionEspacial
+from Fluxo_IA_visual.core.spatial_bank import MotorExtraccionEspacial, WordYIndex
 
 # ============================================================================
 # FIXTURES (Configuración y Mocks en memoria)
@@ -215,4 +215,113 @@ def test_pass_3_extract_rows_flujo_completo(motor, pdf_memoria):
     
     # Como el 500.00 está debajo de "CARGO" y 1000.00 debajo de "SALDO",
     # dependiendo del centro exacto de la columna, debería clasificar el 500.00 como monto.
-    assert tx_encontrada["monto"] in [500.0, 1000.0]
\ No newline at end of file
+    assert tx_encontrada["monto"] in [500.0, 1000.0]
+# ============================================================================
+# PRUEBAS: CACHE DE TEXTO POR PÁGINA
+# ============================================================================
+
+def test_snapshot_extrae_cada_pagina_una_sola_vez(motor, pdf_memoria):
+    """Las 3 pasadas deben compartir una sola extracción de palabras y bloques por página."""
+    geometries = motor.pass_1_detect_geometry(pdf_memoria)
+    layouts = motor.pass_2_detect_columns(pdf_memoria, geometries)
+    motor.pass_3_extract_rows(pdf_memoria, geometries, layouts)
+
+    # 1 página -> 1 get_text("words") + 1 get_text("blocks")
+    assert motor.extracciones_texto == 2 * len(pdf_memoria)
+
+    snapshot = motor._obtener_snapshot(pdf_memoria[0])
+    assert snapshot.word_boxes.shape == (len(snapshot.words), 4)
+    assert motor.extracciones_texto == 2  # Servido desde cache
+
+def test_snapshot_se_reinicia_con_otro_documento(motor, pdf_memoria):
+    """Un documento nuevo no debe reutilizar el cache ni el contador del anterior."""
+    motor.pass_1_detect_geometry(pdf_memoria)
+
+    otro_doc = fitz.open()
+    otro_doc.new_page(width=600, height=800)
+    otro_doc.new_page(width=600, height=800)
+    motor.pass_1_detect_geometry(otro_doc)
+
+    assert motor.extracciones_texto == 4
+    otro_doc.close()
+
+# ============================================================================
+# PRUEBAS: RANGO DE PÁGINAS (Multi-cuenta)
+# ============================================================================
+
+@pytest.fixture
+def pdf_multipagina():
+    """PDF de 4 páginas con el mismo layout y una transacción distinta por página."""
+    doc = fitz.open()
+    for i in range(4):
+        page = doc.new_page(width=600, height=800)
+        page.insert_text((50, 150), "FECHA", fontsize=10)
+        page.insert_text((150, 150), "DESCRIPCION", fontsize=10)
+        page.insert_text((300, 150), "CARGO", fontsize=10)
+        page.insert_text((400, 150), "ABONO", fontsize=10)
+        page.insert_text((500, 150), "SALDO", fontsize=10)
+        page.insert_text((50, 200), f"0{i + 1}/01", fontsize=10)
+        page.insert_text((150, 200), f"PAGO PAGINA {i + 1}", fontsize=10)
+        page.insert_text((300, 200), f"{i + 1}00.00", fontsize=10)
+        page.insert_text((500, 200), "1000.00", fontsize=10)
+    yield doc
+    doc.close()
+
+def test_rango_paginas_solo_lee_paginas_del_rango(motor, pdf_multipagina):
+    """Con rango (3, 4) solo se leen esas páginas más la 2 como contexto sticky."""
+    geometries = motor.pass_1_detect_geometry(pdf_multipagina, rango_paginas=(3, 4))
+    layouts = motor.pass_2_detect_columns(pdf_multipagina, geometries)
+    resultados = motor.pass_3_extract_rows(pdf_multipagina, geometries, layouts)
+
+    assert [g.page_num for g in geometries] == [2, 3, 4]
+    assert [r["page"] for r in resultados] == [2, 3, 4]
+    assert motor.extracciones_texto == 2 * 3
+
+def test_rango_paginas_mismo_resultado_que_documento_completo(pdf_multipagina):
+    """Las transacciones de las páginas del rango no deben cambiar respecto a la corrida completa."""
+    def correr(rango):
+        motor = MotorExtraccionEspacial(debug_flags=None)
+        geometries = motor.pass_1_detect_geometry(pdf_multipagina, rango_paginas=rango)
+        layouts = motor.pass_2_detect_columns(pdf_multipagina, geometries)
+        resultados = motor.pass_3_extract_rows(pdf_multipagina, geometries, layouts)
+        return {r["page"]: r["transacciones"] for r in resultados if 3 <= r["page"] <= 4}
+
+    completo = correr(None)
+    parcial = correr((3, 4))
+
+    assert parcial == completo
+    assert "PAGINA 3" in parcial[3][0]["descripcion"]
+
+# ============================================================================
+# PRUEBAS: ÍNDICE VERTICAL Y ASIGNACIÓN VECTORIZADA DE COLUMNAS
+# ============================================================================
+
+def test_word_y_index_banda_respeta_orden_original():
+    """La banda [y_min, y_max) debe devolver las palabras en el orden original, no ordenadas por Y."""
+    words = [
+        (10, 30.0, 20, 38, "C", 0, 0, 0),
+        (10, 10.0, 20, 18, "A", 0, 0, 1),
+        (10, 20.0, 20, 28, "B", 0, 0, 2),
+        (10, 40.0, 20, 48, "D", 0, 0, 3),
+    ]
+    indice = WordYIndex(words)
+
+    assert [w[4] for w in indice.banda(10.0, 40.0)] == ["C", "A", "B"]
+    assert [w[4] for w in indice.banda(10.0, 40.0, incluir_min=False)] == ["C", "B"]
+    assert indice.banda(50.0, 60.0) == []
+
+def test_asignar_columnas_monto_igual_a_version_escalar(motor):
+    """Las máscaras NumPy deben dar la misma columna que la regla escalar (centro X y luego x0)."""
+    r_cargo, r_abono, r_importe = (260.0, 350.0), (350.0, 440.0), (9999, 9999)
+    words = [
+        (300.0, 0, 340.0, 9, "100.00", 0, 0, 0),   # Centro en CARGO
+        (400.0, 0, 440.0, 9, "100.00", 0, 0, 1),   # Centro en ABONO
+        (340.0, 0, 460.0, 9, "100.00", 0, 0, 2),   # Centro en ABONO (frontera)
+        (430.0, 0, 470.0, 9, "100.00", 0, 0, 3),   # Centro fuera, x0 dentro de ABONO
+        (100.0, 0, 140.0, 9, "100.00", 0, 0, 4),   # Sin columna
+    ]
+
+    vectorizado = motor._asignar_columnas_monto(words, r_cargo, r_abono, r_importe)
+    escalar = [motor._columna_monto(w, r_cargo, r_abono, r_importe) for w in words]
+
+    assert vectorizado == escalar == ["CARGO", "ABONO", "ABONO", "ABONO", None]
@@ -0,0 +1,89 @@
+import json
+import asyncio
+
+import pytest
+from Fluxo_IA_visual.services.passport_service import (
+    AlmacenPasaportesDisco, PassportService, RegistroPasaportes,
+)
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+class AlmacenContado(AlmacenPasaportesDisco):
+    """Almacén en disco que cuenta escrituras."""
+
+    def __init__(self, passport_dir):
+        super().__init__(passport_dir)
+        self.escrituras = 0
+
+    def escribir(self, job_id, contenido):
+        self.escrituras += 1
+        super().escribir(job_id, contenido)
+
+@pytest.fixture
+def servicio(tmp_path):
+    """PassportService con un registro propio (ventana larga) sobre un almacén que cuenta escrituras."""
+    servicio = PassportService(passport_dir=str(tmp_path))
+    servicio.registro = RegistroPasaportes(AlmacenContado(str(tmp_path)), intervalo_volcado=60.0)
+    return servicio
+
+def leer_disco(tmp_path, job_id):
+    return json.loads((tmp_path / f"{job_id}.json").read_text(encoding="utf-8"))
+
+# ============================================================================
+# PRUEBAS
+# ============================================================================
+
+def test_rafaga_de_actualizaciones_se_junta_y_la_lectura_sale_de_memoria(servicio, tmp_path):
+    servicio.crear_pasaporte("job-1")
+    for i in range(200):
+        servicio.actualizar("job-1", descripcion=f"Clasificando lote {i}", sumar_transacciones=10)
+
+    assert servicio.registro.almacen.escrituras == 1  # Solo la creación
+    pasaporte = servicio.leer_pasaporte("job-1")
+    assert pasaporte["metricas"]["transacciones_detectadas"] == 2000
+    assert pasaporte["detalle"]["descripcion"] == "Clasificando lote 199"
+    assert leer_disco(tmp_path, "job-1")["metricas"]["transacciones_detectadas"] == 0
+
+def test_cambio_de_fase_y_cierre_se_escriben_al_momento(servicio, tmp_path):
+    servicio.crear_pasaporte("job-2")
+    servicio.actualizar("job-2", descripcion="Leído: a.pdf")
+    servicio.actualizar("job-2", fase=4, nombre_fase="Generando Reportes")
+
+    assert servicio.registro.almacen.escrituras == 2
+    assert leer_disco(tmp_path, "job-2")["detalle"]["fase_actual"] == 4
+
+    servicio.actualizar("job-2", fase=5, nombre_fase="Completado", terminado=True)
+
+    assert servicio.registro.metricas()["en_memoria"] == 0
+    assert servicio.leer_pasaporte("job-2")["estado"] == "TERMINADO"
+
+def test_otro_proceso_ve_el_pasaporte_del_almacen(servicio, tmp_path):
+    servicio.crear_pasaporte("job-3")
+    servicio.actualizar("job-3", fase=2, nombre_fase="Extracción", descripcion="OCR en curso")
+
+    # Un worker distinto no tiene el job en memoria: lo lee del almacén compartido
+    otro_proceso = RegistroPasaportes(AlmacenPasaportesDisco(str(tmp_path)))
+    assert otro_proceso.leer("job-3") == servicio.leer_pasaporte("job-3")
+    assert otro_proceso.leer("no-existe") is None
+
+@pytest.mark.asyncio
+async def test_volcado_diferido_escribe_el_ultimo_cambio_de_la_rafaga(tmp_path):
+    registro = RegistroPasaportes(AlmacenContado(str(tmp_path)), intervalo_volcado=0.05)
+    servicio = PassportService(passport_dir=str(tmp_path))
+    servicio.registro = registro
+
+    servicio.crear_pasaporte("job-4")
+    for i in range(50):
+        servicio.actualizar("job-4", descripcion=f"paso {i}")
+    await asyncio.sleep(0.15)
+
+    assert registro.almacen.escrituras == 2
+    assert leer_disco(tmp_path, "job-4")["detalle"]["descripcion"] == "paso 49"
+
+def test_actualizar_pasaporte_inexistente_no_falla(servicio):
+    servicio.actualizar("fantasma", descripcion="nada")
+
+    assert servicio.leer_pasaporte("fantasma") is None
+    assert servicio.registro.almacen.escrituras == 0
@@ -0,0 +1,364 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import fitz
+import pytest
+
+# processing_service importa pdf_processor, que necesita la librería nativa de zbar
+pytest.importorskip("pyzbar.pyzbar", exc_type=ImportError)
+
+from Fluxo_IA_visual.core.exceptions import ExtraccionCanceladaError, PDFCifradoError
+from Fluxo_IA_visual.services import processing_service as modulo_processing
+from Fluxo_IA_visual.services.processing_service import ProcessingService
+
+# ============================================================================
+# DOBLES DE PRUEBA (workers, carátulas y servicios inyectados)
+# ============================================================================
+# Los workers se definen a nivel módulo: EjecutorMedido serializa (fn, args) con pickle.
+# En las pruebas el pool es de hilos, así que registran sus llamadas en listas compartidas.
+# La sonda de ruteo temprano NO se simula: corre de verdad sobre los PDFs de prueba.
+
+PAGINAS_TEXTRACT = 10
+LLAMADAS_TEXTRACT = []   # (archivo, instante) al arrancar cada extracción
+PAGINAS_ENVIADAS = []    # archivo por cada página "cobrada"
+LLAMADAS_OCR = []
+LLAMADAS_DIGITAL = []   # (cuenta, instante)
+CLASIFICADOS = []
+SEGMENTOS_AL_CLASIFICAR = []  # segmentos de memoria compartida aún publicados al clasificar cada cuenta
+DEMORAS_WORKER = {"ocr": 0.0, "textract_pagina": 0.0, "digital": 0.0}
+
+def segmento_publicado(nombre_shm):
+    try:
+        shared_memory.SharedMemory(name=nombre_shm).close()
+        return True
+    except FileNotFoundError:
+        return False
+
+def nombre_archivo(ruta):
+    return str(ruta).rsplit("/", 1)[-1]
+
+def textract_falso(file_path, cancelacion=None):
+    """Como `extraer_documento_completo`: revisa la bandera antes de cada página cobrada."""
+    LLAMADAS_TEXTRACT.append((nombre_archivo(file_path), time.monotonic()))
+    for _ in range(PAGINAS_TEXTRACT):
+        if cancelacion is not None and cancelacion.activa():
+            raise ExtraccionCanceladaError(file_path)
+        PAGINAS_ENVIADAS.append(nombre_archivo(file_path))
+        time.sleep(DEMORAS_WORKER["textract_pagina"])
+    return [{"fila": 1}], ["texto"]
+
+def ocr_falso(ia_data, file_path, filename, extraccion_previa=None):
+    LLAMADAS_OCR.append((filename, extraccion_previa))
+    time.sleep(DEMORAS_WORKER["ocr"])
+    return {**ia_data, "nombre_archivo_virtual": filename, "transacciones": []}
+
+def digital_falso(ia_data, filename, file_path, rango_paginas, documento=None):
+    LLAMADAS_DIGITAL.append((filename, time.monotonic()))
+    time.sleep(DEMORAS_WORKER["digital"])
+    return {**ia_data, "nombre_archivo_virtual": filename, "transacciones": []}
+
+def caratula(clabe, depositos=1000.0):
+    return {
+        "banco": "BBVA", "rfc": "AAA010101AA1", "clabe_interbancaria": clabe,
+        "periodo_inicio": "01/03/2025", "periodo_fin": "31/03/2025",
+        "depositos": depositos, "cargos": 10.0,
+    }
+
+def analisis(cuentas, es_digital):
+    """Misma forma que `MotorCaratulas.procesar_caratula_completa`."""
+    rangos = [(i + 1, i + 1) for i in range(len(cuentas))]
+    return cuentas, es_digital, "", {}, {i + 1: "" for i in range(len(cuentas))}, rangos
+
+def pdf_escaneado(encabezado=None):
+    """
+    Una página cubierta por una imagen y sin capa de texto: la sonda la marca como escaneado confiable.
+    Con `encabezado` lleva algo de texto: sigue siendo escaneado, pero la sonda ya no está segura.
+    """
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 60, 80), False)
+    pix.clear_with(220)
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_image(page.rect, pixmap=pix)
+    if encabezado:
+        page.insert_text((50, 40), encabezado, fontsize=8)
+    datos = doc.tobytes()
+    doc.close()
+    return datos
+
+class PasaporteFalso:
+    def __init__(self):
+        self.eventos = []
+
+    def crear_pasaporte(self, job_id):
+        pass
+
+    def actualizar(self, job_id, **kwargs):
+        self.eventos.append(kwargs)
+
+class AlmacenFalso:
+    def __init__(self):
+        self.resultado = None
+
+    async def obtener_documentos(self, job_id, hashes):
+        return []
+
+    async def guardar_excel(self, excel_bytes, job_id):
+        pass
+
+    async def guardar_resultado(self, datos, job_id):
+        self.resultado = datos
+
+class ArchivosFalsos:
+    def limpiar_temporales(self, rutas):
+        pass
+
+@pytest.fixture
+def entorno(monkeypatch, tmp_path):
+    """Servicio con workers, Excel y clasificación IA falsos; cada archivo tiene su carátula guionizada."""
+    for lista in (LLAMADAS_TEXTRACT, PAGINAS_ENVIADAS, LLAMADAS_OCR, LLAMADAS_DIGITAL, CLASIFICADOS, SEGMENTOS_AL_CLASIFICAR):
+        lista.clear()
+    monkeypatch.setattr(modulo_processing, "extraer_textract_worker_sync", textract_falso)
+    monkeypatch.setattr(modulo_processing, "procesar_ocr_worker_sync", ocr_falso)
+    monkeypatch.setattr(modulo_processing, "procesar_digital_worker_sync", digital_falso)
+    monkeypatch.setattr(modulo_processing, "generar_excel_reporte", lambda datos: b"xlsx")
+
+    almacen = AlmacenFalso()
+    service = ProcessingService(ArchivosFalsos(), PasaporteFalso(), almacen)
+    guion = {}  # filename -> (demora_seg, resultado de la carátula o excepción)
+    caratulas_terminadas = {}  # filename -> instante en que respondió la carátula
+    segmentos = {}  # filename -> nombre del segmento de memoria compartida de su PDF
+
+    async def caratula_guionizada(pdf_bytes, ref_documento, executor):
+        filename = nombre_archivo(ref_documento.ruta)
+        segmentos[filename] = ref_documento.nombre_shm
+        demora, resultado = guion[filename]
+        await asyncio.sleep(demora)
+        caratulas_terminadas[filename] = time.monotonic()
+        if isinstance(resultado, Exception):
+            raise resultado
+        return resultado
+
+    async def clasificar_sin_ia(job_id, resultado_doc):
+        CLASIFICADOS.append(resultado_doc.nombre_documento)
+        SEGMENTOS_AL_CLASIFICAR.append([f for f, nombre in segmentos.items() if nombre and segmento_publicado(nombre)])
+
+    monkeypatch.setattr(service, "_analizar_caratula", caratula_guionizada)
+    monkeypatch.setattr(service, "_clasificar_documento_async", clasificar_sin_ia)
+
+    pool = ThreadPoolExecutor(max_workers=8)
+
+    async def ejecutar(archivos, pdfs=None, hashes=None):
+        """
+        archivos: lista de (filename, demora_seg, resultado_caratula) en el orden de subida.
+        pdfs / hashes: bytes y hash por filename (por omisión, escaneado confiable y hash propio).
+        """
+        pdfs, hashes = pdfs or {}, hashes or {}
+        lista_archivos = []
+        for filename, demora, resultado in archivos:
+            ruta = tmp_path / filename
+            ruta.write_bytes(pdfs.get(filename) or pdf_escaneado())
+            guion[filename] = (demora, resultado)
+            lista_archivos.append({"path": ruta, "filename": filename, "hash_documento": hashes.get(filename, f"hash-{filename}")})
+        await service.ejecutar_pipeline_background("job-prueba", lista_archivos, pool_global=pool)
+        # Deja terminar a los workers descartados (y a sus callbacks en el loop) antes de revisar
+        await asyncio.get_running_loop().run_in_executor(None, pool.shutdown, True)
+        await asyncio.sleep(0.01)
+        return almacen.resultado["resultados_individuales"]
+
+    ejecutar.caratulas_terminadas = caratulas_terminadas
+    ejecutar.segmentos = segmentos
+    ejecutar.ruta = tmp_path
+    yield ejecutar
+    pool.shutdown(wait=True)
+
+def por_documento(resultados):
+    return {r["nombre_documento"]: r for r in resultados}
+
+def arrancados():
+    return [nombre for nombre, _ in LLAMADAS_TEXTRACT]
+
+def extraidos_digitales():
+    return [nombre for nombre, _ in LLAMADAS_DIGITAL]
+
+# ============================================================================
+# PRUEBAS: RUTEO TEMPRANO A TEXTRACT (SONDA + CANCELACIÓN)
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_textract_arranca_en_paralelo_a_la_caratula(entorno):
+    """Escaneado confiable: Textract empieza antes de que responda la carátula y su pasada se reutiliza."""
+    await entorno([("escaneado.pdf", 0.2, analisis([caratula("012180001234567890")], es_digital=False))])
+
+    (nombre, inicio), = LLAMADAS_TEXTRACT
+    assert nombre == "escaneado.pdf"
+    assert inicio < entorno.caratulas_terminadas["escaneado.pdf"]
+    assert PAGINAS_ENVIADAS.count("escaneado.pdf") == PAGINAS_TEXTRACT
+    assert LLAMADAS_OCR == [("escaneado.pdf (Cta 1)", ([{"fila": 1}], ["texto"]))]
+
+@pytest.mark.asyncio
+async def test_sonda_insegura_espera_a_la_caratula(entorno):
+    """Con algo de texto la sonda no está segura: ni digital ni escaneado arrancan Textract antes de confirmar."""
+    pdfs = {nombre: pdf_escaneado(encabezado="BANCO ESTADO DE CUENTA MARZO") for nombre in ("digital.pdf", "escaneado.pdf")}
+    await entorno([
+        ("digital.pdf", 0.0, analisis([caratula("012180001111111111")], es_digital=True)),
+        ("escaneado.pdf", 0.1, analisis([caratula("012180002222222222")], es_digital=False)),
+    ], pdfs=pdfs)
+
+    (nombre, inicio), = LLAMADAS_TEXTRACT
+    assert nombre == "escaneado.pdf"
+    assert inicio >= entorno.caratulas_terminadas["escaneado.pdf"]
+
+@pytest.mark.asyncio
+async def test_rutas_descartadas_detienen_textract(entorno, monkeypatch):
+    """
+    Carátula fallida, cifrada, digital o duplicada: la extracción temprana se cancela y deja de enviar
+    páginas; su resultado nunca se usa y el marcador de cancelación se limpia.
+    """
+    monkeypatch.setitem(DEMORAS_WORKER, "textract_pagina", 0.02)
+    resultados = por_documento(await entorno([
+        ("escaneado.pdf", 0.0, analisis([caratula("012180001234567890")], es_digital=False)),
+        ("ilegible.pdf", 0.05, ValueError("PDF corrupto")),
+        ("cifrado.pdf", 0.05, PDFCifradoError("protegido")),
+        ("digital.pdf", 0.05, analisis([caratula("012180009999999999")], es_digital=True)),
+        ("copia_escaneada.pdf", 0.05, analisis([caratula("012180001234567890")], es_digital=False)),
+    ]))
+
+    assert PAGINAS_ENVIADAS.count("escaneado.pdf") == PAGINAS_TEXTRACT
+    for descartado in ("ilegible.pdf", "cifrado.pdf", "digital.pdf", "copia_escaneada.pdf"):
+        assert PAGINAS_ENVIADAS.count(descartado) < PAGINAS_TEXTRACT // 2, descartado
+    assert [nombre for nombre, _ in LLAMADAS_OCR] == ["escaneado.pdf (Cta 1)"]
+    assert extraidos_digitales() == ["digital.pdf (Cta 1)"]
+    assert resultados["copia_escaneada.pdf"]["AnalisisIA"]["banco"] == "DUPLICADO"
+    assert not list(entorno.ruta.glob("*.cancelar"))
+
+@pytest.mark.asyncio
+async def test_copia_exacta_nunca_llama_a_textract(entorno):
+    """Mismo hash que un documento anterior: es DUPLICADO antes de la carátula, así que Textract ni arranca."""
+    resultados = por_documento(await entorno([
+        ("original.pdf", 0.0, analisis([caratula("012180001234567890")], es_digital=False)),
+        ("reenvio.pdf", 0.0, analisis([caratula("012180001234567890")], es_digital=False)),
+    ], hashes={"original.pdf": "mismo-hash", "reenvio.pdf": "mismo-hash"}))
+
+    assert arrancados() == ["original.pdf"]
+    assert resultados["reenvio.pdf"]["AnalisisIA"]["banco"] == "DUPLICADO"
+    assert "reenvio.pdf" not in entorno.caratulas_terminadas
+
+@pytest.mark.asyncio
+async def test_una_pasada_de_textract_compartida_por_las_cuentas(entorno):
+    await entorno([
+        ("dos_cuentas.pdf", 0.0, analisis([caratula("012180001111111111"), caratula("012180002222222222")], es_digital=False)),
+    ])
+
+    assert arrancados() == ["dos_cuentas.pdf"]
+    assert sorted(nombre for nombre, _ in LLAMADAS_OCR) == ["dos_cuentas.pdf (Cta 1)", "dos_cuentas.pdf (Cta 2)"]
+    assert all(previa == ([{"fila": 1}], ["texto"]) for _, previa in LLAMADAS_OCR)
+
+# ============================================================================
+# PRUEBAS: PIPELINE POR DOCUMENTO (ORDEN, DEDUPLICACIÓN, ERRORES, TIMEOUT)
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_resultados_en_el_orden_de_la_lista_aunque_terminen_en_otro(entorno):
+    resultados = await entorno([
+        ("lento.pdf", 0.06, analisis([caratula("012180001111111111")], es_digital=True)),
+        ("medio.pdf", 0.03, analisis([caratula("012180002222222222")], es_digital=False)),
+        ("rapido.pdf", 0.0, analisis([caratula("012180003333333333")], es_digital=True)),
+    ])
+
+    assert [r["nombre_documento"] for r in resultados] == ["lento.pdf (Cta 1)", "medio.pdf (Cta 1)", "rapido.pdf (Cta 1)"]
+    assert all(r["estatus_documento"] == "exitoso" for r in resultados)
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("demora_original, demora_copia", [(0.0, 0.05), (0.05, 0.0), (0.1, 0.0)])
+async def test_el_duplicado_es_siempre_el_posterior_en_la_lista(entorno, monkeypatch, demora_original, demora_copia):
+    """
+    Aunque la carátula de la copia termine primero (y ya esté extraída o clasificada cuando llega la del
+    original), el DUPLICADO es el archivo que va después en la lista.
+    """
+    monkeypatch.setitem(DEMORAS_WORKER, "digital", 0.03)
+    resultados = await entorno([
+        ("original.pdf", demora_original, analisis([caratula("012180001234567890")], es_digital=True)),
+        ("copia.pdf", demora_copia, analisis([caratula("012180001234567890")], es_digital=True)),
+    ])
+
+    assert [r["nombre_documento"] for r in resultados] == ["original.pdf (Cta 1)", "copia.pdf"]
+    assert resultados[0]["estatus_documento"] == "exitoso"
+    assert resultados[1]["AnalisisIA"]["banco"] == "DUPLICADO"
+
+@pytest.mark.asyncio
+async def test_copia_superada_durante_la_extraccion_no_se_clasifica(entorno, monkeypatch):
+    """El original reclama la firma mientras la copia se extrae: la copia se descarta antes de la IA."""
+    monkeypatch.setitem(DEMORAS_WORKER, "digital", 0.1)
+    resultados = por_documento(await entorno([
+        ("original.pdf", 0.03, analisis([caratula("012180001234567890")], es_digital=True)),
+        ("copia.pdf", 0.0, analisis([caratula("012180001234567890")], es_digital=True)),
+    ]))
+
+    assert resultados["copia.pdf"]["AnalisisIA"]["banco"] == "DUPLICADO"
+    assert CLASIFICADOS == ["original.pdf (Cta 1)"]
+
+@pytest.mark.asyncio
+async def test_un_documento_lento_no_retrasa_la_extraccion_de_otro_distinto(entorno):
+    """Sin barrera de deduplicación: el segundo documento se extrae sin esperar la carátula del primero."""
+    await entorno([
+        ("lento.pdf", 0.3, analisis([caratula("012180001111111111")], es_digital=True)),
+        ("rapido.pdf", 0.0, analisis([caratula("012180002222222222")], es_digital=True)),
+    ])
+
+    extraccion_rapido = dict(LLAMADAS_DIGITAL)["rapido.pdf (Cta 1)"]
+    assert extraccion_rapido < entorno.caratulas_terminadas["lento.pdf"]
+
+@pytest.mark.asyncio
+async def test_memoria_compartida_se_libera_antes_de_clasificar(entorno):
+    """El PDF no ocupa /dev/shm mientras el documento espera a la clasificación IA."""
+    await entorno([
+        ("a.pdf", 0.0, analisis([caratula("012180001111111111"), caratula("012180002222222222")], es_digital=True)),
+    ])
+
+    assert entorno.segmentos["a.pdf"]  # Sí se publicó para los workers
+    assert len(CLASIFICADOS) == 2
+    assert SEGMENTOS_AL_CLASIFICAR == [[], []]
+
+@pytest.mark.asyncio
+async def test_cuentas_repetidas_dentro_del_mismo_documento(entorno):
+    """La primera cuenta gana; la repetida del mismo PDF no se extrae y el documento no queda como DUPLICADO."""
+    resultados = await entorno([
+        ("doble.pdf", 0.0, analisis([caratula("012180001234567890"), caratula("012180001234567890")], es_digital=True)),
+    ])
+
+    assert [r["nombre_documento"] for r in resultados] == ["doble.pdf (Cta 1)"]
+    assert extraidos_digitales() == ["doble.pdf (Cta 1)"]
+
+@pytest.mark.asyncio
+async def test_caratulas_fallidas_conservan_su_tipo_de_error(entorno):
+    resultados = por_documento(await entorno([
+        ("ilegible.pdf", 0.05, ValueError("PDF corrupto")),
+        ("cifrado.pdf", 0.0, PDFCifradoError("protegido")),
+        ("valido.pdf", 0.0, analisis([caratula("012180001234567890")], es_digital=True)),
+    ]))
+
+    assert resultados["ilegible.pdf"]["estatus_documento"] == "fallido"
+    assert resultados["ilegible.pdf"]["AnalisisIA"]["banco"] == "ERROR_LECTURA"
+    assert resultados["ilegible.pdf"]["DetalleTransacciones"]["detalle_error"] == "PDF corrupto"
+    assert resultados["cifrado.pdf"]["AnalisisIA"]["banco"] == "ERROR_CIFRADO"
+    assert resultados["valido.pdf (Cta 1)"]["estatus_documento"] == "exitoso"
+
+@pytest.mark.asyncio
+async def test_timeout_ocr_se_reporta_sin_tumbar_el_lote(entorno, monkeypatch):
+    ejecutar_ocr_original = ProcessingService._ejecutar_ocr_cuenta
+
+    async def ejecutar_ocr_timeout_corto(self, cuenta, executor, extraccion_ocr=None):
+        return await ejecutar_ocr_original(self, cuenta, executor, extraccion_ocr, timeout_seg=0.05)
+
+    monkeypatch.setattr(ProcessingService, "_ejecutar_ocr_cuenta", ejecutar_ocr_timeout_corto)
+    monkeypatch.setitem(DEMORAS_WORKER, "ocr", 0.3)
+    resultados = por_documento(await entorno([
+        ("escaneado.pdf", 0.0, analisis([caratula("012180001111111111")], es_digital=False)),
+        ("digital.pdf", 0.0, analisis([caratula("012180002222222222")], es_digital=True)),
+    ]))
+
+    assert resultados["escaneado.pdf (Cta 1)"]["estatus_documento"] == "fallido"
+    assert resultados["escaneado.pdf (Cta 1)"]["DetalleTransacciones"]["detalle_error"] == "Timeout: Procesamiento OCR excedió 13 min."
+    assert resultados["digital.pdf (Cta 1)"]["estatus_documento"] == "exitoso"
@@ -0,0 +1,265 @@
+import asyncio
+from io import BytesIO
+
+import openai
+import pytest
+from Fluxo_IA_visual.core.exceptions import CircuitoAbiertoError
+from Fluxo_IA_visual.services import resiliencia_ia
+from Fluxo_IA_visual.services.resiliencia_ia import (
+    CircuitBreaker, calcular_espera, es_reintentable, llamar_con_resiliencia,
+    metricas_llm, obtener_circuito, obtener_metricas, proveedor_de_cliente, segundos_retry_after,
+)
+
+# ============================================================================
+# MOCKS Y FIXTURES
+# ============================================================================
+
+class RespuestaMock:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+class ErrorHTTPMock(Exception):
+    """Imita openai.APIStatusError: expone status_code y response.headers."""
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = RespuestaMock(status_code, headers)
+
+def llamada_guionada(guion):
+    """Fábrica que en cada intento consume el siguiente elemento: Exception se lanza, lo demás se regresa."""
+    intentos = []
+
+    async def _llamada():
+        paso = guion[len(intentos)]
+        intentos.append(paso)
+        if isinstance(paso, Exception):
+            raise paso
+        return paso
+
+    return _llamada, intentos
+
+@pytest.fixture(autouse=True)
+def registros_limpios():
+    """Métricas y circuitos son globales por proceso: cada prueba arranca en limpio."""
+    resiliencia_ia._METRICAS_POR_MODELO.clear()
+    resiliencia_ia._CIRCUITOS_POR_PROVEEDOR.clear()
+    yield
+    resiliencia_ia._METRICAS_POR_MODELO.clear()
+    resiliencia_ia._CIRCUITOS_POR_PROVEEDOR.clear()
+
+# ============================================================================
+# PRUEBAS: CLASIFICACIÓN DE ERRORES Y ESPERAS
+# ============================================================================
+
+def test_es_reintentable_por_estado_http():
+    assert es_reintentable(ErrorHTTPMock(429))
+    assert es_reintentable(ErrorHTTPMock(503))
+    assert es_reintentable(asyncio.TimeoutError())
+    assert not es_reintentable(ErrorHTTPMock(400))
+    assert not es_reintentable(ValueError("json inválido"))
+
+def test_retry_after_en_segundos_y_milisegundos():
+    assert segundos_retry_after(ErrorHTTPMock(429, {"retry-after": "7"})) == 7.0
+    assert segundos_retry_after(ErrorHTTPMock(429, {"retry-after-ms": "1500", "retry-after": "9"})) == 1.5
+    assert segundos_retry_after(ErrorHTTPMock(503)) is None
+
+def test_espera_con_jitter_acotada_y_respeta_retry_after():
+    for intento in range(6):
+        assert 0.0 <= calcular_espera(intento, base_seg=1.0, max_seg=8.0) <= min(8.0, 2 ** intento)
+    assert calcular_espera(0, base_seg=0.1, max_seg=30.0, retry_after=5.0) == 5.0
+    assert calcular_espera(0, base_seg=0.1, max_seg=30.0, retry_after=90.0) == 30.0
+
+# ============================================================================
+# PRUEBAS: REINTENTOS
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_reintenta_429_y_5xx_hasta_tener_exito():
+    llamada, intentos = llamada_guionada([ErrorHTTPMock(429), ErrorHTTPMock(502), "ok"])
+
+    resultado = await llamar_con_resiliencia(llamada, "openai", "gpt-x", base_seg=0.001)
+
+    assert resultado == "ok"
+    assert len(intentos) == 3
+    resumen = metricas_llm()["modelos"]["gpt-x"]
+    assert resumen["reintentos"] == 2 and resumen["exitos"] == 1 and resumen["fallos"] == 0
+
+@pytest.mark.asyncio
+async def test_error_de_cliente_no_se_reintenta():
+    llamada, intentos = llamada_guionada([ErrorHTTPMock(400), "nunca"])
+
+    with pytest.raises(ErrorHTTPMock):
+        await llamar_con_resiliencia(llamada, "openai", "gpt-x", base_seg=0.001)
+
+    assert len(intentos) == 1
+    assert obtener_circuito("openai").estado == "CERRADO"
+
+@pytest.mark.asyncio
+async def test_agota_reintentos_y_propaga_el_ultimo_error():
+    llamada, intentos = llamada_guionada([ErrorHTTPMock(503)] * 3)
+
+    with pytest.raises(ErrorHTTPMock):
+        await llamar_con_resiliencia(llamada, "openai", "gpt-x", max_reintentos=2, base_seg=0.001)
+
+    assert len(intentos) == 3
+    assert obtener_metricas("gpt-x").fallos == 1
+
+# ============================================================================
+# PRUEBAS: CORTACIRCUITOS
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_circuito_abierto_corta_sin_llamar_al_proveedor():
+    llamada, intentos = llamada_guionada([ErrorHTTPMock(500)] * 5 + ["ok"])
+
+    with pytest.raises(ErrorHTTPMock):
+        await llamar_con_resiliencia(llamada, "openrouter", "qwen", max_reintentos=4, base_seg=0.001)
+    assert obtener_circuito("openrouter").estado == "ABIERTO"
+
+    with pytest.raises(CircuitoAbiertoError):
+        await llamar_con_resiliencia(llamada, "openrouter", "qwen", base_seg=0.001)
+    assert len(intentos) == 5
+
+    # Otro proveedor no se ve afectado
+    otra, _ = llamada_guionada(["ok"])
+    assert await llamar_con_resiliencia(otra, "openai", "gpt-x") == "ok"
+
+@pytest.mark.parametrize("base_url, proveedor", [
+    (None, "openai"),
+    ("https://openrouter.ai/api/v1", "openrouter"),
+    ("https://gateway.interno.mx/v1", "gateway.interno.mx"),
+])
+def test_proveedor_se_deduce_del_cliente(base_url, proveedor):
+    assert proveedor_de_cliente(openai.AsyncOpenAI(api_key="x", base_url=base_url)) == proveedor
+
+@pytest.mark.asyncio
+async def test_ocr_service_usa_el_circuito_de_su_cliente(monkeypatch):
+    pytest.importorskip("pyzbar.pyzbar", exc_type=ImportError)  # ocr_services importa pdf_processor (zbar)
+    from Fluxo_IA_visual.services import ocr_services
+
+    proveedores = []
+
+    async def resiliencia_registrada(fabrica_llamada, proveedor, **kwargs):
+        proveedores.append(proveedor)
+        raise ErrorHTTPMock(400)
+
+    monkeypatch.setattr(ocr_services, "llamar_con_resiliencia", resiliencia_registrada)
+    monkeypatch.setattr(ocr_services, "convertir_pdf_a_imagenes_mejorada", lambda pdf, paginas: [BytesIO(b"png")])
+    servicio = ocr_services.OCRService()
+    servicio._client = openai.AsyncOpenAI(api_key="x", base_url="https://gateway.interno.mx/v1")
+
+    await servicio.extraer_con_vision(b"%PDF", "prompt")
+
+    assert proveedores == ["gateway.interno.mx"]
+
+def test_circuito_semi_abierto_deja_pasar_una_prueba():
+    circuito = CircuitBreaker(umbral_fallos=2, segundos_reposo=0.0)
+    circuito.registrar_fallo()
+    circuito.registrar_fallo()
+    assert circuito.estado == "ABIERTO"
+
+    assert circuito.permitir() is True    # Pasa a SEMI_ABIERTO con una sola prueba
+    assert circuito.permitir() is False
+    circuito.registrar_exito()
+    assert circuito.estado == "CERRADO" and circuito.permitir()
+
+# ============================================================================
+# PRUEBAS: HEDGING
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_hedge_lanza_segunda_peticion_al_rebasar_p95():
+    """Con p95 histórico de 10 ms, una llamada que tarda 1 s es rebasada por el respaldo."""
+    metricas = obtener_metricas("gpt-hedge")
+    metricas.latencias.extend([0.01] * 20)
+    llamadas = []
+
+    async def llamada():
+        llamadas.append(1)
+        if len(llamadas) == 1:
+            await asyncio.sleep(1.0)
+            return "lenta"
+        return "respaldo"
+
+    resultado = await asyncio.wait_for(
+        llamar_con_resiliencia(llamada, "openai", "gpt-hedge", hedge=True), timeout=0.5
+    )
+
+    assert resultado == "respaldo"
+    assert metricas.hedges == 1 and metricas.hedges_ganados == 1
+
+@pytest.mark.asyncio
+async def test_sin_historial_suficiente_no_hay_hedge():
+    llamada, intentos = llamada_guionada(["ok"])
+
+    assert await llamar_con_resiliencia(llamada, "openai", "gpt-nuevo", hedge=True) == "ok"
+    assert len(intentos) == 1 and obtener_metricas("gpt-nuevo").hedges == 0
+
+@pytest.mark.asyncio
+async def test_cancelar_el_hedge_no_deja_peticiones_corriendo():
+    metricas = obtener_metricas("gpt-cancelado")
+    metricas.latencias.extend([0.5] * 20)
+    canceladas = []
+
+    async def llamada():
+        try:
+            await asyncio.sleep(5.0)
+        except asyncio.CancelledError:
+            canceladas.append(1)
+            raise
+
+    tarea = asyncio.ensure_future(llamar_con_resiliencia(llamada, "openai", "gpt-cancelado", hedge=True))
+    await asyncio.sleep(0.05)  # Todavía dentro de la espera previa al hedge
+    tarea.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await tarea
+    await asyncio.sleep(0)
+
+    assert canceladas == [1]
+
+@pytest.mark.asyncio
+async def test_hedge_sin_cupo_espera_a_la_principal():
+    metricas = obtener_metricas("gpt-saturado")
+    metricas.latencias.extend([0.01] * 20)
+    llamada, intentos = llamada_guionada(["ok", "respaldo"])
+
+    async def lenta():
+        await asyncio.sleep(0.05)
+        return await llamada()
+
+    async def sin_cupo():
+        return None
+
+    contexto = resiliencia_ia.reserva_hedge.set(sin_cupo)
+    try:
+        assert await llamar_con_resiliencia(lenta, "openai", "gpt-saturado", hedge=True) == "ok"
+    finally:
+        resiliencia_ia.reserva_hedge.reset(contexto)
+    assert len(intentos) == 1
+    assert metricas.hedges == 0 and metricas.hedges_sin_cupo == 1
+
+# ============================================================================
+# PRUEBAS: CANCELACIÓN DE LA LLAMADA DE PRUEBA
+# ============================================================================
+
+@pytest.mark.asyncio
+async def test_prueba_semi_abierta_cancelada_libera_el_circuito():
+    circuito = obtener_circuito("openrouter")
+    circuito.segundos_reposo = 0.0
+    for _ in range(circuito.umbral_fallos):
+        circuito.registrar_fallo()
+
+    async def colgada():
+        await asyncio.sleep(5.0)
+
+    tarea = asyncio.ensure_future(llamar_con_resiliencia(colgada, "openrouter", "qwen"))
+    await asyncio.sleep(0.01)
+    assert circuito.estado == "SEMI_ABIERTO"
+    tarea.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await tarea
+
+    llamada, _ = llamada_guionada(["ok"])
+    assert await llamar_con_resiliencia(llamada, "openrouter", "qwen") == "ok"
+    assert circuito.estado == "CERRADO"
@@ -0,0 +1,124 @@
+import pickle
+import random
+
+import pytest
+from Fluxo_IA_visual.core.motor_clasificador import MotorClasificador
+from Fluxo_IA_visual.models.responses_analisisTPV import AnalisisTPV
+from Fluxo_IA_visual.models.tabla_transacciones import (
+    CATEGORIAS_BASE, FilaTransaccion, TablaTransacciones, como_tabla, monto_a_float,
+)
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+def filas_legado(n: int, semilla: int = 3) -> list:
+    """Filas como las dejaba el worker antes: monto ya formateado a string con comas."""
+    rnd = random.Random(semilla)
+    categorias = ["GENERAL", "TPV", "EFECTIVO", "TRASPASO_ABONO", "COMISION_CR", "BASURA_OCR", " tpv "]
+    tipos = ["abono", "cargo", "ABONO", "Depósito", "importe"]
+    return [
+        {
+            "fecha": f"{(i % 28) + 1:02d}/03/2026", "periodo": "MARZO 2026",
+            "descripcion": f"SPEI RECIBIDO REF {i % 50}",
+            "monto": f"{rnd.uniform(0, 250_000):,.2f}",
+            "tipo": rnd.choice(tipos), "categoria": rnd.choice(categorias),
+        }
+        for i in range(n)
+    ]
+
+@pytest.fixture
+def tabla():
+    t = TablaTransacciones()
+    t.agregar("01/03/2026", "MARZO 2026", "DEPOSITO EN EFECTIVO", 1234.5, "abono", "EFECTIVO")
+    t.agregar("02/03/2026", "MARZO 2026", "PAGO LUZ", 99.99, "cargo")
+    return t
+
+# ============================================================================
+# PRUEBAS: COLUMNAS Y VISTA POR FILA
+# ============================================================================
+
+def test_vista_por_fila_lee_y_escribe_en_las_columnas(tabla):
+    fila = tabla[1]
+    assert isinstance(fila, FilaTransaccion)
+    assert fila.monto == "99.99" and fila.importe == 99.99
+    assert fila.tipo == "cargo" and fila.categoria == "GENERAL"
+
+    fila.categoria = "PAGO_SERVICIOS"   # Etiqueta libre de la IA: se agrega al catálogo de la tabla
+    fila.es_sospechosa = True
+    fila.razon_clasificacion = "Delegado a IA"
+
+    assert tabla.categorias[1] == len(CATEGORIAS_BASE)
+    assert tabla.registro(1)["categoria"] == "PAGO_SERVICIOS"
+    assert tabla.registro(1)["es_sospechosa"] is True
+    assert [f.categoria for f in tabla] == ["EFECTIVO", "PAGO_SERVICIOS"]
+
+def test_codigos_conocidos_son_fijos_y_descripciones_internadas():
+    a, b = TablaTransacciones(), TablaTransacciones()
+    a.agregar(descripcion="SPEI " + "RECIBIDO", tipo="ABONO", categoria="TPV")
+    b.agregar(descripcion="".join(["SPEI ", "RECIBIDO"]), tipo="ABONO", categoria="TPV")
+
+    assert (a.tipos[0], a.categorias[0]) == (b.tipos[0], b.categorias[0])
+    assert a.descripciones[0] is b.descripciones[0]
+
+def test_parseo_de_monto_igual_al_de_los_totales():
+    assert monto_a_float("$1,234.50") == 1234.5
+    assert monto_a_float(" 500 ") == 500.0
+    assert monto_a_float("MontoInvalido") == 0.0
+    assert monto_a_float(None) == 0.0
+
+def test_pickle_conserva_filas_y_catalogo(tabla):
+    tabla[0].categoria = "ETIQUETA_NUEVA"
+
+    copia = pickle.loads(pickle.dumps(tabla, protocol=pickle.HIGHEST_PROTOCOL))
+
+    assert copia.a_registros() == tabla.a_registros()
+    copia.agregar(categoria="ETIQUETA_NUEVA")
+    assert copia.categorias[-1] == copia.categorias[0]
+
+# ============================================================================
+# PRUEBAS: FRONTERA JSON Y EQUIVALENCIA CON EL MODELO PYDANTIC
+# ============================================================================
+
+def test_serializacion_identica_a_lista_de_transacciones():
+    filas = filas_legado(300)
+    por_tabla = AnalisisTPV.ResultadoTPV(transacciones=TablaTransacciones.desde_registros(filas))
+    por_pydantic = AnalisisTPV.ResultadoTPV(transacciones=[AnalisisTPV.Transaccion(**f) for f in filas])
+
+    assert por_tabla.model_dump(mode="json") == por_pydantic.model_dump(mode="json")
+
+def test_documento_rescatado_del_json_vuelve_a_tabla():
+    volcado = AnalisisTPV.ResultadoExtraccion(
+        DetalleTransacciones=AnalisisTPV.ResultadoTPV(transacciones=TablaTransacciones.desde_registros(filas_legado(5)))
+    ).model_dump(mode="json")
+
+    tabla = como_tabla(volcado["DetalleTransacciones"]["transacciones"])
+
+    assert tabla.a_registros() == volcado["DetalleTransacciones"]["transacciones"]
+
+def test_totales_sobre_tabla_iguales_a_los_de_objetos_pydantic():
+    motor = MotorClasificador(debug_flags=None)
+    filas = filas_legado(2000)
+
+    totales_pydantic = motor._calcular_totales([AnalisisTPV.Transaccion(**f) for f in filas])
+    totales_tabla = motor._calcular_totales(TablaTransacciones.desde_registros(filas))
+
+    assert totales_tabla == totales_pydantic
+
+@pytest.mark.asyncio
+async def test_motor_clasifica_escribiendo_en_la_tabla():
+    motor = MotorClasificador(debug_flags=None)
+    tabla = TablaTransacciones()
+    tabla.agregar(descripcion="MOVIMIENTO REF 88231", monto=1500.0, tipo="abono")
+    tabla.agregar(descripcion="IVA COMISION", monto=16.0, tipo="cargo")
+    montos_enviados = []
+
+    async def ia_falsa(banco, lote):
+        montos_enviados.extend(item["tx_data"].monto for item in lote)
+        return {str(item["id"]): "tpv" for item in lote}
+
+    totales = await motor.clasificar_y_sumar_transacciones(tabla, "bbva", ia_falsa)
+
+    assert montos_enviados == ["1,500.00"]  # La IA sigue recibiendo el monto formateado
+    assert [tabla.registro(i)["categoria"] for i in range(2)] == ["TPV", "IVA"]
+    assert totales["TPV"] == 1500.0 and totales["DEPOSITOS"] == 1500.0
@@ -0,0 +1,50 @@
+import pytest
+
+from Fluxo_IA_visual.core import textract_engine
+from Fluxo_IA_visual.core.exceptions import ExtraccionCanceladaError
+from Fluxo_IA_visual.services.ipc_pool import BanderaCancelacion
+
+# ============================================================================
+# PRUEBAS: CANCELACIÓN DE LA EXTRACCIÓN TEXTRACT
+# ============================================================================
+
+@pytest.fixture
+def textract_simulado(monkeypatch):
+    """Sin poppler ni AWS: 6 páginas "rasterizadas" y un cliente que cuenta las llamadas cobradas."""
+    llamadas = []
+    monkeypatch.setattr(textract_engine, "convert_from_path", lambda ruta, **kwargs: [f"img{i}" for i in range(6)])
+    monkeypatch.setattr(textract_engine, "limpiar_imagen_para_ocr", lambda imagen: imagen)
+    monkeypatch.setattr(textract_engine, "inicializar_textract", lambda: "cliente")
+    monkeypatch.setattr(textract_engine, "extraer_texto_textract", lambda cliente, imagen: llamadas.append(imagen) or {"Blocks": []})
+    return llamadas
+
+def test_sin_cancelar_envia_todas_las_paginas(textract_simulado, tmp_path):
+    bandera = BanderaCancelacion(str(tmp_path / "doc.pdf.cancelar"))
+
+    assert textract_engine.extraer_documento_completo("doc.pdf", bandera) == ([], [])
+    assert len(textract_simulado) == 6
+
+def test_bandera_activa_no_envia_paginas(textract_simulado, tmp_path):
+    bandera = BanderaCancelacion(str(tmp_path / "doc.pdf.cancelar"))
+    bandera.activar()
+
+    with pytest.raises(ExtraccionCanceladaError):
+        textract_engine.extraer_documento_completo("doc.pdf", bandera)
+    assert textract_simulado == []
+
+def test_cancelar_a_medio_camino_detiene_las_paginas_pendientes(textract_simulado, tmp_path, monkeypatch):
+    """Las páginas que el pool aún no toma ven la bandera y no se cobran."""
+    bandera = BanderaCancelacion(str(tmp_path / "doc.pdf.cancelar"))
+
+    def extraer_y_cancelar(cliente, imagen):
+        textract_simulado.append(imagen)
+        bandera.activar()
+        return {"Blocks": []}
+
+    monkeypatch.setattr(textract_engine, "extraer_texto_textract", extraer_y_cancelar)
+    monkeypatch.setattr(textract_engine.concurrent.futures, "ThreadPoolExecutor",
+                        lambda max_workers: textract_engine.concurrent.futures.thread.ThreadPoolExecutor(max_workers=1))
+
+    with pytest.raises(ExtraccionCanceladaError, match="1/6"):
+        textract_engine.extraer_documento_completo("doc.pdf", bandera)
+    assert textract_simulado == ["img0"]
@@ -10,7 +10,8 @@ from Fluxo_IA_visual.utils.helpers import (
     extraer_unico, sumar_lista_montos, sanitizar_datos_ia, 
     total_depositos_verificacion, limpiar_y_normalizar_texto, 
     crear_objeto_resultado, verificar_fecha_comprobante,
-    aplicar_reglas_de_negocio, detectar_tipo_contribuyente
+    aplicar_reglas_de_negocio, detectar_tipo_contribuyente,
+    ContextoFechasCuenta, separar_fecha_y_ruido, construir_fecha_completa, calcular_periodo
 )
 
 pytest_plugins = ('pytest_asyncio',)
@@ -316,6 +317,38 @@ def test_limpiar_monto(entrada, esperado):
     """Prueba la limpieza con diferentes tipos de entrada."""
     assert limpiar_monto(entrada) == esperado
 
+# ---- Pruebas para ContextoFechasCuenta ----
+@pytest.mark.parametrize("fecha_raw, inicio, fin, esperado", [
+    ("05", "20/12/2024", "19/01/2025", ("05/01/2025", "01-01-2025", "")),   # Día bajo -> mes de fin
+    ("28", "20/12/2024", "19/01/2025", ("28/12/2024", "01-12-2024", "")),   # Día alto -> mes de inicio
+    ("125", "01/03/2025", "31/03/2025", ("25/03/2025", "01-03-2025", "")),  # Ruido OCR a la izquierda
+    ("02/ENE", "01/12/2024", "31/12/2024", ("02/01/2025", "01-01-2025", "")),  # BBVA con cambio de año
+    ("01-DIC-25 COMISION", "2025-12-01", "2025-12-31", ("01/12/2025", "01-12-2025", "COMISION")),
+    ("25/12/23 REF 88", "01/12/2023", "31/12/2023", ("25/12/2023", "01-12-2023", "REF 88")),
+    ("999", "01/03/2025", "31/03/2025", ("999/??/???? (Inválido)", "01-03-2025", "")),
+    ("07", None, None, ("07/??/????", "01-01-1900", "")),                   # Sin metadata del periodo
+])
+def test_contexto_fechas_resuelve_igual_que_las_funciones_sueltas(fecha_raw, inicio, fin, esperado):
+    """El contexto por cuenta da lo mismo que separar -> construir -> calcular_periodo fila por fila."""
+    fecha_pura, ruido = separar_fecha_y_ruido(fecha_raw)
+    fecha = construir_fecha_completa(fecha_pura, inicio, fin)
+
+    assert (fecha, calcular_periodo(fecha, inicio), ruido) == esperado
+    assert ContextoFechasCuenta(inicio, fin).resolver(fecha_raw) == esperado
+
+def test_contexto_fechas_parsea_el_periodo_una_vez_y_memoiza_tokens():
+    contexto = ContextoFechasCuenta("01/03/2025", "31/03/2025", max_memo=2)
+    assert contexto.dt_inicio == datetime(2025, 3, 1)
+    assert contexto.periodo_respaldo == "01-03-2025"
+
+    for token in ["05", "05", "05", "12", "05"]:
+        contexto.resolver(token)
+    assert contexto.resolver.cache_info().hits == 3
+
+    # Memo acotado: el token menos reciente sale al llenarse
+    contexto.resolver("20")
+    assert contexto.resolver.cache_info().currsize == 2
+
 # ---- Pruebas para limpiar_y_normalizar_texto ----
 def test_limpiar_texto_vacio():
     assert limpiar_y_normalizar_texto("") == ""
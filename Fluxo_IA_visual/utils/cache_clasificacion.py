@@ -0,0 +1,163 @@
+# utils/cache_clasificacion.py
+
+import os
+import re
+import json
+import time
+import logging
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+TIPOS_ABONO = {"abono", "deposito", "depósito", "credito", "crédito"}
+REGEX_DIGITOS = re.compile(r'\d+')
+REGEX_ESPACIOS = re.compile(r'\s+')
+
+class CacheClasificacionIA:
+    """
+    Caché persistente descripción -> etiqueta de la IA (Capa 2 del MotorClasificador).
+
+    La clave es (banco, tipo de movimiento, descripción canónica con dígitos enmascarados),
+    así "SPEI RECIBIDO 0012345 CLIENTE X" de marzo y de abril comparten entrada.
+    Se guarda la etiqueta CRUDA que devolvió la IA; la traducción a categoría del sistema
+    sigue ocurriendo en el ensamblaje del motor.
+
+    Expulsión LRU (máximo de entradas) + TTL por entrada. Se persiste a un JSON en disco
+    (escritura atómica con archivo temporal + rename) para sobrevivir reinicios.
+    """
+
+    def __init__(
+        self,
+        ruta: Optional[str] = None,
+        max_entradas: int = 50_000,
+        ttl_segundos: float = 30 * 86400,
+        intervalo_persistencia: float = 60.0
+    ):
+        self.ruta = ruta
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self.intervalo_persistencia = intervalo_persistencia
+        self._entradas: "OrderedDict[str, tuple]" = OrderedDict()  # clave -> (etiqueta, timestamp)
+        self._sucio = False
+        self._ultima_persistencia = 0.0
+
+        # --- MÉTRICAS ---
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+        if self.ruta:
+            self.cargar()
+
+    @staticmethod
+    def construir_clave(banco: str, tipo: str, descripcion: str) -> str:
+        """Clave canónica: banco | abono/cargo | descripción sin acentos, minúsculas y con dígitos -> '#'."""
+        banco_key = str(banco or "generico").lower().strip()
+        tipo_key = "abono" if str(tipo or "").lower().strip() in TIPOS_ABONO else "cargo"
+        desc = unicodedata.normalize('NFKD', str(descripcion or "").lower()).encode('ASCII', 'ignore').decode('utf-8')
+        desc = REGEX_DIGITOS.sub('#', desc)
+        desc = REGEX_ESPACIOS.sub(' ', desc).strip()
+        return f"{banco_key}|{tipo_key}|{desc}"
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    def obtener(self, clave: str) -> Optional[str]:
+        """Etiqueta cacheada o None. Una entrada vencida cuenta como fallo y se descarta."""
+        entrada = self._entradas.get(clave)
+        if entrada is not None and time.time() - entrada[1] <= self.ttl_segundos:
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[0]
+
+        if entrada is not None:
+            del self._entradas[clave]
+            self._sucio = True
+        self.fallos += 1
+        return None
+
+    def guardar(self, clave: str, etiqueta: str):
+        """Inserta/refresca una entrada y expulsa las menos usadas si se rebasa el máximo."""
+        if not clave or not etiqueta:
+            return
+        self._entradas[clave] = (str(etiqueta), time.time())
+        self._entradas.move_to_end(clave)
+        self._sucio = True
+
+        while len(self._entradas) > self.max_entradas:
+            self._entradas.popitem(last=False)
+            self.expulsiones += 1
+
+    def metricas(self) -> dict:
+        consultas = self.aciertos + self.fallos
+        return {
+            "entradas": len(self._entradas),
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0,
+            "expulsiones": self.expulsiones,
+        }
+
+    # =========================================================
+    # PERSISTENCIA
+    # =========================================================
+
+    def cargar(self):
+        """Carga el JSON del disco descartando entradas vencidas. Un archivo corrupto no detiene el servicio."""
+        if not self.ruta or not os.path.exists(self.ruta):
+            return
+        try:
+            with open(self.ruta, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+        except Exception as e:
+            logger.warning(f"Caché de clasificación ilegible, se inicia vacía: {e}")
+            return
+
+        ahora = time.time()
+        # El archivo se escribe de menos a más reciente: reinsertar en orden conserva el LRU
+        for clave, etiqueta, marca in datos.get("entradas", []):
+            if ahora - marca <= self.ttl_segundos:
+                self._entradas[clave] = (etiqueta, marca)
+        while len(self._entradas) > self.max_entradas:
+            self._entradas.popitem(last=False)
+
+        logger.info(f"Caché de clasificación cargada: {len(self._entradas)} entradas.")
+
+    def instantanea(self, forzar: bool = False) -> Optional[dict]:
+        """
+        Copia serializable del caché, o None si no hubo cambios o si la última escritura fue
+        hace menos de `intervalo_persistencia` (salvo `forzar`). Se toma en el event loop para
+        que la escritura pueda ir a un hilo sin que el OrderedDict mute mientras se recorre.
+        """
+        if not self._sucio:
+            return None
+        ahora = time.time()
+        if not forzar and ahora - self._ultima_persistencia < self.intervalo_persistencia:
+            return None
+        self._sucio = False
+        self._ultima_persistencia = ahora
+        return {"entradas": [[clave, etiqueta, marca] for clave, (etiqueta, marca) in self._entradas.items()]}
+
+    def escribir(self, datos: Optional[dict]):
+        """Escritura atómica (temporal + rename) de una instantánea."""
+        if not self.ruta or datos is None:
+            return
+        directorio = os.path.dirname(self.ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+        ruta_tmp = f"{self.ruta}.tmp"
+        try:
+            with open(ruta_tmp, "w", encoding="utf-8") as f:
+                json.dump(datos, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(ruta_tmp, self.ruta)
+        except Exception as e:
+            self._sucio = True  # Se reintenta en la siguiente persistencia
+            logger.warning(f"No se pudo persistir la caché de clasificación: {e}")
+
+    def persistir(self):
+        """Escritura inmediata (ej. al apagar la aplicación) si hubo cambios."""
+        if self.ruta:
+            self.escribir(self.instantanea(forzar=True))
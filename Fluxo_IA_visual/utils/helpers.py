@@ -11,6 +11,7 @@ import json
 from datetime import datetime, timedelta
 import logging
 import re
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
@@ -160,10 +161,40 @@ def extraer_rfc_curp_por_texto(texto: str, tipo_doc: str) -> Tuple[List[str], Li
 
 #     return transacciones
 
+def firma_caratula(cuenta: dict) -> tuple:
+    """
+    Firma única de una carátula para la deduplicación del lote:
+    Banco, RFC, CLABE, Periodos y Montos (Depósitos y Cargos) normalizados.
+    """
+    # 1. Normalización de campos de texto
+    banco = str(cuenta.get("banco", "")).strip().lower()
+    rfc = str(cuenta.get("rfc", "")).strip().upper()
+
+    # Nos quedamos solo con los números de la CLABE o Cuenta
+    clabe_raw = str(cuenta.get("clabe_interbancaria", ""))
+    clabe = ''.join(filter(str.isdigit, clabe_raw))
+
+    p_inicio = str(cuenta.get("periodo_inicio", "")).strip().lower()
+    p_fin = str(cuenta.get("periodo_fin", "")).strip().lower()
+
+    # 2. Normalización de campos numéricos (seguros contra Nones y comas)
+    try:
+        depositos = round(float(str(cuenta.get("depositos", 0.0)).replace(",", "")), 2)
+    except (ValueError, TypeError):
+        depositos = 0.0
+
+    try:
+        cargos = round(float(str(cuenta.get("cargos", 0.0)).replace(",", "")), 2)
+    except (ValueError, TypeError):
+        cargos = 0.0
+
+    # 3. Creación de la Firma Única (Tuple hash)
+    return (banco, rfc, clabe, p_inicio, p_fin, depositos, cargos)
+
 def filtrar_caratulas_duplicadas(lista_cuentas: list, firmas_vistas_globales: set) -> list:
     """
     Filtra una lista de carátulas extraídas evaluando su unicidad.
-    Se considera duplicado si coincide exactamente en:
+    Se considera duplicado si coincide exactamente en la firma de `firma_caratula`:
     Banco, RFC, CLABE, Periodos y Montos (Depósitos y Cargos).
     
     Args:
@@ -177,36 +208,14 @@ def filtrar_caratulas_duplicadas(lista_cuentas: list, firmas_vistas_globales: se
     cuentas_unicas = []
 
     for cuenta in lista_cuentas:
-        # 1. Normalización de campos de texto
-        banco = str(cuenta.get("banco", "")).strip().lower()
-        rfc = str(cuenta.get("rfc", "")).strip().upper()
-        
-        # Nos quedamos solo con los números de la CLABE o Cuenta
-        clabe_raw = str(cuenta.get("clabe_interbancaria", ""))
-        clabe = ''.join(filter(str.isdigit, clabe_raw))
-        
-        p_inicio = str(cuenta.get("periodo_inicio", "")).strip().lower()
-        p_fin = str(cuenta.get("periodo_fin", "")).strip().lower()
-
-        # 2. Normalización de campos numéricos (seguros contra Nones y comas)
-        try:
-            depositos = round(float(str(cuenta.get("depositos", 0.0)).replace(",", "")), 2)
-        except (ValueError, TypeError):
-            depositos = 0.0
-
-        try:
-            cargos = round(float(str(cuenta.get("cargos", 0.0)).replace(",", "")), 2)
-        except (ValueError, TypeError):
-            cargos = 0.0
+        firma_cuenta = firma_caratula(cuenta)
 
-        # 3. Creación de la Firma Única (Tuple hash)
-        firma_cuenta = (banco, rfc, clabe, p_inicio, p_fin, depositos, cargos)
-
-        # 4. Evaluación
+        # Evaluación
         if firma_cuenta not in firmas_vistas_globales:
             firmas_vistas_globales.add(firma_cuenta)
             cuentas_unicas.append(cuenta)
         else:
+            banco, rfc, _, _, p_fin, _, _ = firma_cuenta
             logger.info(f"[Filtro Duplicados] Se omitió un estado de cuenta duplicado: {banco.upper()} | RFC: {rfc} | Periodo: {p_fin}")
 
     return cuentas_unicas
@@ -492,6 +501,20 @@ def crear_objeto_resultado(datos_dict: dict) -> AnalisisTPV.ResultadoExtraccion:
             )
         )
 
+# --- FECHAS DE TRANSACCIONES ---
+REGEX_FECHA_TEXTUAL_LARGA = re.compile(r'^(\d{1,2}\s*[-/]\s*[a-zA-Z]{3}\s*[-/]\s*\d{2,4})(.*)', re.IGNORECASE)
+REGEX_FECHA_NUMERICA = re.compile(r'^(\d{1,2}\s*[-/]\s*\d{1,2}\s*[-/]\s*\d{2,4})(.*)')
+REGEX_FECHA_CORTA = re.compile(r'^(\d{1,2}\s*[-/]\s*[a-zA-Z]{3})(.*)', re.IGNORECASE)
+REGEX_FECHA_BBVA = re.compile(r'(\d{1,2})\/([a-zA-Z]{3})')
+REGEX_FECHA_COMPLETA = re.compile(r'\b(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})\b')
+REGEX_DIA_SUELTO = re.compile(r'\b(\d{1,3})\b')
+
+FORMATOS_FECHA_PERIODO = ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y")
+MESES_ABREVIADOS = {"ene":1,"feb":2,"mar":3,"abr":4,"may":5,"jun":6,"jul":7,"ago":8,"sep":9,"oct":10,"nov":11,"dic":12}
+
+# Tope del memo de fechas crudas por cuenta (un estado trae unas cuantas decenas de días distintos)
+MAX_FECHAS_MEMO_CUENTA = 1024
+
 def separar_fecha_y_ruido(raw_text: str) -> Tuple[str, str]:
     """
     Toma "01-DIC-25 COMISION" y devuelve ("01-DIC-25", "COMISION").
@@ -502,180 +525,215 @@ def separar_fecha_y_ruido(raw_text: str) -> Tuple[str, str]:
 
     # Prioridad 1: Formato Textual Largo (01-DIC-25 o 01/ENE/2025)
     # Busca digito + sep + letras + sep + digitos
-    match_largo = re.match(r'^(\d{1,2}\s*[-/]\s*[a-zA-Z]{3}\s*[-/]\s*\d{2,4})(.*)', raw_text, re.IGNORECASE)
+    match_largo = REGEX_FECHA_TEXTUAL_LARGA.match(raw_text)
     if match_largo:
         return match_largo.group(1).strip(), match_largo.group(2).strip()
 
     # Prioridad 2: Formato Numérico (01/12/25 o 01-12-2025)
-    match_num = re.match(r'^(\d{1,2}\s*[-/]\s*\d{1,2}\s*[-/]\s*\d{2,4})(.*)', raw_text)
+    match_num = REGEX_FECHA_NUMERICA.match(raw_text)
     if match_num:
         return match_num.group(1).strip(), match_num.group(2).strip()
 
     # Prioridad 3: Formato Corto/BBVA (02/ENE - sin año)
     # Cuidado: Esto podría confundirse si hay texto pegado, asumimos separador visual
-    match_corto = re.match(r'^(\d{1,2}\s*[-/]\s*[a-zA-Z]{3})(.*)', raw_text, re.IGNORECASE)
+    match_corto = REGEX_FECHA_CORTA.match(raw_text)
     if match_corto:
         return match_corto.group(1).strip(), match_corto.group(2).strip()
         
     # Si no detecta patrón claro, devuelve todo como fecha y nada de ruido
     # (para que construir_fecha_completa intente salvarlo o falle ahí)
     return raw_text, ""
-    
-def construir_fecha_completa(dia_raw: str, periodo_inicio_str: str, periodo_fin_str: str) -> str:
-    """
-    Recibe un día (ej: "02", "15", "125", "30/12") y las fechas del periodo.
-    Devuelve la fecha completa formateada (dd/mm/yyyy).
-    """
-    if not dia_raw: return ""
-    dia_raw = str(dia_raw).strip()
 
-    # --- HELPER INTERNO: PARSEO DE FECHAS DE METADATA ---
-    def parse_meta_fecha(f_str):
-        if not f_str: return None
-        for fmt in ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y"):
+def parsear_fecha_periodo(f_str: Any) -> Optional[datetime]:
+    """Fecha de metadata del periodo (periodo_inicio / periodo_fin) en cualquiera de los formatos aceptados."""
+    if not f_str: return None
+    for fmt in FORMATOS_FECHA_PERIODO:
+        try:
+            return datetime.strptime(str(f_str).strip(), fmt)
+        except ValueError:
+            continue
+    return None
+
+class ContextoFechasCuenta:
+    """
+    Periodo de una cuenta (inicio/fin) parseado una sola vez, más un memo acotado (LRU) de las
+    fechas crudas ya resueltas: en un estado de cuenta el mismo token de día se repite en muchas
+    filas, así que resolverlo de nuevo es solo una búsqueda en diccionario.
+    """
+
+    def __init__(self, periodo_inicio_str: Any = None, periodo_fin_str: Any = None, max_memo: int = MAX_FECHAS_MEMO_CUENTA):
+        self.dt_inicio = parsear_fecha_periodo(periodo_inicio_str)
+        self.dt_fin = parsear_fecha_periodo(periodo_fin_str)
+        # Fallback de calcular_periodo cuando la fecha OCR no sirve
+        self.periodo_respaldo = f"01-{self.dt_inicio.month:02d}-{self.dt_inicio.year}" if self.dt_inicio else "01-01-1900"
+        self.resolver = lru_cache(maxsize=max_memo)(self._resolver)
+
+    def _resolver(self, fecha_raw: Any) -> Tuple[str, str, str]:
+        """Fecha cruda del motor -> (fecha dd/mm/yyyy, periodo 01-mm-yyyy, ruido pegado a la fecha)."""
+        fecha_pura_raw, ruido = separar_fecha_y_ruido(fecha_raw)
+        fecha_final = self.fecha_completa(fecha_pura_raw)
+        return fecha_final, self.periodo(fecha_final), ruido
+
+    def periodo(self, fecha_transaccion: str) -> str:
+        """Ver `calcular_periodo`."""
+        # 1. Intentar extraer de la fecha de la transacción (Viene de construir_fecha_completa)
+        if fecha_transaccion and "??" not in fecha_transaccion:
+            partes = fecha_transaccion.split("/")
+            if len(partes) == 3:
+                mes = partes[1].zfill(2)
+                anio = partes[2]
+                return f"01-{mes}-{anio}"
+
+        # 2. Fallback: mes del periodo_inicio (o 01-01-1900 para que no truene la base de datos)
+        return self.periodo_respaldo
+
+    def fecha_completa(self, dia_raw: str) -> str:
+        """Ver `construir_fecha_completa`."""
+        if not dia_raw: return ""
+        dia_raw = str(dia_raw).strip()
+
+        dt_inicio = self.dt_inicio
+        dt_fin = self.dt_fin
+
+        # CASO ESPECIAL: DETECCIÓN FORMATO BBVA (DD/MMM)
+        match_bbva = REGEX_FECHA_BBVA.match(dia_raw)
+        if match_bbva:
+            dia_bbva = int(match_bbva.group(1))
+            mes_bbva_str = match_bbva.group(2).lower()[:3] # 'jul'
+            mes_num = MESES_ABREVIADOS.get(mes_bbva_str)
+            
+            if mes_num and dt_inicio:
+                # MAGIA DEL AÑO:
+                # Si el mes detectado es el mismo (o cercano) al inicio del periodo, usamos año inicio.
+                # Si el mes es ENE y el periodo empezó en DIC, sumamos año.
+                # Si el mes es DIC y el periodo termina en ENE, restamos año (raro en este orden).
+                
+                anio_calc = dt_inicio.year
+                
+                # Caso cambio de año (Periodo Dic 2024 -> Ene 2025)
+                if dt_inicio.month == 12 and mes_num == 1:
+                    anio_calc += 1
+                elif dt_inicio.month == 11 and mes_num == 1: # Nov -> Ene
+                    anio_calc += 1
+                
+                # Validación con fecha fin si existe
+                if dt_fin and dt_fin.year != dt_inicio.year:
+                    if mes_num == dt_fin.month:
+                        anio_calc = dt_fin.year
+                
+                return f"{dia_bbva:02d}/{mes_num:02d}/{anio_calc}"
+                
+            return dia_raw
+
+        # --- CASO 1: ¿YA ES UNA FECHA COMPLETA? ---
+        # A veces el 'dia_raw' viene como "25/12/2023" o "25-12-23"
+        match_full = REGEX_FECHA_COMPLETA.search(dia_raw)
+        if match_full:
+            d, m, y = map(int, match_full.groups())
+            # Ajuste de año corto (ej: 25 -> 2025)
+            if y < 100: y += 2000 
             try:
-                return datetime.strptime(str(f_str).strip(), fmt)
+                return datetime(y, m, d).strftime("%d/%m/%Y")
             except ValueError:
-                continue
-        return None
+                pass # Si falla, seguimos intentando como día suelto
+
+        # --- CASO 2: LIMPIEZA INTELIGENTE DEL DÍA ---
+        # Usamos regex para sacar solo el PRIMER grupo de dígitos encontrado
+        # Esto evita que "25 Dic" se convierta en "25" pero "| 25" se convierta en "25"
+        match_dia = REGEX_DIA_SUELTO.search(dia_raw)
+        if not match_dia:
+            # Intento desesperado: filtrar todo lo que no sea dígito
+            dia_str = "".join(filter(str.isdigit, dia_raw))
+        else:
+            dia_str = match_dia.group(1)
 
-    dt_inicio = parse_meta_fecha(periodo_inicio_str)
-    dt_fin = parse_meta_fecha(periodo_fin_str)
+        if not dia_str: return dia_raw
 
-    # CASO ESPECIAL: DETECCIÓN FORMATO BBVA (DD/MMM)
-    match_bbva = re.match(r'(\d{1,2})\/([a-zA-Z]{3})', str(dia_raw))
-    if match_bbva:
-        dia_bbva = int(match_bbva.group(1))
-        mes_bbva_str = match_bbva.group(2).lower()[:3] # 'jul'
-        
-        # Mapa simple
-        meses = {"ene":1,"feb":2,"mar":3,"abr":4,"may":5,"jun":6,"jul":7,"ago":8,"sep":9,"oct":10,"nov":11,"dic":12}
-        mes_num = meses.get(mes_bbva_str)
-        
-        if mes_num and dt_inicio:
-            # MAGIA DEL AÑO:
-            # Si el mes detectado es el mismo (o cercano) al inicio del periodo, usamos año inicio.
-            # Si el mes es ENE y el periodo empezó en DIC, sumamos año.
-            # Si el mes es DIC y el periodo termina en ENE, restamos año (raro en este orden).
-            
-            anio_calc = dt_inicio.year
-            
-            # Caso cambio de año (Periodo Dic 2024 -> Ene 2025)
-            if dt_inicio.month == 12 and mes_num == 1:
-                anio_calc += 1
-            elif dt_inicio.month == 11 and mes_num == 1: # Nov -> Ene
-                anio_calc += 1
-            
-            # Validación con fecha fin si existe
-            if dt_fin and dt_fin.year != dt_inicio.year:
-                if mes_num == dt_fin.month:
-                    anio_calc = dt_fin.year
-            
-            return f"{dia_bbva:02d}/{mes_num:02d}/{anio_calc}"
-            
-        return dia_raw
-
-    # --- CASO 1: ¿YA ES UNA FECHA COMPLETA? ---
-    # A veces el 'dia_raw' viene como "25/12/2023" o "25-12-23"
-    # Regex busca patrones dd/mm/aaaa o dd-mm-aaaa
-    match_full = re.search(r'\b(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})\b', dia_raw)
-    if match_full:
-        d, m, y = map(int, match_full.groups())
-        # Ajuste de año corto (ej: 25 -> 2025)
-        if y < 100: y += 2000 
         try:
-            return datetime(y, m, d).strftime("%d/%m/%Y")
-        except ValueError:
-            pass # Si falla, seguimos intentando como día suelto
-
-    # --- CASO 2: LIMPIEZA INTELIGENTE DEL DÍA ---
-    # Usamos regex para sacar solo el PRIMER grupo de dígitos encontrado
-    # Esto evita que "25 Dic" se convierta en "25" pero "| 25" se convierta en "25"
-    match_dia = re.search(r'\b(\d{1,3})\b', dia_raw)
-    if not match_dia:
-        # Intento desesperado: filtrar todo lo que no sea dígito
-        dia_str = "".join(filter(str.isdigit, dia_raw))
-    else:
-        dia_str = match_dia.group(1)
-
-    if not dia_str: return dia_raw
+            dia_int = int(dia_str)
+        except:
+            return dia_raw
+
+        # --- CORRECCIÓN DE ERRORES OCR (El problema del 125) ---
+        if dia_int > 31:
+            # Si es mayor a 31, asumimos ruido a la izquierda (ej: "125" -> "25")
+            dia_posible = int(str(dia_int)[-2:]) # Tomamos los últimos 2
+            if 1 <= dia_posible <= 31:
+                dia_int = dia_posible
+            else:
+                # Si aún así falla (ej: "999"), devolvemos error visual
+                return f"{dia_int}/??/???? (Inválido)"
+        
+        if dia_int == 0: dia_int = 1 # Corrección mínima
 
-    try:
-        dia_int = int(dia_str)
-    except:
-        return dia_raw
-
-    # --- CORRECCIÓN DE ERRORES OCR (El problema del 125) ---
-    if dia_int > 31:
-        # Si es mayor a 31, asumimos ruido a la izquierda (ej: "125" -> "25")
-        dia_posible = int(str(dia_int)[-2:]) # Tomamos los últimos 2
-        if 1 <= dia_posible <= 31:
-            dia_int = dia_posible
-        else:
-            # Si aún así falla (ej: "999"), devolvemos error visual
-            return f"{dia_int}/??/???? (Inválido)"
-    
-    if dia_int == 0: dia_int = 1 # Corrección mínima
+        # --- LÓGICA DE ASIGNACIÓN DE MES/AÑO ---
+        if not dt_inicio:
+            # Sin metadata, no podemos adivinar
+            return f"{dia_int:02d}/??/????"
 
-    # --- LÓGICA DE ASIGNACIÓN DE MES/AÑO ---
-    if not dt_inicio:
-        # Sin metadata, no podemos adivinar
-        return f"{dia_int:02d}/??/????"
+        # Candidatos: El día puede pertenecer al mes de inicio o al mes de fin
+        # Creamos fechas hipotéticas
+        fechas_candidatas = []
+        
+        # Opción A: Mes/Año de inicio
+        try:
+            candidato_inicio = datetime(dt_inicio.year, dt_inicio.month, dia_int)
+            fechas_candidatas.append(candidato_inicio)
+        except ValueError: pass # Ej: dia 31 en mes de 30 días
 
-    # Candidatos: El día puede pertenecer al mes de inicio o al mes de fin
-    # Creamos fechas hipotéticas
-    fechas_candidatas = []
-    
-    # Opción A: Mes/Año de inicio
-    try:
-        candidato_inicio = datetime(dt_inicio.year, dt_inicio.month, dia_int)
-        fechas_candidatas.append(candidato_inicio)
-    except ValueError: pass # Ej: dia 31 en mes de 30 días
+        # Opción B: Mes/Año de fin (si existe y es diferente mes)
+        if dt_fin and (dt_fin.month != dt_inicio.month or dt_fin.year != dt_inicio.year):
+            try:
+                candidato_fin = datetime(dt_fin.year, dt_fin.month, dia_int)
+                fechas_candidatas.append(candidato_fin)
+            except ValueError: pass
 
-    # Opción B: Mes/Año de fin (si existe y es diferente mes)
-    if dt_fin and (dt_fin.month != dt_inicio.month or dt_fin.year != dt_inicio.year):
+        # Opción C: Mes siguiente al inicio (para periodos largos o saltos de año)
+        # Si el periodo es 20 Dic - 20 Ene, y tenemos día 05.
         try:
-            candidato_fin = datetime(dt_fin.year, dt_fin.month, dia_int)
-            fechas_candidatas.append(candidato_fin)
+            # Truco para obtener el mes siguiente
+            mes_sig = (dt_inicio.replace(day=1) + timedelta(days=32)).replace(day=dia_int)
+            fechas_candidatas.append(mes_sig)
         except ValueError: pass
 
-    # Opción C: Mes siguiente al inicio (para periodos largos o saltos de año)
-    # Si el periodo es 20 Dic - 20 Ene, y tenemos día 05.
-    try:
-        # Truco para obtener el mes siguiente
-        mes_sig = (dt_inicio.replace(day=1) + timedelta(days=32)).replace(day=dia_int)
-        fechas_candidatas.append(mes_sig)
-    except ValueError: pass
-
-    # --- SELECCIÓN DEL MEJOR CANDIDATO ---
-    mejor_fecha = None
-    
-    if dt_fin:
-        # Si tenemos rango cerrado, buscamos cuál cae DENTRO (o más cerca)
-        for fecha in fechas_candidatas:
-            if dt_inicio <= fecha <= dt_fin:
-                mejor_fecha = fecha
-                break
-    
-    # Si ninguno cayó dentro (o no hay fin), usamos la heurística original
-    if not mejor_fecha:
-        if dt_fin and dt_inicio.month != dt_fin.month:
-            # Heurística simple: Si el día es alto (>20) va al inicio, si es bajo (<10) va al fin
-            if dia_int >= dt_inicio.day:
-                mejor_fecha = fechas_candidatas[0] if fechas_candidatas else None
-            elif len(fechas_candidatas) > 1:
-                mejor_fecha = fechas_candidatas[1]
+        # --- SELECCIÓN DEL MEJOR CANDIDATO ---
+        mejor_fecha = None
+        
+        if dt_fin:
+            # Si tenemos rango cerrado, buscamos cuál cae DENTRO (o más cerca)
+            for fecha in fechas_candidatas:
+                if dt_inicio <= fecha <= dt_fin:
+                    mejor_fecha = fecha
+                    break
+        
+        # Si ninguno cayó dentro (o no hay fin), usamos la heurística original
+        if not mejor_fecha:
+            if dt_fin and dt_inicio.month != dt_fin.month:
+                # Heurística simple: Si el día es alto (>20) va al inicio, si es bajo (<10) va al fin
+                if dia_int >= dt_inicio.day:
+                    mejor_fecha = fechas_candidatas[0] if fechas_candidatas else None
+                elif len(fechas_candidatas) > 1:
+                    mejor_fecha = fechas_candidatas[1]
+                else:
+                    mejor_fecha = fechas_candidatas[0] if fechas_candidatas else None
             else:
+                # Si es el mismo mes, o no hay fin, nos quedamos con la opción A
                 mejor_fecha = fechas_candidatas[0] if fechas_candidatas else None
+
+        if mejor_fecha:
+            return mejor_fecha.strftime("%d/%m/%Y")
         else:
-            # Si es el mismo mes, o no hay fin, nos quedamos con la opción A
-            mejor_fecha = fechas_candidatas[0] if fechas_candidatas else None
+            # Fallback de seguridad
+            return f"{dia_int:02d}/{dt_inicio.month:02d}/{dt_inicio.year}"
 
-    if mejor_fecha:
-        return mejor_fecha.strftime("%d/%m/%Y")
-    else:
-        # Fallback de seguridad
-        return f"{dia_int:02d}/{dt_inicio.month:02d}/{dt_inicio.year}"
+def construir_fecha_completa(dia_raw: str, periodo_inicio_str: str, periodo_fin_str: str) -> str:
+    """
+    Recibe un día (ej: "02", "15", "125", "30/12") y las fechas del periodo.
+    Devuelve la fecha completa formateada (dd/mm/yyyy).
+    Para muchas filas de la misma cuenta conviene un solo `ContextoFechasCuenta`.
+    """
+    if not dia_raw: return ""
+    return ContextoFechasCuenta(periodo_inicio_str, periodo_fin_str).fecha_completa(dia_raw)
 
 def calcular_periodo(fecha_transaccion: str, periodo_inicio_str: str = None) -> str:
     """
@@ -683,25 +741,7 @@ def calcular_periodo(fecha_transaccion: str, periodo_inicio_str: str = None) ->
     Devuelve el formato estandarizado: 01-mm-yyyy.
     Si la fecha es inválida, usa el periodo_inicio como salvavidas.
     """
-    # 1. Intentar extraer de la fecha de la transacción (Viene de construir_fecha_completa)
-    if fecha_transaccion and "??" not in fecha_transaccion:
-        partes = fecha_transaccion.split("/")
-        if len(partes) == 3:
-            mes = partes[1].zfill(2)
-            anio = partes[2]
-            return f"01-{mes}-{anio}"
-
-    # 2. Fallback: Si la fecha OCR fue un desastre, usamos el mes del periodo_inicio
-    if periodo_inicio_str:
-        for fmt in ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y"):
-            try:
-                dt = datetime.strptime(str(periodo_inicio_str).strip(), fmt)
-                return f"01-{dt.month:02d}-{dt.year}"
-            except ValueError:
-                continue
-
-    # 3. Fallback extremo (Para que no truene la base de datos)
-    return "01-01-1900"
+    return ContextoFechasCuenta(periodo_inicio_str).periodo(fecha_transaccion)
         
 # --- FUNCIONES AUXILIARES NOMIFLASH ---
 def verificar_fecha_comprobante(fecha_str: Optional[str]) -> Optional[bool]:
@@ -0,0 +1,92 @@
+# utils/matcher_tags.py
+
+from collections import deque
+from typing import Dict, List
+
+class AutomataTags:
+    """
+    Autómata Aho-Corasick sobre las palabras clave de CONFIGURACION_TAGS.
+
+    Se compila una sola vez y, en UNA pasada por la descripción, devuelve todos los tags
+    cuyas palabras aparecen como substring (misma semántica que `any(p in desc for p in palabras)`).
+    Cada estado guarda una máscara de bits con los tags que terminan ahí (incluye los heredados
+    por los enlaces de fallo), así que la unión de tags es un OR de enteros.
+    """
+
+    def __init__(self, configuracion_tags: Dict):
+        # Orden estable de tags = orden de la configuración (los bits siguen ese orden)
+        self.tags: List = list(configuracion_tags.keys())
+        self._transiciones: List[Dict[str, int]] = [{}]
+        self._salidas: List[int] = [0]
+        self._fallos: List[int] = [0]
+        self._mascara_siempre = 0  # Tags con palabra vacía: "" está contenido en cualquier texto
+
+        for bit, tag in enumerate(self.tags):
+            for palabra in configuracion_tags[tag].get("palabras", []):
+                if not palabra:
+                    self._mascara_siempre |= 1 << bit
+                    continue
+                self._agregar_palabra(palabra, 1 << bit)
+
+        self._construir_fallos()
+
+    def _agregar_palabra(self, palabra: str, mascara: int):
+        estado = 0
+        for caracter in palabra:
+            siguiente = self._transiciones[estado].get(caracter)
+            if siguiente is None:
+                siguiente = len(self._transiciones)
+                self._transiciones.append({})
+                self._salidas.append(0)
+                self._fallos.append(0)
+                self._transiciones[estado][caracter] = siguiente
+            estado = siguiente
+        self._salidas[estado] |= mascara
+
+    def _construir_fallos(self):
+        """
+        BFS clásico: el fallo de un estado es el sufijo propio más largo que también es prefijo.
+        De paso se completa la tabla de transiciones (DFA), así la búsqueda nunca sigue
+        enlaces de fallo: un carácter = un lookup. Caracteres fuera del alfabeto regresan a la raíz.
+        """
+        transiciones = self._transiciones
+        orden_bfs = []
+        cola = deque(transiciones[0].values())
+        while cola:
+            estado = cola.popleft()
+            orden_bfs.append(estado)
+            for caracter, hijo in transiciones[estado].items():
+                cola.append(hijo)
+                fallo = self._fallos[estado]
+                while fallo and caracter not in transiciones[fallo]:
+                    fallo = self._fallos[fallo]
+                destino = transiciones[fallo].get(caracter, 0)
+                self._fallos[hijo] = destino if destino != hijo else 0
+                self._salidas[hijo] |= self._salidas[self._fallos[hijo]]
+
+        # Completar el DFA en orden BFS: el estado de fallo (menos profundo) ya está completo
+        self._delta: List[Dict[str, int]] = [dict(transiciones[0])]
+        self._delta.extend({} for _ in range(len(transiciones) - 1))
+        for estado in orden_bfs:
+            completo = dict(self._delta[self._fallos[estado]])
+            completo.update(transiciones[estado])
+            # Transiciones que regresan a la raíz se omiten (el default del lookup ya es 0)
+            self._delta[estado] = {c: s for c, s in completo.items() if s}
+
+    def buscar_mascara(self, texto: str) -> int:
+        """Máscara de bits de todos los tags presentes en el texto."""
+        delta = self._delta
+        salidas = self._salidas
+        encontrados = self._mascara_siempre
+        estado = 0
+
+        for caracter in texto:
+            estado = delta[estado].get(caracter, 0)
+            encontrados |= salidas[estado]
+
+        return encontrados
+
+    def buscar(self, texto: str) -> List:
+        """Tags presentes en el texto, en el orden de la configuración."""
+        mascara = self.buscar_mascara(texto)
+        return [tag for bit, tag in enumerate(self.tags) if mascara >> bit & 1]
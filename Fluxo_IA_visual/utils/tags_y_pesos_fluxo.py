@@ -13,6 +13,7 @@ from .helpers_texto_fluxo import (
     PALABRAS_BMRCASH,
     PALABRAS_TRASPASO_MORATORIO
 )
+from .matcher_tags import AutomataTags
 
 # --- NUEVO ECOSISTEMA DE CLASIFICACIÓN (MOTOR HÍBRIDO) ---
 
@@ -91,4 +92,7 @@ CONFIGURACION_TAGS = {
         "peso": 20,
         "palabras": PALABRAS_TRASPASO_MORATORIO
     }
-}
\ No newline at end of file
+}
+
+# Autómata compilado UNA vez al importar: una sola pasada por descripción devuelve todos los tags
+AUTOMATA_TAGS = AutomataTags(CONFIGURACION_TAGS)